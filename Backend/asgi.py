@@ -0,0 +1,198 @@
+"""
+ASGI 入口
+
+把 server.py 中的 Flask 应用包装为 ASGI 应用，接口与同步部署完全相同。
+事件循环只负责连接和请求读写，路由处理（服务调用、加锁、数据库访问）
+在有限大小的线程池中执行，空闲的长连接和轮询连接不再各自占用一个线程。
+
+没有 Content-Length 的响应（如事件流、长轮询）按块转发给客户端。响应迭代对象
+在需要等待时产出 utils.async_wait.Wait，适配器在事件循环中 await 它，状态变化时
+由服务线程通过 loop.call_soon_threadsafe 唤醒：等待中的事件流和长轮询不占用线程，
+线程池只执行两次等待之间的短暂处理。
+
+可以由 run_async_server.py 内置的 asyncio HTTP 服务器运行，
+也可以交给任意 ASGI 服务器，例如: uvicorn asgi:application
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from utils.async_wait import ASYNC_WAIT_ENVIRON, Wait
+
+# 响应迭代对象结束的标记
+_END = object()
+
+
+class WSGIToASGI:
+    """在线程池中运行 WSGI 应用的 ASGI 适配器"""
+
+    def __init__(self, wsgi_app: Callable, max_threads: int,
+                 on_shutdown: Optional[Callable[[], None]] = None):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="asgi-handler")
+        self.on_shutdown = on_shutdown
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        # 读取完整请求体（接口请求体都很小）
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.extend(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        environ = self._build_environ(scope, bytes(body))
+        loop = asyncio.get_running_loop()
+        response, response_body, result = await loop.run_in_executor(self.executor, self._run_wsgi, environ)
+
+        if result is None:
+            await self._send_start(send, response)
+            await send({"type": "http.response.body", "body": response_body})
+            return
+
+        # 流式响应：在线程池中取下一块（不阻塞），遇到 Wait 在事件循环中等待；
+        # 响应头在第一块之前发送（长轮询等待结束后才调用 start_response）。
+        # 客户端断开（发送失败）时关闭迭代器
+        started = False
+        try:
+            iterator = iter(result)
+            while True:
+                item = await loop.run_in_executor(self.executor, next, iterator, _END)
+                if item is _END:
+                    break
+                if isinstance(item, Wait):
+                    await item.wakeup.wait_async(item.timeout)
+                    continue
+                if not started:
+                    await self._send_start(send, response)
+                    started = True
+                if item:
+                    await send({"type": "http.response.body", "body": item, "more_body": True})
+            if not started:
+                await self._send_start(send, response)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                await loop.run_in_executor(self.executor, result.close)
+
+    @staticmethod
+    async def _send_start(send: Callable, response: Dict[str, Any]):
+        if "status" not in response:
+            raise RuntimeError("WSGI 应用没有调用 start_response")
+        await send({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        """服务在导入 server 时已经初始化，这里只处理关闭"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.on_shutdown:
+                    await asyncio.get_running_loop().run_in_executor(self.executor, self.on_shutdown)
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _run_wsgi(self, environ: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes, Any]:
+        """
+        在工作线程中调用 WSGI 应用，返回响应状态（status、headers）、响应体和流式响应的迭代对象
+
+        带 Content-Length 的响应在这里读完，迭代对象为 None；否则不读取响应体，
+        由调用方逐块读取。应用可以推迟到产出第一块时才调用 start_response，
+        此时返回的响应状态为空，由调用方在发送第一块前读取。
+        """
+        response: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ]
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        if "headers" not in response or not any(name == b"content-length" for name, _ in response["headers"]):
+            return response, b"", result
+
+        try:
+            for chunk in result:
+                if chunk:
+                    chunks.append(chunk)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+        return response, b"".join(chunks), None
+
+    @staticmethod
+    def _build_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+        """按 PEP 3333 由 ASGI scope 构造 WSGI environ"""
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+            ASYNC_WAIT_ENVIRON: True,
+        }
+
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_LENGTH":
+                continue
+            if name != "CONTENT_TYPE":
+                name = f"HTTP_{name}"
+            if name in environ:
+                value = f"{environ[name]},{value}"
+            environ[name] = value
+
+        return environ
+
+
+def create_application() -> WSGIToASGI:
+    """导入 server（初始化全部服务）并创建 ASGI 应用"""
+    import server
+    return WSGIToASGI(server.app, Config.ASYNC_HANDLER_THREADS, on_shutdown=server.shutdown_services)
+
+
+_application: Optional[WSGIToASGI] = None
+
+
+def __getattr__(name: str):
+    """ASGI 服务器的入口 application 在第一次访问时创建（只导入适配器时不初始化服务）"""
+    global _application
+    if name == "application":
+        if _application is None:
+            _application = create_application()
+        return _application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+数据模型内存基准测试
+对比热点模型改用 __slots__ 前后每个对象占用的字节数
+
+改造前的数据来自 git 历史中改造前版本的 models 包：基准版本的 models 导出到临时目录，
+两个版本分别在独立的子进程中导入和测量。
+
+用法: python benchmark_model_memory.py [对象数量] [--baseline 基准版本]
+"""
+
+import argparse
+import sys
+import os
+import gc
+import io
+import json
+import subprocess
+import tarfile
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_NAMES = ["WaitingCar", "ChargingRequest", "ChargingSession", "ChargingBill", "ChargingPile", "User"]
+
+def model_factories():
+    """导入 sys.path 中最先找到的 models 包，返回 模型名称 -> 构造函数"""
+    from models.queue_system_model import WaitingCar
+    from models.charging_request_model import ChargingRequest, ChargeMode
+    from models.charging_session_model import ChargingSession
+    from models.charging_bill_model import ChargingBill
+    from models.charging_pile_model import ChargingPile, PileType
+    from models.user_model import User
+
+    def make_car(i):
+        return WaitingCar(f"user{i}", f"REQ{i}", "fast" if i % 2 else "slow", 10.0 + i % 50)
+
+    def make_request(i):
+        return ChargingRequest(f"user{i}", ChargeMode.FAST if i % 2 else ChargeMode.SLOW, 10.0 + i % 50)
+
+    def make_session(i):
+        session = ChargingSession(f"SESSION_user{i}_A_{i}", f"user{i}", "A", 10.0 + i % 50, 30.0)
+        session.start_charging()
+        session.update_progress(5.0 + i % 5)
+        session.interrupt_charging("用户主动停止")
+        return session
+
+    def make_bill(i):
+        start_time = datetime(2024, 1, 1, 8) + timedelta(minutes=i % 1440)
+        return ChargingBill(f"user{i}", "A", 10.0 + i % 50, start_time, start_time + timedelta(minutes=20 + i % 90))
+
+    def make_pile(i):
+        return ChargingPile(f"P{i}", f"快充桩 P{i}", PileType.FAST, 30)
+
+    def make_user(i):
+        return User(f"user{i}", "123", "user")
+
+    return dict(zip(MODEL_NAMES, [make_car, make_request, make_session, make_bill, make_pile, make_user]))
+
+def measure(factory, count):
+    """测量保留 count 个对象时每个对象的平均字节数"""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    objects = [factory(i) for i in range(count)]
+
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del objects
+    return used / count
+
+def git(*args, cwd=BACKEND_DIR):
+    return subprocess.run(["git", *args], cwd=cwd, check=True,
+                          capture_output=True).stdout
+
+def default_baseline():
+    """最早引入 __slots__ 的 models 提交的父提交"""
+    commits = git("log", "--reverse", "--format=%H", "-S__slots__", "--", "models").decode().split()
+    if not commits:
+        raise RuntimeError("git 历史中没有找到引入 __slots__ 的提交，请用 --baseline 指定基准版本")
+    return commits[0] + "^"
+
+def export_models(revision, target_dir):
+    """把指定版本的 models 包导出到 target_dir"""
+    prefix = git("rev-parse", "--show-prefix").decode().strip()
+    toplevel = git("rev-parse", "--show-toplevel").decode().strip()
+    archive = git("archive", "--format=tar", "--prefix=models/", f"{revision}:{prefix}models", cwd=toplevel)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target_dir)
+    return target_dir
+
+def measure_in_subprocess(models_root, count):
+    """在独立进程中导入 models_root 下的 models 包并测量"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), str(count), "--measure-root", models_root],
+        check=True, capture_output=True
+    ).stdout
+    return json.loads(output)
+
+def run_benchmark(count: int, baseline: str):
+    """运行内存基准测试"""
+    with tempfile.TemporaryDirectory(prefix="echarge-models-") as workdir:
+        before = measure_in_subprocess(export_models(baseline, workdir), count)
+    after = measure_in_subprocess(BACKEND_DIR, count)
+
+    print("=" * 64)
+    print(f"数据模型内存基准测试（每种模型 {count} 个对象，基准版本 {baseline}）")
+    print("=" * 64)
+    print(f"{'模型':<18}{'改造前(字节)':>14}{'改造后(字节)':>14}{'节省':>10}")
+    for name in MODEL_NAMES:
+        saved = (1 - after[name] / before[name]) * 100 if before[name] else 0
+        print(f"{name:<18}{before[name]:>14.1f}{after[name]:>14.1f}{saved:>9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="数据模型内存基准测试")
+    parser.add_argument("count", type=int, nargs="?", default=100000, help="每种模型的对象数量")
+    parser.add_argument("--baseline", help="改造前的 git 版本，默认为最早引入 __slots__ 的提交的父提交")
+    parser.add_argument("--measure-root", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_root:
+        # 子进程：只测量 measure_root 下的 models 包
+        sys.path.insert(0, args.measure_root)
+        factories = model_factories()
+        print(json.dumps({name: measure(factory, args.count) for name, factory in factories.items()}))
+        return
+
+    run_benchmark(args.count, args.baseline or default_baseline())
+
+if __name__ == '__main__':
+    main()
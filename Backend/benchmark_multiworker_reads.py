@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+多进程部署读请求基准测试
+按不同的工作进程数量启动 run_multiworker.py，并发请求读接口（默认充电桩队列状态），输出吞吐量、延迟，
+以及状态进程每个请求消耗的 CPU 时间和 CPU 占用
+
+工作进程的请求都经状态进程的服务调用处理，状态进程只有一个，读请求的吞吐量上限约为
+1 / 状态进程每请求 CPU 时间；状态进程 CPU 占用接近 100% 时增加工作进程不再提升吞吐量。
+
+用法: python benchmark_multiworker_reads.py [工作进程数量...] [--seconds 秒数] [--clients 并发数] [--path 接口]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PORT = 5099
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+def request(method, path, body=None, token=None):
+    connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=10)
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+def wait_until_ready(process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            status, _ = request("POST", "/api/login", {"username": "user", "password": "123"})
+            if status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+def state_process_pid(launcher_pid):
+    """状态进程是启动脚本最先创建的子进程"""
+    with open(f"/proc/{launcher_pid}/task/{launcher_pid}/children") as f:
+        return min(int(pid) for pid in f.read().split())
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+def run_clients(path, token, clients, seconds):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client():
+        local = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _ = request("GET", path, token=token)
+            except OSError:
+                status = None
+            if status == 200:
+                local.append(time.perf_counter() - started)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0]
+
+def benchmark(workers, path, clients, seconds):
+    workdir = tempfile.mkdtemp(prefix="echarge-bench-")
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_multiworker.py"),
+         "--workers", str(workers), "--host", "127.0.0.1", "--port", str(PORT),
+         "--socket", os.path.join(workdir, "state.sock")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_until_ready(process):
+            raise RuntimeError(f"{workers} 个工作进程的服务未能启动")
+        _, body = request("POST", "/api/login", {"username": "user", "password": "123"})
+        token = json.loads(body)["token"]
+
+        # 预热
+        run_clients(path, token, clients, 1.0)
+
+        state_pid = state_process_pid(process.pid)
+        state_cpu = cpu_seconds(state_pid)
+        started = time.monotonic()
+        latencies, errors = run_clients(path, token, clients, seconds)
+        elapsed = time.monotonic() - started
+        state_cpu = cpu_seconds(state_pid) - state_cpu
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    count = len(latencies)
+    return {
+        "workers": workers,
+        "throughput": count / elapsed,
+        "p50": latencies[count // 2] * 1000 if count else 0.0,
+        "p99": latencies[min(int(count * 0.99), count - 1)] * 1000 if count else 0.0,
+        "errors": errors,
+        "state_cpu_per_request": state_cpu / count * 1000 if count else 0.0,
+        "state_cpu_share": state_cpu / elapsed * 100
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程部署读请求基准测试")
+    parser.add_argument("workers", type=int, nargs="*", default=[1, 2, 4], help="工作进程数量")
+    parser.add_argument("--seconds", type=float, default=10.0, help="每组测试时长（秒）")
+    parser.add_argument("--clients", type=int, default=16, help="并发客户端数量")
+    parser.add_argument("--path", default="/api/dispatch/pile-queues", help="请求的读接口")
+    args = parser.parse_args()
+
+    print(f"CPU 核心数: {os.cpu_count()}，接口: GET {args.path}，并发: {args.clients}，每组 {args.seconds:g} 秒")
+    print(f"{'工作进程':>8} {'请求/秒':>10} {'p50(ms)':>10} {'p99(ms)':>10} {'失败':>6} "
+          f"{'状态进程CPU/请求(ms)':>20} {'状态进程CPU占用':>14}")
+    for workers in args.workers:
+        result = benchmark(workers, args.path, args.clients, args.seconds)
+        print(f"{result['workers']:>8} {result['throughput']:>10.1f} {result['p50']:>10.2f} "
+              f"{result['p99']:>10.2f} {result['errors']:>6} "
+              f"{result['state_cpu_per_request']:>20.3f} {result['state_cpu_share']:>13.1f}%")
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,9 @@ load_dotenv()
 class DatabaseConfig:
     """数据库配置类"""
     
+    # 数据库后端：mysql 或 sqlite（单机部署，数据保存在本地文件）
+    DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+    
     # MySQL数据库配置
     MYSQL_HOST = os.getenv('MYSQL_HOST', 'localhost')
     MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
@@ -16,10 +19,52 @@ class DatabaseConfig:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'password')
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'echarge_system')
     
+    # SQLite数据库配置（WAL模式）
+    SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "echarge_system.db"
+    ))
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",       # 读写互不阻塞
+        "synchronous": "NORMAL",     # WAL模式下只在检查点时fsync，崩溃不损坏数据库
+        "busy_timeout": 5000,        # 写锁等待时间（毫秒）
+        "cache_size": -16000,        # 页缓存大小（负数表示KB）
+        "temp_store": "MEMORY",
+        "mmap_size": 268435456,      # 内存映射读取（256MB）
+        "foreign_keys": "ON"
+    }
+    
+    # 连接池配置
+    POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))  # 常驻连接数
+    POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 20))  # 高峰时允许额外创建的连接数
+    POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # 等待空闲连接的超时时间（秒）
+    POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # 连接最长使用时间（秒），早于MySQL的wait_timeout回收
+    POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'  # 取出连接时检测是否可用
+    POOL_WARMUP = os.getenv('DB_POOL_WARMUP', 'true').lower() == 'true'  # 启动时预先建立常驻连接
+    
+    # 批量写入每批的行数
+    BULK_INSERT_CHUNK_SIZE = 1000
+    
+    # 最后登录时间延迟写入配置
+    LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', 1.0))  # 批量写入间隔（秒）
+    LAST_LOGIN_FLUSH_BATCH_SIZE = int(os.getenv('LAST_LOGIN_FLUSH_BATCH_SIZE', 500))  # 累计多少个用户后立即写入
+    
+    # 用户目录配置
+    USER_DIRECTORY_LAZY = os.getenv('USER_DIRECTORY_LAZY', 'false').lower() == 'true'  # 按需加载用户（启动时不加载整张用户表）
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))  # 按需加载时缓存的最大用户数
+    USER_NEGATIVE_CACHE_SIZE = 10000  # 缓存的不存在用户名的最大数量
+    USER_NEGATIVE_CACHE_TTL = 60  # 不存在用户名的缓存时间（秒）
+    
     # 连接字符串
+    @classmethod
+    def is_sqlite(cls):
+        """是否使用SQLite后端"""
+        return cls.DB_BACKEND == 'sqlite'
+    
     @classmethod
     def get_connection_url(cls):
         """获取数据库连接URL"""
+        if cls.is_sqlite():
+            return f"sqlite:///{cls.SQLITE_PATH}"
         return f"mysql+pymysql://{cls.MYSQL_USER}:{cls.MYSQL_PASSWORD}@{cls.MYSQL_HOST}:{cls.MYSQL_PORT}/{cls.MYSQL_DATABASE}?charset=utf8mb4"
     
     # 表配置
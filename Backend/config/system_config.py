@@ -1,8 +1,12 @@
 """
 系统配置文件
 """
+import os
 from enum import Enum
 
+# 运行时数据目录（日志、快照等）
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
 class DispatchMode(Enum):
     """调度模式"""
     PRIORITY = "priority"      # 优先级调度（故障队列优先）
@@ -30,4 +34,75 @@ class Config:
     CHARGING_PROGRESS_INTERVAL = 2
     
     # 队列管理配置
-    MAX_PILE_QUEUE_SIZE = 2  # 每个充电桩最大队列容量 
\ No newline at end of file
+    MAX_PILE_QUEUE_SIZE = 2  # 每个充电桩最大队列容量
+
+    # 队列预写日志配置
+    QUEUE_JOURNAL_ENABLED = True  # 是否启用队列日志（崩溃后恢复排队状态）
+    QUEUE_JOURNAL_PATH = os.path.join(DATA_DIR, "queue_journal.log")
+    QUEUE_JOURNAL_FLUSH_INTERVAL = 0.05  # 批量写盘(fsync)间隔（秒）
+    QUEUE_JOURNAL_COMPACT_THRESHOLD = 1000  # 累计多少条记录后压缩日志
+
+    # 状态快照配置
+    SNAPSHOT_ENABLED = True  # 是否启用状态快照（重启后恢复会话和统计）
+    SNAPSHOT_PATH = os.path.join(DATA_DIR, "station_state.snap")
+    SNAPSHOT_INTERVAL = 60  # 定期快照间隔（秒）
+
+    # 充电历史归档配置
+    SESSION_ARCHIVE_ENABLED = True  # 是否将已完成的会话和详单移入列式归档
+    SESSION_ARCHIVE_DIR = os.path.join(DATA_DIR, "session_archive")
+    SESSION_ARCHIVE_INTERVAL = 300  # 归档间隔（秒）
+
+    # 详单账本配置
+    BILL_LEDGER_ENABLED = True  # 是否将生成的详单追加写入定长记录账本（按日期和用户查询）
+    BILL_LEDGER_DIR = os.path.join(DATA_DIR, "bill_ledger")
+
+    # 会话令牌配置
+    AUTH_TOKEN_SECRET = os.getenv('AUTH_TOKEN_SECRET', '')  # 签名密钥，多进程部署时必须配置相同的值；为空时每次启动随机生成
+    AUTH_TOKEN_TTL = 12 * 3600  # 令牌有效期（秒）
+    AUTH_TOKEN_CACHE_SIZE = 10000  # 验证通过的令牌缓存数量
+    AUTH_ALLOW_USERNAME_HEADER = os.getenv('AUTH_ALLOW_USERNAME_HEADER', '').lower() in ('1', 'true')  # 仅供开发调试：未携带令牌时接受 X-Username 请求头（任何客户端都能冒充其他用户，生产环境不能开启）
+
+    # 多进程部署配置（run_multiworker.py）
+    STATE_SOCKET_PATH = os.getenv('STATE_SOCKET_PATH', os.path.join(DATA_DIR, "state.sock"))  # 状态进程监听的 Unix 套接字
+    WORKER_COUNT = int(os.getenv('WORKER_COUNT', os.cpu_count() or 2))  # HTTP 工作进程数量
+    WORKER_METRICS_REPORT_INTERVAL = 5  # 工作进程上报请求指标的间隔（秒），/metrics 输出各工作进程之和
+
+    # 异步服务器配置（run_async_server.py / asgi.py）
+    ASYNC_HANDLER_THREADS = 64  # 执行路由处理的线程数，与连接数无关
+    ASYNC_MAX_CONNECTIONS = 10000  # 最大并发连接数
+    ASYNC_KEEPALIVE_TIMEOUT = 75  # 空闲连接超时（秒），大于前端轮询间隔
+
+    # 响应编码配置
+    RESPONSE_MSGPACK_ENABLED = True  # 客户端请求 application/msgpack 时使用 MessagePack（需要安装 msgpack）
+    RESPONSE_COMPRESSION_ENABLED = True  # 客户端接受 gzip 时压缩较大的响应
+    RESPONSE_COMPRESS_MIN_SIZE = 1024  # 压缩阈值（字节）
+    RESPONSE_COMPRESS_LEVEL = 5  # gzip 压缩级别
+
+    # 日志配置
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # 日志级别，未启用级别的日志调用只做一次级别判断
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # json：每行一个 JSON 对象（含事件名和事件字段）；text：普通文本
+    LOG_QUEUE_SIZE = 10000  # 待写出日志队列容量，已满时丢弃新日志，不阻塞调用方
+
+    # 运行指标配置
+    METRICS_ENABLED = True  # 是否记录请求指标并开放 /metrics（Prometheus 文本格式）
+
+    # 后台循环监督配置（/health/live、/health/ready）
+    LOOP_STALL_TIMEOUT = 60  # 单次迭代超过该时间（秒）视为卡住，存活检查失败
+    LOOP_RESTART_BACKOFF = 1  # 迭代出错或线程退出后第一次重试的等待（秒），连续出错时翻倍
+    LOOP_RESTART_BACKOFF_MAX = 30  # 重试等待上限（秒）
+
+    # 事件总线配置
+    EVENT_BUS_WORKERS = 4  # 投递事件的线程数
+    EVENT_BUS_QUEUE_SIZE = 1000  # 每个订阅方的待投递事件上限
+
+    # 状态版本配置（ETag、长轮询）
+    STATE_VERSION_MAX_KEYS = 100000  # 保留版本号的聚合数量上限，超过时淘汰最久未变化的聚合，被淘汰聚合的 ETag 最多失效一次
+
+    # 排队状态长轮询配置（/api/queue/status?version=...）
+    QUEUE_LONG_POLL_MAX_WAIT = 25  # 最长挂起时间（秒），需小于多进程部署的状态进程调用超时
+    QUEUE_LONG_POLL_MAX_WAITERS = 32  # 同步和多进程部署中同时阻塞处理线程的请求上限，超过时立即返回（异步模式等待不占线程，不限制）
+    QUEUE_LONG_POLL_RETRY_AFTER = 2  # 超过上限时 Retry-After 建议的重试间隔（秒）
+
+    # 实时推送配置（/api/charging/events）
+    PUSH_HEARTBEAT_INTERVAL = 15  # 没有事件时发送心跳的间隔（秒），需小于代理的空闲超时
+    PUSH_STREAM_TOKEN_TTL = 60  # 事件流令牌有效期（秒），只用于建立连接，断线重连前需重新获取
@@ -0,0 +1,409 @@
+"""
+充电详单账本
+
+每张充电详单生成时追加一条定长二进制记录（详单编号、用户、充电桩、电量、起止时间、
+电价类型、单价、充电费、服务费、总费用、生成时间），通过 mmap 只读映射访问，
+按行号直接定位，读取时不把整个账本载入内存。
+
+旁路索引：
+- 日期索引：按生成日期记录当天第一条记录的行号（详单按生成顺序追加），
+  按日期范围查询时二分定位到连续的行区间
+- 用户索引：每行一个用户编号，启动时载入为 用户 -> 行号数组
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 定长记录格式（小端，无填充）
+RECORD_FORMAT = "<24sI8s2B8d"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+RECORD_STRUCT = struct.Struct(RECORD_FORMAT)
+
+# 记录字段（与 RECORD_FORMAT 顺序一致）
+RECORD_FIELDS = (
+    "bill_id", "user_code", "pile_id", "status", "price_type",
+    "energy_amount", "start_time", "end_time", "unit_price",
+    "charge_cost", "service_cost", "total_cost", "generate_time"
+)
+
+# 枚举编码
+STATUS_CODES = ("COMPLETED", "INTERRUPTED", "CANCELLED")
+PRICE_TYPE_CODES = ("峰时", "平时", "谷时")
+
+# NumPy 结构化数组类型（与 RECORD_FORMAT 对应，安装了 NumPy 时可用）
+NUMPY_DTYPE_SPEC = [
+    ("bill_id", "S24"), ("user_code", "<u4"), ("pile_id", "S8"),
+    ("status", "u1"), ("price_type", "u1"),
+    ("energy_amount", "<f8"), ("start_time", "<f8"), ("end_time", "<f8"),
+    ("unit_price", "<f8"), ("charge_cost", "<f8"), ("service_cost", "<f8"),
+    ("total_cost", "<f8"), ("generate_time", "<f8")
+]
+
+
+def _date_key(value: date) -> int:
+    """日期键（yyyymmdd）"""
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+class BillLedger:
+    """定长记录的充电详单账本"""
+
+    DATA_FILE = "bills.dat"
+    USER_INDEX_FILE = "bills.user.idx"
+    DATE_INDEX_FILE = "bills.date.idx"
+    USERS_FILE = "bills.users.jsonl"
+
+    def __init__(self):
+        self.directory: Optional[str] = None
+        self.row_count = 0
+
+        # 用户编号
+        self._users: List[str] = []
+        self._user_codes: Dict[str, int] = {}
+
+        # 用户索引：用户编号 -> 行号数组
+        self._user_rows: Dict[int, array] = {}
+
+        # 日期索引：日期键 / 当天第一条记录的行号
+        self._date_keys: List[int] = []
+        self._date_rows: List[int] = []
+
+        self._data_file = None
+        self._user_index_file = None
+        self._date_index_file = None
+
+        # 只读映射，读取的行超出映射范围时才重新映射；
+        # 被替换的映射在没有导出的视图后关闭
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_rows = 0
+        self._retired_maps: List[mmap.mmap] = []
+
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """账本是否已打开"""
+        return self.directory is not None
+
+    def open(self, directory: str):
+        """打开账本目录，截断未写完整的记录并补齐落后的旁路索引"""
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            self.directory = directory
+
+            # 用户编号
+            self._users = []
+            self._user_codes = {}
+            users_path = self._path(self.USERS_FILE)
+            if os.path.exists(users_path):
+                with open(users_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            user_id = json.loads(line)
+                            self._user_codes[user_id] = len(self._users)
+                            self._users.append(user_id)
+
+            # 数据文件截断到整条记录
+            self.row_count = self._file_size(self.DATA_FILE) // RECORD_SIZE
+            self._truncate(self.DATA_FILE, self.row_count * RECORD_SIZE)
+            self._data_file = open(self._path(self.DATA_FILE), "ab")
+            self._release_map()
+
+            self._load_user_index()
+            self._load_date_index()
+
+            logger.info(f"详单账本已打开: {directory}（{self.row_count} 条记录）")
+
+    def append(self, bill) -> int:
+        """
+        追加一张充电详单
+
+        写入后立即 flush 到操作系统，进程崩溃不丢失；关闭时 fsync。
+
+        Args:
+            bill: ChargingBill
+
+        Returns:
+            记录的行号，账本未打开时返回 -1
+        """
+        if not self.enabled:
+            return -1
+
+        with self._lock:
+            user_code = self._user_codes.get(bill.user_id)
+            if user_code is None:
+                user_code = len(self._users)
+                with open(self._path(self.USERS_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(bill.user_id, ensure_ascii=False) + "\n")
+                self._users.append(bill.user_id)
+                self._user_codes[bill.user_id] = user_code
+
+            charge_cost = bill.charge_cost
+            service_cost = bill.service_cost
+            row = self.row_count
+
+            # 先写数据记录，再写索引；启动时以数据文件为准补齐索引
+            self._data_file.write(RECORD_STRUCT.pack(
+                bill.bill_id.encode("utf-8"), user_code, bill.pile_id.encode("utf-8"),
+                STATUS_CODES.index(bill.status.value), PRICE_TYPE_CODES.index(bill.price_type.value),
+                bill.energy_amount, bill.start_time.timestamp(), bill.end_time.timestamp(),
+                bill.unit_price, charge_cost, service_cost, charge_cost + service_cost,
+                bill.generate_time.timestamp()
+            ))
+            self._data_file.flush()
+            self.row_count += 1
+
+            self._index_row(row, user_code, bill.generate_time.date())
+            self._user_index_file.flush()
+            self._date_index_file.flush()
+            return row
+
+    def iter_rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple]:
+        """
+        零拷贝遍历行区间内的原始记录（字段顺序见 RECORD_FIELDS）
+
+        Args:
+            start: 起始行号
+            stop: 结束行号（不含），默认到末尾
+        """
+        with self._lock:
+            return self._iter_rows(start, stop)
+
+    def to_numpy(self, start: int = 0, stop: Optional[int] = None):
+        """
+        将行区间映射为 NumPy 结构化数组（不复制数据，需要安装 NumPy）
+        """
+        import numpy
+
+        with self._lock:
+            stop = self.row_count if stop is None else min(stop, self.row_count)
+            start = max(0, min(start, stop))
+            view = self._view(stop)
+        if view is None:
+            return numpy.zeros(0, dtype=numpy.dtype(NUMPY_DTYPE_SPEC))
+
+        return numpy.frombuffer(
+            view[start * RECORD_SIZE:stop * RECORD_SIZE], dtype=numpy.dtype(NUMPY_DTYPE_SPEC)
+        )
+
+    def date_range_rows(self, start_date: Optional[date] = None,
+                        end_date: Optional[date] = None) -> Tuple[int, int]:
+        """按生成日期范围（含两端）定位行区间"""
+        with self._lock:
+            start = 0
+            stop = self.row_count
+            if start_date:
+                pos = bisect_left(self._date_keys, _date_key(start_date))
+                start = self._date_rows[pos] if pos < len(self._date_rows) else self.row_count
+            if end_date:
+                pos = bisect_right(self._date_keys, _date_key(end_date))
+                stop = self._date_rows[pos] if pos < len(self._date_rows) else self.row_count
+            return start, max(start, stop)
+
+    def query(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+              user_id: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        按生成日期范围和用户查询详单
+
+        Args:
+            start_date: 起始日期（含）
+            end_date: 结束日期（含）
+            user_id: 用户名，为空时查询所有用户
+            limit: 最多返回的记录数（按生成顺序）
+
+        Returns:
+            详单记录列表
+        """
+        start, stop = self.date_range_rows(start_date, end_date)
+
+        if user_id is None:
+            rows = range(start, stop)
+        else:
+            with self._lock:
+                code = self._user_codes.get(user_id)
+                user_rows = self._user_rows.get(code) if code is not None else None
+                if not user_rows:
+                    return []
+                rows = user_rows[bisect_left(user_rows, start):bisect_left(user_rows, stop)]
+
+        if limit is not None:
+            rows = rows[:limit]
+        if not rows:
+            return []
+
+        with self._lock:
+            view = self._view(rows[-1] + 1)
+        if view is None:
+            return []
+        return [self._to_record(RECORD_STRUCT.unpack_from(view, row * RECORD_SIZE)) for row in rows]
+
+    def close(self):
+        """写盘并关闭账本"""
+        with self._lock:
+            for f in (self._data_file, self._user_index_file, self._date_index_file):
+                if f:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+            self._data_file = self._user_index_file = self._date_index_file = None
+            self._release_map()
+            self.directory = None
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取账本统计信息"""
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "rows": self.row_count,
+            "recordSize": RECORD_SIZE,
+            "users": len(self._users),
+            "days": len(self._date_keys)
+        }
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _file_size(self, name: str) -> int:
+        path = self._path(name)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _truncate(self, name: str, size: int):
+        with open(self._path(name), "ab") as f:
+            f.truncate(size)
+
+    def _load_user_index(self):
+        """载入用户索引，丢弃超出数据文件的部分并补齐落后的部分"""
+        codes = array("I")
+        size = min(self._file_size(self.USER_INDEX_FILE) // codes.itemsize, self.row_count)
+        self._truncate(self.USER_INDEX_FILE, size * codes.itemsize)
+        with open(self._path(self.USER_INDEX_FILE), "rb") as f:
+            codes.fromfile(f, size)
+
+        self._user_rows = {}
+        for row, code in enumerate(codes):
+            self._user_rows.setdefault(code, array("I")).append(row)
+
+        self._user_index_file = open(self._path(self.USER_INDEX_FILE), "ab")
+        for row, record in enumerate(self._iter_rows(size), start=size):
+            self._user_index_file.write(array("I", [record[1]]).tobytes())
+            self._user_rows.setdefault(record[1], array("I")).append(row)
+        self._user_index_file.flush()
+
+    def _load_date_index(self):
+        """载入日期索引，从最后一个日期的第一行开始重新核对"""
+        entries = array("Q")
+        with open(self._path(self.DATE_INDEX_FILE), "ab+") as f:
+            f.seek(0)
+            data = f.read()
+        entries.frombytes(data[:len(data) // 16 * 16])
+
+        self._date_keys = list(entries[0::2])
+        self._date_rows = list(entries[1::2])
+        while self._date_rows and self._date_rows[-1] >= self.row_count:
+            self._date_keys.pop()
+            self._date_rows.pop()
+
+        # 最后一天可能不完整，去掉后从这一天的第一行重新建立
+        rescan_from = 0
+        if self._date_rows:
+            self._date_keys.pop()
+            rescan_from = self._date_rows.pop()
+
+        with open(self._path(self.DATE_INDEX_FILE), "wb") as f:
+            entries = array("Q")
+            for key, row in zip(self._date_keys, self._date_rows):
+                entries.extend((key, row))
+            entries.tofile(f)
+
+        self._date_index_file = open(self._path(self.DATE_INDEX_FILE), "ab")
+        for row, record in enumerate(self._iter_rows(rescan_from), start=rescan_from):
+            self._index_date(row, datetime.fromtimestamp(record[12]).date())
+        self._date_index_file.flush()
+
+    def _iter_rows(self, start: int, stop: Optional[int] = None) -> Iterator[Tuple]:
+        """遍历行区间内的原始记录（调用方持有锁）"""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        start = max(0, min(start, stop))
+        view = self._view(stop)
+        if view is None:
+            return iter(())
+        return RECORD_STRUCT.iter_unpack(view[start * RECORD_SIZE:stop * RECORD_SIZE])
+
+    def _index_row(self, row: int, user_code: int, generate_date: date):
+        """为新追加的行建立索引"""
+        self._user_index_file.write(array("I", [user_code]).tobytes())
+        self._user_rows.setdefault(user_code, array("I")).append(row)
+        self._index_date(row, generate_date)
+
+    def _index_date(self, row: int, generate_date: date):
+        """日期变化时记录新日期的第一行（时钟回拨时沿用当前日期）"""
+        key = _date_key(generate_date)
+        if self._date_keys and key <= self._date_keys[-1]:
+            return
+        self._date_keys.append(key)
+        self._date_rows.append(row)
+        self._date_index_file.write(array("Q", [key, row]).tobytes())
+
+    def _view(self, rows: int) -> Optional[memoryview]:
+        """
+        数据文件前 rows 行的只读视图（调用方持有锁）
+
+        已有映射覆盖这些行时直接使用，否则映射到当前末尾；只读映射不能超出文件长度，
+        追加后只有读取新行时才需要重新映射。
+        """
+        if rows <= 0 or self.row_count == 0:
+            return None
+        if rows > self._mapped_rows:
+            self._data_file.flush()
+            with open(self._path(self.DATA_FILE), "rb") as f:
+                new_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._map is not None:
+                self._retired_maps.append(self._map)
+            self._map = new_map
+            self._mapped_rows = self.row_count
+            self._close_retired_maps()
+        return memoryview(self._map)
+
+    def _close_retired_maps(self):
+        """关闭被替换的映射；仍有导出的视图（如 to_numpy 返回的数组）时留到下次重新映射再关闭"""
+        retired = []
+        for old_map in self._retired_maps:
+            try:
+                old_map.close()
+            except BufferError:
+                retired.append(old_map)
+        self._retired_maps = retired
+
+    def _release_map(self):
+        """放弃当前映射（打开和关闭账本时）"""
+        if self._map is not None:
+            self._retired_maps.append(self._map)
+        self._map = None
+        self._mapped_rows = 0
+        self._close_retired_maps()
+
+    def _to_record(self, values: Tuple) -> Dict[str, Any]:
+        """原始记录转换为详单记录"""
+        record = dict(zip(RECORD_FIELDS, values))
+        record["bill_id"] = record["bill_id"].rstrip(b"\0").decode("utf-8")
+        record["pile_id"] = record["pile_id"].rstrip(b"\0").decode("utf-8")
+        record["user_id"] = self._users[record.pop("user_code")]
+        record["status"] = STATUS_CODES[record["status"]]
+        record["price_type"] = PRICE_TYPE_CODES[record["price_type"]]
+        for field in ("start_time", "end_time", "generate_time"):
+            record[field] = datetime.fromtimestamp(record[field])
+        return record
+
+
+# 全局单例实例（打开前不记账）
+bill_ledger = BillLedger()
@@ -3,10 +3,14 @@
 """
 
 import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-from sqlalchemy import create_engine, text, MetaData, Table, Column, String, DateTime, Integer
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import create_engine, event, text, bindparam, MetaData, Table, Column, String, DateTime, Integer
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from config.database_config import DatabaseConfig
 
 logger = logging.getLogger(__name__)
@@ -19,6 +23,21 @@ class DatabaseManager:
         self.engine = None
         self.metadata = MetaData()
         self._define_tables()
+        self._prepare_statements()
+        
+        # 连接池统计
+        self._stats_lock = threading.Lock()
+        self.total_checkouts = 0
+        self.total_checkout_wait = 0.0  # 累计等待连接时间（秒）
+        self.max_checkout_wait = 0.0
+        self.total_connections_created = 0
+        self.checkout_errors = 0
+        
+        # 批量写入统计
+        self.upsert_progress = {"total": 0, "written": 0, "running": False}
+        self.last_upsert_rows = 0
+        self.last_upsert_ms = 0.0
+        self.total_upserted = 0
     
     def _define_tables(self):
         """定义数据库表结构"""
@@ -34,6 +53,116 @@ class DatabaseManager:
             Column('last_login', DateTime, nullable=True)
         )
     
+    def _prepare_statements(self):
+        """预先构造SQL语句，各方法复用同一语句对象（编译结果由引擎缓存）"""
+        table = DatabaseConfig.TABLE_USERS
+        
+        # 时间字段声明类型，由SQLAlchemy负责不同数据库之间的转换
+        datetime_params = (bindparam('created_at', type_=DateTime), bindparam('last_login', type_=DateTime))
+        datetime_columns = {'created_at': DateTime, 'last_login': DateTime}
+        
+        insert_user = f"""
+                INSERT INTO {table} 
+                (username, password, usertype, created_at, last_login) 
+                VALUES (:username, :password, :usertype, :created_at, :last_login)
+            """
+        if DatabaseConfig.is_sqlite():
+            upsert_user = insert_user + """
+                ON CONFLICT(username) DO UPDATE SET 
+                password = excluded.password, usertype = excluded.usertype, last_login = excluded.last_login
+            """
+        else:
+            upsert_user = insert_user + """
+                ON DUPLICATE KEY UPDATE 
+                password = VALUES(password), usertype = VALUES(usertype), last_login = VALUES(last_login)
+            """
+        
+        self._statements = {
+            "count_users": text(f"SELECT COUNT(*) as count FROM {table}"),
+            "select_users": text(f"SELECT * FROM {table}").columns(**datetime_columns),
+            "select_user": text(f"SELECT * FROM {table} WHERE username = :username").columns(**datetime_columns),
+            "select_users_page": text(
+                f"SELECT * FROM {table} ORDER BY id LIMIT :limit OFFSET :offset"
+            ).columns(**datetime_columns),
+            "count_users_by_type": text(f"SELECT COUNT(*) as count FROM {table} WHERE usertype = :usertype"),
+            "upsert_user": text(upsert_user).bindparams(*datetime_params),
+            "insert_user": text(insert_user).bindparams(*datetime_params),
+            "update_last_login": text(f"""
+                UPDATE {table} 
+                SET last_login = :last_login 
+                WHERE username = :username
+            """).bindparams(bindparam('last_login', type_=DateTime))
+        }
+    
+    def _on_sqlite_connect(self, dbapi_connection, connection_record):
+        """SQLite新连接设置WAL模式和性能参数"""
+        cursor = dbapi_connection.cursor()
+        for name, value in DatabaseConfig.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    
+    @contextmanager
+    def _connection(self):
+        """从连接池取出连接，记录等待时间"""
+        start = time.perf_counter()
+        try:
+            conn = self.engine.connect()
+        except Exception:
+            with self._stats_lock:
+                self.checkout_errors += 1
+            raise
+        
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self.total_checkouts += 1
+            self.total_checkout_wait += wait
+            self.max_checkout_wait = max(self.max_checkout_wait, wait)
+        
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def _on_pool_connect(self, dbapi_connection, connection_record):
+        """连接池新建数据库连接"""
+        with self._stats_lock:
+            self.total_connections_created += 1
+    
+    def _warm_up_pool(self):
+        """预先建立常驻连接，高峰时不必等待建立连接"""
+        connections = []
+        try:
+            for _ in range(DatabaseConfig.POOL_SIZE):
+                connections.append(self.engine.connect())
+        finally:
+            for conn in connections:
+                conn.close()
+        logger.info(f"数据库连接池已预热 {len(connections)} 个连接")
+    
+    def get_pool_statistics(self) -> Dict[str, Any]:
+        """
+        获取连接池统计信息
+        
+        Returns:
+            连接池大小、使用中连接数、等待连接时间等
+        """
+        pool = self.engine.pool if self.engine else None
+        with self._stats_lock:
+            checkouts = self.total_checkouts
+            return {
+                "connected": pool is not None,
+                "poolSize": DatabaseConfig.POOL_SIZE,
+                "maxOverflow": DatabaseConfig.POOL_MAX_OVERFLOW,
+                "inUse": pool.checkedout() if pool else 0,
+                "idle": pool.checkedin() if pool else 0,
+                "overflow": max(pool.overflow(), 0) if pool else 0,
+                "totalCheckouts": checkouts,
+                "avgCheckoutWaitMs": round(self.total_checkout_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                "maxCheckoutWaitMs": round(self.max_checkout_wait * 1000, 3),
+                "connectionsCreated": self.total_connections_created,
+                "checkoutErrors": self.checkout_errors
+            }
+    
     def connect(self) -> bool:
         """
         连接数据库
@@ -43,13 +172,34 @@ class DatabaseManager:
         """
         try:
             connection_url = DatabaseConfig.get_connection_url()
-            self.engine = create_engine(connection_url, echo=False)
+            connect_args = {}
+            if DatabaseConfig.is_sqlite():
+                # 连接由连接池在线程间复用
+                os.makedirs(os.path.dirname(os.path.abspath(DatabaseConfig.SQLITE_PATH)), exist_ok=True)
+                connect_args["check_same_thread"] = False
+            
+            self.engine = create_engine(
+                connection_url,
+                echo=False,
+                connect_args=connect_args,
+                pool_size=DatabaseConfig.POOL_SIZE,
+                max_overflow=DatabaseConfig.POOL_MAX_OVERFLOW,
+                pool_timeout=DatabaseConfig.POOL_TIMEOUT,
+                pool_recycle=DatabaseConfig.POOL_RECYCLE,
+                pool_pre_ping=DatabaseConfig.POOL_PRE_PING
+            )
+            event.listen(self.engine, "connect", self._on_pool_connect)
+            if DatabaseConfig.is_sqlite():
+                event.listen(self.engine, "connect", self._on_sqlite_connect)
             
             # 测试连接
-            with self.engine.connect() as conn:
+            with self._connection() as conn:
                 conn.execute(text("SELECT 1"))
             
-            logger.info("数据库连接成功")
+            if DatabaseConfig.POOL_WARMUP:
+                self._warm_up_pool()
+            
+            logger.info(f"数据库连接成功 ({DatabaseConfig.DB_BACKEND})")
             return True
             
         except Exception as e:
@@ -59,6 +209,7 @@ class DatabaseManager:
     def disconnect(self):
         """断开数据库连接"""
         if self.engine:
+            logger.info(f"数据库连接池统计: {self.get_pool_statistics()}")
             self.engine.dispose()
             logger.info("数据库连接已关闭")
     
@@ -90,25 +241,22 @@ class DatabaseManager:
     def _insert_default_users(self):
         """插入默认用户数据"""
         try:
-            with self.engine.connect() as conn:
+            with self._connection() as conn:
                 # 检查是否已有用户数据
-                result = conn.execute(text(f"SELECT COUNT(*) as count FROM {DatabaseConfig.TABLE_USERS}"))
+                result = conn.execute(self._statements["count_users"])
                 count = result.fetchone()[0]
                 
                 if count == 0:
                     # 插入默认用户
                     for user_data in DatabaseConfig.DEFAULT_USERS:
                         conn.execute(
-                            text(f"""
-                                INSERT INTO {DatabaseConfig.TABLE_USERS} 
-                                (username, password, usertype, created_at) 
-                                VALUES (:username, :password, :usertype, :created_at)
-                            """),
+                            self._statements["insert_user"],
                             {
                                 'username': user_data['username'],
                                 'password': user_data['password'],
                                 'usertype': user_data['usertype'],
-                                'created_at': datetime.now()
+                                'created_at': datetime.now(),
+                                'last_login': None
                             }
                         )
                     conn.commit()
@@ -131,18 +279,12 @@ class DatabaseManager:
                 logger.error("数据库未连接")
                 return []
             
-            with self.engine.connect() as conn:
-                result = conn.execute(text(f"SELECT * FROM {DatabaseConfig.TABLE_USERS}"))
+            with self._connection() as conn:
+                result = conn.execute(self._statements["select_users"])
                 users = []
                 
                 for row in result:
-                    users.append({
-                        'username': row.username,
-                        'password': row.password,
-                        'usertype': row.usertype,
-                        'created_at': row.created_at,
-                        'last_login': row.last_login
-                    })
+                    users.append(self._row_to_user_data(row))
                 
                 logger.info(f"从数据库加载了 {len(users)} 个用户")
                 return users
@@ -153,7 +295,7 @@ class DatabaseManager:
     
     def save_all_users(self, users_data: Dict[str, Dict[str, Any]]) -> bool:
         """
-        保存所有用户数据到数据库
+        保存用户数据到数据库（按用户名增量更新，不删除表中其他用户）
         
         Args:
             users_data: 用户数据字典，key为username，value为用户信息
@@ -161,50 +303,90 @@ class DatabaseManager:
         Returns:
             是否保存成功
         """
+        return self.upsert_users(list(users_data.values()))
+    
+    def upsert_users(self, users_data: List[Dict[str, Any]]) -> bool:
+        """
+        批量写入用户（INSERT ... ON DUPLICATE KEY UPDATE，按批 executemany，每批一个事务）
+        
+        Args:
+            users_data: 用户数据列表（username, password, usertype, created_at, last_login）
+            
+        Returns:
+            是否全部保存成功（失败时之前已提交的批次保留）
+        """
         try:
             if not self.engine:
                 logger.error("数据库未连接")
                 return False
             
-            with self.engine.connect() as conn:
-                # 开始事务
-                trans = conn.begin()
-                
-                try:
-                    # 清空现有用户数据
-                    conn.execute(text(f"DELETE FROM {DatabaseConfig.TABLE_USERS}"))
-                    
-                    # 插入新的用户数据
-                    for username, user_info in users_data.items():
-                        conn.execute(
-                            text(f"""
-                                INSERT INTO {DatabaseConfig.TABLE_USERS} 
-                                (username, password, usertype, created_at, last_login) 
-                                VALUES (:username, :password, :usertype, :created_at, :last_login)
-                            """),
-                            {
-                                'username': user_info['username'],
-                                'password': user_info['password'],
-                                'usertype': user_info['usertype'],
-                                'created_at': user_info.get('created_at'),
-                                'last_login': user_info.get('last_login')
-                            }
-                        )
+            total = len(users_data)
+            chunk_size = DatabaseConfig.BULK_INSERT_CHUNK_SIZE
+            start = time.perf_counter()
+            written = 0
+            
+            with self._stats_lock:
+                self.upsert_progress = {"total": total, "written": 0, "running": True}
+            
+            with self._connection() as conn:
+                for offset in range(0, total, chunk_size):
+                    params = [
+                        {
+                            'username': user_info['username'],
+                            'password': user_info['password'],
+                            'usertype': user_info['usertype'],
+                            'created_at': user_info.get('created_at') or datetime.now(),
+                            'last_login': user_info.get('last_login')
+                        }
+                        for user_info in users_data[offset:offset + chunk_size]
+                    ]
                     
-                    # 提交事务
-                    trans.commit()
-                    logger.info(f"成功保存 {len(users_data)} 个用户到数据库")
-                    return True
+                    # 开始事务
+                    trans = conn.begin()
+                    try:
+                        conn.execute(self._statements["upsert_user"], params)
+                        trans.commit()
+                    except Exception:
+                        # 回滚事务
+                        trans.rollback()
+                        raise
                     
-                except Exception as e:
-                    # 回滚事务
-                    trans.rollback()
-                    raise e
+                    written += len(params)
+                    with self._stats_lock:
+                        self.upsert_progress["written"] = written
+                    logger.debug(f"用户写入进度: {written}/{total}")
+            
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.upsert_progress["running"] = False
+                self.total_upserted += written
+                self.last_upsert_rows = written
+                self.last_upsert_ms = elapsed * 1000
+            
+            logger.info(f"成功保存 {written} 个用户到数据库，耗时 {elapsed * 1000:.1f}ms")
+            return True
                     
         except Exception as e:
+            with self._stats_lock:
+                self.upsert_progress["running"] = False
             logger.error(f"保存用户数据失败: {e}")
             return False
     
+    def get_write_statistics(self) -> Dict[str, Any]:
+        """
+        获取批量写入统计信息
+        
+        Returns:
+            当前写入进度、上次写入的行数和耗时、累计写入行数
+        """
+        with self._stats_lock:
+            return {
+                "progress": dict(self.upsert_progress),
+                "lastUpsertRows": self.last_upsert_rows,
+                "lastUpsertMs": round(self.last_upsert_ms, 3),
+                "totalUpserted": self.total_upserted
+            }
+    
     def add_user(self, username: str, password: str, usertype: str, created_at: datetime, last_login: Optional[datetime] = None) -> bool:
         """
         添加单个用户到数据库
@@ -224,17 +406,13 @@ class DatabaseManager:
                 logger.error("数据库未连接")
                 return False
             
-            with self.engine.connect() as conn:
+            with self._connection() as conn:
                 # 开始事务
                 trans = conn.begin()
                 
                 try:
                     result = conn.execute(
-                        text(f"""
-                            INSERT INTO {DatabaseConfig.TABLE_USERS} 
-                            (username, password, usertype, created_at, last_login) 
-                            VALUES (:username, :password, :usertype, :created_at, :last_login)
-                        """),
+                        self._statements["insert_user"],
                         {
                             'username': username,
                             'password': password,
@@ -244,11 +422,23 @@ class DatabaseManager:
                         }
                     )
                     
+                    # 以插入结果确认写入，不再回查
+                    if result.rowcount != 1:
+                        trans.rollback()
+                        logger.error(f"用户 {username} 插入结果异常 (rowcount: {result.rowcount})，已回滚")
+                        return False
+                    
                     # 提交事务
                     trans.commit()
                     logger.info(f"用户 {username} 已成功添加到数据库 (ID: {result.lastrowid})")
                     return True
                     
+                except IntegrityError:
+                    # 用户名唯一约束冲突
+                    trans.rollback()
+                    logger.warning(f"用户 {username} 已存在于数据库")
+                    return False
+                    
                 except Exception as e:
                     # 回滚事务
                     trans.rollback()
@@ -259,6 +449,209 @@ class DatabaseManager:
             logger.error(f"添加用户到数据库失败: {e}")
             return False
     
+    def add_users(self, users_data: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """
+        批量添加用户到数据库（按批 executemany，每批一个事务）
+        
+        某一批出现用户名冲突时回滚该批，再逐条插入以找出冲突的用户。
+        
+        Args:
+            users_data: 用户数据列表（username, password, usertype, created_at, last_login）
+            
+        Returns:
+            {"inserted": 成功的用户名列表, "duplicates": 已存在的用户名列表, "failed": 其他失败的用户名列表}
+        """
+        inserted: List[str] = []
+        duplicates: List[str] = []
+        failed: List[str] = []
+        
+        if not self.engine:
+            logger.error("数据库未连接")
+            return {"inserted": inserted, "duplicates": duplicates, "failed": [u['username'] for u in users_data]}
+        
+        chunk_size = DatabaseConfig.BULK_INSERT_CHUNK_SIZE
+        for offset in range(0, len(users_data), chunk_size):
+            chunk = users_data[offset:offset + chunk_size]
+            params = [
+                {
+                    'username': user['username'],
+                    'password': user['password'],
+                    'usertype': user['usertype'],
+                    'created_at': user.get('created_at') or datetime.now(),
+                    'last_login': user.get('last_login')
+                }
+                for user in chunk
+            ]
+            
+            try:
+                with self._connection() as conn:
+                    trans = conn.begin()
+                    try:
+                        conn.execute(self._statements["insert_user"], params)
+                        trans.commit()
+                        inserted.extend(param['username'] for param in params)
+                        continue
+                    except IntegrityError:
+                        trans.rollback()
+                    except Exception as e:
+                        trans.rollback()
+                        logger.error(f"批量添加用户失败，已回滚 {len(params)} 个: {e}")
+                        failed.extend(param['username'] for param in params)
+                        continue
+            except Exception as e:
+                logger.error(f"批量添加用户失败: {e}")
+                failed.extend(param['username'] for param in params)
+                continue
+            
+            # 该批存在冲突，逐条插入
+            for param in params:
+                if self.add_user(**param):
+                    inserted.append(param['username'])
+                elif self.user_exists(param['username']):
+                    duplicates.append(param['username'])
+                else:
+                    failed.append(param['username'])
+        
+        logger.info(f"批量添加用户完成: 成功 {len(inserted)} 个，已存在 {len(duplicates)} 个，失败 {len(failed)} 个")
+        return {"inserted": inserted, "duplicates": duplicates, "failed": failed}
+    
+    def _row_to_user_data(self, row) -> Dict[str, Any]:
+        """数据库行转换为用户数据"""
+        return {
+            'username': row.username,
+            'password': row.password,
+            'usertype': row.usertype,
+            'created_at': row.created_at,
+            'last_login': row.last_login
+        }
+    
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        按用户名（唯一索引）查询单个用户
+        
+        Args:
+            username: 用户名
+            
+        Returns:
+            用户数据，不存在或查询失败时返回None
+        """
+        try:
+            if not self.engine:
+                return None
+            
+            with self._connection() as conn:
+                row = conn.execute(self._statements["select_user"], {'username': username}).fetchone()
+                return self._row_to_user_data(row) if row else None
+                
+        except Exception as e:
+            logger.error(f"查询用户失败: {e}")
+            return None
+    
+    def load_users_page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """
+        分页加载用户（按主键顺序）
+        
+        Args:
+            offset: 起始位置
+            limit: 数量
+            
+        Returns:
+            用户数据列表
+        """
+        try:
+            if not self.engine:
+                return []
+            
+            with self._connection() as conn:
+                result = conn.execute(self._statements["select_users_page"], {'offset': offset, 'limit': limit})
+                return [self._row_to_user_data(row) for row in result]
+                
+        except Exception as e:
+            logger.error(f"分页加载用户失败: {e}")
+            return []
+    
+    def count_users(self, usertype: Optional[str] = None) -> int:
+        """
+        统计用户数量
+        
+        Args:
+            usertype: 用户类型，为空时统计全部用户
+            
+        Returns:
+            用户数量，查询失败时返回0
+        """
+        try:
+            if not self.engine:
+                return 0
+            
+            with self._connection() as conn:
+                if usertype:
+                    result = conn.execute(self._statements["count_users_by_type"], {'usertype': usertype})
+                else:
+                    result = conn.execute(self._statements["count_users"])
+                return result.fetchone()[0]
+                
+        except Exception as e:
+            logger.error(f"统计用户数量失败: {e}")
+            return 0
+    
+    def user_exists(self, username: str) -> bool:
+        """
+        按用户名（唯一索引）检查数据库中是否存在该用户
+        
+        Args:
+            username: 用户名
+            
+        Returns:
+            是否存在
+        """
+        try:
+            if not self.engine:
+                return False
+            
+            with self._connection() as conn:
+                result = conn.execute(self._statements["select_user"], {'username': username})
+                return result.fetchone() is not None
+                
+        except Exception as e:
+            logger.error(f"查询用户失败: {e}")
+            return False
+    
+    def update_users_last_login(self, updates: List[Dict[str, Any]]) -> bool:
+        """
+        批量更新用户最后登录时间（按批 executemany，每批一个事务）
+        
+        Args:
+            updates: 更新列表，每项包含 username 和 last_login
+            
+        Returns:
+            是否全部更新成功（失败时之前已提交的批次保留）
+        """
+        try:
+            if not self.engine:
+                logger.error("数据库未连接")
+                return False
+            
+            chunk_size = DatabaseConfig.BULK_INSERT_CHUNK_SIZE
+            with self._connection() as conn:
+                for offset in range(0, len(updates), chunk_size):
+                    # 开始事务
+                    trans = conn.begin()
+                    try:
+                        conn.execute(self._statements["update_last_login"], updates[offset:offset + chunk_size])
+                        trans.commit()
+                    except Exception:
+                        # 回滚事务
+                        trans.rollback()
+                        raise
+            
+            logger.debug(f"已批量更新 {len(updates)} 个用户的最后登录时间")
+            return True
+            
+        except Exception as e:
+            logger.error(f"批量更新用户登录时间失败: {e}")
+            return False
+    
     def update_user_last_login(self, username: str, last_login: datetime) -> bool:
         """
         更新用户最后登录时间
@@ -275,17 +668,13 @@ class DatabaseManager:
                 logger.error("数据库未连接")
                 return False
             
-            with self.engine.connect() as conn:
+            with self._connection() as conn:
                 # 开始事务
                 trans = conn.begin()
                 
                 try:
                     result = conn.execute(
-                        text(f"""
-                            UPDATE {DatabaseConfig.TABLE_USERS} 
-                            SET last_login = :last_login 
-                            WHERE username = :username
-                        """),
+                        self._statements["update_last_login"],
                         {
                             'username': username,
                             'last_login': last_login
@@ -0,0 +1,371 @@
+"""
+排队状态预写日志（WAL）
+
+所有排队变更（提交、取消、修改、调度、开始充电、完成、故障）以追加方式写入日志文件，
+由后台线程批量写盘并 fsync，调用方只做一次内存追加，不等待磁盘 I/O。
+服务启动时回放日志重建排队状态；记录数达到阈值后用当前状态的检查点压缩日志，
+保证恢复时间有界。
+"""
+
+import copy
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 日志操作类型
+OP_CHECKPOINT = "checkpoint"
+OP_SUBMIT = "submit"
+OP_CANCEL = "cancel"
+OP_MODIFY = "modify"
+OP_DISPATCH = "dispatch"
+OP_START = "start"
+OP_COMPLETE = "complete"
+OP_REQUEUE = "requeue"
+OP_FAULT = "fault"
+OP_RECOVER = "recover"
+
+# 车辆位置：等候区 / 充电桩充电车位 / 充电桩等待车位
+SLOT_WAITING_AREA = "waiting_area"
+SLOT_CHARGING = "charging"
+SLOT_WAITING = "waiting"
+
+
+def empty_queue_state() -> Dict[str, Any]:
+    """空的排队状态"""
+    return {
+        "cars": {},            # user_id -> 车辆记录（含 pile_id / slot）
+        "waiting_order": [],   # 等候区中车辆的先后顺序（user_id）
+        "counters": {"fast": 0, "slow": 0},
+        "faults": {}           # pile_id -> 故障原因
+    }
+
+
+def apply_record(state: Dict[str, Any], op: str, data: Dict[str, Any]):
+    """
+    将一条日志记录应用到排队状态上
+
+    所有操作都是按 user_id / pile_id 的覆盖或删除，重复应用结果不变，
+    因此压缩时检查点之后的记录即使已反映在检查点中也可以安全回放。
+    """
+    cars = state["cars"]
+    order = state["waiting_order"]
+
+    if op == OP_CHECKPOINT:
+        state.clear()
+        state.update(empty_queue_state())
+        state.update(data)
+        return
+
+    if "counters" in data:
+        for mode, value in data["counters"].items():
+            state["counters"][mode] = max(state["counters"].get(mode, 0), value)
+
+    if op in (OP_SUBMIT, OP_REQUEUE, OP_MODIFY):
+        car = dict(data["car"])
+        user_id = car["user_id"]
+        car["pile_id"] = None
+        car["slot"] = SLOT_WAITING_AREA
+        cars[user_id] = car
+        # 修改充电模式等同重新排队，排到队尾
+        if data.get("reorder") and user_id in order:
+            order.remove(user_id)
+        if user_id not in order:
+            order.append(user_id)
+
+    elif op in (OP_DISPATCH, OP_START):
+        car = dict(data["car"])
+        user_id = car["user_id"]
+        car["pile_id"] = data["pile_id"]
+        car["slot"] = SLOT_CHARGING if op == OP_START else data.get("slot", SLOT_WAITING)
+        # 同一充电桩同一车位只能有一辆车
+        for other_id, other in list(cars.items()):
+            if other_id != user_id and other.get("pile_id") == car["pile_id"] and other.get("slot") == car["slot"]:
+                other["pile_id"] = None
+                other["slot"] = None
+        cars[user_id] = car
+        if user_id in order:
+            order.remove(user_id)
+
+    elif op in (OP_CANCEL, OP_COMPLETE):
+        user_id = data["user_id"]
+        cars.pop(user_id, None)
+        if user_id in order:
+            order.remove(user_id)
+
+    elif op == OP_FAULT:
+        state["faults"][data["pile_id"]] = data.get("reason", "")
+
+    elif op == OP_RECOVER:
+        state["faults"].pop(data["pile_id"], None)
+
+
+class QueueJournal:
+    """排队状态预写日志"""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.flush_interval = 0.05
+        self.compact_threshold = 1000
+
+        self._file = None
+        self._seq = 0                     # 最后分配的序号
+        self._pending: List[Dict[str, Any]] = []
+        self._records_since_checkpoint = 0
+        self._valid_size = 0              # 回放时最后一条完整记录的结束位置
+        self._state_provider: Optional[Callable[[], Dict[str, Any]]] = None
+
+        self._cond = threading.Condition()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._running = False
+
+        # 统计信息
+        self.total_records = 0
+        self.total_fsyncs = 0
+        self.total_compactions = 0
+
+    @property
+    def enabled(self) -> bool:
+        """日志是否已打开"""
+        return self._running
+
+    @property
+    def last_seq(self) -> int:
+        """最后分配的记录序号"""
+        with self._cond:
+            return self._seq
+
+    def open(self, path: str, flush_interval: float = 0.05, compact_threshold: int = 1000,
+             base_state: Optional[Dict[str, Any]] = None, after_seq: int = 0) -> Dict[str, Any]:
+        """
+        打开日志文件并回放
+
+        Args:
+            path: 日志文件路径
+            flush_interval: 批量写盘间隔（秒）
+            compact_threshold: 触发压缩的记录数
+            base_state: 回放的起始状态（如状态快照中的排队状态）
+            after_seq: 起始状态已包含的最后序号，只回放之后的记录
+
+        Returns:
+            回放得到的排队状态
+        """
+        if self._running:
+            return self.replay(base_state, after_seq)
+
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        state = self.replay(base_state, after_seq)
+
+        # 截断崩溃时写了一半的尾部记录，否则新记录会接在它后面，下次回放时一起被丢弃
+        if os.path.exists(path) and os.path.getsize(path) > self._valid_size:
+            logger.warning(f"队列日志尾部有不完整的记录，已截断到 {self._valid_size} 字节")
+            with open(path, "r+b") as f:
+                f.truncate(self._valid_size)
+
+        self._file = open(path, "a", encoding="utf-8")
+        self._running = True
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+
+        logger.info(f"队列日志已打开: {path}（回放 {self._records_since_checkpoint} 条记录）")
+        return state
+
+    def set_state_provider(self, provider: Callable[[], Dict[str, Any]]):
+        """设置压缩时用于获取当前排队状态的回调"""
+        self._state_provider = provider
+
+    def record(self, op: str, **data):
+        """
+        追加一条日志记录（仅内存操作，由后台线程写盘）
+
+        调用方应在内存状态修改完成后、释放相应锁之前调用，
+        保证日志顺序与状态变更顺序一致。
+        """
+        if not self._running:
+            return
+
+        with self._cond:
+            self._seq += 1
+            self._pending.append({
+                "seq": self._seq,
+                "ts": datetime.now().isoformat(),
+                "op": op,
+                "data": data
+            })
+            self._cond.notify()
+
+    def record_car(self, op: str, car, **extra):
+        """追加一条携带车辆信息的日志记录"""
+        if not self._running:
+            return
+        self.record(op, car=car.to_record(), **extra)
+
+    def replay(self, base_state: Optional[Dict[str, Any]] = None, after_seq: int = 0) -> Dict[str, Any]:
+        """
+        读取日志文件并重建排队状态
+
+        Args:
+            base_state: 回放的起始状态，默认为空状态
+            after_seq: 起始状态已包含的最后序号，序号不大于它的记录将被跳过
+
+        Returns:
+            重建的排队状态
+        """
+        state = empty_queue_state()
+        if base_state:
+            apply_record(state, OP_CHECKPOINT, copy.deepcopy(base_state))
+
+        # 序号保持单调递增，即使日志文件被删除也不会与起始状态重叠
+        self._seq = max(self._seq, after_seq)
+        self._valid_size = 0
+        if not self.path or not os.path.exists(self.path):
+            return state
+
+        applied = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                # 崩溃时最后一行可能只写了一半（没有换行或不是完整的 JSON），忽略
+                if not raw.endswith(b"\n"):
+                    logger.warning("队列日志存在不完整的记录，已忽略")
+                    break
+                line = raw.strip()
+                if not line:
+                    self._valid_size += len(raw)
+                    continue
+                try:
+                    entry = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    logger.warning("队列日志存在不完整的记录，已忽略")
+                    break
+                self._valid_size += len(raw)
+
+                seq = entry.get("seq", 0)
+                self._seq = max(self._seq, seq)
+                if seq <= after_seq:
+                    continue
+
+                apply_record(state, entry["op"], entry.get("data", {}))
+                applied = 0 if entry["op"] == OP_CHECKPOINT else applied + 1
+
+        self._records_since_checkpoint = applied
+        return state
+
+    def _compact(self) -> bool:
+        """用当前排队状态的检查点替换日志内容（仅由写盘线程调用）"""
+        if not self._running or not self._state_provider:
+            return False
+
+        with self._cond:
+            checkpoint_seq = self._seq
+
+        # 所有 seq <= checkpoint_seq 的变更此时都已生效于内存状态
+        state = self._state_provider()
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "seq": checkpoint_seq,
+                "ts": datetime.now().isoformat(),
+                "op": OP_CHECKPOINT,
+                "data": state
+            }, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+        with self._cond:
+            # 已包含在检查点中的记录不再写入
+            self._pending = [entry for entry in self._pending if entry["seq"] > checkpoint_seq]
+            self._records_since_checkpoint = len(self._pending)
+
+        self.total_compactions += 1
+        logger.info(f"队列日志已压缩（检查点序号 {checkpoint_seq}）")
+        return True
+
+    def _writer_loop(self):
+        """后台写盘循环：批量写入并 fsync"""
+        while True:
+            with self._cond:
+                if self._running and not self._pending:
+                    self._cond.wait(self.flush_interval)
+                batch = self._pending
+                self._pending = []
+                running = self._running
+
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    logger.error(f"写入队列日志失败: {e}")
+
+            if not running:
+                break
+
+            if self._records_since_checkpoint >= self.compact_threshold:
+                try:
+                    self._compact()
+                except Exception as e:
+                    logger.error(f"压缩队列日志失败: {e}")
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """写入一批记录"""
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+        self._file.write(lines)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._records_since_checkpoint += len(batch)
+        self.total_records += len(batch)
+        self.total_fsyncs += 1
+
+    def close(self):
+        """写出所有缓冲记录并关闭日志"""
+        if not self._running:
+            return
+
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+        if self._writer_thread:
+            self._writer_thread.join()
+            self._writer_thread = None
+
+        if self._file:
+            self._file.close()
+            self._file = None
+
+        logger.info("队列日志已关闭")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取日志统计信息"""
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "enabled": self._running,
+            "path": self.path,
+            "lastSeq": self._seq,
+            "pendingRecords": pending,
+            "recordsSinceCheckpoint": self._records_since_checkpoint,
+            "totalRecords": self.total_records,
+            "totalFsyncs": self.total_fsyncs,
+            "totalCompactions": self.total_compactions
+        }
+
+
+# 全局单例实例（未打开时记录为空操作）
+queue_journal = QueueJournal()
@@ -0,0 +1,425 @@
+"""
+已完成充电会话和详单的列式归档
+
+会话结算后不再变化，定期从内存移入追加写的列式文件：每列一个定长数组文件，
+用户、充电桩、状态等字符串字段采用字典编码，会话和详单编号存放在字符串堆文件中。
+查询通过 mmap 直接扫描列文件（按值查找使用 mmap.find）；按会话编号查找使用常驻内存的
+会话编号 -> 行号索引（每条记录一个字典项），不扫描字符串堆。
+详单总电量和总费用（全部记录和按用户）在打开时汇总一次，之后随追加累加，读取时不扫描列文件。
+"""
+
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 列定义：列名 -> array 类型码（字典编码列存放 字典序号+1，0 表示空值）
+COLUMNS = (
+    ("user_id", "I"),
+    ("pile_id", "I"),
+    ("status", "I"),
+    ("interruption_reason", "I"),
+    ("requested_amount", "d"),
+    ("pile_power", "d"),
+    ("current_amount", "d"),
+    ("create_time", "d"),
+    ("start_time", "d"),
+    ("end_time", "d"),
+    ("pause_time", "d"),
+    ("estimated_end_time", "d"),
+    ("total_pause_duration", "d"),
+    ("bill_status", "I"),
+    ("bill_generate_time", "d"),
+    ("bill_energy", "d"),
+    ("bill_cost", "d"),
+    ("session_id_end", "Q"),
+    ("bill_id_end", "Q"),
+)
+
+# 字典编码列
+DICT_COLUMNS = ("user_id", "pile_id", "status", "interruption_reason", "bill_status")
+
+# 时间列（存放时间戳，空值为 NaN）
+TIME_COLUMNS = ("create_time", "start_time", "end_time", "pause_time", "estimated_end_time")
+
+# 字符串堆：堆名 -> 结束偏移列
+HEAPS = {"session_id": "session_id_end", "bill_id": "bill_id_end"}
+
+
+def _to_timestamp(value: Optional[datetime]) -> float:
+    return value.timestamp() if value else math.nan
+
+
+def _from_timestamp(value: float) -> Optional[datetime]:
+    return None if math.isnan(value) else datetime.fromtimestamp(value)
+
+
+class SessionArchive:
+    """已完成充电会话的列式归档"""
+
+    def __init__(self):
+        self.directory: Optional[str] = None
+        self.row_count = 0
+        self.total_energy = 0.0  # 详单总电量（累计值）
+        self.total_cost = 0.0    # 详单总费用（累计值）
+        self._user_totals: Dict[str, List[float]] = {}  # 用户 -> [记录数, 详单总电量, 详单总费用]
+
+        # 字典编码：列名 -> 值列表 / 值 -> 序号
+        self._dict_values: Dict[str, List[str]] = {name: [] for name in DICT_COLUMNS}
+        self._dict_index: Dict[str, Dict[str, int]] = {name: {} for name in DICT_COLUMNS}
+
+        # 会话编号 -> 行号
+        self._session_rows: Dict[str, int] = {}
+
+        # 只读映射，追加后按需重新映射
+        self._maps: Dict[str, Optional[mmap.mmap]] = {}
+        self._mapped_rows = -1
+
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """归档是否已打开"""
+        return self.directory is not None
+
+    def open(self, directory: str):
+        """打开归档目录，截断崩溃时未写完整的尾部记录"""
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            self.directory = directory
+
+            # 加载字典
+            for name in DICT_COLUMNS:
+                values = self._dict_values[name] = []
+                index = self._dict_index[name] = {}
+                path = self._path(f"dict_{name}.jsonl")
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            if not line.strip():
+                                continue
+                            value = json.loads(line)
+                            index[value] = len(values)
+                            values.append(value)
+
+            # 行数以最短的列为准，截断多余部分
+            rows = min(self._file_size(f"{name}.col") // array(typecode).itemsize
+                       for name, typecode in COLUMNS)
+            for name, typecode in COLUMNS:
+                self._truncate(f"{name}.col", rows * array(typecode).itemsize)
+            self.row_count = rows
+            self.total_energy = self._sum_column("bill_energy", rows)
+            self.total_cost = self._sum_column("bill_cost", rows)
+            self._user_totals = self._sum_by_user(rows)
+
+            # 字符串堆截断到最后一条记录的结束位置
+            for heap, end_column in HEAPS.items():
+                end = 0
+                if rows:
+                    with open(self._path(f"{end_column}.col"), "rb") as f:
+                        f.seek((rows - 1) * 8)
+                        end = struct.unpack("Q", f.read(8))[0]
+                self._truncate(f"{heap}.heap", end)
+
+            self._close_maps()
+            self._session_rows = self._load_session_rows(rows)
+            logger.info(f"会话归档已打开: {directory}（{rows} 条记录）")
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        """
+        追加已完成的会话记录
+
+        Args:
+            records: 会话记录（ChargingSession.to_record()），可带 "bill" 详单记录
+
+        Returns:
+            追加的记录数
+        """
+        if not records or not self.enabled:
+            return 0
+
+        with self._lock:
+            columns = {name: array(typecode) for name, typecode in COLUMNS}
+            heaps = {heap: bytearray() for heap in HEAPS}
+            heap_ends = {heap: self._file_size(f"{heap}.heap") for heap in HEAPS}
+            new_dict_values = {name: [] for name in DICT_COLUMNS}
+
+            for record in records:
+                bill = record.get("bill")
+                values = {
+                    "user_id": record["user_id"],
+                    "pile_id": record["pile_id"],
+                    "status": record["status"],
+                    "interruption_reason": record.get("interruption_reason"),
+                    "bill_status": bill["status"] if bill else None,
+                }
+                for name in DICT_COLUMNS:
+                    columns[name].append(self._encode(name, values[name], new_dict_values))
+
+                for name in ("requested_amount", "pile_power", "current_amount", "total_pause_duration"):
+                    columns[name].append(float(record.get(name) or 0.0))
+                for name in TIME_COLUMNS:
+                    columns[name].append(_to_timestamp(record.get(name)))
+
+                columns["bill_generate_time"].append(_to_timestamp(bill["generate_time"]) if bill else math.nan)
+                columns["bill_energy"].append(float(bill["energy_amount"]) if bill else 0.0)
+                columns["bill_cost"].append(float(bill["total_cost"]) if bill else 0.0)
+
+                for heap, value in (("session_id", record["session_id"]), ("bill_id", bill["bill_id"] if bill else "")):
+                    heaps[heap] += value.encode("utf-8")
+                    columns[HEAPS[heap]].append(heap_ends[heap] + len(heaps[heap]))
+
+            # 先写字典和字符串堆，最后写列文件；列文件长度决定有效行数
+            for name, values in new_dict_values.items():
+                if values:
+                    with open(self._path(f"dict_{name}.jsonl"), "a", encoding="utf-8") as f:
+                        for value in values:
+                            f.write(json.dumps(value, ensure_ascii=False) + "\n")
+                        f.flush()
+                        os.fsync(f.fileno())
+            for heap, data in heaps.items():
+                self._append_file(f"{heap}.heap", bytes(data))
+            for name, _ in COLUMNS:
+                self._append_file(f"{name}.col", columns[name].tobytes())
+
+            for offset, record in enumerate(records):
+                self._session_rows[record["session_id"]] = self.row_count + offset
+            self.row_count += len(records)
+            self.total_energy += sum(columns["bill_energy"])
+            self.total_cost += sum(columns["bill_cost"])
+            for offset, record in enumerate(records):
+                self._add_user_totals(self._user_totals, record["user_id"],
+                                      columns["bill_energy"][offset], columns["bill_cost"][offset])
+            return len(records)
+
+    def find_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """按会话编号查找记录"""
+        with self._lock:
+            row = self._session_rows.get(session_id)
+            if row is None or not self._remap():
+                return None
+            return self._read_row(row)
+
+    def user_sessions(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """获取用户的会话记录（按创建时间倒序）"""
+        with self._lock:
+            code = self._dict_index["user_id"].get(user_id)
+            if code is None or not self._remap():
+                return []
+
+            rows = self._find_rows("user_id", code + 1)
+            create_times = self._column("create_time")
+            rows.sort(key=lambda row: create_times[row], reverse=True)
+            return [self._read_row(row) for row in rows[:limit]]
+
+    def get_totals(self) -> Tuple[int, float, float]:
+        """归档记录汇总（记录数、详单总电量、详单总费用），读取累计值，不扫描列文件"""
+        with self._lock:
+            return self.row_count, self.total_energy, self.total_cost
+
+    def get_user_totals(self) -> Dict[str, Tuple[int, float, float]]:
+        """按用户的归档记录汇总（记录数、详单总电量、详单总费用），读取累计值，不扫描列文件"""
+        with self._lock:
+            return {user_id: (int(count), energy, cost) for user_id, (count, energy, cost) in self._user_totals.items()}
+
+    def close(self):
+        """关闭归档"""
+        with self._lock:
+            self._close_maps()
+            self._session_rows = {}
+            self._user_totals = {}
+            self.directory = None
+            self.row_count = 0
+            self.total_energy = 0.0
+            self.total_cost = 0.0
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取归档统计信息"""
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "rows": self.row_count,
+            "users": len(self._dict_values["user_id"]),
+            "bytes": sum(self._file_size(f"{name}.col") for name, _ in COLUMNS) if self.enabled else 0
+        }
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _file_size(self, name: str) -> int:
+        path = self._path(name)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _truncate(self, name: str, size: int):
+        with open(self._path(name), "ab") as f:
+            f.truncate(size)
+
+    def _sum_column(self, name: str, rows: int) -> float:
+        """对列文件的前 rows 个值求和（打开归档时汇总一次）"""
+        if rows == 0:
+            return 0.0
+        with open(self._path(f"{name}.col"), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+                    memoryview(data) as view, view.cast(dict(COLUMNS)[name]) as values:
+                return sum(values[:rows])
+
+    def _sum_by_user(self, rows: int) -> Dict[str, List[float]]:
+        """按用户汇总前 rows 条记录的详单电量和费用（打开归档时汇总一次）"""
+        totals: Dict[str, List[float]] = {}
+        if rows == 0:
+            return totals
+        columns = {}
+        for name in ("user_id", "bill_energy", "bill_cost"):
+            with open(self._path(f"{name}.col"), "rb") as f:
+                values = columns[name] = array(dict(COLUMNS)[name])
+                values.fromfile(f, rows)
+        for code, energy, cost in zip(columns["user_id"], columns["bill_energy"], columns["bill_cost"]):
+            self._add_user_totals(totals, self._decode("user_id", code), energy, cost)
+        return totals
+
+    @staticmethod
+    def _add_user_totals(totals: Dict[str, List[float]], user_id: Optional[str], energy: float, cost: float):
+        user_totals = totals.get(user_id)
+        if user_totals is None:
+            user_totals = totals[user_id] = [0, 0.0, 0.0]
+        user_totals[0] += 1
+        user_totals[1] += energy
+        user_totals[2] += cost
+
+    def _load_session_rows(self, rows: int) -> Dict[str, int]:
+        """读取前 rows 条记录的会话编号，建立会话编号 -> 行号索引（打开归档时执行一次）"""
+        if rows == 0:
+            return {}
+        with open(self._path("session_id_end.col"), "rb") as f:
+            ends = array("Q")
+            ends.fromfile(f, rows)
+        with open(self._path("session_id.heap"), "rb") as f:
+            heap = f.read()
+
+        index = {}
+        start = 0
+        for row, end in enumerate(ends):
+            index[heap[start:end].decode("utf-8")] = row
+            start = end
+        return index
+
+    def _append_file(self, name: str, data: bytes):
+        with open(self._path(name), "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _encode(self, name: str, value: Optional[str], new_values: Dict[str, List[str]]) -> int:
+        """字典编码（0 表示空值）"""
+        if value is None:
+            return 0
+        index = self._dict_index[name]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(self._dict_values[name])
+            self._dict_values[name].append(value)
+            new_values[name].append(value)
+        return code + 1
+
+    def _decode(self, name: str, code: int) -> Optional[str]:
+        return self._dict_values[name][code - 1] if code else None
+
+    def _remap(self) -> bool:
+        """追加后重新映射列文件，无记录时返回 False"""
+        if self.row_count == 0:
+            return False
+        if self._mapped_rows != self.row_count:
+            maps = {}
+            for name in [f"{column}.col" for column, _ in COLUMNS] + [f"{heap}.heap" for heap in HEAPS]:
+                size = self._file_size(name)
+                if size == 0:
+                    maps[name] = None
+                    continue
+                with open(self._path(name), "rb") as f:
+                    maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._close_maps()
+            self._maps = maps
+            self._mapped_rows = self.row_count
+        return True
+
+    def _close_maps(self):
+        """关闭当前映射（调用方持有锁，列视图只在持锁的查询中使用）"""
+        for data in self._maps.values():
+            if data is not None:
+                try:
+                    data.close()
+                except BufferError:
+                    # 仍有视图引用时由垃圾回收释放
+                    pass
+        self._maps = {}
+        self._mapped_rows = -1
+
+    def _column(self, name: str) -> memoryview:
+        """列的零拷贝视图"""
+        typecode = dict(COLUMNS)[name]
+        return memoryview(self._maps[f"{name}.col"]).cast(typecode)
+
+    def _find_rows(self, name: str, value: int) -> List[int]:
+        """在整数列中查找等于指定值的行（mmap.find 扫描，按元素边界对齐）"""
+        typecode = dict(COLUMNS)[name]
+        size = array(typecode).itemsize
+        pattern = array(typecode, [value]).tobytes()
+        data = self._maps[f"{name}.col"]
+
+        rows = []
+        pos = data.find(pattern)
+        while pos >= 0:
+            if pos % size:
+                pos = data.find(pattern, pos + 1)
+                continue
+            rows.append(pos // size)
+            pos = data.find(pattern, pos + size)
+        return rows
+
+    def _read_heap(self, heap: str, row: int) -> str:
+        ends = self._column(HEAPS[heap])
+        start = ends[row - 1] if row else 0
+        data = self._maps[f"{heap}.heap"]
+        return data[start:ends[row]].decode("utf-8") if data is not None else ""
+
+    def _read_row(self, row: int) -> Dict[str, Any]:
+        """读取一行并还原为会话记录"""
+        value = lambda name: self._column(name)[row]
+
+        record = {
+            "session_id": self._read_heap("session_id", row),
+            "user_id": self._decode("user_id", value("user_id")),
+            "pile_id": self._decode("pile_id", value("pile_id")),
+            "status": self._decode("status", value("status")),
+            "interruption_reason": self._decode("interruption_reason", value("interruption_reason")),
+            "requested_amount": value("requested_amount"),
+            "pile_power": value("pile_power"),
+            "current_amount": value("current_amount"),
+            "total_pause_duration": value("total_pause_duration"),
+            "bill": None
+        }
+        for name in TIME_COLUMNS:
+            record[name] = _from_timestamp(value(name))
+
+        bill_status = self._decode("bill_status", value("bill_status"))
+        if bill_status:
+            record["bill"] = {
+                "bill_id": self._read_heap("bill_id", row),
+                "status": bill_status,
+                "generate_time": _from_timestamp(value("bill_generate_time")),
+                "energy_amount": value("bill_energy"),
+                "total_cost": value("bill_cost")
+            }
+        return record
+
+
+# 全局单例实例（打开前不归档）
+session_archive = SessionArchive()
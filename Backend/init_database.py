@@ -27,9 +27,13 @@ def init_database():
     
     # 显示数据库配置
     print("数据库配置:")
-    print(f"  - 主机: {DatabaseConfig.MYSQL_HOST}:{DatabaseConfig.MYSQL_PORT}")
-    print(f"  - 数据库: {DatabaseConfig.MYSQL_DATABASE}")
-    print(f"  - 用户: {DatabaseConfig.MYSQL_USER}")
+    if DatabaseConfig.is_sqlite():
+        print(f"  - 后端: SQLite (WAL)")
+        print(f"  - 文件: {DatabaseConfig.SQLITE_PATH}")
+    else:
+        print(f"  - 主机: {DatabaseConfig.MYSQL_HOST}:{DatabaseConfig.MYSQL_PORT}")
+        print(f"  - 数据库: {DatabaseConfig.MYSQL_DATABASE}")
+        print(f"  - 用户: {DatabaseConfig.MYSQL_USER}")
     print()
     
     # 创建数据库管理器
@@ -15,7 +15,12 @@ class BillStatus(Enum):
     CANCELLED = "CANCELLED"     # 用户取消
 
 class ChargingBill:
-    """充电详单模型"""
+    """充电详单模型（时长文本和费用等展示字段按需计算，不随对象保存）"""
+    
+    __slots__ = (
+        "bill_id", "user_id", "pile_id", "energy_amount",
+        "start_time", "end_time", "status", "price_type", "generate_time"
+    )
     
     # 电价配置（元/度）
     PRICE_CONFIG = {
@@ -38,19 +43,41 @@ class ChargingBill:
         self.end_time = end_time
         self.status = status
         
-        # 时间计算
-        self.duration = self._calculate_duration()  # 充电时长（小时）
-        self.duration_text = self._format_duration()  # 充电时长文本
-        
-        # 费用计算
+        # 电价类型（由开始时间决定）
         self.price_type = self._determine_price_type()
-        self.unit_price = self.PRICE_CONFIG[self.price_type]  # 单位电价
-        self.charge_cost = self._calculate_charge_cost()      # 充电费用
-        self.service_cost = self._calculate_service_cost()    # 服务费用
-        self.total_cost = self.charge_cost + self.service_cost  # 总费用
         
         # 生成时间
         self.generate_time = datetime.now()
+    
+    @property
+    def duration(self) -> float:
+        """充电时长（小时）"""
+        return self._calculate_duration()
+    
+    @property
+    def duration_text(self) -> str:
+        """充电时长文本"""
+        return self._format_duration()
+    
+    @property
+    def unit_price(self) -> float:
+        """单位电价"""
+        return self.PRICE_CONFIG[self.price_type]
+    
+    @property
+    def charge_cost(self) -> float:
+        """充电费用"""
+        return self._calculate_charge_cost()
+    
+    @property
+    def service_cost(self) -> float:
+        """服务费用"""
+        return self._calculate_service_cost()
+    
+    @property
+    def total_cost(self) -> float:
+        """总费用"""
+        return self.charge_cost + self.service_cost
         
     def _generate_bill_id(self) -> str:
         """生成详单编号"""
@@ -106,6 +133,8 @@ class ChargingBill:
         
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
+        charge_cost = self.charge_cost
+        service_cost = self.service_cost
         return {
             "recordId": self.bill_id,
             "billId": self.bill_id,
@@ -119,13 +148,38 @@ class ChargingBill:
             "durationHours": round(self.duration, 2),
             "priceType": self.price_type.value,
             "unitPrice": self.unit_price,
-            "chargeCost": self.charge_cost,
-            "serviceCost": self.service_cost,
-            "totalCost": self.total_cost,
+            "chargeCost": charge_cost,
+            "serviceCost": service_cost,
+            "totalCost": charge_cost + service_cost,
             "status": self.status.value,
             "generateTime": self.generate_time.isoformat()
         }
         
+    def to_record(self) -> Dict[str, Any]:
+        """转换为持久化记录（时间字段保留 datetime，附带总费用便于汇总）"""
+        return {
+            "bill_id": self.bill_id,
+            "user_id": self.user_id,
+            "pile_id": self.pile_id,
+            "energy_amount": self.energy_amount,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "status": self.status.value,
+            "generate_time": self.generate_time,
+            "total_cost": self.total_cost
+        }
+        
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'ChargingBill':
+        """从持久化记录恢复充电详单（费用由电量和开始时间重新计算）"""
+        bill = cls(
+            record["user_id"], record["pile_id"], record["energy_amount"],
+            record["start_time"], record["end_time"], BillStatus(record["status"])
+        )
+        bill.bill_id = record["bill_id"]
+        bill.generate_time = record["generate_time"]
+        return bill
+        
     @classmethod
     def calculate_estimated_cost(cls, energy_amount: float, start_time: datetime = None) -> Tuple[float, float, float]:
         """计算预估费用（充电费、服务费、总费用）"""
@@ -17,6 +17,13 @@ class PileType(Enum):
 class ChargingPile:
     """充电桩模型"""
     
+    __slots__ = (
+        "pile_id", "name", "pile_type", "power", "status", "is_active",
+        "total_charges", "total_hours", "total_energy", "daily_charge",
+        "current_user", "current_session", "queue_count",
+        "created_at", "last_updated", "fault_info"
+    )
+    
     def __init__(self, pile_id: str, name: str, pile_type: PileType, power: float):
         self.pile_id = pile_id
         self.name = name
@@ -156,6 +163,42 @@ class ChargingPile:
         self.last_updated = datetime.now()
         return True
     
+    def to_record(self) -> Dict[str, Any]:
+        """转换为持久化记录（用于状态快照）"""
+        return {
+            "pile_id": self.pile_id,
+            "status": self.status.value,
+            "is_active": self.is_active,
+            "total_charges": self.total_charges,
+            "total_hours": self.total_hours,
+            "total_energy": self.total_energy,
+            "daily_charge": self.daily_charge,
+            "current_user": self.current_user,
+            "current_session": dict(self.current_session) if self.current_session else None,
+            "created_at": self.created_at,
+            "fault_info": dict(self.fault_info) if self.fault_info else None
+        }
+    
+    def restore_counters(self, record: Dict[str, Any]):
+        """从持久化记录恢复统计数据"""
+        self.total_charges = record.get("total_charges", self.total_charges)
+        self.total_hours = record.get("total_hours", self.total_hours)
+        self.total_energy = record.get("total_energy", self.total_energy)
+        self.daily_charge = record.get("daily_charge", self.daily_charge)
+        self.created_at = record.get("created_at", self.created_at)
+        self.last_updated = datetime.now()
+    
+    def restore_charging(self, record: Dict[str, Any]) -> bool:
+        """从持久化记录恢复充电中状态"""
+        if not self.is_active or self.status != PileStatus.ACTIVE or not record.get("current_session"):
+            return False
+        
+        self.status = PileStatus.CHARGING
+        self.current_user = record.get("current_user")
+        self.current_session = dict(record["current_session"])
+        self.last_updated = datetime.now()
+        return True
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
         return {
@@ -17,6 +17,12 @@ class RequestStatus(Enum):
 class ChargingRequest:
     """充电请求模型"""
     
+    __slots__ = (
+        "request_id", "user_id", "charge_mode", "requested_amount", "status",
+        "queue_number", "position", "assigned_pile_id", "submit_time", "start_time",
+        "end_time", "actual_amount", "estimated_wait_time", "estimated_charge_time"
+    )
+    
     def __init__(self, user_id: str, charge_mode: ChargeMode, requested_amount: float):
         # 基本信息
         self.request_id = self._generate_request_id()
@@ -16,7 +16,13 @@ class SessionStatus(Enum):
     CANCELLED = "CANCELLED"   # 已取消
 
 class ChargingSession:
-    """充电会话模型"""
+    """充电会话模型（进度、预计时长和实时费用按需计算，不随对象保存）"""
+    
+    __slots__ = (
+        "session_id", "user_id", "pile_id", "requested_amount", "pile_power",
+        "status", "current_amount", "create_time", "start_time", "end_time",
+        "pause_time", "total_pause_duration", "estimated_end_time", "interruption_reason"
+    )
     
     def __init__(self, session_id: str, user_id: str, pile_id: str, 
                  requested_amount: float, pile_power: float):
@@ -30,7 +36,6 @@ class ChargingSession:
         # 状态信息
         self.status = SessionStatus.PREPARING
         self.current_amount = 0.0  # 当前充电量（度）
-        self.progress_percent = 0.0  # 充电进度百分比
         
         # 时间信息
         self.create_time = datetime.now()
@@ -40,20 +45,43 @@ class ChargingSession:
         self.total_pause_duration = 0.0  # 总暂停时长（秒）
         
         # 估算信息
-        self.estimated_duration = self._calculate_estimated_duration()  # 预计充电时长（小时）
         self.estimated_end_time: Optional[datetime] = None
         
-        # 费用信息
-        self.current_charge_cost = 0.0
-        self.current_service_cost = 0.0
-        self.current_total_cost = 0.0
-        
         # 其他信息
         self.interruption_reason: Optional[str] = None
-        
-    def _calculate_estimated_duration(self) -> float:
-        """计算预计充电时长（小时）"""
+    
+    @property
+    def estimated_duration(self) -> float:
+        """预计充电时长（小时）"""
         return self.requested_amount / self.pile_power
+    
+    @property
+    def progress_percent(self) -> float:
+        """充电进度百分比（请求充电量为 0 时为 0）"""
+        if not self.requested_amount:
+            return 0.0
+        return min(100.0, (self.current_amount / self.requested_amount) * 100)
+    
+    @property
+    def current_charge_cost(self) -> float:
+        """当前充电费用"""
+        return self._current_costs()[0]
+    
+    @property
+    def current_service_cost(self) -> float:
+        """当前服务费用"""
+        return self._current_costs()[1]
+    
+    @property
+    def current_total_cost(self) -> float:
+        """当前总费用"""
+        return self._current_costs()[2]
+    
+    def _current_costs(self):
+        """计算当前费用（充电费、服务费、总费用）"""
+        if self.current_amount > 0 and self.start_time:
+            return ChargingBill.calculate_estimated_cost(self.current_amount, self.start_time)
+        return 0.0, 0.0, 0.0
         
     def start_charging(self):
         """开始充电"""
@@ -90,10 +118,6 @@ class ChargingSession:
             return
             
         self.current_amount = min(current_amount, self.requested_amount)
-        self.progress_percent = (self.current_amount / self.requested_amount) * 100
-        
-        # 更新实时费用
-        self._update_current_cost()
         
         # 检查是否充电完成
         if self.current_amount >= self.requested_amount:
@@ -105,8 +129,6 @@ class ChargingSession:
             self.status = SessionStatus.COMPLETED
             self.end_time = datetime.now()
             self.current_amount = min(self.current_amount, self.requested_amount)
-            self.progress_percent = 100.0
-            self._update_current_cost()
             
     def interrupt_charging(self, reason: str):
         """中断充电（故障等）"""
@@ -114,24 +136,12 @@ class ChargingSession:
             self.status = SessionStatus.INTERRUPTED
             self.end_time = datetime.now()
             self.interruption_reason = reason
-            self._update_current_cost()
             
     def cancel_charging(self):
         """取消充电"""
         if self.status in [SessionStatus.PREPARING, SessionStatus.CHARGING, SessionStatus.PAUSED]:
             self.status = SessionStatus.CANCELLED
             self.end_time = datetime.now()
-            self._update_current_cost()
-            
-    def _update_current_cost(self):
-        """更新当前费用"""
-        if self.current_amount > 0 and self.start_time:
-            charge_cost, service_cost, total_cost = ChargingBill.calculate_estimated_cost(
-                self.current_amount, self.start_time
-            )
-            self.current_charge_cost = charge_cost
-            self.current_service_cost = service_cost
-            self.current_total_cost = total_cost
             
     def get_actual_duration(self) -> Optional[float]:
         """获取实际充电时长（小时，不包括暂停时间）"""
@@ -184,6 +194,7 @@ class ChargingSession:
         
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
+        charge_cost, service_cost, total_cost = self._current_costs()
         return {
             "sessionId": self.session_id,
             "userId": self.user_id,
@@ -201,9 +212,9 @@ class ChargingSession:
             "actualDuration": round(self.get_actual_duration() or 0, 2),
             "remainingTime": round(self.get_remaining_time() or 0, 2),
             "chargingSpeed": round(self.get_charging_speed(), 2),
-            "currentChargeCost": self.current_charge_cost,
-            "currentServiceCost": self.current_service_cost,
-            "currentTotalCost": self.current_total_cost,
+            "currentChargeCost": charge_cost,
+            "currentServiceCost": service_cost,
+            "currentTotalCost": total_cost,
             "interruptionReason": self.interruption_reason,
             "pileActive": True,  # 默认充电桩正常，实际应从充电桩服务获取
             "hasActiveCharging": self.status in [SessionStatus.CHARGING, SessionStatus.PAUSED]
@@ -232,6 +243,32 @@ class ChargingSession:
             "status": self.status.value
         }
         
+    # 持久化字段（用于状态快照）
+    RECORD_FIELDS = (
+        "session_id", "user_id", "pile_id", "requested_amount", "pile_power",
+        "current_amount", "create_time", "start_time", "end_time",
+        "pause_time", "total_pause_duration", "estimated_end_time", "interruption_reason"
+    )
+    
+    def to_record(self) -> Dict[str, Any]:
+        """转换为持久化记录（时间字段保留 datetime）"""
+        record = {field: getattr(self, field) for field in self.RECORD_FIELDS}
+        record["status"] = self.status.value
+        return record
+        
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'ChargingSession':
+        """从持久化记录恢复充电会话"""
+        session = cls(
+            record["session_id"], record["user_id"], record["pile_id"],
+            record["requested_amount"], record["pile_power"]
+        )
+        for field in cls.RECORD_FIELDS:
+            if field in record:
+                setattr(session, field, record[field])
+        session.status = SessionStatus(record["status"])
+        return session
+        
     @classmethod
     def generate_session_id(cls, user_id: str, pile_id: str) -> str:
         """生成会话ID"""
@@ -1,7 +1,6 @@
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from enum import Enum
-from collections import deque
 import threading
 
 class QueuePosition(Enum):
@@ -13,6 +12,12 @@ class QueuePosition(Enum):
 class WaitingCar:
     """等候车辆模型"""
     
+    __slots__ = (
+        "user_id", "request_id", "charge_mode", "requested_amount", "battery_capacity",
+        "queue_number", "queue_position", "assigned_pile_id", "join_time",
+        "estimated_wait_time", "estimated_charge_time"
+    )
+    
     def __init__(self, user_id: str, request_id: str, charge_mode: str, 
                  requested_amount: float, battery_capacity: float = 60.0):
         self.user_id = user_id
@@ -59,72 +64,96 @@ class WaitingCar:
             "estimatedChargeTime": self.estimated_charge_time
         }
 
+    def to_record(self) -> Dict[str, Any]:
+        """转换为持久化记录（用于日志和快照）"""
+        return {
+            "user_id": self.user_id,
+            "request_id": self.request_id,
+            "charge_mode": self.charge_mode,
+            "requested_amount": self.requested_amount,
+            "battery_capacity": self.battery_capacity,
+            "queue_number": self.queue_number,
+            "queue_position": self.queue_position.value,
+            "assigned_pile_id": self.assigned_pile_id,
+            "join_time": self.join_time.isoformat()
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'WaitingCar':
+        """从持久化记录恢复车辆"""
+        car = cls(
+            record["user_id"],
+            record["request_id"],
+            record["charge_mode"],
+            record["requested_amount"],
+            record.get("battery_capacity", 60.0)
+        )
+        car.queue_number = record.get("queue_number", "")
+        car.queue_position = QueuePosition(record.get("queue_position", QueuePosition.WAITING_AREA.value))
+        car.assigned_pile_id = record.get("assigned_pile_id")
+        if record.get("join_time"):
+            car.join_time = datetime.fromisoformat(record["join_time"])
+        return car
+
 class PileQueue:
-    """充电桩队列模型"""
+    """充电桩队列模型（第一个车位充电中，第二个车位等待），排队和调度共用同一份队列状态"""
     
-    def __init__(self, pile_id: str, max_size: int = 2):
+    def __init__(self, pile_id: str, max_size: int = 2, 
+                 on_change: Optional[Callable[[str], None]] = None):
         self.pile_id = pile_id
-        self.max_size = max_size  # 队列最大容量
-        self.queue: deque[WaitingCar] = deque()
-        self.charging_car: Optional[WaitingCar] = None  # 当前充电车辆
+        self.max_capacity = max_size  # 每桩最大车位数
+        self.on_change = on_change  # 车位变化回调（参数为充电桩ID）
+        
+        self._charging_car: Optional[WaitingCar] = None  # 正在充电的车辆
+        self._waiting_car: Optional[WaitingCar] = None   # 等待充电的车辆
+        
+        self._lock = threading.Lock()
+    
+    @property
+    def charging_car(self) -> Optional[WaitingCar]:
+        return self._charging_car
+    
+    @charging_car.setter
+    def charging_car(self, car: Optional[WaitingCar]):
+        self._charging_car = car
+        self._notify_change()
+    
+    @property
+    def waiting_car(self) -> Optional[WaitingCar]:
+        return self._waiting_car
+    
+    @waiting_car.setter
+    def waiting_car(self, car: Optional[WaitingCar]):
+        self._waiting_car = car
+        self._notify_change()
+    
+    def _notify_change(self):
+        """通知车位变化"""
+        if self.on_change:
+            self.on_change(self.pile_id)
         
     def is_full(self) -> bool:
         """队列是否已满"""
-        return len(self.queue) >= self.max_size
+        return self.charging_car is not None and self.waiting_car is not None
         
     def has_space(self) -> bool:
         """是否有空位"""
-        return len(self.queue) < self.max_size
-        
-    def add_car(self, car: WaitingCar) -> bool:
-        """添加车辆到队列"""
-        if self.has_space():
-            car.queue_position = QueuePosition.PILE_QUEUE
-            car.assigned_pile_id = self.pile_id
-            self.queue.append(car)
-            return True
-        return False
-        
-    def remove_next_car(self) -> Optional[WaitingCar]:
-        """移除并返回下一个车辆"""
-        if self.queue:
-            return self.queue.popleft()
-        return None
-        
-    def start_charging(self) -> Optional[WaitingCar]:
-        """开始充电下一个车辆"""
-        if self.queue and not self.charging_car:
-            self.charging_car = self.queue.popleft()
-            self.charging_car.queue_position = QueuePosition.CHARGING
-            return self.charging_car
-        return None
-        
-    def complete_charging(self) -> Optional[WaitingCar]:
-        """完成当前充电"""
-        if self.charging_car:
-            completed_car = self.charging_car
-            self.charging_car = None
-            return completed_car
+        return not self.is_full()
+    
+    def get_available_capacity(self) -> int:
+        """获取可用车位数"""
+        occupied = (1 if self.charging_car else 0) + (1 if self.waiting_car else 0)
+        return self.max_capacity - occupied
+    
+    def find_car(self, user_id: str) -> Optional[WaitingCar]:
+        """查找队列中的用户车辆"""
+        for car in (self.charging_car, self.waiting_car):
+            if car and car.user_id == user_id:
+                return car
         return None
         
-    def get_total_wait_time(self, power: float) -> float:
-        """计算队列中所有车辆的总等待时间（小时）"""
-        total_time = 0.0
-        
-        # 如果有车在充电，计算其剩余时间
-        if self.charging_car:
-            # 这里应该从充电桩获取剩余时间，暂时估算
-            remaining_amount = self.charging_car.requested_amount * 0.5  # 假设还剩50%
-            total_time += remaining_amount / power
-            
-        # 计算队列中每个车辆的充电时间
-        for car in self.queue:
-            total_time += car.requested_amount / power
-            
-        return total_time
-        
-    def get_queue_info(self) -> List[Dict[str, Any]]:
-        """获取队列信息"""
+    def get_cars_info(self) -> List[Dict[str, Any]]:
+        """获取队列中车辆信息"""
         queue_info = []
         
         # 当前充电车辆
@@ -135,9 +164,9 @@ class PileQueue:
             queue_info.append(car_info)
             
         # 排队车辆
-        for i, car in enumerate(self.queue):
-            car_info = car.to_dict()
-            car_info["status"] = f"排队中(第{i+1}位)"
+        if self.waiting_car:
+            car_info = self.waiting_car.to_dict()
+            car_info["status"] = "排队中(第1位)"
             car_info["statusClass"] = "waiting"
             queue_info.append(car_info)
             
@@ -199,18 +228,26 @@ class WaitingArea:
         """获取指定充电模式的排队数量"""
         return len(self.get_cars_by_mode(charge_mode))
 
+    def get_counters(self) -> Dict[str, int]:
+        """获取排队号码计数器"""
+        return {"fast": self.fast_queue_counter, "slow": self.slow_queue_counter}
+
+    def restore_counters(self, counters: Dict[str, int]):
+        """恢复排队号码计数器（只增不减，避免号码重复）"""
+        self.fast_queue_counter = max(self.fast_queue_counter, counters.get("fast", 0))
+        self.slow_queue_counter = max(self.slow_queue_counter, counters.get("slow", 0))
+
 class QueueManager:
     """排队管理器"""
     
-    def __init__(self):
+    def __init__(self, pile_queues: Optional[Dict[str, PileQueue]] = None):
         self.waiting_area = WaitingArea()
-        self.pile_queues: Dict[str, PileQueue] = {}
         self._lock = threading.Lock()
         
-        # 初始化充电桩队列
-        pile_ids = ["A", "B", "C", "D", "E"]
-        for pile_id in pile_ids:
-            self.pile_queues[pile_id] = PileQueue(pile_id)
+        # 充电桩队列由调度服务创建并共享，排队和调度读写同一份状态
+        if pile_queues is None:
+            pile_queues = {pile_id: PileQueue(pile_id) for pile_id in ["A", "B", "C", "D", "E"]}
+        self.pile_queues: Dict[str, PileQueue] = pile_queues
             
     def submit_request(self, user_id: str, request_id: str, charge_mode: str, 
                       requested_amount: float, battery_capacity: float = 60.0) -> Tuple[bool, str]:
@@ -227,85 +264,46 @@ class QueueManager:
                 return False, "加入等候区失败"
                 
     def cancel_request(self, user_id: str) -> bool:
-        """取消充电请求"""
+        """从等候区取消充电请求（充电桩队列中的车辆由排队服务处理）"""
         with self._lock:
-            # 从等候区查找并移除
             for car in self.waiting_area.cars:
                 if car.user_id == user_id:
                     self.waiting_area.remove_car(car)
                     return True
-                    
-            # 从充电桩队列查找并移除
-            for pile_queue in self.pile_queues.values():
-                for car in list(pile_queue.queue):
-                    if car.user_id == user_id:
-                        pile_queue.queue.remove(car)
-                        return True
                         
         return False
+    
+    def get_waiting_cars(self, charge_mode: str) -> List[WaitingCar]:
+        """获取等候区指定模式的车辆（按先来先到排序）"""
+        with self._lock:
+            cars = self.waiting_area.get_cars_by_mode(charge_mode)
+        cars.sort(key=lambda car: car.join_time)
+        return cars
+    
+    def locate_car(self, user_id: str) -> Tuple[Optional[WaitingCar], Optional[PileQueue]]:
+        """
+        查找用户车辆所在位置
         
-    def dispatch_car(self, charge_mode: str, pile_powers: Dict[str, float]) -> Optional[Tuple[WaitingCar, str]]:
-        """调度车辆（实现最短完成时长策略）"""
+        Returns:
+            (车辆, 所在充电桩队列)，在等候区时充电桩队列为None，未找到时均为None
+        """
         with self._lock:
-            # 获取下一个要调度的车辆
-            car = self.waiting_area.get_next_car(charge_mode)
-            if not car:
-                return None
-                
-            # 获取匹配的充电桩
-            matching_piles = []
-            if charge_mode == "fast":
-                matching_piles = ["A", "B"]  # 快充桩
-            else:  # slow
-                matching_piles = ["C", "D", "E"]  # 慢充桩
-                
-            # 找到有空位的充电桩
-            available_piles = []
-            for pile_id in matching_piles:
-                if pile_id in self.pile_queues and self.pile_queues[pile_id].has_space():
-                    available_piles.append(pile_id)
+            for pile_queue in self.pile_queues.values():
+                car = pile_queue.find_car(user_id)
+                if car:
+                    return car, pile_queue
                     
-            if not available_piles:
-                return None  # 没有可用充电桩
-                
-            # 计算每个充电桩的完成时长，选择最短的
-            best_pile_id = None
-            min_completion_time = float('inf')
-            
-            for pile_id in available_piles:
-                pile_queue = self.pile_queues[pile_id]
-                power = pile_powers.get(pile_id, 30.0)  # 默认30kW
-                
-                # 等待时间 = 队列中所有车辆的充电时间之和
-                wait_time = pile_queue.get_total_wait_time(power)
-                
-                # 自己充电时间 = 请求充电量/充电桩功率
-                charge_time = car.requested_amount / power
-                
-                # 总完成时长
-                completion_time = wait_time + charge_time
-                
-                if completion_time < min_completion_time:
-                    min_completion_time = completion_time
-                    best_pile_id = pile_id
+            for car in self.waiting_area.cars:
+                if car.user_id == user_id:
+                    return car, None
                     
-            # 将车辆分配到最优充电桩
-            if best_pile_id and self.pile_queues[best_pile_id].add_car(car):
-                self.waiting_area.remove_car(car)
-                
-                # 更新估算时间
-                car.estimated_wait_time = int(min_completion_time * 60)  # 转换为分钟
-                car.estimated_charge_time = int((car.requested_amount / pile_powers.get(best_pile_id, 30.0)) * 60)
-                
-                return car, best_pile_id
-                
-        return None
+        return None, None
         
     def get_statistics(self) -> Dict[str, Any]:
         """获取排队统计信息"""
         with self._lock:
             total_waiting = len(self.waiting_area.cars)
-            total_in_pile_queues = sum(len(pq.queue) for pq in self.pile_queues.values())
+            total_in_pile_queues = sum(1 for pq in self.pile_queues.values() if pq.waiting_car)
             total_charging = sum(1 for pq in self.pile_queues.values() if pq.charging_car)
             
             return {
@@ -319,33 +317,22 @@ class QueueManager:
             
     def get_user_status(self, user_id: str) -> Optional[Dict[str, Any]]:
         """获取用户排队状态"""
-        with self._lock:
-            # 在等候区查找
-            for car in self.waiting_area.cars:
-                if car.user_id == user_id:
-                    position = len([c for c in self.waiting_area.cars 
-                                  if c.charge_mode == car.charge_mode and 
-                                  c.join_time <= car.join_time])
-                    car_info = car.to_dict()
-                    car_info["position"] = position
-                    return car_info
-                    
-            # 在充电桩队列查找
-            for pile_queue in self.pile_queues.values():
-                # 检查充电中车辆
-                if pile_queue.charging_car and pile_queue.charging_car.user_id == user_id:
-                    car_info = pile_queue.charging_car.to_dict()
-                    car_info["position"] = 0  # 正在充电
-                    return car_info
-                    
-                # 检查队列中车辆
-                for i, car in enumerate(pile_queue.queue):
-                    if car.user_id == user_id:
-                        car_info = car.to_dict()
-                        car_info["position"] = i + (1 if pile_queue.charging_car else 0)
-                        return car_info
-                        
-        return None
+        car, pile_queue = self.locate_car(user_id)
+        if not car:
+            return None
+        
+        car_info = car.to_dict()
+        if pile_queue is None:
+            # 等候区中同模式排在前面的车辆数 + 1
+            with self._lock:
+                car_info["position"] = len([c for c in self.waiting_area.cars 
+                                            if c.charge_mode == car.charge_mode and 
+                                            c.join_time <= car.join_time])
+        elif car is pile_queue.charging_car:
+            car_info["position"] = 0  # 正在充电
+        else:
+            car_info["position"] = 1  # 充电桩队列第二个车位
+        return car_info
         
     def get_all_queue_info(self) -> Dict[str, Any]:
         """获取所有队列信息"""
@@ -356,6 +343,6 @@ class QueueManager:
             }
             
             for pile_id, pile_queue in self.pile_queues.items():
-                queue_info["pileQueues"][pile_id] = pile_queue.get_queue_info()
+                queue_info["pileQueues"][pile_id] = pile_queue.get_cars_info()
                 
             return queue_info 
\ No newline at end of file
@@ -4,6 +4,8 @@ from typing import Dict, Any
 class User:
     """用户数据模型"""
     
+    __slots__ = ("username", "password", "usertype", "created_at", "last_login")
+    
     def __init__(self, username: str, password: str, usertype: str):
         self.username = username
         self.password = password
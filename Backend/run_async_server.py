@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+智能充电桩调度计费系统 - 异步服务器启动脚本
+
+使用内置的 asyncio HTTP 服务器运行 asgi.py 中的 ASGI 应用，
+接口与 run_server.py 相同；空闲的轮询连接只占用套接字，不占用线程。
+
+用法: python run_async_server.py [--host HOST] [--port PORT] [--max-connections N]
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+
+
+def raise_file_limit(required: int):
+    """提高进程可打开的文件描述符数量，使其能容纳全部连接"""
+    try:
+        import resource
+    except ImportError:
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = required if hard == resource.RLIM_INFINITY else min(required, hard)
+    if soft < target:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        soft = target
+    if soft < required:
+        print(f"⚠️ 文件描述符上限为 {soft}，低于最大连接数 {required}")
+
+
+async def serve(args):
+    from asgi import application
+    from utils.async_http_server import AsyncHTTPServer
+
+    http_server = AsyncHTTPServer(
+        application, args.host, args.port,
+        max_connections=args.max_connections,
+        keepalive_timeout=Config.ASYNC_KEEPALIVE_TIMEOUT
+    )
+
+    # 由事件循环处理退出信号，关闭监听后再关闭服务
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop_event.set)
+
+    print(f"✅ 异步服务器已启动: http://{args.host}:{args.port}")
+    await http_server.serve_until(stop_event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="异步模式启动充电桩调度计费系统")
+    parser.add_argument('--host', default='0.0.0.0', help="监听地址")
+    parser.add_argument('--port', type=int, default=5000, help="监听端口")
+    parser.add_argument('--max-connections', type=int, default=Config.ASYNC_MAX_CONNECTIONS, help="最大并发连接数")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("智能充电桩调度计费系统（异步模式）")
+    print(f"  - 地址: http://{args.host}:{args.port}")
+    print(f"  - 最大连接数: {args.max_connections}")
+    print(f"  - 处理线程数: {Config.ASYNC_HANDLER_THREADS}")
+    print("=" * 50)
+
+    # 预留监听、数据库和日志等文件描述符
+    raise_file_limit(args.max_connections + 256)
+
+    asyncio.run(serve(args))
+    print("服务器已停止")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+智能充电桩调度计费系统 - 多进程启动脚本
+
+启动一个状态进程和多个 HTTP 工作进程：
+- 状态进程持有调度、排队、充电过程和用户数据，运行调度引擎和充电监控，
+  通过 Unix 套接字对外提供服务调用
+- 工作进程不持有状态，共享同一个监听端口处理 HTTP 请求，
+  请求解析、鉴权和响应序列化在各自进程中完成，可以利用多个 CPU 核心
+
+用法: python run_multiworker.py [--workers N] [--host HOST] [--port PORT]
+仅支持 Linux/macOS（依赖 fork 和 Unix 套接字）。
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import sys
+import time
+
+# 添加当前目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 各工作进程签发的令牌必须能互相验证，未配置密钥时为本次启动生成一个共享密钥
+if not os.getenv('AUTH_TOKEN_SECRET'):
+    os.environ['AUTH_TOKEN_SECRET'] = secrets.token_hex(32)
+
+from config import Config
+
+
+def run_state_process(socket_path):
+    """状态进程：初始化全部服务并监听 Unix 套接字"""
+    os.environ['ECHARGE_PROCESS_ROLE'] = 'state'
+
+    import server
+    from utils.state_rpc import StateServer
+
+    state_server = StateServer(socket_path, server.get_state_services())
+    state_server.start()
+
+    def handle_signal(signum, frame):
+        state_server.stop()
+        server.shutdown_services()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    while True:
+        signal.pause()
+
+
+def run_worker(listen_fd, host, port, socket_path):
+    """工作进程：在共享的监听套接字上处理 HTTP 请求"""
+    os.environ['ECHARGE_PROCESS_ROLE'] = 'worker'
+    os.environ['ECHARGE_STATE_SOCKET'] = socket_path
+
+    import server
+    from werkzeug.serving import make_server
+
+    httpd = make_server(host, port, server.app, threaded=True, fd=listen_fd)
+    httpd.serve_forever()
+
+
+def wait_for_state_process(process, socket_path, timeout=60.0):
+    """等待状态进程开始监听"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            return False
+        if os.path.exists(socket_path):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程启动充电桩调度计费系统")
+    parser.add_argument('--workers', type=int, default=Config.WORKER_COUNT, help="HTTP 工作进程数量")
+    parser.add_argument('--host', default='0.0.0.0', help="监听地址")
+    parser.add_argument('--port', type=int, default=5000, help="监听端口")
+    parser.add_argument('--socket', default=Config.STATE_SOCKET_PATH, help="状态进程的 Unix 套接字路径")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('fork')
+
+    # 删除上次异常退出残留的套接字文件，等待状态进程重新创建
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    print("=" * 50)
+    print("智能充电桩调度计费系统（多进程模式）")
+    print(f"  - 地址: http://{args.host}:{args.port}")
+    print(f"  - 工作进程: {args.workers}")
+    print(f"  - 状态进程套接字: {args.socket}")
+    print("=" * 50)
+
+    state_process = ctx.Process(target=run_state_process, args=(args.socket,), name="echarge-state")
+    state_process.start()
+
+    if not wait_for_state_process(state_process, args.socket):
+        print("❌ 状态进程启动失败")
+        state_process.terminate()
+        state_process.join()
+        sys.exit(1)
+
+    # 监听套接字由主进程创建，工作进程继承后共同 accept
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        listener.bind((args.host, args.port))
+    except OSError as e:
+        print(f"❌ 无法监听 {args.host}:{args.port}: {e}")
+        state_process.terminate()
+        state_process.join()
+        sys.exit(1)
+    listener.listen(1024)
+    listener.set_inheritable(True)
+
+    workers = []
+    for i in range(args.workers):
+        worker = ctx.Process(
+            target=run_worker,
+            args=(listener.fileno(), args.host, args.port, args.socket),
+            name=f"echarge-worker-{i}"
+        )
+        worker.start()
+        workers.append(worker)
+
+    print(f"✅ 已启动 {len(workers)} 个工作进程")
+
+    stopping = False
+
+    def handle_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    try:
+        # 工作进程异常退出时重新启动，状态进程退出时整体停止
+        while not stopping and state_process.is_alive():
+            for i, worker in enumerate(workers):
+                if not worker.is_alive() and not stopping:
+                    print(f"⚠️ 工作进程 {worker.name} 已退出（退出码 {worker.exitcode}），正在重启")
+                    workers[i] = ctx.Process(
+                        target=run_worker,
+                        args=(listener.fileno(), args.host, args.port, args.socket),
+                        name=worker.name
+                    )
+                    workers[i].start()
+            time.sleep(0.5)
+    finally:
+        print("\n🛑 正在停止工作进程和状态进程...")
+
+        # 先停止工作进程，再停止状态进程（状态进程关闭时保存数据）
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+
+        if state_process.is_alive():
+            state_process.terminate()
+        state_process.join()
+
+        listener.close()
+        print("服务器已停止")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,214 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, g, make_response
 from flask_cors import CORS
-from services.user_service import UserService
-from services.charging_pile_service import charging_pile_service
-from services.dispatch_service import dispatch_service
-from services.queue_service import queue_service
-from services.charging_process_service import charging_process_service
-from services.charging_fault_service import charging_fault_service
-from config import DispatchMode
-from database.database_manager import DatabaseManager
-from utils.response_helper import success_response, error_response
+from config import Config, DispatchMode
+from utils.structured_log import setup_logging
+import os
+
+# 配置日志：在导入服务之前配置，服务初始化时的日志也由后台线程写出
+setup_logging(Config.LOG_LEVEL, Config.LOG_FORMAT, Config.LOG_QUEUE_SIZE)
+
+# 多进程部署的工作进程不持有充电站状态，不导入服务模块：服务模块导入时创建单例，
+# 会启动充电桩监控等后台循环并注册状态监听器。服务名称在连接状态进程后绑定为代理。
+IS_WORKER = os.environ.get('ECHARGE_PROCESS_ROLE') == 'worker'
+
+if not IS_WORKER:
+    from services.user_service import UserService
+    from services.charging_pile_service import charging_pile_service
+    from services.dispatch_service import dispatch_service
+    from services.queue_service import queue_service
+    from services.charging_process_service import charging_process_service
+    from services.charging_fault_service import charging_fault_service
+    from services.dashboard_service import dashboard_service
+    from services.event_bus import event_bus
+    from services.push_service import push_service
+    from services.queue_watch import queue_watch_service
+    from services.snapshot_service import snapshot_service
+    from database.database_manager import DatabaseManager
+    from database.queue_journal import queue_journal
+    from database.session_archive import session_archive
+    from database.bill_ledger import bill_ledger
+    from utils.loop_supervisor import loop_supervisor
+from utils.response_encoder import build_response, encode_json
+from utils.response_helper import success_response, error_response, etag_matches, not_modified_response, with_etag
+from utils.async_wait import ASYNC_WAIT_ENVIRON, DeferredResponse, Wait, stream_with_waits
+from utils.auth_token import auth_token_service
+from utils.state_rpc import StateClient, ServiceProxy
+from utils.state_version import queue_status_version
+from utils.metrics import metrics
 from datetime import datetime
 import logging
 import atexit
 import signal
 import sys
+import threading
+import time
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # 创建Flask应用
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
+# 会话令牌签名配置
+auth_token_service.configure(Config.AUTH_TOKEN_SECRET, Config.AUTH_TOKEN_TTL, Config.AUTH_TOKEN_CACHE_SIZE)
+if auth_token_service.ephemeral_secret:
+    logger.warning("未配置 AUTH_TOKEN_SECRET，使用随机密钥：重启后令牌失效，多进程之间不能互相验证")
+
+# 后台循环监督配置
+if not IS_WORKER:
+    loop_supervisor.configure(Config.LOOP_STALL_TIMEOUT, Config.LOOP_RESTART_BACKOFF, Config.LOOP_RESTART_BACKOFF_MAX)
+
+# 状态进程中记录的指标（调度、后台循环）；单进程部署时就是本进程的指标
+station_metrics = metrics
+
+# 请求指标
+HTTP_REQUESTS = metrics.counter("echarge_http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+HTTP_LATENCY = metrics.histogram("echarge_http_request_duration_seconds", "HTTP 请求处理耗时（秒）", ("method", "route"))
+HTTP_IN_FLIGHT = metrics.gauge("echarge_http_requests_in_flight", "处理中的 HTTP 请求数")
+REQUEST_METRICS = (HTTP_REQUESTS.name, HTTP_LATENCY.name, HTTP_IN_FLIGHT.name)
+
+def _record_request_metrics(status_code):
+    """记录一次请求的耗时和状态码"""
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    _observe_request(request.method, route, started, status_code)
+
+def _observe_request(method, route, started, status_code):
+    HTTP_LATENCY.observe(time.perf_counter() - started, (method, route))
+    HTTP_REQUESTS.inc((method, route, str(status_code)))
+    HTTP_IN_FLIGHT.dec()
+
+if Config.METRICS_ENABLED:
+    @app.before_request
+    def metrics_before_request():
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+    
+    @app.after_request
+    def metrics_after_request(response):
+        if isinstance(response, DeferredResponse):
+            # 长轮询等待结束后才确定状态码，响应关闭时记录
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                method, route = request.method, request.url_rule.rule
+                response.call_on_close(lambda: _observe_request(method, route, started, response.status_code))
+            return response
+        
+        _record_request_metrics(response.status_code)
+        return response
+    
+    @app.teardown_request
+    def metrics_teardown_request(exc):
+        # 未处理的异常不会经过 after_request
+        _record_request_metrics(500)
+
+# 充电站状态指标（抓取时读取）
+def _waiting_area_depth():
+    stats = queue_service.get_statistics()
+    return {("fast",): stats["fastQueueCount"], ("slow",): stats["slowQueueCount"]}
+
+def _pile_counts():
+    stats = charging_pile_service.get_statistics()
+    return {("total",): stats["totalPiles"], ("active",): stats["activePiles"], ("charging",): stats["chargingPiles"]}
+
+def _pile_utilization():
+    stats = charging_pile_service.get_statistics()
+    return stats["chargingPiles"] / stats["activePiles"] if stats["activePiles"] else 0.0
+
+metrics.gauge_func("echarge_waiting_area_cars", "等候区排队车辆数", _waiting_area_depth, ("mode",))
+metrics.gauge_func("echarge_piles", "充电桩数量", _pile_counts, ("state",))
+metrics.gauge_func("echarge_pile_utilization", "正在充电的充电桩占正常充电桩的比例", _pile_utilization)
+metrics.gauge_func("echarge_active_sessions", "活跃充电会话数",
+                   lambda: charging_process_service.get_active_session_count())
+
 # 初始化数据库管理器
-db_manager = DatabaseManager()
+db_manager = None if IS_WORKER else DatabaseManager()
 
 # 初始化服务
 user_service = None
 
+# 多进程部署时由状态进程持有的服务，工作进程中替换为代理
+STATE_SERVICE_NAMES = (
+    "user_service", "charging_pile_service", "dispatch_service", "queue_service",
+    "charging_process_service", "charging_fault_service", "dashboard_service", "push_service",
+    "queue_watch_service", "event_bus", "bill_ledger", "station_metrics", "loop_supervisor"
+)
+state_client = None
+
+def get_state_services():
+    """状态进程：返回对工作进程开放的服务"""
+    return {name: globals()[name] for name in STATE_SERVICE_NAMES}
+
+def connect_state_process(socket_path):
+    """工作进程：不持有充电站状态，把服务替换为状态进程的代理"""
+    global state_client
+    
+    state_client = StateClient(socket_path)
+    for name in STATE_SERVICE_NAMES:
+        globals()[name] = ServiceProxy(state_client, name)
+    logger.info(f"工作进程已连接状态进程: {socket_path}")
+    
+    if Config.METRICS_ENABLED:
+        threading.Thread(target=_request_metrics_reporter, name="metrics-reporter", daemon=True).start()
+
+def report_request_metrics():
+    """工作进程：把本进程请求指标的累计值上报给状态进程，/metrics 输出全部工作进程之和"""
+    station_metrics.merge_remote(f"worker-{os.getpid()}", metrics.export(REQUEST_METRICS))
+
+def _request_metrics_reporter():
+    """工作进程：定期上报请求指标（状态进程暂时不可用时下次重试）"""
+    while not _shutdown_called:
+        time.sleep(Config.WORKER_METRICS_REPORT_INTERVAL)
+        try:
+            report_request_metrics()
+        except Exception as e:
+            logger.warning(f"上报请求指标失败: {e}")
+
+def recover_station_state():
+    """加载状态快照并回放快照之后的队列日志，恢复重启前的充电站状态"""
+    if queue_journal.enabled:
+        return
+    
+    try:
+        snapshot = None
+        if Config.SNAPSHOT_ENABLED:
+            snapshot_service.bind_user_service(user_service)
+            snapshot = snapshot_service.load_snapshot(Config.SNAPSHOT_PATH)
+        
+        base_state = snapshot["queue"] if snapshot else None
+        after_seq = snapshot["journal_seq"] if snapshot else 0
+        
+        if Config.QUEUE_JOURNAL_ENABLED:
+            state = queue_journal.open(
+                Config.QUEUE_JOURNAL_PATH,
+                flush_interval=Config.QUEUE_JOURNAL_FLUSH_INTERVAL,
+                compact_threshold=Config.QUEUE_JOURNAL_COMPACT_THRESHOLD,
+                base_state=base_state,
+                after_seq=after_seq
+            )
+            queue_journal.set_state_provider(queue_service.export_queue_state)
+        else:
+            state = base_state
+        
+        if snapshot:
+            snapshot_service.restore_snapshot(snapshot, state)
+        if state:
+            queue_service.restore_queue_state(state)
+        
+        if Config.SNAPSHOT_ENABLED:
+            snapshot_service.start_periodic_snapshots(Config.SNAPSHOT_PATH, Config.SNAPSHOT_INTERVAL)
+        
+        if Config.SESSION_ARCHIVE_ENABLED:
+            charging_process_service.enable_archive(Config.SESSION_ARCHIVE_DIR, Config.SESSION_ARCHIVE_INTERVAL)
+        
+        if Config.BILL_LEDGER_ENABLED and not bill_ledger.enabled:
+            bill_ledger.open(Config.BILL_LEDGER_DIR)
+    except Exception as e:
+        logger.error(f"恢复充电站状态失败: {e}")
+
 def init_services():
     """初始化所有服务"""
     global user_service
@@ -42,6 +222,15 @@ def init_services():
             # 初始化用户服务（从数据库加载数据）
             user_service = UserService(db_manager)
             
+            # 启动最后登录时间批量写入
+            user_service.start_login_writer()
+            
+            # 恢复充电站状态
+            recover_station_state()
+            
+            # 启动事件总线
+            event_bus.start(Config.EVENT_BUS_WORKERS)
+            
             # 启动调度引擎
             dispatch_service.start_dispatch_engine()
             
@@ -55,6 +244,12 @@ def init_services():
             # 如果数据库连接失败，使用纯内存模式
             user_service = UserService()
             
+            # 恢复充电站状态
+            recover_station_state()
+            
+            # 启动事件总线
+            event_bus.start(Config.EVENT_BUS_WORKERS)
+            
             # 启动调度引擎
             dispatch_service.start_dispatch_engine()
             
@@ -68,6 +263,12 @@ def init_services():
         # 如果初始化失败，使用内存模式
         user_service = UserService()
         
+        # 恢复充电站状态
+        recover_station_state()
+        
+        # 启动事件总线
+        event_bus.start(Config.EVENT_BUS_WORKERS)
+        
         # 启动调度引擎
         dispatch_service.start_dispatch_engine()
         
@@ -88,17 +289,46 @@ def shutdown_services():
     
     _shutdown_called = True
     
+    # 工作进程只需断开与状态进程的连接
+    if state_client:
+        state_client.close()
+        return
+    
     try:
-        # 注意：不再执行全量保存，因为用户数据已经实时同步到数据库
-        # 全量保存会覆盖数据库中的数据，可能导致数据丢失
+        # 用户数据已经实时同步到数据库，这里只按用户名增量写回尚未同步的用户
         logger.info("正在关闭服务...")
         
+        # 结束全部事件流
+        push_service.close_all()
+        
         # 停止调度引擎
         dispatch_service.stop_dispatch_engine()
         
         # 停止充电过程监控
         charging_process_service.stop_progress_monitor()
         
+        # 投递剩余事件后停止事件总线
+        event_bus.stop()
+        
+        # 保存最终状态快照
+        snapshot_service.stop_periodic_snapshots()
+        
+        # 写出并关闭队列日志
+        queue_journal.close()
+        
+        # 停止定期归档，归档剩余的充电历史记录
+        charging_process_service.stop_archive()
+        charging_process_service.archive_completed_sessions()
+        session_archive.close()
+        
+        # 写盘并关闭详单账本
+        bill_ledger.close()
+        
+        # 写入缓冲的登录时间，再写回尚未同步的用户
+        if user_service and user_service.db_manager:
+            user_service.stop_login_writer()
+            user_service.save_users_to_database()
+        
         logger.info("正在关闭数据库连接...")
         
         if db_manager:
@@ -123,14 +353,63 @@ signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
 # 只在主进程中初始化服务（避免Flask reloader重复初始化）
-import os
-if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug:
+if IS_WORKER:
+    connect_state_process(os.environ.get('ECHARGE_STATE_SOCKET', Config.STATE_SOCKET_PATH))
+elif os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug:
     logger.info("正在初始化服务...")
     init_services()
     logger.info("充电桩系统已初始化，运行状态良好")
 else:
     logger.info("检测到Flask reloader进程，跳过初始化")
 
+def get_current_username():
+    """
+    获取当前请求的用户名
+    
+    验证 Authorization: Bearer 签名令牌（不查询用户数据）。未携带令牌或令牌无效时返回None；
+    开发环境开启 AUTH_ALLOW_USERNAME_HEADER 时，未携带令牌的请求可以用 X-Username 请求头指定用户。
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        claims = auth_token_service.verify(auth_header[7:].strip())
+        if not claims:
+            return None
+        g.auth_role = claims['role']
+        return claims['username']
+    
+    if Config.AUTH_ALLOW_USERNAME_HEADER:
+        return request.headers.get('X-Username')
+    return None
+
+def get_current_role(username):
+    """获取当前请求的用户角色（令牌中携带角色时不查询用户数据）"""
+    role = g.get('auth_role')
+    if role:
+        return role
+    
+    current_user = user_service.get_user_info(username)
+    return current_user['data']['usertype'] if current_user['success'] else None
+
+# 只允许管理员调用的接口（路由前缀和完整路径）
+ADMIN_ROUTE_PREFIX = '/api/admin/'
+ADMIN_ROUTES = ('/api/dispatch/engine/start', '/api/dispatch/engine/stop')
+
+@app.before_request
+def require_admin_token():
+    """管理员接口统一验证令牌和角色：未携带有效令牌返回401，非管理员返回403"""
+    if request.method == 'OPTIONS':
+        return None
+    path = request.path
+    if not path.startswith(ADMIN_ROUTE_PREFIX) and path not in ADMIN_ROUTES:
+        return None
+    
+    username = get_current_username()
+    if not username:
+        return error_response("未提供有效的登录令牌", 401)
+    if get_current_role(username) != 'admin':
+        return error_response("权限不足", 403)
+    return None
+
 def ensure_services_initialized():
     """确保服务已初始化"""
     global user_service
@@ -186,6 +465,43 @@ def register():
         logger.error(f"注册时发生错误: {str(e)}")
         return error_response("服务器内部错误", 500)
 
+@app.route('/api/admin/users/batch', methods=['POST'])
+def register_users_batch():
+    """批量注册用户接口（管理员功能）"""
+    try:
+        # 确保服务已初始化
+        if not ensure_services_initialized():
+            return error_response("服务初始化失败", 500)
+        
+        # 从请求头获取当前用户信息
+        username = get_current_username()
+        
+        if not username:
+            return error_response("未提供用户信息", 401)
+        
+        # 验证管理员权限
+        if get_current_role(username) != 'admin':
+            return error_response("权限不足", 403)
+        
+        data = request.get_json()
+        
+        # 参数验证
+        if not data or not isinstance(data.get('users'), list):
+            return error_response("用户列表不能为空", 400)
+        
+        # 调用服务层处理批量注册
+        result = user_service.register_users(data['users'])
+        
+        if result['success']:
+            logger.info(f"批量注册用户: 成功 {result['data']['registeredCount']} 个")
+            return success_response("批量注册完成", result['data'])
+        else:
+            return error_response(result['message'], 500)
+            
+    except Exception as e:
+        logger.error(f"批量注册时发生错误: {str(e)}")
+        return error_response("服务器内部错误", 500)
+
 @app.route('/api/login', methods=['POST'])
 def login():
     """用户登录接口"""
@@ -211,7 +527,9 @@ def login():
         
         if result['success']:
             logger.info(f"用户登录成功: {username}")
-            return jsonify({"type": result['usertype']})
+            # 签发签名令牌，后续请求通过 Authorization: Bearer 携带
+            token = auth_token_service.issue(username, result['usertype'])
+            return build_response({"type": result['usertype'], "token": token})
         else:
             return error_response(result['message'], 401)
             
@@ -228,7 +546,7 @@ def get_user_info():
             return error_response("服务初始化失败", 500)
         
         # 从请求头获取用户名
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         
         if not username:
             return error_response("未提供用户信息", 401)
@@ -249,32 +567,13 @@ def get_user_info():
 def get_user_statistics():
     """获取用户统计信息"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
         # 获取用户充电历史统计
         try:
-            sessions = charging_process_service.get_user_session_history(username, 100)  # 获取最近100条记录
-            
-            charge_count = len(sessions)
-            total_energy = 0.0
-            total_cost = 0.0
-            
-            for session in sessions:
-                # 统计所有有充电量的记录（包括完成、中断等状态）
-                if session.status.value in ["COMPLETED", "INTERRUPTED"] and session.current_amount > 0:
-                    total_energy += session.current_amount or 0
-                    # 计算费用 (简化计算: 电费 + 服务费)
-                    amount = session.current_amount or 0
-                    session_cost = amount * 1.5  # 假设平均费用1.5元/度
-                    total_cost += session_cost
-            
-            statistics = {
-                "chargeCount": charge_count,
-                "totalEnergy": round(total_energy, 1),
-                "totalCost": round(total_cost, 2)
-            }
+            statistics = dashboard_service.get_user_statistics(username)
             
             return success_response("获取用户统计成功", statistics)
             
@@ -300,18 +599,24 @@ def get_all_users():
             return error_response("服务初始化失败", 500)
         
         # 从请求头获取当前用户信息
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         
         if not username:
             return error_response("未提供用户信息", 401)
         
         # 验证管理员权限
-        current_user = user_service.get_user_info(username)
-        if not current_user['success'] or current_user['data']['usertype'] != 'admin':
+        if get_current_role(username) != 'admin':
             return error_response("权限不足", 403)
         
+        # 分页参数（可选）
+        try:
+            page = int(request.args['page']) if request.args.get('page') else None
+            page_size = int(request.args['pageSize']) if request.args.get('pageSize') else None
+        except ValueError:
+            return error_response("分页参数格式错误", 400)
+        
         # 调用服务层获取用户列表
-        result = user_service.get_all_users()
+        result = user_service.get_all_users(page, page_size)
         
         if result['success']:
             return success_response("获取用户列表成功", result['data'])
@@ -349,6 +654,11 @@ def get_admin_pile_statistics():
 def get_admin_piles():
     """获取所有充电桩详细信息"""
     try:
+        # 充电桩状态没有变化时直接返回304
+        etag = charging_pile_service.get_piles_etag()
+        if etag_matches(etag):
+            return not_modified_response(etag)
+        
         piles_data = charging_pile_service.get_all_piles()
         
         # 转换为前端期望的格式
@@ -373,7 +683,7 @@ def get_admin_piles():
             }
             formatted_piles.append(formatted_pile)
         
-        return success_response("获取充电桩列表成功", {"piles": formatted_piles})
+        return with_etag(success_response("获取充电桩列表成功", {"piles": formatted_piles}), etag)
     
     except Exception as e:
         logger.error(f"获取充电桩列表时发生错误: {str(e)}")
@@ -395,7 +705,6 @@ def update_admin_pile_status(pile_id):
         # 更新充电桩状态
         if is_active:
             # 启动充电桩 - 触发故障恢复处理
-            from services.charging_fault_service import charging_fault_service
             recovery_result = charging_fault_service.handle_pile_recovery(pile_char_id)
             
             if not recovery_result["success"]:
@@ -409,7 +718,6 @@ def update_admin_pile_status(pile_id):
             })
         else:
             # 关闭充电桩 - 触发故障处理
-            from services.charging_fault_service import charging_fault_service
             fault_result = charging_fault_service.handle_pile_fault(pile_char_id, "管理员手动关闭")
             
             if not fault_result["success"]:
@@ -568,76 +876,39 @@ def test_pile_info():
 def get_current_charging_status():
     """获取用户当前充电状态"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
-        # 首先检查用户是否有活跃的充电会话
-        session = charging_process_service.get_user_active_session(username)
-        
-        if session:
-            # 用户有活跃的充电会话，格式化为前端期望的格式
-            queue_status = queue_service.get_queue_status(username)
-            
-            # 获取充电桩名称
-            pile_name = f"快充桩 {session.pile_id}" if session.pile_id in ["A", "B"] else f"慢充桩 {session.pile_id}"
-            
-            # 计算充电进度
-            progress_percent = 0
-            if session.requested_amount > 0:
-                current_amount = session.current_amount or 0
-                progress_percent = min((current_amount / session.requested_amount) * 100, 100)
-            
-            charging_status = {
-                "hasActiveCharging": True,
-                "activePile": pile_name,
-                "chargedAmount": round(session.current_amount or 0, 1),
-                "progressPercent": round(progress_percent, 1),
-                "startTime": session.start_time.isoformat() if session.start_time else "",
-                "estimatedEndTime": session.estimated_end_time.isoformat() if session.estimated_end_time else "",
-                "status": "charging"
-            }
-            
-            # 如果还需要队列信息（用于取消等功能），也包含进去
-            if queue_status:
-                charging_status["queue"] = queue_status
-            
-            return success_response("获取充电状态成功", charging_status)
-        
-        # 如果没有活跃充电会话，检查是否有排队请求
-        queue_status = queue_service.get_queue_status(username)
-        
-        if queue_status:
-            if queue_status.get('status') == 'CHARGING':
-                # 用户正在充电（在调度系统中）
-                return success_response("获取充电状态成功", {
-                    "hasActiveCharging": True,
-                    "status": "charging",
-                    "queue": queue_status
-                })
-            elif queue_status.get('status') == 'WAITING':
-                # 用户在排队等待
-                return success_response("获取充电状态成功", {
-                    "hasActiveCharging": False,
-                    "status": "waiting",
-                    "queue": queue_status
-                })
-        
-        # 用户没有任何充电相关活动
-        return success_response("获取充电状态成功", {
-            "hasActiveCharging": False,
-            "status": "idle"
-        })
+        charging_status = dashboard_service.get_charging_status(username)
+        return success_response("获取充电状态成功", charging_status)
     
     except Exception as e:
         logger.error(f"获取当前充电状态时发生错误: {str(e)}")
         return error_response("获取充电状态失败", 500)
 
+@app.route('/api/user/dashboard', methods=['GET'])
+def get_user_dashboard():
+    """获取用户看板（充电状态、排队状态、前车数量、充电区状态和用户统计）"""
+    try:
+        username = get_current_username()
+        if not username:
+            return error_response("未提供用户信息", 401)
+
+        # 携带上次返回的 version 时，未变化的分区不再返回
+        since = request.args.get('since')
+        dashboard = dashboard_service.get_user_dashboard(username, since)
+        return success_response("获取用户看板成功", dashboard)
+
+    except Exception as e:
+        logger.error(f"获取用户看板时发生错误: {str(e)}")
+        return error_response("获取用户看板失败", 500)
+
 @app.route('/api/charging/request', methods=['POST'])
 def submit_charge_request():
     """提交充电请求"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -664,28 +935,69 @@ def submit_charge_request():
 
 @app.route('/api/queue/status', methods=['GET'])
 def get_queue_status():
-    """获取排队状态"""
+    """
+    获取排队状态
+    
+    携带 version 参数时为长轮询：挂起到排队位置、状态或分配的充电桩相对该版本发生变化，
+    或等待 wait 秒（默认且最多 QUEUE_LONG_POLL_MAX_WAIT）后返回，响应中的 version 用于下一次请求。
+    """
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
+        version = request.args.get('version')
+        if version:
+            try:
+                wait = min(float(request.args.get('wait', Config.QUEUE_LONG_POLL_MAX_WAIT)),
+                           Config.QUEUE_LONG_POLL_MAX_WAIT)
+            except ValueError:
+                return error_response("查询参数格式错误", 400)
+            
+            # 异步部署时等待结束后再构建响应，不占用线程；同步服务器和工作进程（经状态进程）
+            # 阻塞处理线程，同时阻塞的请求数有上限
+            if request.environ.get(ASYNC_WAIT_ENVIRON) and not state_client:
+                return DeferredResponse(
+                    queue_watch_service.watch(username, version, max(wait, 0)), _long_poll_response
+                )
+            return _long_poll_response(queue_watch_service.wait_for_change(
+                username, version, max(wait, 0), Config.QUEUE_LONG_POLL_MAX_WAITERS
+            ))
+        
+        # 排队状态没有变化时直接返回304
+        etag = queue_service.get_queue_status_etag(username)
+        if etag and etag_matches(etag):
+            return not_modified_response(etag)
+        
         queue_status = queue_service.get_queue_status(username)
         
         if queue_status:
-            return success_response("获取排队状态成功", queue_status)
+            response = success_response("获取排队状态成功", {**queue_status, "version": queue_status_version(queue_status)})
+            return with_etag(response, etag) if etag else response
         else:
-            return error_response("未找到排队信息", 404)
+            return error_response("未找到排队信息", 404, {"version": queue_status_version(None)})
     
     except Exception as e:
         logger.error(f"获取排队状态时发生错误: {str(e)}")
         return error_response("获取排队状态失败", 500)
 
+def _long_poll_response(result):
+    """长轮询结果的响应，因挂起请求达到上限未等待时提示客户端稍后重试"""
+    queue_status, version, rejected = result
+    if queue_status:
+        response = success_response("获取排队状态成功", {**queue_status, "version": version})
+    else:
+        response = error_response("未找到排队信息", 404, {"version": version})
+    if rejected:
+        response = make_response(response)
+        response.headers["Retry-After"] = str(Config.QUEUE_LONG_POLL_RETRY_AFTER)
+    return response
+
 @app.route('/api/queue/cancel', methods=['POST'])
 def cancel_queue():
     """取消排队"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -710,7 +1022,7 @@ def cancel_queue():
 def modify_charge_amount():
     """修改充电量"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -735,7 +1047,7 @@ def modify_charge_amount():
 def modify_charge_mode():
     """修改充电模式"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -760,8 +1072,12 @@ def modify_charge_mode():
 def get_charge_area_status():
     """获取充电区整体状态"""
     try:
+        etag = queue_service.get_charge_area_etag()
+        if etag_matches(etag):
+            return not_modified_response(etag)
+        
         charge_area_status = queue_service.get_charge_area_status()
-        return success_response("获取充电区状态成功", charge_area_status)
+        return with_etag(success_response("获取充电区状态成功", charge_area_status), etag)
     
     except Exception as e:
         logger.error(f"获取充电区状态时发生错误: {str(e)}")
@@ -771,7 +1087,7 @@ def get_charge_area_status():
 def get_queue_ahead_count():
     """获取前车等待数量"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -801,8 +1117,12 @@ def get_dispatch_statistics():
 def get_pile_queues():
     """获取所有充电桩队列状态"""
     try:
+        etag = dispatch_service.get_pile_queues_etag()
+        if etag_matches(etag):
+            return not_modified_response(etag)
+        
         pile_queues = dispatch_service.get_all_pile_queues_status()
-        return success_response("获取充电桩队列状态成功", pile_queues)
+        return with_etag(success_response("获取充电桩队列状态成功", pile_queues), etag)
     
     except Exception as e:
         logger.error(f"获取充电桩队列状态时发生错误: {str(e)}")
@@ -918,7 +1238,7 @@ def get_admin_dispatch_overview():
 def get_charging_session_status():
     """获取用户当前充电会话状态"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -939,21 +1259,19 @@ def get_charging_session_status():
 def get_charging_session_history():
     """获取用户充电会话历史"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
         limit = int(request.args.get('limit', 10))
         
-        # 获取用户充电历史
-        sessions = charging_process_service.get_user_session_history(username, limit)
+        # 获取用户充电历史及对应的详单
+        history = charging_process_service.get_user_charging_history(username, limit)
         
         sessions_data = []
-        for session in sessions:
+        for session, bill in history:
             session_data = session.to_dict()
             
-            # 获取对应的详单信息
-            bill = charging_process_service.get_session_bill(session.session_id)
             if bill:
                 session_data["bill"] = bill.to_dict()
             
@@ -972,7 +1290,7 @@ def get_charging_session_history():
 def stop_charging_session_api(session_id):
     """停止充电会话"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -1008,7 +1326,7 @@ def stop_charging_session_api(session_id):
 def get_charging_session_bill(session_id):
     """获取充电会话详单"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -1033,7 +1351,7 @@ def get_charging_session_bill(session_id):
 def get_real_time_charging_status():
     """获取实时充电状态"""
     try:
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -1056,18 +1374,91 @@ def get_real_time_charging_status():
         logger.error(f"获取实时充电状态时发生错误: {str(e)}")
         return error_response("获取实时充电状态失败", 500)
 
+# 事件流令牌的用途，只能用于建立事件流连接
+EVENTS_TOKEN_PURPOSE = 'events'
+
+@app.route('/api/charging/events/token', methods=['POST'])
+def issue_charging_events_token():
+    """
+    签发事件流令牌
+    
+    浏览器 EventSource 不能设置请求头，先用会话令牌换取短期的事件流令牌，再通过 stream_token 查询参数建立连接。
+    事件流令牌只能用于建立事件流连接，出现在访问日志中也不能用于调用其他接口。
+    """
+    username = get_current_username()
+    if not username:
+        return error_response("未提供用户信息", 401)
+    
+    token = auth_token_service.issue(username, get_current_role(username), purpose=EVENTS_TOKEN_PURPOSE,
+                                     ttl=Config.PUSH_STREAM_TOKEN_TTL)
+    return success_response("事件流令牌签发成功", {"streamToken": token, "expiresIn": Config.PUSH_STREAM_TOKEN_TTL})
+
+@app.route('/api/charging/events', methods=['GET'])
+def charging_events():
+    """
+    充电进度和排队状态事件流（Server-Sent Events）
+    
+    事件: progress / session_started / session_completed / session_interrupted / queue。
+    浏览器 EventSource 不能设置请求头，通过 stream_token 查询参数携带事件流令牌（不接受会话令牌）。
+    """
+    username = get_current_username()
+    if not username and request.args.get('stream_token'):
+        claims = auth_token_service.verify(request.args['stream_token'], purpose=EVENTS_TOKEN_PURPOSE)
+        username = claims['username'] if claims else None
+    if not username:
+        return error_response("未提供用户信息", 401)
+    
+    try:
+        sub_id = push_service.subscribe(username)
+    except Exception as e:
+        logger.error(f"订阅充电事件时发生错误: {str(e)}")
+        return error_response("订阅充电事件失败", 500)
+    
+    heartbeat = Config.PUSH_HEARTBEAT_INTERVAL
+    
+    def remote_events():
+        # 工作进程经状态进程阻塞等待
+        while True:
+            events = push_service.next_events(sub_id, heartbeat)
+            if events is None:
+                return
+            yield events
+    
+    def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            # 同一进程内没有事件时产出 Wait，异步部署时由事件循环等待，不占用线程
+            source = remote_events() if state_client else push_service.stream_events(sub_id, heartbeat)
+            for events in source:
+                if isinstance(events, Wait):
+                    yield events
+                elif not events:
+                    yield b": keepalive\n\n"
+                else:
+                    yield b"".join(
+                        b"event: " + event["event"].encode() + b"\ndata: " + encode_json(event["data"]) + b"\n\n"
+                        for event in events
+                    )
+        finally:
+            # 客户端断开后写入失败，服务器关闭生成器时取消订阅
+            push_service.unsubscribe(sub_id)
+    
+    return Response(stream_with_waits(stream(), request.environ), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/admin/charging/sessions', methods=['GET'])
 def get_admin_charging_sessions():
     """获取所有充电会话（管理员）"""
     try:
         # 检查管理员权限
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
         # 验证管理员权限
-        current_user = user_service.get_user_info(username)
-        if not current_user['success'] or current_user['data']['usertype'] != 'admin':
+        if get_current_role(username) != 'admin':
             return error_response("权限不足", 403)
         
         # 获取所有活跃充电会话
@@ -1094,13 +1485,12 @@ def get_admin_charging_statistics():
     """获取充电统计信息（管理员）"""
     try:
         # 检查管理员权限
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
         # 验证管理员权限
-        current_user = user_service.get_user_info(username)
-        if not current_user['success'] or current_user['data']['usertype'] != 'admin':
+        if get_current_role(username) != 'admin':
             return error_response("权限不足", 403)
         
         # 获取充电统计信息
@@ -1112,18 +1502,134 @@ def get_admin_charging_statistics():
         logger.error(f"获取充电统计时发生错误: {str(e)}")
         return error_response("获取充电统计失败", 500)
 
+@app.route('/api/admin/bills', methods=['GET'])
+def get_admin_bills():
+    """按日期范围和用户查询详单账本（管理员）"""
+    try:
+        # 检查管理员权限
+        username = get_current_username()
+        if not username:
+            return error_response("未提供用户信息", 401)
+        
+        # 验证管理员权限
+        if get_current_role(username) != 'admin':
+            return error_response("权限不足", 403)
+        
+        # 获取查询参数
+        try:
+            start_date = request.args.get('startDate', '')
+            end_date = request.args.get('endDate', '')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+            limit = int(request.args.get('limit', 1000))
+        except ValueError:
+            return error_response("查询参数格式错误", 400)
+        
+        user_id = request.args.get('userId') or None
+        
+        bills = bill_ledger.query(start_date, end_date, user_id, limit)
+        
+        records = []
+        for bill in bills:
+            records.append({
+                "billId": bill["bill_id"],
+                "userId": bill["user_id"],
+                "pileId": bill["pile_id"],
+                "energyAmount": bill["energy_amount"],
+                "startTime": bill["start_time"].isoformat(),
+                "endTime": bill["end_time"].isoformat(),
+                "priceType": bill["price_type"],
+                "unitPrice": bill["unit_price"],
+                "chargeCost": bill["charge_cost"],
+                "serviceCost": bill["service_cost"],
+                "totalCost": bill["total_cost"],
+                "status": bill["status"],
+                "generateTime": bill["generate_time"].isoformat()
+            })
+        
+        return success_response("获取详单账本成功", {
+            "bills": records,
+            "totalCount": len(records),
+            "ledger": bill_ledger.get_statistics()
+        })
+    
+    except Exception as e:
+        logger.error(f"查询详单账本时发生错误: {str(e)}")
+        return error_response("查询详单账本失败", 500)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """运行指标（Prometheus 文本格式）"""
+    if not Config.METRICS_ENABLED:
+        return error_response("运行指标未启用", 404)
+    
+    try:
+        if state_client:
+            # 先上报本进程的请求指标；状态进程输出全部工作进程的请求指标之和以及其余指标
+            report_request_metrics()
+            body = station_metrics.render()
+        else:
+            body = metrics.render()
+        return Response(body, mimetype='text/plain; version=0.0.4')
+    
+    except Exception as e:
+        logger.error(f"输出运行指标时发生错误: {str(e)}")
+        return error_response("输出运行指标失败", 500)
+
+def _health_response(check):
+    """存活/就绪检查响应：正常时 200，否则 503，附带各后台循环状态"""
+    try:
+        health = loop_supervisor.get_health()
+    except Exception as e:
+        # 工作进程无法连接状态进程
+        logger.error(f"获取后台循环状态时发生错误: {str(e)}")
+        return error_response("无法获取后台循环状态", 503)
+    
+    if health[check]:
+        return success_response("正常", health)
+    return error_response("后台循环异常", 503, health)
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """存活检查：关键后台循环卡住时失败，应重启进程"""
+    return _health_response("live")
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """就绪检查：关键后台循环全部正常运行（未卡住、没有出错退避）时才接收流量"""
+    return _health_response("ready")
+
+@app.route('/api/admin/system/events', methods=['GET'])
+def get_event_statistics():
+    """获取事件总线和实时推送统计（管理员）"""
+    try:
+        username = get_current_username()
+        if not username:
+            return error_response("未提供用户信息", 401)
+        
+        if get_current_role(username) != 'admin':
+            return error_response("权限不足", 403)
+        
+        return success_response("获取事件统计成功", {
+            "eventBus": event_bus.get_statistics(),
+            "push": push_service.get_statistics()
+        })
+    
+    except Exception as e:
+        logger.error(f"获取事件统计时发生错误: {str(e)}")
+        return error_response("获取事件统计失败", 500)
+
 @app.route('/api/admin/charging/session/<string:session_id>/stop', methods=['POST'])
 def admin_stop_charging_session(session_id):
     """管理员强制停止充电会话"""
     try:
         # 检查管理员权限
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
         # 验证管理员权限
-        current_user = user_service.get_user_info(username)
-        if not current_user['success'] or current_user['data']['usertype'] != 'admin':
+        if get_current_role(username) != 'admin':
             return error_response("权限不足", 403)
         
         data = request.get_json() or {}
@@ -1161,7 +1667,7 @@ def get_charging_records():
     """获取用户充电记录"""
     try:
         # 从请求头获取用户名
-        username = request.headers.get('X-Username')
+        username = get_current_username()
         if not username:
             return error_response("未提供用户信息", 401)
         
@@ -9,7 +9,12 @@ from services.charging_pile_service import charging_pile_service
 from services.dispatch_service import dispatch_service
 from services.queue_service import queue_service
 from services.charging_process_service import charging_process_service
+from services.event_bus import event_bus, Event, EventType
+from database.queue_journal import queue_journal, OP_FAULT, OP_RECOVER
 from config import Config, DispatchMode
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
 
 class FaultStatus(Enum):
     """故障状态"""
@@ -37,16 +42,16 @@ class ChargingFaultService:
             self.pile_fault_status[pile_id] = FaultStatus.NORMAL
             self.fault_queues[pile_id] = []
         
-        print("充电桩故障处理服务已初始化")
+        logger.info("fault_service_initialized", "充电桩故障处理服务已初始化")
     
     def set_dispatch_mode(self, mode: DispatchMode):
         """设置调度模式"""
         self.dispatch_mode = mode
-        print(f"调度模式已设置为: {mode.value}")
+        logger.info("dispatch_mode_changed", "调度模式已设置为: %(mode)s", mode=mode.value)
     
     def handle_pile_fault(self, pile_id: str, fault_reason: str) -> Dict[str, Any]:
         """处理充电桩故障"""
-        with self._lock:
+        with event_bus.deferred(), self._lock:
             result = {
                 "success": False,
                 "message": "",
@@ -66,7 +71,8 @@ class ChargingFaultService:
                     result["message"] = f"充电桩 {pile_id} 已处于故障状态"
                     return result
                 
-                print(f"[故障处理] 充电桩 {pile_id} 发生故障: {fault_reason}")
+                logger.warning("pile_fault", "[故障处理] 充电桩 %(pile_id)s 发生故障: %(reason)s",
+                               pile_id=pile_id, reason=fault_reason)
                 
                 # 3. 处理正在充电的车辆
                 charging_car = None
@@ -84,13 +90,16 @@ class ChargingFaultService:
                                 pile_queue.current_session.session_id, 
                                 f"充电桩故障：{fault_reason}"
                             )
-                            print(f"[故障处理] 车辆 {charging_car.user_id} 停止计费，生成详单")
+                            logger.info("fault_billing_stopped", "[故障处理] 车辆 %(user_id)s 停止计费，生成详单",
+                                        pile_id=pile_id, user_id=charging_car.user_id)
                         except Exception as e:
-                            print(f"[故障处理] 停止计费失败: {e}")
+                            logger.error("fault_billing_failed", "[故障处理] 停止计费失败: %(error)s",
+                                         pile_id=pile_id, error=e)
                 
                 # 4. 设置充电桩故障状态
                 charging_pile_service.set_pile_fault(pile_id, fault_reason)
                 self.pile_fault_status[pile_id] = FaultStatus.FAULT
+                queue_journal.record(OP_FAULT, pile_id=pile_id, reason=fault_reason)
                 
                 # 5. 收集故障队列中的车辆
                 fault_queue_cars = []
@@ -116,7 +125,7 @@ class ChargingFaultService:
                 
                 # 7. 暂停等候区叫号服务
                 self.waiting_area_service_paused = True
-                print("[故障处理] 暂停等候区叫号服务")
+                logger.info("waiting_area_paused", "[故障处理] 暂停等候区叫号服务", pile_id=pile_id)
                 
                 # 8. 执行重新调度
                 self._reschedule_fault_queue(pile_id, fault_queue_cars)
@@ -134,7 +143,7 @@ class ChargingFaultService:
                 
                 # 10. 重新开启等候区叫号服务
                 self.waiting_area_service_paused = False
-                print("[故障处理] 重新开启等候区叫号服务")
+                logger.info("waiting_area_resumed", "[故障处理] 重新开启等候区叫号服务", pile_id=pile_id)
                 
                 result.update({
                     "success": True,
@@ -143,11 +152,16 @@ class ChargingFaultService:
                     "billing_records": [billing_record] if billing_record else []
                 })
                 
-                print(f"[故障处理] 充电桩 {pile_id} 故障处理完成，影响车辆: {len(fault_queue_cars)}")
+                logger.info("pile_fault_handled", "[故障处理] 充电桩 %(pile_id)s 故障处理完成，影响车辆: %(affected_cars)s",
+                            pile_id=pile_id, affected_cars=len(fault_queue_cars))
+                event_bus.publish(Event(EventType.PILE_FAULT, pile_id=pile_id, data={
+                    "reason": fault_reason,
+                    "affectedCars": result["affected_cars"]
+                }))
                 
             except Exception as e:
                 result["message"] = f"故障处理失败: {str(e)}"
-                print(f"[故障处理] 处理失败: {e}")
+                logger.error("pile_fault_failed", "[故障处理] 处理失败: %(error)s", pile_id=pile_id, error=e)
             
             return result
     
@@ -174,11 +188,13 @@ class ChargingFaultService:
                 self._time_order_dispatch(fault_cars, available_piles, pile_type)
                 
         except Exception as e:
-            print(f"[故障处理] 重新调度失败: {e}")
+            logger.error("fault_reschedule_failed", "[故障处理] 重新调度失败: %(error)s",
+                         pile_id=fault_pile_id, error=e)
     
     def _priority_dispatch(self, fault_cars: List[WaitingCar], available_piles: List[str]):
         """优先级调度：故障队列优先"""
-        print(f"[优先级调度] 开始调度 {len(fault_cars)} 辆故障车辆")
+        logger.info("fault_reschedule_started", "[优先级调度] 开始调度 %(cars)s 辆故障车辆",
+                    mode="priority", cars=len(fault_cars))
         
         # 为故障队列中的车辆优先分配空位
         for car in fault_cars:
@@ -189,18 +205,21 @@ class ChargingFaultService:
                 pile_queue = dispatch_service.pile_queues.get(pile_id)
                 if pile_queue and pile_queue.has_space():
                     if pile_queue.add_car(car):
-                        print(f"[优先级调度] 车辆 {car.user_id} 调度到充电桩 {pile_id}")
+                        logger.info("fault_car_dispatched", "[优先级调度] 车辆 %(user_id)s 调度到充电桩 %(pile_id)s",
+                                    mode="priority", user_id=car.user_id, pile_id=pile_id)
                         scheduled = True
                         break
             
             # 如果没有空位，重新加入等候区
             if not scheduled:
-                queue_service.queue_manager.waiting_area.add_car(car)
-                print(f"[优先级调度] 车辆 {car.user_id} 重新加入等候区")
+                queue_service.requeue_car(car)
+                logger.info("fault_car_requeued", "[优先级调度] 车辆 %(user_id)s 重新加入等候区",
+                            mode="priority", user_id=car.user_id)
     
     def _time_order_dispatch(self, fault_cars: List[WaitingCar], available_piles: List[str], pile_type: str):
         """时间顺序调度：合并重新排序"""
-        print(f"[时间顺序调度] 开始调度 {len(fault_cars)} 辆故障车辆")
+        logger.info("fault_reschedule_started", "[时间顺序调度] 开始调度 %(cars)s 辆故障车辆",
+                    mode="time_order", cars=len(fault_cars))
         
         # 1. 收集其他同类型充电桩中尚未充电的车辆
         other_waiting_cars = []
@@ -219,7 +238,8 @@ class ChargingFaultService:
         # 3. 按排队号码排序
         all_cars.sort(key=lambda car: self._get_queue_number_for_sorting(car.queue_number))
         
-        print(f"[时间顺序调度] 合并车辆总数: {len(all_cars)}")
+        logger.debug("fault_reschedule_merged", "[时间顺序调度] 合并车辆总数: %(cars)s",
+                     mode="time_order", cars=len(all_cars))
         
         # 4. 重新调度
         for car in all_cars:
@@ -230,14 +250,17 @@ class ChargingFaultService:
                 pile_queue = dispatch_service.pile_queues.get(pile_id)
                 if pile_queue and pile_queue.has_space():
                     if pile_queue.add_car(car):
-                        print(f"[时间顺序调度] 车辆 {car.user_id} ({car.queue_number}) 调度到充电桩 {pile_id}")
+                        logger.info("fault_car_dispatched", "[时间顺序调度] 车辆 %(user_id)s (%(queue_number)s) 调度到充电桩 %(pile_id)s",
+                                    mode="time_order", user_id=car.user_id, queue_number=car.queue_number,
+                                    pile_id=pile_id)
                         scheduled = True
                         break
             
             # 如果没有空位，重新加入等候区
             if not scheduled:
-                queue_service.queue_manager.waiting_area.add_car(car)
-                print(f"[时间顺序调度] 车辆 {car.user_id} ({car.queue_number}) 重新加入等候区")
+                queue_service.requeue_car(car)
+                logger.info("fault_car_requeued", "[时间顺序调度] 车辆 %(user_id)s (%(queue_number)s) 重新加入等候区",
+                            mode="time_order", user_id=car.user_id, queue_number=car.queue_number)
     
     def _get_queue_number_for_sorting(self, queue_number: str) -> int:
         """提取排队号码用于排序"""
@@ -250,7 +273,7 @@ class ChargingFaultService:
     
     def handle_pile_recovery(self, pile_id: str) -> Dict[str, Any]:
         """处理充电桩恢复"""
-        with self._lock:
+        with event_bus.deferred(), self._lock:
             result = {
                 "success": False,
                 "message": "",
@@ -269,11 +292,12 @@ class ChargingFaultService:
                     result["message"] = f"充电桩 {pile_id} 未处于故障状态"
                     return result
                 
-                print(f"[故障恢复] 充电桩 {pile_id} 开始恢复")
+                logger.info("pile_recovery_started", "[故障恢复] 充电桩 %(pile_id)s 开始恢复", pile_id=pile_id)
                 
                 # 3. 清除充电桩故障状态
                 charging_pile_service.clear_pile_fault(pile_id)
                 self.pile_fault_status[pile_id] = FaultStatus.RECOVERING
+                queue_journal.record(OP_RECOVER, pile_id=pile_id)
                 
                 # 4. 确定充电桩类型
                 pile_type = "fast" if pile_id in ["A", "B"] else "slow"
@@ -296,11 +320,12 @@ class ChargingFaultService:
                 
                 # 6. 如果有等待车辆，需要重新调度
                 if has_waiting_cars:
-                    print(f"[故障恢复] 发现其他充电桩有等待车辆，开始重新调度")
+                    logger.info("recovery_reschedule_started", "[故障恢复] 发现其他充电桩有等待车辆，开始重新调度",
+                                pile_id=pile_id, cars=len(other_waiting_cars))
                     
                     # 暂停等候区叫号服务
                     self.waiting_area_service_paused = True
-                    print("[故障恢复] 暂停等候区叫号服务")
+                    logger.info("waiting_area_paused", "[故障恢复] 暂停等候区叫号服务", pile_id=pile_id)
                     
                     # 按排队号码排序重新调度
                     other_waiting_cars.sort(key=lambda car: self._get_queue_number_for_sorting(car.queue_number))
@@ -316,18 +341,22 @@ class ChargingFaultService:
                             pile_queue = dispatch_service.pile_queues.get(available_pile_id)
                             if pile_queue and pile_queue.has_space():
                                 if pile_queue.add_car(car):
-                                    print(f"[故障恢复] 车辆 {car.user_id} ({car.queue_number}) 调度到充电桩 {available_pile_id}")
+                                    logger.info("recovery_car_dispatched",
+                                                "[故障恢复] 车辆 %(user_id)s (%(queue_number)s) 调度到充电桩 %(pile_id)s",
+                                                user_id=car.user_id, queue_number=car.queue_number,
+                                                pile_id=available_pile_id)
                                     scheduled = True
                                     break
                         
                         # 如果没有空位，重新加入等候区
                         if not scheduled:
-                            queue_service.queue_manager.waiting_area.add_car(car)
-                            print(f"[故障恢复] 车辆 {car.user_id} ({car.queue_number}) 重新加入等候区")
+                            queue_service.requeue_car(car)
+                            logger.info("recovery_car_requeued", "[故障恢复] 车辆 %(user_id)s (%(queue_number)s) 重新加入等候区",
+                                        user_id=car.user_id, queue_number=car.queue_number)
                     
                     # 重新开启等候区叫号服务
                     self.waiting_area_service_paused = False
-                    print("[故障恢复] 重新开启等候区叫号服务")
+                    logger.info("waiting_area_resumed", "[故障恢复] 重新开启等候区叫号服务", pile_id=pile_id)
                 
                 # 7. 标记恢复完成
                 self.pile_fault_status[pile_id] = FaultStatus.NORMAL
@@ -350,14 +379,44 @@ class ChargingFaultService:
                     "rescheduled_cars": [car.user_id for car in other_waiting_cars]
                 })
                 
-                print(f"[故障恢复] 充电桩 {pile_id} 恢复完成，重新调度车辆: {len(other_waiting_cars)}")
+                logger.info("pile_recovered", "[故障恢复] 充电桩 %(pile_id)s 恢复完成，重新调度车辆: %(rescheduled_cars)s",
+                            pile_id=pile_id, rescheduled_cars=len(other_waiting_cars))
+                event_bus.publish(Event(EventType.PILE_RECOVERED, pile_id=pile_id, data={
+                    "rescheduledCars": result["rescheduled_cars"]
+                }))
                 
             except Exception as e:
                 result["message"] = f"故障恢复失败: {str(e)}"
-                print(f"[故障恢复] 恢复失败: {e}")
+                logger.error("pile_recovery_failed", "[故障恢复] 恢复失败: %(error)s", pile_id=pile_id, error=e)
             
             return result
     
+    def get_fault_reasons(self) -> Dict[str, str]:
+        """获取当前处于故障状态的充电桩及故障原因"""
+        reasons = {}
+        for pile_id, status in self.pile_fault_status.items():
+            if status == FaultStatus.FAULT:
+                pile = charging_pile_service.get_pile(pile_id)
+                fault_info = pile.fault_info if pile else None
+                reasons[pile_id] = fault_info.get("reason", "") if fault_info else ""
+        return reasons
+    
+    def restore_fault_state(self, faults: Dict[str, str]):
+        """恢复充电桩故障状态（从队列日志恢复时使用）"""
+        with self._lock:
+            for pile_id, reason in faults.items():
+                if pile_id not in self.pile_fault_status:
+                    continue
+                charging_pile_service.set_pile_fault(pile_id, reason)
+                self.pile_fault_status[pile_id] = FaultStatus.FAULT
+                logger.info("pile_fault_restored", "[故障恢复] 充电桩 %(pile_id)s 恢复为故障状态: %(reason)s",
+                            pile_id=pile_id, reason=reason)
+
+    def restore_fault_histories(self, histories: List[Dict[str, Any]]):
+        """恢复故障历史记录（从状态快照恢复时使用）"""
+        with self._lock:
+            self.fault_histories = list(histories) + self.fault_histories
+
     def get_fault_status(self) -> Dict[str, Any]:
         """获取故障状态信息"""
         with self._lock:
@@ -1,8 +1,13 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set
 from datetime import datetime
+import itertools
 import threading
-import time
 from models.charging_pile_model import ChargingPile, PileType, PileStatus
+from utils.state_version import state_versions, PILES
+from utils.loop_supervisor import loop_supervisor
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
 
 class ChargingPileService:
     """充电桩管理服务"""
@@ -10,12 +15,20 @@ class ChargingPileService:
     def __init__(self):
         self.piles: Dict[str, ChargingPile] = {}
         self._lock = threading.Lock()
-        self._charging_threads: Dict[str, threading.Thread] = {}
+        self._charging_loops: Dict[str, str] = {}  # pile_id -> 充电循环名称
+        self._charging_seq = itertools.count(1)
         self._running = True
         
         # 初始化充电桩
         self._initialize_piles()
         
+        # 待同步的充电桩（调度队列或充电桩状态变化时标记，同步时只处理这些充电桩）
+        self._dirty_piles: Set[str] = set(self.piles)
+        self._dirty_lock = threading.Lock()
+        self.last_sync_touched = 0
+        self.total_sync_passes = 0
+        self.total_sync_touched = 0
+        
         # 启动充电进度更新线程
         self._start_charging_monitor()
     
@@ -41,10 +54,20 @@ class ChargingPileService:
             pile.start_pile()
             self.piles[config["id"]] = pile
     
+    def mark_pile_dirty(self, pile_id: str):
+        """标记充电桩待同步（可在持有其他服务锁时调用）"""
+        with self._dirty_lock:
+            self._dirty_piles.add(pile_id)
+        state_versions.bump(PILES)
+    
     def get_pile(self, pile_id: str) -> Optional[ChargingPile]:
         """获取指定充电桩"""
         return self.piles.get(pile_id)
     
+    def get_piles_etag(self) -> str:
+        """充电桩集合的 ETag（不构建充电桩信息）"""
+        return state_versions.etag(PILES)
+    
     def get_all_piles(self) -> List[Dict[str, Any]]:
         """获取所有充电桩信息"""
         with self._lock:
@@ -63,6 +86,7 @@ class ChargingPileService:
             return False
         
         with self._lock:
+            self.mark_pile_dirty(pile_id)
             return pile.start_pile()
     
     def stop_pile(self, pile_id: str, force: bool = False) -> bool:
@@ -81,6 +105,7 @@ class ChargingPileService:
             if pile.status == PileStatus.CHARGING and force:
                 self._stop_charging_thread(pile_id)
             
+            self.mark_pile_dirty(pile_id)
             return pile.stop_pile(force)
     
     def start_charging(self, pile_id: str, user_id: str, requested_amount: float) -> bool:
@@ -91,6 +116,7 @@ class ChargingPileService:
         
         with self._lock:
             success = pile.start_charging(user_id, requested_amount)
+            self.mark_pile_dirty(pile_id)
             if success:
                 # 启动充电进度更新线程
                 self._start_charging_thread(pile_id)
@@ -105,6 +131,7 @@ class ChargingPileService:
         with self._lock:
             # 停止充电线程
             self._stop_charging_thread(pile_id)
+            self.mark_pile_dirty(pile_id)
             return pile.stop_charging()
     
     def set_pile_fault(self, pile_id: str, reason: str) -> bool:
@@ -117,6 +144,7 @@ class ChargingPileService:
             # 如果正在充电，先停止充电线程
             if pile.status == PileStatus.CHARGING:
                 self._stop_charging_thread(pile_id)
+            self.mark_pile_dirty(pile_id)
             return pile.set_fault(reason)
     
     def clear_pile_fault(self, pile_id: str) -> bool:
@@ -126,6 +154,7 @@ class ChargingPileService:
             return False
         
         with self._lock:
+            self.mark_pile_dirty(pile_id)
             return pile.clear_fault()
     
     def get_available_piles(self, pile_type: PileType) -> List[ChargingPile]:
@@ -147,129 +176,175 @@ class ChargingPileService:
                 "activePiles": active_count,
                 "totalPiles": total_count,
                 "chargingPiles": charging_count,
-                "offlinePiles": total_count - active_count
+                "offlinePiles": total_count - active_count,
+                "syncPasses": self.total_sync_passes,
+                "lastSyncTouchedPiles": self.last_sync_touched,
+                "totalSyncTouchedPiles": self.total_sync_touched
             }
     
+    def restore_piles(self, pile_records: Dict[str, Dict[str, Any]], charging_pile_ids: List[str]):
+        """
+        从状态快照恢复充电桩统计数据和充电状态
+        
+        Args:
+            pile_records: 充电桩记录，key为充电桩ID
+            charging_pile_ids: 已恢复充电会话的充电桩ID
+        """
+        with self._lock:
+            for pile_id, record in pile_records.items():
+                pile = self.piles.get(pile_id)
+                if not pile:
+                    continue
+                
+                pile.restore_counters(record)
+                self.mark_pile_dirty(pile_id)
+                if pile_id in charging_pile_ids and pile.restore_charging(record):
+                    self._start_charging_thread(pile_id)
+    
     def _start_charging_monitor(self):
-        """启动充电监控线程"""
+        """启动充电监控循环（每秒检查一次，由后台循环监督器执行）"""
         def monitor():
-            while self._running:
-                time.sleep(1)  # 每秒检查一次
-                with self._lock:
-                    for pile in self.piles.values():
-                        if pile.status == PileStatus.CHARGING and pile.current_session:
-                            # 模拟充电进度更新
-                            session = pile.current_session
-                            current_amount = session["current_amount"]
-                            power = pile.power  # kW
-                            
-                            # 每秒增加的电量 = 功率 / 3600 (小时转秒)
-                            increment = power / 3600
-                            new_amount = min(
-                                current_amount + increment,
-                                session["requested_amount"]
-                            )
-                            
-                            pile.update_charging_progress(new_amount)
+            if not self._running:
+                return False
+            
+            with self._lock:
+                for pile in self.piles.values():
+                    if pile.status == PileStatus.CHARGING and pile.current_session:
+                        # 模拟充电进度更新
+                        session = pile.current_session
+                        current_amount = session["current_amount"]
+                        power = pile.power  # kW
+                        
+                        # 每秒增加的电量 = 功率 / 3600 (小时转秒)
+                        increment = power / 3600
+                        new_amount = min(
+                            current_amount + increment,
+                            session["requested_amount"]
+                        )
+                        
+                        pile.update_charging_progress(new_amount)
+                        
+                        # 充电完成时充电桩状态和累计数据发生变化，需要与调度系统重新同步
+                        if pile.status != PileStatus.CHARGING:
+                            self.mark_pile_dirty(pile.pile_id)
         
-        thread = threading.Thread(target=monitor, daemon=True)
-        thread.start()
+        loop_supervisor.start_loop("pile_monitor", monitor, period=1, delay=1)
     
     def _start_charging_thread(self, pile_id: str):
-        """启动特定充电桩的充电线程"""
-        if pile_id in self._charging_threads:
+        """启动特定充电桩的充电循环（调用方需持有充电桩服务的锁）"""
+        if pile_id in self._charging_loops:
             return
         
-        def charging_worker():
-            pile = self.get_pile(pile_id)
-            if not pile or not pile.current_session:
-                return
-            
-            session = pile.current_session
-            power = pile.power  # kW/h
-            target_amount = session["requested_amount"]
-            
-            while pile.status == PileStatus.CHARGING and pile.current_session:
-                current_amount = pile.current_session["current_amount"]
-                
-                if current_amount >= target_amount:
-                    break
+        pile = self.get_pile(pile_id)
+        if not pile or not pile.current_session:
+            return
+        
+        power = pile.power  # kW/h
+        target_amount = pile.current_session["requested_amount"]
+        # 每次充电使用新的循环名称，上一次充电的循环尚未退出时不会被复用
+        loop_name = f"pile_charging:{pile_id}:{next(self._charging_seq)}"
+        
+        def charging_step():
+            with self._lock:
+                # 充电循环已被停止或替换
+                if self._charging_loops.get(pile_id) != loop_name:
+                    return False
                 
-                # 每秒更新一次进度
-                time.sleep(1)
+                if pile.status != PileStatus.CHARGING or not pile.current_session \
+                        or pile.current_session["current_amount"] >= target_amount:
+                    del self._charging_loops[pile_id]
+                    return False
                 
                 # 计算新的充电量
                 increment = power / 3600  # 每秒增加的电量
-                new_amount = min(current_amount + increment, target_amount)
-                
-                with self._lock:
-                    pile.update_charging_progress(new_amount)
-            
-            # 清理线程记录
-            if pile_id in self._charging_threads:
-                del self._charging_threads[pile_id]
+                new_amount = min(pile.current_session["current_amount"] + increment, target_amount)
+                pile.update_charging_progress(new_amount)
+                if pile.status != PileStatus.CHARGING:
+                    self.mark_pile_dirty(pile_id)
         
-        thread = threading.Thread(target=charging_worker, daemon=True)
-        self._charging_threads[pile_id] = thread
-        thread.start()
+        # 每秒更新一次进度；单个充电桩的充电循环不作为关键循环
+        self._charging_loops[pile_id] = loop_name
+        loop_supervisor.start_loop(loop_name, charging_step, period=1,
+                                   kind="pile_charging", critical=False, delay=1)
     
     def _stop_charging_thread(self, pile_id: str):
-        """停止特定充电桩的充电线程"""
-        if pile_id in self._charging_threads:
-            # 线程会自动退出，只需清理记录
-            del self._charging_threads[pile_id]
+        """停止特定充电桩的充电循环（调用方需持有充电桩服务的锁，不等待循环线程退出）"""
+        loop_name = self._charging_loops.pop(pile_id, None)
+        if loop_name:
+            loop_supervisor.stop_loop(loop_name, wait=False)
     
-    def _sync_with_dispatch_system(self):
-        """与调度系统同步状态"""
+    def _sync_with_dispatch_system(self) -> int:
+        """
+        与调度系统同步状态（调用方需持有充电桩服务的锁）
+        
+        只处理自上次同步以来被标记为待同步的充电桩
+        
+        Returns:
+            本次同步处理的充电桩数量
+        """
+        with self._dirty_lock:
+            dirty_piles = self._dirty_piles
+            self._dirty_piles = set()
+        
         try:
             from services.dispatch_service import dispatch_service
             
-            # 遍历所有充电桩，同步调度系统状态
-            for pile_id, pile in self.piles.items():
-                if pile_id in dispatch_service.pile_queues:
-                    pile_queue = dispatch_service.pile_queues[pile_id]
+            for pile_id in dirty_piles:
+                pile = self.piles.get(pile_id)
+                pile_queue = dispatch_service.pile_queues.get(pile_id)
+                if not pile or not pile_queue:
+                    continue
+                
+                # 如果调度系统中有车辆正在充电
+                if pile_queue.charging_car and pile_queue.current_session:
+                    charging_car = pile_queue.charging_car
+                    current_session = pile_queue.current_session
                     
-                    # 如果调度系统中有车辆正在充电
-                    if pile_queue.charging_car and pile_queue.current_session:
-                        charging_car = pile_queue.charging_car
-                        current_session = pile_queue.current_session
-                        
-                        # 更新充电桩状态为充电中
-                        if pile.status != PileStatus.CHARGING:
-                            pile.status = PileStatus.CHARGING
-                            pile.current_user = charging_car.user_id
-                            pile.current_session = {
-                                "user_id": charging_car.user_id,
-                                "requested_amount": charging_car.requested_amount,
-                                "current_amount": current_session.current_amount or 0,
-                                "start_time": current_session.start_time or datetime.now(),
-                                "progress_percent": min(100, (current_session.current_amount or 0) / charging_car.requested_amount * 100)
-                            }
+                    # 更新充电桩状态为充电中
+                    if pile.status != PileStatus.CHARGING:
+                        pile.status = PileStatus.CHARGING
+                        pile.current_user = charging_car.user_id
+                        pile.current_session = {
+                            "user_id": charging_car.user_id,
+                            "requested_amount": charging_car.requested_amount,
+                            "current_amount": current_session.current_amount or 0,
+                            "start_time": current_session.start_time or datetime.now(),
+                            "progress_percent": min(100, (current_session.current_amount or 0) / charging_car.requested_amount * 100)
+                        }
+                
+                # 如果调度系统中没有车辆充电，但充电桩显示在充电
+                elif not pile_queue.charging_car and pile.status == PileStatus.CHARGING:
+                    # 重置充电桩状态
+                    if pile.is_active:
+                        pile.status = PileStatus.ACTIVE
+                    pile.current_user = None
+                    pile.current_session = None
                     
-                    # 如果调度系统中没有车辆充电，但充电桩显示在充电
-                    elif not pile_queue.charging_car and pile.status == PileStatus.CHARGING:
-                        # 重置充电桩状态
-                        if pile.is_active:
-                            pile.status = PileStatus.ACTIVE
-                        pile.current_user = None
-                        pile.current_session = None
-                        
         except Exception as e:
-            # 避免因为同步失败影响主要功能
-            print(f"同步调度系统状态时出错: {e}")
-            pass
+            # 避免因为同步失败影响主要功能，未处理的充电桩下次重新同步
+            logger.error("pile_sync_failed", "同步调度系统状态时出错: %(error)s", error=e)
+            with self._dirty_lock:
+                self._dirty_piles |= dirty_piles
+            return 0
+        
+        self.last_sync_touched = len(dirty_piles)
+        self.total_sync_passes += 1
+        self.total_sync_touched += len(dirty_piles)
+        return len(dirty_piles)
     
     def shutdown(self):
         """关闭服务"""
         self._running = False
+        loop_supervisor.stop_loop("pile_monitor")
         
         # 停止所有充电
         with self._lock:
-            for pile_id in list(self._charging_threads.keys()):
+            for pile_id in list(self._charging_loops.keys()):
                 self._stop_charging_thread(pile_id)
                 pile = self.get_pile(pile_id)
                 if pile:
                     pile.stop_charging()
+                    self.mark_pile_dirty(pile_id)
 
 # 全局单例实例
 charging_pile_service = ChargingPileService() 
\ No newline at end of file
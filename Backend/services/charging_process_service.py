@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, Callable, Tuple
 import threading
 import time
 from datetime import datetime, timedelta
@@ -6,6 +6,22 @@ from models.charging_session_model import ChargingSession, SessionStatus
 from models.charging_bill_model import ChargingBill
 from services.charging_pile_service import charging_pile_service
 from services.queue_service import queue_service
+from database.session_archive import session_archive
+from database.bill_ledger import bill_ledger
+from services.event_bus import event_bus, Event, EventType
+from utils.state_version import state_versions, history_key
+from utils.loop_supervisor import loop_supervisor
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
+
+# 充电会话事件 -> 事件总线事件类型
+SESSION_EVENT_TYPES = {
+    "session_started": EventType.SESSION_STARTED,
+    "progress_updated": EventType.SESSION_PROGRESS,
+    "session_completed": EventType.SESSION_COMPLETED,
+    "session_interrupted": EventType.SESSION_INTERRUPTED
+}
 
 class ChargingProcessService:
     """充电过程管理服务"""
@@ -16,13 +32,21 @@ class ChargingProcessService:
         self.user_sessions: Dict[str, str] = {}  # user_id -> session_id
         self.pile_sessions: Dict[str, str] = {}  # pile_id -> session_id
         
-        # 充电历史记录（内存存储）
+        # 充电历史记录（内存存储，定期移入列式归档）
         self.completed_sessions: List[ChargingSession] = []
         self.session_bills: Dict[str, ChargingBill] = {}  # session_id -> ChargingBill
         
+        # 历史记录归档
+        self.archive_interval = 0.0  # 归档间隔（秒），0 表示不定期归档
+        self.last_archive_time = 0.0
+        self.total_archived = 0
+        self._archive_lock = threading.Lock()
+        # 已从内存移除的归档记录汇总（记录数、总电量、总费用），与内存移除在同一次加锁中更新
+        self._archived_totals = (0, 0.0, 0.0)
+        self._archived_user_totals: Dict[str, Tuple[int, float, float]] = {}  # 按用户的归档记录汇总
+        
         # 进度跟踪
         self.progress_monitor_running = False
-        self.progress_thread = None
         
         # 事件监听器
         self.event_listeners: Dict[str, List[Callable]] = {
@@ -32,10 +56,46 @@ class ChargingProcessService:
             "session_interrupted": []
         }
         
+        # 已生成、尚未写入详单账本的详单（持有充电过程锁时加入，释放锁后写入）
+        self._pending_bills: List[ChargingBill] = []
+        self._ledger_lock = threading.Lock()  # 保持写入账本的顺序与详单生成顺序一致
+        
         # 线程锁
         self._lock = threading.Lock()
         
-        print("充电过程管理服务已初始化")
+        logger.info("charging_process_initialized", "充电过程管理服务已初始化")
+    
+    def add_event_listener(self, event_type: str, listener: Callable[[ChargingSession], None]):
+        """
+        注册充电会话事件监听器
+        
+        监听器在持有充电过程锁时调用，只能做记录和通知，不能阻塞或回调本服务；
+        耗时的消费方应订阅事件总线（services.event_bus），由总线线程异步投递。
+        """
+        if event_type not in self.event_listeners:
+            raise ValueError(f"未知的充电会话事件: {event_type}")
+        self.event_listeners[event_type].append(listener)
+    
+    def _emit_event(self, event_type: str, session: ChargingSession):
+        """发布充电会话事件到事件总线（调用方在 deferred() 作用域内持有锁，锁释放后才放入订阅方队列），并通知充电会话事件监听器"""
+        event_bus.publish(Event(
+            SESSION_EVENT_TYPES[event_type], session.user_id, session.pile_id,
+            data={
+                "sessionId": session.session_id,
+                "status": session.status.value,
+                "currentAmount": session.current_amount,
+                "requestedAmount": session.requested_amount,
+                "session": session
+            },
+            key=session.session_id
+        ))
+        
+        for listener in self.event_listeners[event_type]:
+            try:
+                listener(session)
+            except Exception as e:
+                logger.error("session_listener_failed", "充电会话事件监听器执行失败 %(event_type)s: %(error)s",
+                             event_type=event_type, session_id=session.session_id, error=e)
     
     def start_progress_monitor(self):
         """启动充电进度监控"""
@@ -43,26 +103,19 @@ class ChargingProcessService:
             return
         
         self.progress_monitor_running = True
-        self.progress_thread = threading.Thread(target=self._progress_monitor_loop, daemon=True)
-        self.progress_thread.start()
-        print("充电进度监控已启动")
+        # 每2秒更新一次进度，由后台循环监督器执行
+        loop_supervisor.start_loop("progress_monitor", self._progress_monitor_step, period=2)
+        logger.info("progress_monitor_started", "充电进度监控已启动")
     
     def stop_progress_monitor(self):
         """停止充电进度监控"""
         self.progress_monitor_running = False
-        if self.progress_thread:
-            self.progress_thread.join()
-        print("充电进度监控已停止")
+        loop_supervisor.stop_loop("progress_monitor")
+        logger.info("progress_monitor_stopped", "充电进度监控已停止")
     
-    def _progress_monitor_loop(self):
-        """充电进度监控循环"""
-        while self.progress_monitor_running:
-            try:
-                self._update_all_charging_progress()
-                time.sleep(2)  # 每2秒更新一次进度
-            except Exception as e:
-                print(f"充电进度监控发生错误: {e}")
-                time.sleep(1)
+    def _progress_monitor_step(self):
+        """充电进度监控单次迭代"""
+        self._update_all_charging_progress()
     
     def create_charging_session(self, user_id: str, pile_id: str, 
                                requested_amount: float) -> Optional[ChargingSession]:
@@ -71,18 +124,21 @@ class ChargingProcessService:
             try:
                 # 检查用户是否已有活跃会话
                 if user_id in self.user_sessions:
-                    print(f"用户 {user_id} 已有活跃充电会话")
+                    logger.warning("session_rejected", "用户 %(user_id)s 已有活跃充电会话",
+                                   user_id=user_id, pile_id=pile_id, reason="user_busy")
                     return None
                 
                 # 检查充电桩是否可用
                 if pile_id in self.pile_sessions:
-                    print(f"充电桩 {pile_id} 已被占用")
+                    logger.warning("session_rejected", "充电桩 %(pile_id)s 已被占用",
+                                   user_id=user_id, pile_id=pile_id, reason="pile_busy")
                     return None
                 
                 # 获取充电桩信息
                 pile = charging_pile_service.get_pile(pile_id)
                 if not pile:
-                    print(f"充电桩 {pile_id} 不存在")
+                    logger.warning("session_rejected", "充电桩 %(pile_id)s 不存在",
+                                   user_id=user_id, pile_id=pile_id, reason="pile_not_found")
                     return None
                 
                 # 创建充电会话
@@ -96,16 +152,19 @@ class ChargingProcessService:
                 self.user_sessions[user_id] = session_id
                 self.pile_sessions[pile_id] = session_id
                 
-                print(f"充电会话已创建: {session_id}")
+                logger.debug("session_created", "充电会话已创建: %(session_id)s",
+                             session_id=session_id, user_id=user_id, pile_id=pile_id,
+                             requested_amount=requested_amount)
                 return session
                 
             except Exception as e:
-                print(f"创建充电会话失败: {e}")
+                logger.error("session_create_failed", "创建充电会话失败: %(error)s",
+                             user_id=user_id, pile_id=pile_id, error=e)
                 return None
     
     def start_charging_session(self, session_id: str) -> bool:
         """启动充电会话"""
-        with self._lock:
+        with event_bus.deferred(), self._lock:
             session = self.active_sessions.get(session_id)
             if not session:
                 return False
@@ -119,19 +178,29 @@ class ChargingProcessService:
                 if success:
                     # 启动充电会话
                     session.start_charging()
-                    print(f"充电会话已启动: {session_id}")
+                    self._emit_event("session_started", session)
+                    logger.info("session_started", "充电会话已启动: %(session_id)s",
+                                session_id=session_id, user_id=session.user_id, pile_id=session.pile_id)
                     return True
                 else:
-                    print(f"启动充电桩失败: {session.pile_id}")
+                    logger.error("pile_start_failed", "启动充电桩失败: %(pile_id)s",
+                                 session_id=session_id, pile_id=session.pile_id)
                     return False
                     
             except Exception as e:
-                print(f"启动充电会话失败: {e}")
+                logger.error("session_start_failed", "启动充电会话失败: %(error)s",
+                             session_id=session_id, error=e)
                 return False
     
     def stop_charging_session(self, session_id: str, reason: str = "用户主动停止") -> bool:
         """停止充电会话"""
-        with self._lock:
+        try:
+            return self._stop_charging_session(session_id, reason)
+        finally:
+            self._write_pending_bills()
+    
+    def _stop_charging_session(self, session_id: str, reason: str) -> bool:
+        with event_bus.deferred(), self._lock:
             session = self.active_sessions.get(session_id)
             if not session:
                 return False
@@ -149,24 +218,33 @@ class ChargingProcessService:
                 # 生成充电详单
                 bill = session.create_bill()
                 if bill:
-                    self.session_bills[session_id] = bill
+                    self._record_bill(session_id, bill)
                 
                 # 移除活跃会话
                 self._remove_active_session(session)
                 
                 # 添加到历史记录
                 self.completed_sessions.append(session)
+                state_versions.bump(history_key(session.user_id))
+                
+                if session.status == SessionStatus.COMPLETED:
+                    self._emit_event("session_completed", session)
+                else:
+                    self._emit_event("session_interrupted", session)
                 
-                print(f"充电会话已停止: {session_id}, 原因: {reason}")
+                logger.info("session_stopped", "充电会话已停止: %(session_id)s, 原因: %(reason)s",
+                            session_id=session_id, user_id=session.user_id, pile_id=session.pile_id,
+                            reason=reason, status=session.status.value, amount=session.current_amount)
                 return True
                 
             except Exception as e:
-                print(f"停止充电会话失败: {e}")
+                logger.error("session_stop_failed", "停止充电会话失败: %(error)s",
+                             session_id=session_id, error=e)
                 return False
     
     def _update_all_charging_progress(self):
         """更新所有充电会话的进度"""
-        with self._lock:
+        with event_bus.deferred(), self._lock:
             completed_sessions = []
             
             for session_id, session in self.active_sessions.items():
@@ -179,17 +257,21 @@ class ChargingProcessService:
                             
                             # 更新会话进度
                             session.update_progress(current_amount)
+                            self._emit_event("progress_updated", session)
                             
                             # 检查是否充电完成
                             if session.status == SessionStatus.COMPLETED:
                                 completed_sessions.append(session_id)
                                 
                     except Exception as e:
-                        print(f"更新充电进度失败 {session_id}: {e}")
+                        logger.error("progress_update_failed", "更新充电进度失败 %(session_id)s: %(error)s",
+                                     session_id=session_id, error=e)
             
             # 处理完成的会话
             for session_id in completed_sessions:
                 self._complete_charging_session(session_id)
+        
+        self._write_pending_bills()
     
     def _complete_charging_session(self, session_id: str):
         """完成充电会话处理"""
@@ -204,18 +286,46 @@ class ChargingProcessService:
             # 生成充电详单
             bill = session.create_bill()
             if bill:
-                self.session_bills[session_id] = bill
+                self._record_bill(session_id, bill)
             
             # 移除活跃会话
             self._remove_active_session(session)
             
             # 添加到历史记录
             self.completed_sessions.append(session)
+            state_versions.bump(history_key(session.user_id))
+            
+            self._emit_event("session_completed", session)
             
-            print(f"充电会话已完成: {session_id}")
+            logger.info("session_completed", "充电会话已完成: %(session_id)s",
+                        session_id=session_id, user_id=session.user_id, pile_id=session.pile_id,
+                        amount=session.current_amount)
             
         except Exception as e:
-            print(f"完成充电会话处理失败: {e}")
+            logger.error("session_complete_failed", "完成充电会话处理失败: %(error)s",
+                         session_id=session_id, error=e)
+    
+    def _record_bill(self, session_id: str, bill: ChargingBill):
+        """保存充电详单，释放充电过程锁后由 _write_pending_bills 写入详单账本（调用方持有锁）"""
+        self.session_bills[session_id] = bill
+        if bill_ledger.enabled:
+            self._pending_bills.append(bill)
+    
+    def _write_pending_bills(self):
+        """将已生成的详单写入详单账本（不持有充电过程锁调用）"""
+        if not self._pending_bills:
+            return
+        
+        with self._ledger_lock:
+            with self._lock:
+                bills, self._pending_bills = self._pending_bills, []
+            
+            for bill in bills:
+                try:
+                    bill_ledger.append(bill)
+                except Exception as e:
+                    logger.error("bill_ledger_append_failed", "写入详单账本失败 %(bill_id)s: %(error)s",
+                                 bill_id=bill.bill_id, error=e)
     
     def _remove_active_session(self, session: ChargingSession):
         """移除活跃会话"""
@@ -231,7 +341,114 @@ class ChargingProcessService:
                 del self.pile_sessions[session.pile_id]
                 
         except Exception as e:
-            print(f"移除活跃会话失败: {e}")
+            logger.error("session_remove_failed", "移除活跃会话失败: %(error)s",
+                         session_id=session.session_id, error=e)
+    
+    def restore_sessions(self, session_records: List[Dict[str, Any]]) -> int:
+        """从状态快照恢复活跃充电会话，返回恢复的会话数"""
+        with self._lock:
+            restored = 0
+            for record in session_records:
+                session = ChargingSession.from_record(record)
+                if session.user_id in self.user_sessions or session.pile_id in self.pile_sessions:
+                    continue
+                
+                self.active_sessions[session.session_id] = session
+                self.user_sessions[session.user_id] = session.session_id
+                self.pile_sessions[session.pile_id] = session.session_id
+                restored += 1
+            
+            logger.info("sessions_restored", "已恢复 %(count)s 个活跃充电会话", count=restored)
+            return restored
+    
+    def enable_archive(self, directory: str, interval: float):
+        """
+        打开历史记录归档并启用定期归档
+        
+        归档需要写盘并 fsync 全部列文件，由单独的受监督循环执行，不占用充电进度监控的周期。
+        """
+        if not session_archive.enabled:
+            session_archive.open(directory)
+        self._archived_totals = session_archive.get_totals()
+        self._archived_user_totals = session_archive.get_user_totals()
+        self.archive_interval = interval
+        self.last_archive_time = time.time()
+        if interval:
+            loop_supervisor.start_loop("session_archive", self.archive_completed_sessions,
+                                       period=interval, critical=False, delay=interval)
+    
+    def stop_archive(self):
+        """停止定期归档（正在进行的归档会执行完）"""
+        self.archive_interval = 0.0
+        loop_supervisor.stop_loop("session_archive")
+    
+    def archive_completed_sessions(self) -> int:
+        """
+        将内存中已完成的会话和详单移入列式归档
+        
+        写盘在充电过程锁之外进行，写入完成后再从内存移除，
+        期间查询仍能在内存中找到这些记录。
+        
+        Returns:
+            归档的会话数
+        """
+        if not session_archive.enabled:
+            return 0
+        
+        with self._archive_lock:
+            self.last_archive_time = time.time()
+            
+            # 新完成的会话只会追加到列表末尾，前 count 条在归档期间保持不变
+            with self._lock:
+                sessions = self.completed_sessions[:]
+                bills = {session.session_id: self.session_bills.get(session.session_id) for session in sessions}
+            
+            if not sessions:
+                return 0
+            
+            records = []
+            for session in sessions:
+                record = session.to_record()
+                bill = bills[session.session_id]
+                record["bill"] = bill.to_record() if bill else None
+                records.append(record)
+            
+            try:
+                session_archive.append(records)
+            except Exception as e:
+                logger.error("session_archive_failed", "归档充电历史记录失败: %(error)s", error=e)
+                return 0
+            
+            # 只有本方法追加归档，持有归档锁时汇总值不变，在充电过程锁外读取
+            archived_totals = session_archive.get_totals()
+            archived_user_totals = session_archive.get_user_totals()
+            with self._lock:
+                del self.completed_sessions[:len(sessions)]
+                for session_id in bills:
+                    self.session_bills.pop(session_id, None)
+                self._archived_totals = archived_totals
+                self._archived_user_totals = archived_user_totals
+            
+            self.total_archived += len(sessions)
+            logger.info("sessions_archived", "已归档 %(count)s 条充电历史记录", count=len(sessions))
+            return len(sessions)
+    
+    def _load_archived_session(self, record: Dict[str, Any]) -> ChargingSession:
+        """从归档记录恢复充电会话"""
+        return ChargingSession.from_record(record)
+    
+    def _load_archived_bill(self, record: Dict[str, Any]) -> Optional[ChargingBill]:
+        """从归档记录恢复充电详单（用户、充电桩和起止时间与会话相同）"""
+        bill_record = record.get("bill")
+        if not bill_record:
+            return None
+        return ChargingBill.from_record({
+            **bill_record,
+            "user_id": record["user_id"],
+            "pile_id": record["pile_id"],
+            "start_time": record["start_time"],
+            "end_time": record["end_time"]
+        })
     
     def get_user_active_session(self, user_id: str) -> Optional[ChargingSession]:
         """获取用户活跃充电会话"""
@@ -247,28 +464,87 @@ class ChargingProcessService:
         if session:
             return session
         
-        # 再在历史记录中查找
-        for session in self.completed_sessions:
-            if session.session_id == session_id:
-                return session
+        # 再在历史记录中查找（归档线程会从列表头部移除记录，持锁遍历）
+        with self._lock:
+            for session in self.completed_sessions:
+                if session.session_id == session_id:
+                    return session
+        
+        # 最后在归档中查找
+        record = session_archive.find_session(session_id)
+        if record:
+            return self._load_archived_session(record)
         
         return None
     
     def get_user_session_history(self, user_id: str, limit: int = 10) -> List[ChargingSession]:
         """获取用户充电会话历史"""
-        user_sessions = [
-            session for session in self.completed_sessions 
-            if session.user_id == user_id
-        ]
+        return [session for session, _ in self.get_user_charging_history(user_id, limit)]
+    
+    def get_user_charging_history(self, user_id: str,
+                                  limit: int = 10) -> List[Tuple[ChargingSession, Optional[ChargingBill]]]:
+        """
+        获取用户充电会话历史及对应详单（按创建时间倒序）
+        
+        归档记录的详单与会话取自同一行，不再按会话编号逐条查找。
+        """
+        # 归档线程会从列表头部移除记录，持锁复制
+        with self._lock:
+            history = [
+                (session, self.session_bills.get(session.session_id))
+                for session in self.completed_sessions
+                if session.user_id == user_id
+            ]
+        
+        # 合并归档中的记录（归档写入完成到从内存移除之间可能重复）
+        hot_ids = {session.session_id for session, _ in history}
+        history.extend(
+            (self._load_archived_session(record), self._load_archived_bill(record))
+            for record in session_archive.user_sessions(user_id, limit)
+            if record["session_id"] not in hot_ids
+        )
         
         # 按时间倒序排列
-        user_sessions.sort(key=lambda x: x.create_time, reverse=True)
+        history.sort(key=lambda item: item[0].create_time, reverse=True)
         
-        return user_sessions[:limit]
+        return history[:limit]
+    
+    def get_user_charging_totals(self, user_id: str) -> Tuple[int, float, float]:
+        """
+        用户已结束充电会话的汇总（会话数、详单总电量、详单总费用）
+        
+        与 get_charging_statistics 相同，由内存中的详单和归档汇总相加，不读取归档记录。
+        """
+        with self._lock:
+            bills = [
+                self.session_bills.get(session.session_id)
+                for session in self.completed_sessions
+                if session.user_id == user_id
+            ]
+            count, energy, cost = self._archived_user_totals.get(user_id, (0, 0.0, 0.0))
+        
+        for bill in bills:
+            if bill:
+                energy += bill.energy_amount
+                cost += bill.total_cost
+        
+        return count + len(bills), energy, cost
     
     def get_session_bill(self, session_id: str) -> Optional[ChargingBill]:
         """获取充电会话详单"""
-        return self.session_bills.get(session_id)
+        bill = self.session_bills.get(session_id)
+        if bill:
+            return bill
+        
+        record = session_archive.find_session(session_id)
+        if record:
+            return self._load_archived_bill(record)
+        
+        return None
+    
+    def get_active_session_count(self) -> int:
+        """获取活跃充电会话数量"""
+        return len(self.active_sessions)
     
     def get_all_active_sessions(self) -> List[ChargingSession]:
         """获取所有活跃充电会话"""
@@ -276,25 +552,30 @@ class ChargingProcessService:
     
     def get_charging_statistics(self) -> Dict[str, Any]:
         """获取充电统计信息"""
+        # 归档汇总与内存记录的移除在同一次加锁中更新，不会重复或遗漏正在归档的记录
         with self._lock:
             active_count = len(self.active_sessions)
             completed_count = len(self.completed_sessions)
-            
-            # 计算总充电量和总费用
-            total_energy = 0.0
-            total_cost = 0.0
-            
-            for bill in self.session_bills.values():
-                total_energy += bill.energy_amount
-                total_cost += bill.total_cost
-            
-            return {
-                "activeSessions": active_count,
-                "completedSessions": completed_count,
-                "totalSessions": active_count + completed_count,
-                "totalEnergy": round(total_energy, 2),
-                "totalCost": round(total_cost, 2)
-            }
+            bills = list(self.session_bills.values())
+            archived_count, archived_energy, archived_cost = self._archived_totals
+        
+        # 计算总充电量和总费用
+        total_energy = archived_energy
+        total_cost = archived_cost
+        
+        for bill in bills:
+            total_energy += bill.energy_amount
+            total_cost += bill.total_cost
+        
+        completed_count += archived_count
+        
+        return {
+            "activeSessions": active_count,
+            "completedSessions": completed_count,
+            "totalSessions": active_count + completed_count,
+            "totalEnergy": round(total_energy, 2),
+            "totalCost": round(total_cost, 2)
+        }
     
     def get_real_time_status(self) -> Dict[str, Any]:
         """获取实时充电状态"""
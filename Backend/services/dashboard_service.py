@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional, Any
+import zlib
+from models.charging_session_model import ChargingSession
+from services.queue_service import queue_service
+from services.charging_process_service import charging_process_service
+from utils.state_version import state_versions, history_key, user_key, PILES, QUEUE
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
+
+class DashboardService:
+    """用户看板服务：一次请求返回充电状态、排队状态、前车数量、充电区状态和用户统计"""
+    
+    # 看板分区（版本号按此顺序拼接）
+    SECTIONS = ("charging", "queue", "aheadCount", "chargeArea", "statistics")
+    
+    def get_charging_status(self, user_id: str) -> Dict[str, Any]:
+        """获取用户当前充电状态"""
+        session = charging_process_service.get_user_active_session(user_id)
+        queue_status = queue_service.get_queue_status(user_id)
+        return self._build_charging_status(session, queue_status)
+    
+    def get_user_statistics(self, user_id: str) -> Dict[str, Any]:
+        """获取用户充电统计（全部已结束的充电会话，电量和费用取自详单，与充电过程服务的归档汇总一致）"""
+        charge_count, total_energy, total_cost = charging_process_service.get_user_charging_totals(user_id)
+        
+        return {
+            "chargeCount": charge_count,
+            "totalEnergy": round(total_energy, 1),
+            "totalCost": round(total_cost, 2)
+        }
+    
+    def get_user_dashboard(self, user_id: str, since: Optional[str] = None) -> Dict[str, Any]:
+        """
+        获取用户看板
+        
+        排队、前车数量、充电状态和充电区状态在一次持有排队服务锁的过程中读取，
+        各分区来自同一时刻的状态。
+        
+        Args:
+            user_id: 用户ID
+            since: 客户端上次收到的看板版本号，版本未变化的分区不再返回
+        
+        Returns:
+            {"version", 各分区数据, "unchanged": 省略的分区}
+        """
+        previous = self._parse_version(since)
+        versions: Dict[str, str] = {}
+        sections: Dict[str, Any] = {}
+        
+        with queue_service._lock:
+            queue_status = queue_service.get_queue_status_unlocked(user_id)
+            queue_etag = queue_service.get_queue_status_etag_unlocked(user_id) or "none"
+            versions["queue"] = self._short(queue_etag)
+            sections["queue"] = queue_status
+            
+            # 前车数量与排队状态中的 aheadCount 相同，不必再次扫描队列
+            sections["aheadCount"] = queue_status["aheadCount"] if queue_status else 0
+            versions["aheadCount"] = self._short(state_versions.etag(user_key(user_id), QUEUE))
+            
+            # 充电状态由排队状态和活跃会话的进度决定，未变化时不构建
+            session = charging_process_service.get_user_active_session(user_id)
+            versions["charging"] = self._short(f"{queue_etag}|{self._session_tag(session)}")
+            if previous.get("charging") != versions["charging"]:
+                sections["charging"] = self._build_charging_status(session, queue_status)
+            
+            # 充电区状态需要读取全部充电桩，未变化时不构建
+            versions["chargeArea"] = self._short(state_versions.etag(PILES, QUEUE))
+            if previous.get("chargeArea") != versions["chargeArea"]:
+                sections["chargeArea"] = queue_service.get_charge_area_status_unlocked()
+        
+        # 充电统计需要读取充电历史，只在有会话结束后重新计算（不占用排队服务锁）
+        versions["statistics"] = self._short(state_versions.etag(history_key(user_id)))
+        if previous.get("statistics") != versions["statistics"]:
+            try:
+                sections["statistics"] = self.get_user_statistics(user_id)
+            except Exception as e:
+                logger.error("user_statistics_failed", "获取用户统计失败，返回默认统计: %(error)s",
+                             user_id=user_id, error=e)
+                sections["statistics"] = {"chargeCount": 0, "totalEnergy": 0, "totalCost": 0.00}
+        
+        dashboard: Dict[str, Any] = {"version": ".".join(versions[name] for name in self.SECTIONS)}
+        unchanged: List[str] = []
+        for name in self.SECTIONS:
+            if previous.get(name) == versions[name]:
+                unchanged.append(name)
+            else:
+                dashboard[name] = sections[name]
+        dashboard["unchanged"] = unchanged
+        
+        return dashboard
+    
+    def _build_charging_status(self, session: Optional[ChargingSession],
+                               queue_status: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """由活跃充电会话和排队状态构建充电状态"""
+        if session:
+            # 用户有活跃的充电会话，格式化为前端期望的格式
+            pile_name = f"快充桩 {session.pile_id}" if session.pile_id in ["A", "B"] else f"慢充桩 {session.pile_id}"
+            
+            # 计算充电进度
+            progress_percent = 0
+            if session.requested_amount > 0:
+                current_amount = session.current_amount or 0
+                progress_percent = min((current_amount / session.requested_amount) * 100, 100)
+            
+            charging_status = {
+                "hasActiveCharging": True,
+                "activePile": pile_name,
+                "chargedAmount": round(session.current_amount or 0, 1),
+                "progressPercent": round(progress_percent, 1),
+                "startTime": session.start_time.isoformat() if session.start_time else "",
+                "estimatedEndTime": session.estimated_end_time.isoformat() if session.estimated_end_time else "",
+                "status": "charging"
+            }
+            
+            # 如果还需要队列信息（用于取消等功能），也包含进去
+            if queue_status:
+                charging_status["queue"] = queue_status
+            
+            return charging_status
+        
+        # 如果没有活跃充电会话，检查是否有排队请求
+        if queue_status:
+            if queue_status.get('status') == 'CHARGING':
+                # 用户正在充电（在调度系统中）
+                return {
+                    "hasActiveCharging": True,
+                    "status": "charging",
+                    "queue": queue_status
+                }
+            elif queue_status.get('status') == 'WAITING':
+                # 用户在排队等待
+                return {
+                    "hasActiveCharging": False,
+                    "status": "waiting",
+                    "queue": queue_status
+                }
+        
+        # 用户没有任何充电相关活动
+        return {
+            "hasActiveCharging": False,
+            "status": "idle"
+        }
+    
+    @staticmethod
+    def _session_tag(session: Optional[ChargingSession]) -> str:
+        """活跃会话的版本：充电状态中随会话变化的字段只由这些值决定"""
+        if not session:
+            return "none"
+        end_time = session.estimated_end_time.isoformat() if session.estimated_end_time else ""
+        return f"{session.session_id}:{session.status.value}:{session.current_amount!r}:{end_time}"
+    
+    def _parse_version(self, since: Optional[str]) -> Dict[str, str]:
+        """解析看板版本号为各分区版本，格式不正确时视为没有版本"""
+        if not since:
+            return {}
+        parts = since.split(".")
+        if len(parts) != len(self.SECTIONS):
+            return {}
+        return dict(zip(self.SECTIONS, parts))
+    
+    @staticmethod
+    def _short(tag: str) -> str:
+        """将分区的 ETag 压缩为8位十六进制版本号"""
+        return format(zlib.crc32(tag.encode("utf-8")), "08x")
+
+# 全局单例实例
+dashboard_service = DashboardService()
@@ -2,49 +2,58 @@ from typing import Dict, List, Optional, Tuple, Any
 import threading
 import time
 from datetime import datetime, timedelta
-from models.queue_system_model import QueueManager, WaitingCar, QueuePosition, PileQueue
+from models.queue_system_model import WaitingCar, QueuePosition, PileQueue
 from models.charging_session_model import ChargingSession
 from services.charging_pile_service import charging_pile_service
 from models.charging_pile_model import PileStatus
+from database.queue_journal import (
+    queue_journal, OP_DISPATCH, OP_START, OP_COMPLETE, SLOT_WAITING
+)
+from services.event_bus import event_bus, Event, EventType
+from utils.state_version import state_versions, pile_queue_key, QUEUE, WAITING_AREA
+from utils.metrics import metrics
+from utils.loop_supervisor import loop_supervisor
+from utils.structured_log import get_event_logger
 
-class PileDispatchQueue:
-    """充电桩调度队列（每桩2个车位）"""
+logger = get_event_logger(__name__)
+
+DISPATCH_DECISIONS = metrics.counter(
+    "echarge_dispatch_decisions_total", "调度决策数", ("mode", "result")
+)
+
+def _on_pile_queue_change(pile_id: str):
+    """车位变化时标记充电桩待同步，并推进排队状态版本"""
+    charging_pile_service.mark_pile_dirty(pile_id)
+    state_versions.bump(QUEUE, pile_queue_key(pile_id))
+
+class PileDispatchQueue(PileQueue):
+    """充电桩调度队列（每桩2个车位），在共享的充电桩队列上管理充电会话"""
     
     def __init__(self, pile_id: str, pile_type: str, power: float):
-        self.pile_id = pile_id
+        # 车位变化时标记充电桩待同步
+        super().__init__(pile_id, max_size=2, on_change=_on_pile_queue_change)
         self.pile_type = pile_type  # "fast" or "slow"
         self.power = power  # 充电功率 kW
-        self.max_capacity = 2  # 每桩最大车位数
-        
-        # 队列：第一个车位充电中，第二个车位等待
-        self.charging_car: Optional[WaitingCar] = None  # 正在充电的车辆
-        self.waiting_car: Optional[WaitingCar] = None   # 等待充电的车辆
         
         # 充电会话
-        self.current_session: Optional[ChargingSession] = None
+        self._current_session: Optional[ChargingSession] = None
         
         # 统计信息
         self.total_dispatched = 0
         self.total_charge_time = 0.0
-        
-        self._lock = threading.Lock()
     
-    def is_full(self) -> bool:
-        """队列是否已满"""
-        return self.charging_car is not None and self.waiting_car is not None
+    @property
+    def current_session(self) -> Optional[ChargingSession]:
+        return self._current_session
     
-    def has_space(self) -> bool:
-        """是否有空位"""
-        return not self.is_full()
-    
-    def get_available_capacity(self) -> int:
-        """获取可用车位数"""
-        occupied = (1 if self.charging_car else 0) + (1 if self.waiting_car else 0)
-        return self.max_capacity - occupied
+    @current_session.setter
+    def current_session(self, session: Optional[ChargingSession]):
+        self._current_session = session
+        self._notify_change()
     
     def add_car(self, car: WaitingCar) -> bool:
         """添加车辆到队列"""
-        with self._lock:
+        with event_bus.deferred(), self._lock:
             if self.is_full():
                 return False
             
@@ -60,6 +69,8 @@ class PileDispatchQueue:
                     car.queue_position = QueuePosition.CHARGING
                     car.assigned_pile_id = self.pile_id
                     self._start_charging(car)
+                    queue_journal.record_car(OP_START, car, pile_id=self.pile_id)
+                    self._publish_dispatched(car, "charging")
                     return True
                 else:
                     # 充电桩不可用，不分配车辆
@@ -69,12 +80,35 @@ class PileDispatchQueue:
                 self.waiting_car = car
                 car.queue_position = QueuePosition.PILE_QUEUE
                 car.assigned_pile_id = self.pile_id
+                queue_journal.record_car(OP_DISPATCH, car, pile_id=self.pile_id, slot=SLOT_WAITING)
+                self._publish_dispatched(car, "waiting")
                 return True
             
             return False
     
+    def _publish_dispatched(self, car: WaitingCar, slot: str):
+        """发布车辆调度事件"""
+        event_bus.publish(Event(EventType.CAR_DISPATCHED, car.user_id, self.pile_id, data={
+            "queueNumber": car.queue_number,
+            "chargeMode": car.charge_mode,
+            "requestedAmount": car.requested_amount,
+            "slot": slot
+        }))
+    
     def complete_charging(self) -> Optional[WaitingCar]:
-        """完成当前充电，返回完成的车辆"""
+        """完成当前充电，返回完成的车辆（调用方不能持有排队服务或充电桩队列的锁）"""
+        with event_bus.deferred():
+            completed_car = self._release_charging_car()
+            
+            # 释放充电桩队列的锁后再按锁顺序获取排队服务的锁，释放用户的活跃请求
+            if completed_car:
+                from services.queue_service import queue_service
+                queue_service.finish_request(completed_car.user_id)
+        
+        return completed_car
+    
+    def _release_charging_car(self) -> Optional[WaitingCar]:
+        """结束当前充电，等待车辆开始充电，返回完成的车辆"""
         with self._lock:
             if self.charging_car is None:
                 return None
@@ -89,12 +123,14 @@ class PileDispatchQueue:
                         self.current_session.session_id, "充电完成"
                     )
                 except Exception as e:
-                    print(f"停止充电会话失败: {e}")
+                    logger.error("session_stop_failed", "停止充电会话失败: %(error)s",
+                                 pile_id=self.pile_id, error=e)
                 
                 self.current_session = None
             
             # 统计信息
             self.total_dispatched += 1
+            queue_journal.record(OP_COMPLETE, user_id=completed_car.user_id, pile_id=self.pile_id)
             
             # 如果有等待车辆，开始充电
             if self.waiting_car:
@@ -102,11 +138,35 @@ class PileDispatchQueue:
                 self.waiting_car = None
                 self.charging_car.queue_position = QueuePosition.CHARGING
                 self._start_charging(self.charging_car)
+                queue_journal.record_car(OP_START, self.charging_car, pile_id=self.pile_id)
             else:
                 self.charging_car = None
             
             return completed_car
     
+    def restore_car(self, car: WaitingCar, charging: bool) -> bool:
+        """恢复车辆到指定车位（从队列日志恢复时使用，不重复写日志）"""
+        with self._lock:
+            if charging:
+                if self.charging_car is not None:
+                    return False
+                self.charging_car = car
+                car.queue_position = QueuePosition.CHARGING
+                car.assigned_pile_id = self.pile_id
+                # 关联已恢复的充电会话，否则在充电桩正常时重新开始充电
+                from services.charging_process_service import charging_process_service
+                pile = charging_pile_service.get_pile(self.pile_id)
+                has_session = charging_process_service.get_user_active_session(car.user_id) is not None
+                if has_session or (pile and pile.status == PileStatus.ACTIVE):
+                    self._start_charging(car)
+            else:
+                if self.waiting_car is not None:
+                    return False
+                self.waiting_car = car
+                car.queue_position = QueuePosition.PILE_QUEUE
+                car.assigned_pile_id = self.pile_id
+            return True
+    
     def _start_charging(self, car: WaitingCar):
         """开始充电"""
         try:
@@ -115,7 +175,8 @@ class PileDispatchQueue:
             # 检查用户是否已有活跃充电会话
             existing_session = charging_process_service.get_user_active_session(car.user_id)
             if existing_session:
-                print(f"用户 {car.user_id} 已有活跃充电会话: {existing_session.session_id}")
+                logger.info("session_reused", "用户 %(user_id)s 已有活跃充电会话: %(session_id)s",
+                            user_id=car.user_id, session_id=existing_session.session_id)
                 self.current_session = existing_session
                 return
             
@@ -129,13 +190,17 @@ class PileDispatchQueue:
                 success = charging_process_service.start_charging_session(session.session_id)
                 if success:
                     self.current_session = session
-                    print(f"充电桩 {self.pile_id} 开始为用户 {car.user_id} 充电")
+                    logger.info("charging_started", "充电桩 %(pile_id)s 开始为用户 %(user_id)s 充电",
+                                pile_id=self.pile_id, user_id=car.user_id, session_id=session.session_id)
                 else:
-                    print(f"启动充电会话失败: {session.session_id}")
+                    logger.error("session_start_failed", "启动充电会话失败: %(session_id)s",
+                                 pile_id=self.pile_id, user_id=car.user_id, session_id=session.session_id)
             else:
-                print(f"创建充电会话失败：用户 {car.user_id}, 充电桩 {self.pile_id}")
+                logger.error("session_create_failed", "创建充电会话失败：用户 %(user_id)s, 充电桩 %(pile_id)s",
+                             user_id=car.user_id, pile_id=self.pile_id)
         except Exception as e:
-            print(f"启动充电时发生错误: {e}")
+            logger.error("charging_start_error", "启动充电时发生错误: %(error)s",
+                         pile_id=self.pile_id, user_id=car.user_id, error=e)
     
     def get_total_completion_time(self, new_car_amount: float) -> float:
         """计算新车辆的总完成时间（等待时间 + 自己充电时间）"""
@@ -194,10 +259,9 @@ class DispatchService:
         
         # 调度引擎状态
         self.is_running = False
-        self.dispatch_thread = None
         self._lock = threading.Lock()
         
-        print("充电桩调度系统已初始化")
+        logger.info("dispatch_initialized", "充电桩调度系统已初始化")
     
     def start_dispatch_engine(self):
         """启动实时调度决策引擎"""
@@ -205,26 +269,15 @@ class DispatchService:
             return
         
         self.is_running = True
-        self.dispatch_thread = threading.Thread(target=self._dispatch_loop, daemon=True)
-        self.dispatch_thread.start()
-        print("调度引擎已启动")
+        # 调度循环由后台循环监督器每5秒执行一次，出错时退避重试
+        loop_supervisor.start_loop("dispatch", self._check_and_dispatch, period=5)
+        logger.info("dispatch_engine_started", "调度引擎已启动")
     
     def stop_dispatch_engine(self):
         """停止调度引擎"""
         self.is_running = False
-        if self.dispatch_thread:
-            self.dispatch_thread.join()
-        print("调度引擎已停止")
-    
-    def _dispatch_loop(self):
-        """调度循环 - 每5秒检查一次"""
-        while self.is_running:
-            try:
-                self._check_and_dispatch()
-                time.sleep(5)  # 每5秒检查一次
-            except Exception as e:
-                print(f"调度循环发生错误: {e}")
-                time.sleep(1)
+        loop_supervisor.stop_loop("dispatch")
+        logger.info("dispatch_engine_stopped", "调度引擎已停止")
     
     def _check_and_dispatch(self):
         """检查并执行调度"""
@@ -254,17 +307,14 @@ class DispatchService:
         
         # 如果没有可用的充电桩，直接返回，保持车辆在等候区
         if not available_piles:
-            print(f"没有可用的{charge_mode}充电桩，车辆继续等待")
+            logger.debug("no_available_pile", "没有可用的%(charge_mode)s充电桩，车辆继续等待",
+                         charge_mode=charge_mode)
             return
         
         for car in waiting_cars:
             if not available_piles:
                 break
                 
-            # 检查用户是否已经在调度系统中（防止重复调度）
-            if self._is_user_already_dispatched(car.user_id):
-                continue
-            
             # 选择最优充电桩
             best_pile_id = self._select_optimal_pile(car, available_piles)
             if best_pile_id:
@@ -278,46 +328,10 @@ class DispatchService:
                     # 调度成功后，只调度一个车辆就退出，避免重复调度
                     break
     
-    def _is_user_already_dispatched(self, user_id: str) -> bool:
-        """检查用户是否已经在调度系统中"""
-        for pile_queue in self.pile_queues.values():
-            # 检查是否正在充电
-            if pile_queue.charging_car and pile_queue.charging_car.user_id == user_id:
-                return True
-            # 检查是否在队列等待
-            if pile_queue.waiting_car and pile_queue.waiting_car.user_id == user_id:
-                return True
-        return False
-    
     def _get_waiting_cars_by_mode(self, charge_mode: str) -> List[WaitingCar]:
         """获取等候区指定模式的车辆（按先来先到排序）"""
-        try:
-            from services.queue_service import queue_service
-            # 通过排队服务获取等候区车辆
-            waiting_cars = []
-            queue_info = queue_service.queue_manager.get_all_queue_info()
-            
-            for car_data in queue_info["waitingArea"]:
-                if car_data["chargeMode"] == charge_mode:
-                    # 创建WaitingCar对象
-                    car = WaitingCar(
-                        car_data["userId"],
-                        car_data["requestId"],
-                        car_data["chargeMode"],
-                        car_data["requestedAmount"],
-                        car_data["batteryCapacity"]
-                    )
-                    car.queue_number = car_data["queueNumber"]
-                    car.join_time = datetime.fromisoformat(car_data["joinTime"])
-                    waiting_cars.append(car)
-            
-            # 按加入时间排序（先来先到）
-            waiting_cars.sort(key=lambda x: x.join_time)
-            return waiting_cars
-            
-        except Exception as e:
-            print(f"获取等候区车辆失败: {e}")
-            return []
+        from services.queue_service import queue_service
+        return queue_service.queue_manager.get_waiting_cars(charge_mode)
     
     def _select_optimal_pile(self, car: WaitingCar, available_piles: List[str]) -> Optional[str]:
         """选择最优充电桩 - 实现最短完成时长策略"""
@@ -357,88 +371,106 @@ class DispatchService:
     
     def _execute_dispatch(self, car: WaitingCar, pile_id: str) -> bool:
         """执行调度决策"""
-        with self._lock:
+        from services.queue_service import queue_service
+        
+        # 持有排队服务的锁，避免车辆在调度过程中被取消或修改
+        with event_bus.deferred(), queue_service._lock, self._lock:
             try:
-                from services.queue_service import queue_service
+                waiting_area = queue_service.queue_manager.waiting_area
+                if car not in waiting_area.cars:
+                    return False
+                
                 # 将车辆添加到充电桩队列
                 pile_queue = self.pile_queues[pile_id]
                 success = pile_queue.add_car(car)
                 
                 if success:
-                    # 从等候区移除车辆
-                    queue_service.queue_manager.waiting_area.remove_car(car)
+                    # 从等候区移除车辆（与充电桩队列共享同一车辆对象）
+                    waiting_area.remove_car(car)
+                    state_versions.bump(QUEUE, WAITING_AREA)
                     
                     # 更新统计
                     self.total_dispatched += 1
+                    DISPATCH_DECISIONS.inc((car.charge_mode, "success"))
                     
-                    print(f"调度成功：用户 {car.user_id} ({car.queue_number}) 调度到充电桩 {pile_id}")
+                    logger.info("car_dispatched", "调度成功：用户 %(user_id)s (%(queue_number)s) 调度到充电桩 %(pile_id)s",
+                                user_id=car.user_id, queue_number=car.queue_number, pile_id=pile_id,
+                                charge_mode=car.charge_mode)
                     return True
                 else:
-                    print(f"调度失败：充电桩 {pile_id} 队列已满")
+                    DISPATCH_DECISIONS.inc((car.charge_mode, "rejected"))
+                    logger.warning("dispatch_rejected", "调度失败：充电桩 %(pile_id)s 队列已满",
+                                   pile_id=pile_id, user_id=car.user_id)
                     return False
                     
             except Exception as e:
-                print(f"执行调度时发生错误: {e}")
+                logger.error("dispatch_error", "执行调度时发生错误: %(error)s", pile_id=pile_id, error=e)
                 return False
     
     def _check_charging_completion(self):
         """检查充电完成状态"""
+        from services.queue_service import queue_service
+        
         for pile_id, pile_queue in self.pile_queues.items():
             if pile_queue.charging_car and pile_queue.current_session:
-                session = pile_queue.current_session
-                
                 # 检查充电桩状态
                 pile = charging_pile_service.get_pile(pile_id)
                 is_pile_fault = not pile.is_active or pile.status == PileStatus.MAINTENANCE
                 
                 # 如果充电桩故障或充电完成
                 if is_pile_fault or self._is_pile_charging_completed(pile_id):
-                    try:
-                        # 结算当前充电会话
-                        from services.charging_process_service import charging_process_service
-                        charging_process_service.stop_charging_session(
-                            session.session_id,
-                            "充电桩故障" if is_pile_fault else "充电完成"
-                        )
-                        
-                        # 获取已充电量
-                        charged_amount = session.get_charged_amount()
-                        
-                        # 更新用户的请求电量（减去已充电的部分）
-                        remaining_amount = pile_queue.charging_car.requested_amount - charged_amount
-                        
-                        # 如果还有剩余电量且充电桩故障，将用户加入等候区重新等待
-                        if is_pile_fault and remaining_amount > 0:
-                            from services.queue_service import queue_service
-                            car = pile_queue.charging_car
-                            
-                            # 先从等候区移除该用户的所有请求（避免重复）
-                            waiting_cars = queue_service.queue_manager.waiting_area.cars.copy()
-                            for waiting_car in waiting_cars:
-                                if waiting_car.user_id == car.user_id:
-                                    queue_service.queue_manager.waiting_area.remove_car(waiting_car)
-                                    print(f"移除用户 {car.user_id} 的重复请求")
-                            
-                            # 更新车辆信息并加入等候区
-                            car.requested_amount = remaining_amount  # 更新剩余请求电量
-                            car.queue_position = QueuePosition.WAITING_AREA
-                            car.assigned_pile_id = None
-                            queue_service.queue_manager.waiting_area.add_car(car)
-                            print(f"充电桩 {pile_id} 故障，用户 {car.user_id} 返回等候区，剩余电量：{remaining_amount}度")
-                        
-                        # 清除充电桩状态
-                        pile_queue.charging_car = None
-                        pile_queue.current_session = None
-                        
-                        # 如果有等待的车辆且充电桩正常，开始下一个充电
-                        if not is_pile_fault and pile_queue.waiting_car:
-                            pile_queue.charging_car = pile_queue.waiting_car
-                            pile_queue.waiting_car = None
-                            pile_queue.charging_car.queue_position = QueuePosition.CHARGING
-                            pile_queue._start_charging(pile_queue.charging_car)
-                        
-                    except Exception as e:
-                        print(f"处理充电完成时发生错误: {e}")
+                    # 故障时车辆返回等候区，按锁顺序先获取排队服务的锁
+                    with event_bus.deferred(), queue_service._lock, pile_queue._lock:
+                        self._handle_charging_finished(pile_queue, is_pile_fault)
+    
+    def _handle_charging_finished(self, pile_queue: PileDispatchQueue, is_pile_fault: bool):
+        """结算充电桩当前车辆并叫下一辆车（调用方需持有排队服务和充电桩队列的锁）"""
+        car = pile_queue.charging_car
+        session = pile_queue.current_session
+        if not car or not session:
+            return
+        
+        pile_id = pile_queue.pile_id
+        try:
+            from services.queue_service import queue_service
+            from services.charging_process_service import charging_process_service
+            
+            # 结算当前充电会话
+            charging_process_service.stop_charging_session(
+                session.session_id,
+                "充电桩故障" if is_pile_fault else "充电完成"
+            )
+            
+            # 更新用户的请求电量（减去已充电的部分）
+            remaining_amount = car.requested_amount - session.current_amount
+            
+            # 清除充电车位
+            pile_queue.charging_car = None
+            pile_queue.current_session = None
+            
+            # 如果还有剩余电量且充电桩故障，将用户加入等候区重新等待
+            requeued = False
+            if is_pile_fault and remaining_amount > 0:
+                car.requested_amount = remaining_amount  # 更新剩余请求电量
+                requeued = queue_service.requeue_car_locked(car)
+                logger.info("car_requeued", "充电桩 %(pile_id)s 故障，用户 %(user_id)s 返回等候区，剩余电量：%(remaining_amount)s度",
+                            pile_id=pile_id, user_id=car.user_id, remaining_amount=remaining_amount)
+            
+            if not requeued:
+                queue_journal.record(OP_COMPLETE, user_id=car.user_id, pile_id=pile_id)
+                queue_service.finish_request_locked(car.user_id, session.current_amount)
+            
+            # 如果有等待的车辆且充电桩正常，开始下一个充电
+            if not is_pile_fault and pile_queue.waiting_car:
+                pile_queue.charging_car = pile_queue.waiting_car
+                pile_queue.waiting_car = None
+                pile_queue.charging_car.queue_position = QueuePosition.CHARGING
+                pile_queue._start_charging(pile_queue.charging_car)
+                queue_journal.record_car(OP_START, pile_queue.charging_car, pile_id=pile_id)
+            
+        except Exception as e:
+            logger.error("charging_completion_error", "处理充电完成时发生错误: %(error)s",
+                         pile_id=pile_id, error=e)
     
     def _is_pile_charging_completed(self, pile_id: str) -> bool:
         """检查充电桩是否完成充电"""
@@ -455,6 +487,16 @@ class DispatchService:
         
         return self.pile_queues[pile_id].get_queue_info()
     
+    def get_pile_queues_etag(self) -> str:
+        """所有充电桩队列状态的 ETag（车辆的排队时长按分钟显示，也计入 ETag）"""
+        now = datetime.now()
+        queue_minutes = [
+            int((now - car.join_time).total_seconds() / 60)
+            for pile_queue in self.pile_queues.values()
+            for car in (pile_queue.charging_car, pile_queue.waiting_car) if car
+        ]
+        return state_versions.etag(QUEUE, extra=queue_minutes)
+    
     def get_all_pile_queues_status(self) -> Dict[str, Any]:
         """获取所有充电桩队列状态"""
         return {
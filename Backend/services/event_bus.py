@@ -0,0 +1,377 @@
+"""
+进程内事件总线
+
+调度、排队、充电过程和故障处理在状态变化时发布类型化事件，持久化、指标、推送等
+消费方订阅感兴趣的事件类型，由后台工作线程池异步投递：
+
+- 发布只在订阅方的有界队列中追加事件，不调用消费方代码
+- 服务持有锁发布事件时先进入 deferred() 作用域：事件暂存在当前线程，离开最外层作用域
+  （锁已释放）后才放入订阅方队列，BLOCK 订阅方队列已满时的等待不会发生在持锁期间
+- 每个订阅方独立的有界队列和背压策略：丢弃最旧（DROP_OLDEST）、按键合并（COALESCE）、
+  限时阻塞（BLOCK，超时后丢弃新事件，发布方等待时间有上限）
+- 同一订阅方的事件按发布顺序串行投递，不同订阅方由线程池并行投递，
+  慢消费方只会积压或丢弃自己的事件，不影响调度和其他订阅方
+"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from enum import Enum
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
+
+
+class EventType(Enum):
+    """事件类型"""
+    CAR_QUEUED = "car_queued"                    # 车辆进入等候区
+    CAR_DISPATCHED = "car_dispatched"            # 车辆调度到充电桩
+    SESSION_STARTED = "session_started"          # 充电会话开始
+    SESSION_PROGRESS = "session_progress"        # 充电进度更新
+    SESSION_COMPLETED = "session_completed"      # 充电会话完成
+    SESSION_INTERRUPTED = "session_interrupted"  # 充电会话中断
+    PILE_FAULT = "pile_fault"                    # 充电桩故障
+    PILE_RECOVERED = "pile_recovered"            # 充电桩故障恢复
+
+
+class BackpressurePolicy(Enum):
+    """订阅队列已满时的处理策略"""
+    DROP_OLDEST = "drop_oldest"  # 丢弃最早的未投递事件
+    COALESCE = "coalesce"        # 同一合并键的事件只保留最新一条，仍然满时丢弃最旧
+    BLOCK = "block"              # 发布方最多等待 block_timeout 秒，仍然满时丢弃新事件
+
+
+class Event:
+    """总线事件"""
+
+    __slots__ = ("type", "user_id", "pile_id", "data", "key", "timestamp")
+
+    def __init__(self, event_type: EventType, user_id: Optional[str] = None,
+                 pile_id: Optional[str] = None, data: Optional[Dict[str, Any]] = None,
+                 key: Any = None):
+        """
+        Args:
+            event_type: 事件类型
+            user_id: 相关用户
+            pile_id: 相关充电桩
+            data: 事件数据
+            key: 合并键，COALESCE 订阅方按 (事件类型, 合并键) 合并；为 None 时不合并
+        """
+        self.type = event_type
+        self.user_id = user_id
+        self.pile_id = pile_id
+        self.data = data or {}
+        self.key = key
+        self.timestamp = time.time()
+
+    def __repr__(self) -> str:
+        return f"Event({self.type.value}, user={self.user_id}, pile={self.pile_id})"
+
+
+class Subscription:
+    """一个订阅方：事件类型过滤、有界队列和投递统计"""
+
+    def __init__(self, name: str, handler: Callable[[Event], None],
+                 event_types: Optional[Iterable[EventType]], maxsize: int,
+                 policy: BackpressurePolicy, block_timeout: float):
+        self.name = name
+        self.handler = handler
+        self.event_types = frozenset(event_types) if event_types else None
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        # 待投递事件：合并键 -> 事件（不合并的事件使用递增序号作为键）
+        self._pending: "OrderedDict[Any, Event]" = OrderedDict()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._scheduled = False
+        self.active = True
+
+        # 统计信息（投递统计由投递线程在订阅锁内更新）
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.peak_depth = 0
+        self.handler_time = 0.0
+
+    def accepts(self, event: Event) -> bool:
+        return self.active and (self.event_types is None or event.type in self.event_types)
+
+    def offer(self, event: Event) -> bool:
+        """放入事件，返回是否需要调度投递"""
+        with self._lock:
+            self.published += 1
+
+            if self.policy == BackpressurePolicy.COALESCE and event.key is not None:
+                key = (event.type, event.key)
+                if key in self._pending:
+                    # 保留原来的投递位置，替换为最新事件
+                    self._pending[key] = event
+                    self.coalesced += 1
+                    return False
+            else:
+                key = next(self._seq)
+
+            if len(self._pending) >= self.maxsize:
+                if self.policy == BackpressurePolicy.BLOCK:
+                    deadline = time.time() + self.block_timeout
+                    while len(self._pending) >= self.maxsize and self.active:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            break
+                        self._not_full.wait(remaining)
+                    if len(self._pending) >= self.maxsize:
+                        self.dropped += 1
+                        return False
+                else:
+                    self._pending.popitem(last=False)
+                    self.dropped += 1
+
+            self._pending[key] = event
+            self.peak_depth = max(self.peak_depth, len(self._pending))
+
+            if self._scheduled:
+                return False
+            self._scheduled = True
+            return True
+
+    def take_batch(self, limit: int) -> List[Event]:
+        """取出一批待投递事件"""
+        with self._lock:
+            batch = []
+            while self._pending and len(batch) < limit:
+                batch.append(self._pending.popitem(last=False)[1])
+            self._not_full.notify_all()
+            return batch
+
+    def finish_batch(self, delivered: int, errors: int, handler_time: float) -> bool:
+        """一批投递完成，记录投递统计，返回是否还有事件需要继续调度"""
+        with self._lock:
+            self.delivered += delivered
+            self.errors += errors
+            self.handler_time += handler_time
+            if self._pending and self.active:
+                return True
+            self._scheduled = False
+            return False
+
+    def reschedule(self) -> bool:
+        """重置调度状态（总线启动时调用，此前的调度已随投递线程停止失效），返回是否有事件需要调度"""
+        with self._lock:
+            self._scheduled = bool(self._pending) and self.active
+            return self._scheduled
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def close(self):
+        with self._lock:
+            self.active = False
+            self._pending.clear()
+            self._not_full.notify_all()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "policy": self.policy.value,
+                "maxsize": self.maxsize,
+                "depth": self.depth(),
+                "peakDepth": self.peak_depth,
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "avgHandlerMs": round(self.handler_time / self.delivered * 1000, 3) if self.delivered else 0.0
+            }
+
+
+class EventBus:
+    """有界异步事件总线"""
+
+    # 工作线程一次为同一订阅方投递的最大事件数（之后让出给其他订阅方）
+    BATCH_SIZE = 64
+
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._ready: "Queue[Optional[Subscription]]" = Queue()
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._deferred = threading.local()
+        self.is_running = False
+
+        # 统计信息
+        self.total_published = 0
+        self.unrouted = 0
+
+    def subscribe(self, name: str, handler: Callable[[Event], None],
+                  event_types: Optional[Iterable[EventType]] = None, maxsize: int = 1000,
+                  policy: BackpressurePolicy = BackpressurePolicy.DROP_OLDEST,
+                  block_timeout: float = 0.05) -> Subscription:
+        """
+        订阅事件
+
+        Args:
+            name: 订阅方名称（用于统计）
+            handler: 事件处理函数，在总线工作线程中调用
+            event_types: 订阅的事件类型，为 None 时订阅全部
+            maxsize: 待投递队列容量
+            policy: 队列已满时的背压策略
+            block_timeout: BLOCK 策略下发布方的最长等待时间（秒）
+        """
+        subscription = Subscription(name, handler, event_types, maxsize, policy, block_timeout)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """取消订阅，未投递的事件被丢弃"""
+        with self._lock:
+            self._subscriptions = [sub for sub in self._subscriptions if sub is not subscription]
+        subscription.close()
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        """
+        推迟发布：作用域内当前线程发布的事件暂存，离开最外层作用域时按发布顺序放入订阅方队列
+
+        持有服务锁时发布事件的代码在获取锁之前进入作用域（with event_bus.deferred(), self._lock:），
+        锁释放后才发布；作用域可以嵌套，调用方已在作用域内时由最外层统一发布
+        """
+        local = self._deferred
+        outermost = not getattr(local, "depth", 0)
+        if outermost:
+            local.depth = 0
+            local.events = []
+        local.depth += 1
+        try:
+            yield
+        finally:
+            local.depth -= 1
+            if outermost:
+                events, local.events = local.events, []
+                for event in events:
+                    self._publish(event)
+
+    def publish(self, event: Event):
+        """
+        发布事件（不调用订阅方代码）
+
+        在 deferred() 作用域内时暂存到离开最外层作用域；否则 BLOCK 订阅方队列已满时最多等待其 block_timeout
+        """
+        local = self._deferred
+        if getattr(local, "depth", 0):
+            local.events.append(event)
+            return
+        self._publish(event)
+
+    def _publish(self, event: Event):
+        self.total_published += 1
+        routed = False
+        for subscription in self._subscriptions:
+            if subscription.accepts(event):
+                routed = True
+                if subscription.offer(event):
+                    self._schedule(subscription)
+        if not routed:
+            self.unrouted += 1
+
+    def _schedule(self, subscription: Subscription):
+        """把订阅方放入就绪队列；总线未运行时只保留调度标记，启动时重新调度"""
+        with self._lock:
+            if self.is_running:
+                self._ready.put(subscription)
+
+    def start(self, workers: int = 4):
+        """启动投递线程池"""
+        if self.is_running:
+            return
+
+        with self._lock:
+            # 丢弃上次运行遗留的就绪项（包括停止信号），按当前待投递事件重新调度
+            while True:
+                try:
+                    self._ready.get_nowait()
+                except Empty:
+                    break
+            self.is_running = True
+            for subscription in self._subscriptions:
+                if subscription.reschedule():
+                    self._ready.put(subscription)
+
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"event-bus-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        logger.info("event_bus_started", "事件总线已启动，投递线程: %(workers)s", workers=workers)
+
+    def stop(self, timeout: float = 5.0):
+        """停止投递线程池（先投递已排队的事件，最多等待 timeout 秒）"""
+        if not self.is_running:
+            return
+
+        deadline = time.time() + timeout
+        while time.time() < deadline and any(sub.depth() for sub in self._subscriptions):
+            time.sleep(0.01)
+
+        with self._lock:
+            self.is_running = False
+            for _ in self._workers:
+                self._ready.put(None)
+        for worker in self._workers:
+            worker.join(max(deadline - time.time(), 0.1))
+        self._workers = []
+        logger.info("event_bus_stopped", "事件总线已停止")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取事件总线统计信息"""
+        return {
+            "running": self.is_running,
+            "workers": len(self._workers),
+            "totalPublished": self.total_published,
+            "unrouted": self.unrouted,
+            "subscriptions": [sub.get_statistics() for sub in self._subscriptions]
+        }
+
+    def _worker_loop(self):
+        """投递线程：取出一个就绪的订阅方，串行投递一批事件"""
+        while True:
+            try:
+                subscription = self._ready.get(timeout=1.0)
+            except Empty:
+                if not self.is_running:
+                    return
+                continue
+            if subscription is None:
+                return
+
+            batch = subscription.take_batch(self.BATCH_SIZE)
+            errors = 0
+            started = time.perf_counter()
+            for event in batch:
+                try:
+                    subscription.handler(event)
+                except Exception as e:
+                    errors += 1
+                    logger.error("event_handler_failed", "事件处理失败 %(subscription)s %(event_type)s: %(error)s",
+                                 subscription=subscription.name, event_type=event.type.value,
+                                 user_id=event.user_id, pile_id=event.pile_id, error=e)
+
+            if subscription.finish_batch(len(batch), errors, time.perf_counter() - started):
+                self._schedule(subscription)
+
+
+# 全局单例实例
+event_bus = EventBus()
@@ -0,0 +1,303 @@
+"""
+实时推送服务
+
+把充电会话事件（开始、进度、完成、中断）和排队状态变化推送给订阅的客户端，
+替代对 /api/charging/real-time-status 等接口的轮询。
+
+- 每个订阅按事件类型只保留最新一条待发送数据，慢客户端不会积压，只会收到最新状态
+- 排队状态只记录"可能变化"，由订阅方在发送前重新读取并与上次发送的内容比较
+- 充电会话事件经事件总线（按会话合并）在总线线程中接收，推送数据在服务锁之外构建
+- 排队状态版本回调在服务持有锁时执行，只标记并唤醒对应订阅，不做序列化和 I/O
+- next_events 阻塞等待，只使用订阅ID和普通数据，多进程部署时可以经状态进程调用；
+  同一进程内的事件流使用 stream_events，等待时产出 Wait，异步部署时不占用线程
+"""
+
+import itertools
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from config import Config
+from models.charging_session_model import ChargingSession
+from services.queue_service import queue_service
+from services.charging_process_service import charging_process_service
+from services.event_bus import event_bus, Event, EventType, BackpressurePolicy
+from utils.state_version import state_versions, user_key, QUEUE
+from utils.async_wait import Wakeup, Wait
+
+# 充电会话事件 -> 推送事件名
+SESSION_EVENTS = {
+    EventType.SESSION_STARTED: "session_started",
+    EventType.SESSION_PROGRESS: "progress",
+    EventType.SESSION_COMPLETED: "session_completed",
+    EventType.SESSION_INTERRUPTED: "session_interrupted",
+}
+
+QUEUE_EVENT = "queue"
+
+# 用户充电请求聚合名的前缀
+USER_KEY_PREFIX = user_key("")
+
+# 超过该时间（秒）没有读取事件的订阅视为已断开
+SUBSCRIPTION_EXPIRE = 120
+
+
+class _Subscription:
+    """一个客户端连接的订阅"""
+
+    def __init__(self, sub_id: str, user_id: str, lock: threading.Lock):
+        self.sub_id = sub_id
+        self.user_id = user_id
+        self.condition = threading.Condition(lock)
+
+        # 事件名 -> 最新数据（同类事件后到的覆盖先到的）
+        self.pending: Dict[str, Any] = {}
+        self.queue_dirty = True
+        self.last_queue: Any = None
+        self.last_poll = time.time()
+        self.wakeup: Optional[Wakeup] = None  # 同一进程内等待中的读取方（每个订阅一个连接）
+
+        self.delivered = 0
+        self.coalesced = 0
+
+
+class PushService:
+    """充电进度和排队状态推送服务"""
+
+    def __init__(self):
+        self._subscriptions: Dict[str, _Subscription] = {}
+        self._user_subscriptions: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        # 统计信息
+        self.total_subscriptions = 0
+        self.total_published = 0
+
+    def attach(self):
+        """订阅事件总线的充电会话事件，注册状态版本监听器"""
+        event_bus.subscribe(
+            "push", self._on_session_event, event_types=SESSION_EVENTS.keys(),
+            maxsize=Config.EVENT_BUS_QUEUE_SIZE, policy=BackpressurePolicy.COALESCE
+        )
+        state_versions.add_listener(self._on_state_change)
+
+    def subscribe(self, user_id: str) -> str:
+        """订阅用户的充电和排队事件，返回订阅ID；订阅后先收到当前状态"""
+        session = charging_process_service.get_user_active_session(user_id)
+        initial = self.session_payload(session) if session else None
+
+        with self._lock:
+            self._expire_subscriptions()
+
+            sub_id = f"{user_id}-{next(self._ids)}"
+            subscription = _Subscription(sub_id, user_id, self._lock)
+            if initial:
+                subscription.pending[SESSION_EVENTS[EventType.SESSION_PROGRESS]] = initial
+
+            self._subscriptions[sub_id] = subscription
+            self._user_subscriptions.setdefault(user_id, set()).add(sub_id)
+            self.total_subscriptions += 1
+
+        return sub_id
+
+    def unsubscribe(self, sub_id: str):
+        """取消订阅"""
+        with self._lock:
+            self._remove_subscription(sub_id)
+
+    def close_all(self):
+        """关闭全部订阅，等待中的读取方立即返回（服务关闭时调用）"""
+        with self._lock:
+            for sub_id in list(self._subscriptions):
+                self._remove_subscription(sub_id)
+
+    def next_events(self, sub_id: str, timeout: float) -> Optional[List[Dict[str, Any]]]:
+        """
+        等待并取出订阅的待发送事件
+
+        Args:
+            sub_id: 订阅ID
+            timeout: 最长等待时间（秒），超时返回空列表（调用方据此发送心跳）
+
+        Returns:
+            [{"event": 事件名, "data": 数据}]，订阅不存在（已过期或已取消）时返回None
+        """
+        with self._lock:
+            subscription = self._subscriptions.get(sub_id)
+            if not subscription:
+                return None
+
+            deadline = time.time() + timeout
+            while not subscription.pending and not subscription.queue_dirty:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not subscription.condition.wait(remaining):
+                    break
+                if sub_id not in self._subscriptions:
+                    return None
+
+            pending, queue_dirty = self._take_pending(subscription)
+
+        return self._build_events(subscription, pending, queue_dirty)
+
+    def poll_events(self, sub_id: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Wakeup]]:
+        """
+        不等待，取出订阅的待发送事件
+
+        Returns:
+            (事件列表, 唤醒)：没有待发送事件时事件列表为空，唤醒在有新事件或订阅被移除时触发；
+            订阅不存在时返回 (None, None)
+        """
+        with self._lock:
+            subscription = self._subscriptions.get(sub_id)
+            if not subscription:
+                return None, None
+
+            if not subscription.pending and not subscription.queue_dirty:
+                subscription.last_poll = time.time()
+                wakeup = subscription.wakeup = Wakeup()
+                return [], wakeup
+
+            pending, queue_dirty = self._take_pending(subscription)
+
+        return self._build_events(subscription, pending, queue_dirty), None
+
+    def stream_events(self, sub_id: str, heartbeat: float) -> Iterator[Union[List[Dict[str, Any]], Wait]]:
+        """
+        订阅的事件流（同一进程内使用）
+
+        产出事件列表；超过 heartbeat 秒没有事件时产出空列表（调用方据此发送心跳）；
+        没有事件时产出 Wait，由调用方等待。订阅不存在时结束。
+        """
+        last_sent = time.monotonic()
+        while True:
+            events, wakeup = self.poll_events(sub_id)
+            if events is None:
+                return
+
+            now = time.monotonic()
+            if events or now - last_sent >= heartbeat:
+                last_sent = now
+                yield events
+            elif wakeup is not None:
+                yield Wait(wakeup, last_sent + heartbeat - now)
+
+    def _take_pending(self, subscription: _Subscription) -> Tuple[Dict[str, Any], bool]:
+        """取出待发送数据（调用方需已持有推送锁）"""
+        subscription.last_poll = time.time()
+        pending, subscription.pending = subscription.pending, {}
+        queue_dirty, subscription.queue_dirty = subscription.queue_dirty, False
+        return pending, queue_dirty
+
+    def _build_events(self, subscription: _Subscription, pending: Dict[str, Any],
+                      queue_dirty: bool) -> List[Dict[str, Any]]:
+        """构建待发送事件，需要时重新读取排队状态（不持有推送锁调用）"""
+        events = [{"event": name, "data": data} for name, data in pending.items()]
+
+        # 排队状态在释放推送锁后读取（读取需要排队服务的锁）
+        if queue_dirty:
+            queue_status = queue_service.get_queue_status(subscription.user_id)
+            if queue_status != subscription.last_queue:
+                subscription.last_queue = queue_status
+                events.append({"event": QUEUE_EVENT, "data": queue_status})
+
+        subscription.delivered += len(events)
+        return events
+
+    def publish(self, user_id: str, event: str, data: Any):
+        """向用户的全部订阅发布事件（同类待发送事件只保留最新一条）"""
+        if user_id not in self._user_subscriptions:
+            return
+
+        with self._lock:
+            for sub_id in self._user_subscriptions.get(user_id, ()):
+                subscription = self._subscriptions[sub_id]
+                if event in subscription.pending:
+                    subscription.coalesced += 1
+                subscription.pending[event] = data
+                self._wake(subscription)
+            self.total_published += 1
+
+    @staticmethod
+    def session_payload(session: ChargingSession) -> Dict[str, Any]:
+        """充电会话的推送数据（与实时充电状态接口的 session 字段一致）"""
+        session_data = session.to_dict()
+        session_data["remainingTime"] = session.get_remaining_time() or 0
+        session_data["chargingSpeed"] = session.get_charging_speed()
+        return session_data
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取推送统计信息"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            return {
+                "activeSubscriptions": len(subscriptions),
+                "subscribedUsers": len(self._user_subscriptions),
+                "totalSubscriptions": self.total_subscriptions,
+                "totalPublished": self.total_published,
+                "totalDelivered": sum(sub.delivered for sub in subscriptions),
+                "totalCoalesced": sum(sub.coalesced for sub in subscriptions)
+            }
+
+    def _on_session_event(self, event: Event):
+        """充电会话事件（在事件总线线程中调用）"""
+        # 没有订阅时不构建推送数据
+        if event.user_id in self._user_subscriptions:
+            session = event.data["session"]
+            self.publish(event.user_id, SESSION_EVENTS[event.type], self.session_payload(session))
+
+    def _on_state_change(self, keys: Tuple[str, ...]):
+        """状态版本变化：标记可能受影响的订阅的排队状态需要重新读取"""
+        if not self._subscriptions:
+            return
+
+        with self._lock:
+            if QUEUE in keys:
+                targets = list(self._subscriptions.values())
+            else:
+                targets = []
+                for key in keys:
+                    if key.startswith(USER_KEY_PREFIX):
+                        for sub_id in self._user_subscriptions.get(key[len(USER_KEY_PREFIX):], ()):
+                            targets.append(self._subscriptions[sub_id])
+
+            for subscription in targets:
+                if not subscription.queue_dirty:
+                    subscription.queue_dirty = True
+                    self._wake(subscription)
+
+    def _expire_subscriptions(self):
+        """移除长时间没有读取事件的订阅（调用方需已持有推送锁）"""
+        now = time.time()
+        expired = [
+            sub_id for sub_id, subscription in self._subscriptions.items()
+            if now - subscription.last_poll > SUBSCRIPTION_EXPIRE
+        ]
+        for sub_id in expired:
+            self._remove_subscription(sub_id)
+
+    def _remove_subscription(self, sub_id: str):
+        """移除订阅并唤醒等待中的读取方（调用方需已持有推送锁）"""
+        subscription = self._subscriptions.pop(sub_id, None)
+        if not subscription:
+            return
+
+        user_subs = self._user_subscriptions.get(subscription.user_id)
+        if user_subs:
+            user_subs.discard(sub_id)
+            if not user_subs:
+                del self._user_subscriptions[subscription.user_id]
+        self._wake(subscription)
+
+    @staticmethod
+    def _wake(subscription: _Subscription):
+        """唤醒等待中的读取方（调用方需已持有推送锁）"""
+        subscription.condition.notify_all()
+        if subscription.wakeup is not None:
+            subscription.wakeup.set()
+            subscription.wakeup = None
+
+
+# 全局单例实例
+push_service = PushService()
+push_service.attach()
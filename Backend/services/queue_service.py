@@ -4,26 +4,28 @@ import threading
 from models.queue_system_model import QueueManager, WaitingCar, QueuePosition
 from models.charging_request_model import ChargingRequest, ChargeMode, RequestStatus
 from services.charging_pile_service import charging_pile_service
+from services.dispatch_service import dispatch_service
+from database.queue_journal import (
+    queue_journal, empty_queue_state, OP_SUBMIT, OP_CANCEL, OP_MODIFY, OP_START, OP_REQUEUE,
+    SLOT_WAITING_AREA, SLOT_CHARGING, SLOT_WAITING
+)
+from services.event_bus import event_bus, Event, EventType
+from utils.state_version import state_versions, user_key, PILES, QUEUE, WAITING_AREA
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
 
 class QueueService:
     """排队管理服务"""
     
     def __init__(self):
-        self.queue_manager = QueueManager()
+        # 与调度服务共享充电桩队列，排队状态只有一份
+        self.queue_manager = QueueManager(dispatch_service.pile_queues)
         self.active_requests: Dict[str, ChargingRequest] = {}  # user_id -> ChargingRequest
         self.user_sessions: Dict[str, str] = {}  # user_id -> session_id
         self._lock = threading.Lock()
         
-        # 充电桩功率配置
-        self.pile_powers = {
-            "A": 30.0,  # 快充桩A: 30kW
-            "B": 30.0,  # 快充桩B: 30kW
-            "C": 7.0,   # 慢充桩C: 7kW
-            "D": 7.0,   # 慢充桩D: 7kW
-            "E": 7.0    # 慢充桩E: 7kW
-        }
-        
-        print("排队管理服务已初始化")
+        logger.info("queue_service_initialized", "排队管理服务已初始化")
     
     def submit_charging_request(self, user_id: str, charge_type: str, target_amount: float, 
                                battery_capacity: float = 60.0) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
@@ -39,7 +41,7 @@ class QueueService:
         Returns:
             (成功标志, 消息, 请求信息)
         """
-        with self._lock:
+        with event_bus.deferred(), self._lock:
             # 检查用户是否已有活跃请求
             if user_id in self.active_requests:
                 existing_request = self.active_requests[user_id]
@@ -69,9 +71,21 @@ class QueueService:
                 
                 # 保存活跃请求
                 self.active_requests[user_id] = request
+                state_versions.bump(QUEUE, WAITING_AREA, user_key(user_id))
                 
-                # 不再使用旧的调度逻辑，依赖dispatch_service的实时调度引擎
-                # self._try_dispatch_cars()
+                # 写入队列日志
+                car = self._find_waiting_car(user_id)
+                if car:
+                    queue_journal.record_car(
+                        OP_SUBMIT, car, counters=self.queue_manager.waiting_area.get_counters()
+                    )
+                
+                event_bus.publish(Event(EventType.CAR_QUEUED, user_id, data={
+                    "requestId": request.request_id,
+                    "queueNumber": request.queue_number,
+                    "chargeMode": charge_mode,
+                    "requestedAmount": target_amount
+                }))
                 
                 # 返回请求信息
                 request_info = {
@@ -90,75 +104,79 @@ class QueueService:
     def get_queue_status(self, user_id: str) -> Optional[Dict[str, Any]]:
         """获取用户排队状态"""
         with self._lock:
-            # 检查活跃请求
-            if user_id not in self.active_requests:
-                return None
-            
-            request = self.active_requests[user_id]
-            
-            # 首先检查用户是否已经在调度系统的充电桩队列中
-            from services.dispatch_service import dispatch_service
-            for pile_id, pile_queue in dispatch_service.pile_queues.items():
-                # 检查是否正在充电
-                if pile_queue.charging_car and pile_queue.charging_car.user_id == user_id:
-                    return {
-                        "requestId": request.request_id,
-                        "chargeType": "快充模式" if request.charge_mode == ChargeMode.FAST else "慢充模式",
-                        "targetAmount": request.requested_amount,
-                        "status": "CHARGING",
-                        "queueNumber": request.queue_number,
-                        "position": 0,
-                        "estimatedWaitTime": 0,
-                        "queuePosition": QueuePosition.CHARGING.value,
-                        "assignedPileId": pile_id,
-                        "aheadCount": 0
-                    }
-                # 检查是否在充电桩队列等待
-                elif pile_queue.waiting_car and pile_queue.waiting_car.user_id == user_id:
-                    return {
-                        "requestId": request.request_id,
-                        "chargeType": "快充模式" if request.charge_mode == ChargeMode.FAST else "慢充模式",
-                        "targetAmount": request.requested_amount,
-                        "status": "WAITING",
-                        "queueNumber": request.queue_number,
-                        "position": 1,  # 在充电桩队列中的第二位
-                        "estimatedWaitTime": self._estimate_wait_time_in_pile_queue(pile_queue),
-                        "queuePosition": QueuePosition.PILE_QUEUE.value,
-                        "assignedPileId": pile_id,
-                        "aheadCount": 1
-                    }
-            
-            # 如果不在调度系统中，检查原始排队系统状态
-            user_status = self.queue_manager.get_user_status(user_id)
-            
-            if not user_status:
-                return None
-            
-            # 计算前方等待车辆数
-            position = user_status.get("position", 0)
-            queue_position = user_status.get("queuePosition", "")
-            
-            # 如果在充电桩队列中，前方车辆数就是position的值（position从0开始）
-            # 如果在等候区，计算同模式下排在前面的车辆数
-            if queue_position == QueuePosition.PILE_QUEUE.value:
-                ahead_count = max(0, position)  # position本身就是前方车辆数
-            elif queue_position == QueuePosition.CHARGING.value:
-                ahead_count = 0  # 正在充电，前方没有车辆
-            else:
-                ahead_count = max(0, position - 1)  # 等候区中的位置
-            
+            return self.get_queue_status_unlocked(user_id)
+    
+    def get_queue_status_unlocked(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取用户排队状态（调用方需已持有排队服务的锁）"""
+        # 检查活跃请求
+        if user_id not in self.active_requests:
+            return None
+        
+        request = self.active_requests[user_id]
+        charge_type = "快充模式" if request.charge_mode == ChargeMode.FAST else "慢充模式"
+        
+        car, pile_queue = self.queue_manager.locate_car(user_id)
+        if not car:
+            return None
+        
+        # 在充电桩队列中：第一个车位充电中，第二个车位等待
+        if pile_queue is not None:
+            charging = car is pile_queue.charging_car
             return {
                 "requestId": request.request_id,
-                "chargeType": "快充模式" if request.charge_mode == ChargeMode.FAST else "慢充模式",
+                "chargeType": charge_type,
                 "targetAmount": request.requested_amount,
-                "status": request.status.value,
+                "status": "CHARGING" if charging else "WAITING",
                 "queueNumber": request.queue_number,
-                "position": position,
-                "estimatedWaitTime": user_status.get("estimatedWaitTime", 0),
-                "queuePosition": queue_position,
-                "assignedPileId": user_status.get("assignedPileId"),
-                "aheadCount": ahead_count
+                "position": 0 if charging else 1,
+                "estimatedWaitTime": 0 if charging else self._estimate_wait_time_in_pile_queue(pile_queue),
+                "queuePosition": (QueuePosition.CHARGING if charging else QueuePosition.PILE_QUEUE).value,
+                "assignedPileId": pile_queue.pile_id,
+                "aheadCount": 0 if charging else 1
             }
+        
+        # 在等候区：计算同模式下排在前面的车辆数
+        position = len([c for c in self.queue_manager.get_waiting_cars(car.charge_mode)
+                        if c.join_time <= car.join_time])
+        
+        return {
+            "requestId": request.request_id,
+            "chargeType": charge_type,
+            "targetAmount": request.requested_amount,
+            "status": request.status.value,
+            "queueNumber": request.queue_number,
+            "position": position,
+            "estimatedWaitTime": car.estimated_wait_time,
+            "queuePosition": QueuePosition.WAITING_AREA.value,
+            "assignedPileId": None,
+            "aheadCount": max(0, position - 1)
+        }
+    
+    def get_queue_status_etag(self, user_id: str) -> Optional[str]:
+        """
+        用户排队状态的 ETag（不构建排队状态）
+        
+        在充电桩队列中等待时，预计等待时间随前车充电进度变化，也计入 ETag。
+        
+        Returns:
+            ETag，用户没有排队信息时返回None
+        """
+        with self._lock:
+            return self.get_queue_status_etag_unlocked(user_id)
+    
+    def get_queue_status_etag_unlocked(self, user_id: str) -> Optional[str]:
+        """用户排队状态的 ETag（调用方需已持有排队服务的锁）"""
+        if user_id not in self.active_requests:
+            return None
+        
+        car, pile_queue = self.queue_manager.locate_car(user_id)
+        if not car:
+            return None
+        
+        wait_time = None
+        if pile_queue is not None and car is not pile_queue.charging_car:
+            wait_time = self._estimate_wait_time_in_pile_queue(pile_queue)
+        return state_versions.etag(user_key(user_id), QUEUE, extra=wait_time)
     
     def _estimate_wait_time_in_pile_queue(self, pile_queue) -> int:
         """估算在充电桩队列中的等待时间（分钟）"""
@@ -172,7 +190,7 @@ class QueueService:
     
     def cancel_request(self, user_id: str, request_id: str) -> Tuple[bool, str]:
         """取消充电请求"""
-        with self._lock:
+        with event_bus.deferred(), self._lock:
             # 检查请求是否存在
             if user_id not in self.active_requests:
                 return False, "未找到对应的充电请求"
@@ -181,26 +199,13 @@ class QueueService:
             if request.request_id != request_id:
                 return False, "请求ID不匹配"
             
-            # 检查用户是否在调度系统中
-            from services.dispatch_service import dispatch_service
-            user_in_dispatch_system = False
-            user_pile_id = None
-            
-            for pile_id, pile_queue in dispatch_service.pile_queues.items():
-                # 检查是否正在充电
-                if pile_queue.charging_car and pile_queue.charging_car.user_id == user_id:
-                    user_in_dispatch_system = True
-                    user_pile_id = pile_id
-                    break
-                # 检查是否在充电桩队列等待
-                elif pile_queue.waiting_car and pile_queue.waiting_car.user_id == user_id:
-                    user_in_dispatch_system = True
-                    user_pile_id = pile_id
-                    break
+            # 检查用户是否在充电桩队列中
+            car, pile_queue = self.queue_manager.locate_car(user_id)
+            user_in_pile_queue = pile_queue is not None
             
-            # 如果用户在调度系统中，从调度系统移除
-            if user_in_dispatch_system and user_pile_id:
-                pile_queue = dispatch_service.pile_queues[user_pile_id]
+            # 如果用户在充电桩队列中，从充电桩队列移除
+            if user_in_pile_queue:
+                user_pile_id = pile_queue.pile_id
                 with pile_queue._lock:
                     # 检查是否正在充电
                     if pile_queue.charging_car and pile_queue.charging_car.user_id == user_id:
@@ -211,9 +216,11 @@ class QueueService:
                                 charging_process_service.stop_charging_session(
                                     pile_queue.current_session.session_id, "用户取消充电"
                                 )
-                                print(f"已停止用户 {user_id} 的充电会话")
+                                logger.info("cancel_session_stopped", "已停止用户 %(user_id)s 的充电会话",
+                                            user_id=user_id, pile_id=user_pile_id)
                             except Exception as e:
-                                print(f"停止充电会话失败: {e}")
+                                logger.error("cancel_session_stop_failed", "停止充电会话失败: %(error)s",
+                                             user_id=user_id, pile_id=user_pile_id, error=e)
                         
                         # 移除正在充电的车辆
                         pile_queue.charging_car = None
@@ -225,24 +232,32 @@ class QueueService:
                             pile_queue.waiting_car = None
                             pile_queue.charging_car.queue_position = QueuePosition.CHARGING
                             pile_queue._start_charging(pile_queue.charging_car)
+                            queue_journal.record_car(OP_START, pile_queue.charging_car, pile_id=user_pile_id)
                         
-                        print(f"已从充电桩 {user_pile_id} 移除正在充电的用户 {user_id}")
+                        logger.info("cancel_charging_removed", "已从充电桩 %(pile_id)s 移除正在充电的用户 %(user_id)s",
+                                    pile_id=user_pile_id, user_id=user_id)
                     
                     # 检查是否在队列等待
                     elif pile_queue.waiting_car and pile_queue.waiting_car.user_id == user_id:
                         pile_queue.waiting_car = None
-                        print(f"已从充电桩 {user_pile_id} 队列中移除等待用户 {user_id}")
+                        logger.info("cancel_waiting_removed", "已从充电桩 %(pile_id)s 队列中移除等待用户 %(user_id)s",
+                                    pile_id=user_pile_id, user_id=user_id)
             
-            # 从原始排队管理器中移除
-            success = self.queue_manager.cancel_request(user_id)
+            # 从等候区移除
+            success = user_in_pile_queue or self.queue_manager.cancel_request(user_id)
             
-            # 无论从原始队列移除是否成功，如果用户在调度系统中被移除了，就算成功
-            if success or user_in_dispatch_system:
+            if success:
                 # 更新请求状态
                 request.cancel_request()
                 
                 # 移除活跃请求
                 del self.active_requests[user_id]
+                # 充电桩队列中的车位变化已由充电桩队列推进版本
+                if user_in_pile_queue:
+                    state_versions.bump(QUEUE, user_key(user_id))
+                else:
+                    state_versions.bump(QUEUE, WAITING_AREA, user_key(user_id))
+                queue_journal.record(OP_CANCEL, user_id=user_id)
                 
                 return True, "充电请求已取消"
             else:
@@ -271,7 +286,9 @@ class QueueService:
             for car in self.queue_manager.waiting_area.cars:
                 if car.user_id == user_id:
                     car.requested_amount = new_amount
+                    queue_journal.record_car(OP_MODIFY, car)
                     break
+            state_versions.bump(QUEUE, user_key(user_id))
             
             return True, "充电量修改成功"
     
@@ -310,46 +327,62 @@ class QueueService:
                 request.requested_amount, 60.0  # 默认电池容量
             )
             
+            state_versions.bump(QUEUE, WAITING_AREA, user_key(user_id))
+            
             if success:
                 # 更新排队号码
                 user_status = self.queue_manager.get_user_status(user_id)
                 if user_status:
                     request.set_queue_number(user_status["queueNumber"])
                 
+                car = self._find_waiting_car(user_id)
+                if car:
+                    queue_journal.record_car(
+                        OP_MODIFY, car, reorder=True, counters=self.queue_manager.waiting_area.get_counters()
+                    )
+                
                 return True, f"充电模式已修改为{new_charge_type}，新排队号码：{request.queue_number}"
             else:
                 return False, "修改充电模式失败"
     
+    def get_charge_area_etag(self) -> str:
+        """充电区整体状态的 ETag（不构建充电区状态）"""
+        return state_versions.etag(PILES, QUEUE)
+    
     def get_charge_area_status(self) -> Dict[str, Any]:
         """获取充电区整体状态"""
         with self._lock:
-            stats = self.queue_manager.get_statistics()
-            
-            # 获取充电桩状态
-            piles_data = charging_pile_service.get_all_piles()
-            all_piles = []
-            
-            for pile in piles_data:
-                pile_status = "AVAILABLE"
-                if pile["status"] == "charging":
-                    pile_status = "IN_USE"
-                elif pile["status"] == "maintenance":
-                    pile_status = "FAULT"
-                elif pile["status"] == "offline":
-                    pile_status = "FAULT"
-                
-                all_piles.append({
-                    "pileId": pile["id"],
-                    "name": pile["name"],
-                    "status": pile_status,
-                    "type": pile["type"]
-                })
-            
-            return {
-                "queueCarCount": stats["waitingAreaCount"],
-                "chargingCarCount": stats["chargingCount"],
-                "piles": all_piles
-            }
+            return self.get_charge_area_status_unlocked()
+    
+    def get_charge_area_status_unlocked(self) -> Dict[str, Any]:
+        """获取充电区整体状态（调用方需已持有排队服务的锁）"""
+        stats = self.queue_manager.get_statistics()
+        
+        # 获取充电桩状态
+        piles_data = charging_pile_service.get_all_piles()
+        all_piles = []
+        
+        for pile in piles_data:
+            pile_status = "AVAILABLE"
+            if pile["status"] == "charging":
+                pile_status = "IN_USE"
+            elif pile["status"] == "maintenance":
+                pile_status = "FAULT"
+            elif pile["status"] == "offline":
+                pile_status = "FAULT"
+            
+            all_piles.append({
+                "pileId": pile["id"],
+                "name": pile["name"],
+                "status": pile_status,
+                "type": pile["type"]
+            })
+        
+        return {
+            "queueCarCount": stats["waitingAreaCount"],
+            "chargingCarCount": stats["chargingCount"],
+            "piles": all_piles
+        }
     
     def get_queue_ahead_count(self, user_id: str, charge_mode: str) -> int:
         """获取指定充电模式下前车等待数量"""
@@ -375,105 +408,218 @@ class QueueService:
             
             return 0
     
-    def _try_dispatch_cars(self):
-        """尝试调度车辆"""
-        # 尝试调度快充车辆
-        result = self.queue_manager.dispatch_car("fast", self.pile_powers)
-        if result:
-            car, pile_id = result
-            self._handle_car_dispatched(car, pile_id)
+    def _find_waiting_car(self, user_id: str) -> Optional[WaitingCar]:
+        """在等候区查找用户车辆"""
+        for car in self.queue_manager.waiting_area.cars:
+            if car.user_id == user_id:
+                return car
+        return None
+    
+    def requeue_car(self, car: WaitingCar) -> bool:
+        """
+        将车辆重新加入等候区（故障、恢复重新调度时使用）
         
-        # 尝试调度慢充车辆
-        result = self.queue_manager.dispatch_car("slow", self.pile_powers)
-        if result:
-            car, pile_id = result
-            self._handle_car_dispatched(car, pile_id)
+        获取排队服务的锁，排队号码、计数器和队列日志的顺序与其他排队操作一致。
+        调用方不能持有调度服务、充电桩队列或更靠后的锁（锁顺序：故障 -> 排队 -> 调度 -> ...），
+        已持有排队服务锁的调用方使用 requeue_car_locked。
+        """
+        with self._lock:
+            return self.requeue_car_locked(car)
     
-    def _handle_car_dispatched(self, car: WaitingCar, pile_id: str):
-        """处理车辆调度成功"""
-        # 更新充电请求状态
+    def requeue_car_locked(self, car: WaitingCar) -> bool:
+        """将车辆重新加入等候区（调用方需已持有排队服务的锁）"""
+        car.queue_position = QueuePosition.WAITING_AREA
+        car.assigned_pile_id = None
+        waiting_area = self.queue_manager.waiting_area
+        if not waiting_area.add_car(car):
+            return False
+        
+        # 重新分配了排队号码，同步到充电请求
         if car.user_id in self.active_requests:
-            request = self.active_requests[car.user_id]
-            # 这里暂时不启动充电，等待充电桩调度系统处理
-            print(f"车辆 {car.user_id} 已调度到充电桩 {pile_id}")
+            self.active_requests[car.user_id].set_queue_number(car.queue_number)
+        state_versions.bump(QUEUE, WAITING_AREA, user_key(car.user_id))
+        
+        queue_journal.record_car(OP_REQUEUE, car, counters=waiting_area.get_counters())
+        return True
+    
+    def finish_request(self, user_id: str, actual_amount: float = 0.0):
+        """
+        充电结束后释放用户的活跃请求，允许再次提交
+        
+        按锁顺序获取排队服务的锁，调用方不能持有充电桩队列的锁。
+        """
+        with self._lock:
+            self.finish_request_locked(user_id, actual_amount)
+    
+    def finish_request_locked(self, user_id: str, actual_amount: float = 0.0):
+        """释放用户的活跃请求（调用方需已持有排队服务的锁）"""
+        request = self.active_requests.pop(user_id, None)
+        if request:
+            request.complete_charging(actual_amount)
+            state_versions.bump(user_key(user_id))
+    
+    def _request_from_car(self, car: WaitingCar, status: RequestStatus) -> ChargingRequest:
+        """根据恢复的车辆信息重建充电请求"""
+        request = ChargingRequest(
+            car.user_id,
+            ChargeMode.FAST if car.charge_mode == "fast" else ChargeMode.SLOW,
+            car.requested_amount
+        )
+        request.request_id = car.request_id
+        request.submit_time = car.join_time
+        request.set_queue_number(car.queue_number)
+        request.status = status
+        if status == RequestStatus.CHARGING:
+            request.start_charging(car.assigned_pile_id)
+        return request
+    
+    def export_queue_state(self) -> Dict[str, Any]:
+        """导出当前排队状态（队列日志压缩检查点使用）"""
+        with self._lock:
+            pile_locks = [pile_queue._lock for pile_queue in dispatch_service.pile_queues.values()]
+            for lock in pile_locks:
+                lock.acquire()
+            try:
+                return self.export_queue_state_unlocked()
+            finally:
+                for lock in reversed(pile_locks):
+                    lock.release()
+    
+    def export_queue_state_unlocked(self) -> Dict[str, Any]:
+        """导出当前排队状态（调用方需已持有排队服务和各充电桩队列的锁）"""
+        from services.charging_fault_service import charging_fault_service
+        
+        state = empty_queue_state()
+        cars = state["cars"]
+        
+        # 充电桩队列中的车辆
+        for pile_id, pile_queue in dispatch_service.pile_queues.items():
+            for slot, car in ((SLOT_CHARGING, pile_queue.charging_car), (SLOT_WAITING, pile_queue.waiting_car)):
+                if car:
+                    record = car.to_record()
+                    record["pile_id"] = pile_id
+                    record["slot"] = slot
+                    cars[car.user_id] = record
+        
+        # 等候区中的车辆
+        for car in self.queue_manager.waiting_area.cars:
+            record = car.to_record()
+            record["pile_id"] = None
+            record["slot"] = SLOT_WAITING_AREA
+            cars[car.user_id] = record
+            state["waiting_order"].append(car.user_id)
+        
+        state["counters"] = self.queue_manager.waiting_area.get_counters()
+        
+        # 故障充电桩
+        state["faults"] = charging_fault_service.get_fault_reasons()
+        
+        return state
+    
+    def restore_queue_state(self, state: Dict[str, Any]) -> int:
+        """
+        从队列日志或状态快照恢复排队信息
+        
+        Args:
+            state: 排队状态（见 database.queue_journal.empty_queue_state）
+            
+        Returns:
+            恢复的车辆数量
+        """
+        from services.charging_fault_service import charging_fault_service
+        
+        # 先恢复故障状态，避免车辆被分配到故障充电桩
+        charging_fault_service.restore_fault_state(state.get("faults", {}))
+        
+        restored = 0
+        with self._lock:
+            waiting_area = self.queue_manager.waiting_area
+            waiting_area.restore_counters(state.get("counters", {}))
+            cars = state.get("cars", {})
+            
+            # 等候区车辆按原顺序恢复
+            for user_id in state.get("waiting_order", []):
+                record = cars.get(user_id)
+                if not record or user_id in self.active_requests:
+                    continue
+                car = WaitingCar.from_record(record)
+                car.queue_position = QueuePosition.WAITING_AREA
+                car.assigned_pile_id = None
+                waiting_area.cars.append(car)
+                self.active_requests[user_id] = self._request_from_car(car, RequestStatus.WAITING)
+                restored += 1
+            
+            # 充电桩队列中的车辆，先恢复充电车位再恢复等待车位
+            for slot in (SLOT_CHARGING, SLOT_WAITING):
+                for user_id, record in cars.items():
+                    pile_id = record.get("pile_id")
+                    if record.get("slot") != slot or pile_id not in dispatch_service.pile_queues:
+                        continue
+                    if user_id in self.active_requests:
+                        continue
+                    car = WaitingCar.from_record(record)
+                    car.assigned_pile_id = pile_id
+                    if not dispatch_service.pile_queues[pile_id].restore_car(car, slot == SLOT_CHARGING):
+                        continue
+                    status = RequestStatus.CHARGING if slot == SLOT_CHARGING else RequestStatus.WAITING
+                    self.active_requests[user_id] = self._request_from_car(car, status)
+                    restored += 1
+            
+            state_versions.bump(QUEUE)
+        
+        logger.info("queue_state_restored", "已恢复 %(cars)s 辆车的排队状态", cars=restored)
+        return restored
     
     def get_admin_queue_info(self) -> List[Dict[str, Any]]:
         """获取管理员队列信息"""
         with self._lock:
             admin_queue = []
-            processed_users = set()  # 记录已处理的用户，避免重复显示
             
-            # 首先从调度系统获取实际的充电和队列状态
-            try:
-                from services.dispatch_service import dispatch_service
+            # 充电桩队列中的车辆（每辆车只会出现在一个位置）
+            for pile_id, pile_queue in self.queue_manager.pile_queues.items():
+                pile_name = f"{'快充桩' if pile_id in ['A', 'B'] else '慢充桩'} {pile_id}"
                 
-                # 获取调度系统中的车辆状态
-                for pile_id, pile_queue in dispatch_service.pile_queues.items():
-                    pile_name = f"{'快充桩' if pile_id in ['A', 'B'] else '慢充桩'} {pile_id}"
-                    
-                    # 正在充电的车辆
-                    if pile_queue.charging_car:
-                        car = pile_queue.charging_car
-                        if car.user_id not in processed_users:  # 检查是否已处理
-                            processed_users.add(car.user_id)  # 标记为已处理
-                            
-                            admin_queue.append({
-                                "id": len(admin_queue) + 1,
-                                "pileName": pile_name,
-                                "userId": car.user_id,
-                                "batteryCapacity": getattr(car, 'battery_capacity', 60),
-                                "requestedCharge": car.requested_amount,
-                                "queueTime": "0分钟",  # 正在充电的车辆等待时间为0
-                                "status": "充电中",
-                                "statusClass": "charging"
-                            })
-                    
-                    # 在充电桩队列等待的车辆
-                    if pile_queue.waiting_car:
-                        car = pile_queue.waiting_car
-                        if car.user_id not in processed_users:  # 检查是否已处理
-                            processed_users.add(car.user_id)  # 标记为已处理
-                            
-                            wait_time = ""
-                            if hasattr(car, 'join_time') and car.join_time:
-                                elapsed = datetime.now() - car.join_time
-                                minutes = int(elapsed.total_seconds() / 60)
-                                wait_time = f"{minutes}分钟"
-                            
-                            admin_queue.append({
-                                "id": len(admin_queue) + 1,
-                                "pileName": pile_name,
-                                "userId": car.user_id,
-                                "batteryCapacity": getattr(car, 'battery_capacity', 60),
-                                "requestedCharge": car.requested_amount,
-                                "queueTime": wait_time,
-                                "status": "排队中(第1位)",
-                                "statusClass": "waiting"
-                            })
-            
-            except Exception as e:
-                print(f"获取调度系统状态时出错: {e}")
+                # 正在充电的车辆
+                if pile_queue.charging_car:
+                    car = pile_queue.charging_car
+                    admin_queue.append({
+                        "id": len(admin_queue) + 1,
+                        "pileName": pile_name,
+                        "userId": car.user_id,
+                        "batteryCapacity": car.battery_capacity,
+                        "requestedCharge": car.requested_amount,
+                        "queueTime": "0分钟",  # 正在充电的车辆等待时间为0
+                        "status": "充电中",
+                        "statusClass": "charging"
+                    })
+                
+                # 在充电桩队列等待的车辆
+                if pile_queue.waiting_car:
+                    car = pile_queue.waiting_car
+                    elapsed = datetime.now() - car.join_time
+                    admin_queue.append({
+                        "id": len(admin_queue) + 1,
+                        "pileName": pile_name,
+                        "userId": car.user_id,
+                        "batteryCapacity": car.battery_capacity,
+                        "requestedCharge": car.requested_amount,
+                        "queueTime": f"{int(elapsed.total_seconds() / 60)}分钟",
+                        "status": "排队中(第1位)",
+                        "statusClass": "waiting"
+                    })
             
-            # 然后获取等候区的车辆（仅显示未被处理的）
-            try:
-                queue_info = self.queue_manager.get_all_queue_info()
-                for car_data in queue_info["waitingArea"]:
-                    # 只显示未被处理的用户
-                    if car_data["userId"] not in processed_users:
-                        processed_users.add(car_data["userId"])  # 标记为已处理
-                        
-                        admin_queue.append({
-                            "id": len(admin_queue) + 1,
-                            "pileName": "等候区",
-                            "userId": car_data["userId"],
-                            "batteryCapacity": car_data["batteryCapacity"],
-                            "requestedCharge": car_data["requestedAmount"],
-                            "queueTime": car_data["queueTime"],
-                            "status": "等候中",
-                            "statusClass": "waiting"
-                        })
-            except Exception as e:
-                print(f"获取等候区状态时出错: {e}")
+            # 等候区的车辆
+            for car_data in self.queue_manager.get_all_queue_info()["waitingArea"]:
+                admin_queue.append({
+                    "id": len(admin_queue) + 1,
+                    "pileName": "等候区",
+                    "userId": car_data["userId"],
+                    "batteryCapacity": car_data["batteryCapacity"],
+                    "requestedCharge": car_data["requestedAmount"],
+                    "queueTime": car_data["queueTime"],
+                    "status": "等候中",
+                    "statusClass": "waiting"
+                })
             
             return admin_queue
     
@@ -481,12 +627,10 @@ class QueueService:
         """获取特定充电桩的队列状态"""
         with self._lock:
             try:
-                from services.dispatch_service import dispatch_service
-                
-                if pile_id not in dispatch_service.pile_queues:
+                if pile_id not in self.queue_manager.pile_queues:
                     return None
                 
-                pile_queue = dispatch_service.pile_queues[pile_id]
+                pile_queue = self.queue_manager.pile_queues[pile_id]
                 waiting_cars = []
                 
                 # 获取等待车辆信息
@@ -494,7 +638,7 @@ class QueueService:
                     waiting_cars.append({
                         "username": pile_queue.waiting_car.user_id,
                         "requestedCharge": pile_queue.waiting_car.requested_amount,
-                        "queueTime": f"{int((datetime.now() - pile_queue.waiting_car.create_time).total_seconds() / 60)}分钟"
+                        "queueTime": f"{int((datetime.now() - pile_queue.waiting_car.join_time).total_seconds() / 60)}分钟"
                     })
                 
                 return {
@@ -503,53 +647,21 @@ class QueueService:
                     "currentCharging": pile_queue.charging_car.user_id if pile_queue.charging_car else None
                 }
             except Exception as e:
-                print(f"获取充电桩 {pile_id} 队列状态时出错: {e}")
+                logger.error("pile_queue_status_failed", "获取充电桩 %(pile_id)s 队列状态时出错: %(error)s",
+                             pile_id=pile_id, error=e)
                 return None
     
     def get_statistics(self) -> Dict[str, Any]:
         """获取排队统计信息"""
         with self._lock:
-            # 重新计算真实的排队统计
-            total_queued = 0
-            charging_count = 0
-            waiting_area_count = 0
-            
-            try:
-                # 从调度系统获取实际统计
-                from services.dispatch_service import dispatch_service
-                
-                # 统计调度系统中的车辆
-                for pile_id, pile_queue in dispatch_service.pile_queues.items():
-                    if pile_queue.charging_car:
-                        charging_count += 1
-                        total_queued += 1
-                    if pile_queue.waiting_car:
-                        total_queued += 1
-                
-                # 统计等候区车辆
-                queue_info = self.queue_manager.get_all_queue_info()
-                waiting_area_count = len(queue_info["waitingArea"])
-                total_queued += waiting_area_count
-                
-            except Exception as e:
-                print(f"获取统计信息时出错: {e}")
-                # 如果调度系统获取失败，使用原始统计
-                queue_stats = self.queue_manager.get_statistics()
-                pile_stats = charging_pile_service.get_statistics()
-                return {
-                    "totalQueuedCars": queue_stats["totalCount"],
-                    "waitingAreaCount": queue_stats["waitingAreaCount"],
-                    "fastQueueCount": queue_stats["fastQueueCount"],
-                    "slowQueueCount": queue_stats["slowQueueCount"],
-                    "chargingCount": pile_stats.get("chargingPiles", 0)
-                }
+            queue_stats = self.queue_manager.get_statistics()
             
             return {
-                "totalQueuedCars": total_queued,
-                "waitingAreaCount": waiting_area_count,
-                "fastQueueCount": 0,  # 可以进一步细化统计
-                "slowQueueCount": 0,  # 可以进一步细化统计
-                "chargingCount": charging_count
+                "totalQueuedCars": queue_stats["totalCount"],
+                "waitingAreaCount": queue_stats["waitingAreaCount"],
+                "fastQueueCount": queue_stats["fastQueueCount"],
+                "slowQueueCount": queue_stats["slowQueueCount"],
+                "chargingCount": queue_stats["chargingCount"]
             }
 
 # 全局单例实例
@@ -0,0 +1,191 @@
+"""
+排队状态长轮询
+
+客户端携带上次收到的排队版本号请求 /api/queue/status?version=...，
+服务器挂起请求，直到该用户的排队位置、状态或分配的充电桩发生变化，或者等待超时。
+
+- 排队版本号只由位置相关字段计算，不包含随时间变化的预计等待时间
+- 每次等待注册一个唤醒（utils.async_wait.Wakeup），登记在可能改变该用户排队状态的聚合上：
+  用户自己的请求，以及在等候区时的等候区、在充电桩队列中时所在充电桩的车位。
+  状态版本推进时只唤醒登记在变化的聚合上的等待，不轮询，也不让全部等待者重新读取排队状态
+- watch 在需要等待时产出 Wait：异步部署时由事件循环等待，不占用线程，不限制等待数；
+  wait_for_change 在当前线程中阻塞等待，供同步部署和多进程部署的工作进程（经状态进程）调用，
+  同时阻塞的请求数有上限，超过时立即返回当前状态，并在响应中提示客户端稍后重试
+"""
+
+import threading
+import time
+from typing import Any, Dict, Generator, Optional, Set, Tuple
+
+from services.queue_service import queue_service
+from utils.state_version import (state_versions, pile_queue_key, queue_status_version, user_key,
+                                 QUEUE, WAITING_AREA)
+from utils.async_wait import Wakeup, Wait, run_blocking
+
+
+def _watched_keys(user_id: str, queue_status: Optional[Dict[str, Any]]) -> Tuple[str, ...]:
+    """
+    可能改变用户排队状态的聚合
+
+    等候区中的排队位置只随等候区车辆增减变化；充电桩队列中的状态只随所在充电桩的车位变化；
+    提交、取消、修改和充电结束都会推进用户自己的请求。
+    """
+    if not queue_status:
+        return (user_key(user_id),)
+    pile_id = queue_status.get("assignedPileId")
+    if pile_id:
+        return (user_key(user_id), pile_queue_key(pile_id))
+    return (user_key(user_id), WAITING_AREA)
+
+
+class QueueWatchService:
+    """排队状态变化等待服务"""
+
+    def __init__(self):
+        # 聚合名 -> 登记在该聚合上的唤醒；唤醒 -> 登记的聚合
+        self._watchers: Dict[str, Set[Wakeup]] = {}
+        self._watched: Dict[Wakeup, Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._blocking = 0
+
+        # 统计信息
+        self.total_waits = 0
+        self.total_changed = 0
+        self.total_timeouts = 0
+        self.total_rejected = 0
+        self.total_wakeups = 0
+
+    def attach(self):
+        """注册状态版本监听器"""
+        state_versions.add_listener(self._on_state_change)
+
+    def wait_for_change(self, user_id: str, version: Optional[str], timeout: float,
+                        max_waiters: int) -> Tuple[Optional[Dict[str, Any]], str, bool]:
+        """
+        在当前线程中等待用户排队状态相对 version 发生变化
+
+        Args:
+            user_id: 用户ID
+            version: 客户端上次收到的排队版本号，为空时立即返回当前状态
+            timeout: 最长等待时间（秒）
+            max_waiters: 同时阻塞等待的请求数上限，达到上限时立即返回
+
+        Returns:
+            (排队状态, 排队版本号, 是否因达到上限未等待)，超时时返回未变化的当前状态
+        """
+        with self._lock:
+            rejected = bool(version) and self._blocking >= max_waiters
+            if rejected:
+                self.total_rejected += 1
+            else:
+                self._blocking += 1
+
+        if rejected:
+            queue_status = queue_service.get_queue_status(user_id)
+            return queue_status, queue_status_version(queue_status), True
+
+        try:
+            return run_blocking(self.watch(user_id, version, timeout))
+        finally:
+            with self._lock:
+                self._blocking -= 1
+
+    def watch(self, user_id: str, version: Optional[str],
+              timeout: float) -> Generator[Wait, None, Tuple[Optional[Dict[str, Any]], str, bool]]:
+        """
+        等待用户排队状态相对 version 发生变化，需要等待时产出 Wait（等待不占用线程，不限制等待数）
+
+        参数和返回值同 wait_for_change（返回值为生成器的返回值）。
+        """
+        queue_status = queue_service.get_queue_status(user_id)
+        current = queue_status_version(queue_status)
+        if not version or current != version:
+            return queue_status, current, False
+
+        with self._lock:
+            self._waiting += 1
+            self.total_waits += 1
+
+        wakeup = None
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                # 先按上次读取的状态登记唤醒再重新读取，读取之后的变化不会漏掉；
+                # 版本号没有变化时登记的聚合也不变（位置和分配的充电桩都计入版本号）
+                wakeup = self._register(_watched_keys(user_id, queue_status))
+
+                queue_status = queue_service.get_queue_status(user_id)
+                current = queue_status_version(queue_status)
+                if current != version:
+                    self.total_changed += 1
+                    return queue_status, current, False
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.total_timeouts += 1
+                    return queue_status, current, False
+                yield Wait(wakeup, remaining)
+                self._unregister(wakeup)
+        finally:
+            with self._lock:
+                if wakeup is not None:
+                    self._unregister_locked(wakeup)
+                self._waiting -= 1
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取长轮询统计信息"""
+        return {
+            "waiting": self._waiting,
+            "blocking": self._blocking,
+            "watchedKeys": len(self._watchers),
+            "totalWaits": self.total_waits,
+            "totalChanged": self.total_changed,
+            "totalTimeouts": self.total_timeouts,
+            "totalRejected": self.total_rejected,
+            "totalWakeups": self.total_wakeups
+        }
+
+    def _register(self, keys: Tuple[str, ...]) -> Wakeup:
+        wakeup = Wakeup()
+        with self._lock:
+            self._watched[wakeup] = keys
+            for key in keys:
+                self._watchers.setdefault(key, set()).add(wakeup)
+        return wakeup
+
+    def _unregister(self, wakeup: Wakeup):
+        """移除唤醒（等待超时后唤醒仍在登记中）"""
+        with self._lock:
+            self._unregister_locked(wakeup)
+
+    def _unregister_locked(self, wakeup: Wakeup):
+        for key in self._watched.pop(wakeup, ()):
+            watchers = self._watchers.get(key)
+            if watchers is not None:
+                watchers.discard(wakeup)
+                if not watchers:
+                    del self._watchers[key]
+
+    def _on_state_change(self, keys):
+        """状态版本变化：唤醒登记在变化的聚合上的等待（在调用方持有服务锁时执行）"""
+        if not self._watched:
+            return
+
+        with self._lock:
+            if tuple(keys) == (QUEUE,):
+                # 没有更细的聚合（如从快照恢复排队状态），唤醒全部等待
+                targets = list(self._watched)
+            else:
+                targets = {wakeup for key in keys for wakeup in self._watchers.get(key, ())}
+            for wakeup in targets:
+                self._unregister_locked(wakeup)
+            self.total_wakeups += len(targets)
+
+        for wakeup in targets:
+            wakeup.set()
+
+
+# 全局单例实例
+queue_watch_service = QueueWatchService()
+queue_watch_service.attach()
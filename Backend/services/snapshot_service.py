@@ -0,0 +1,298 @@
+"""
+充电站状态快照服务
+
+在短暂静止（按固定顺序获取各服务的锁）期间将内存状态复制为普通数据结构，
+释放锁后再序列化为压缩的 JSON 文件（只有数据，加载时不执行代码），不阻塞请求处理。
+启动时加载快照恢复排队、充电桩队列、活跃会话、充电桩统计和故障状态；
+内存模式下用户只存在于内存中，也一并保存和恢复（文件权限为仅所有者可读写），
+数据库模式下以数据库为准，快照不包含用户。
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from models.user_model import User
+from services.charging_pile_service import charging_pile_service
+from services.dispatch_service import dispatch_service
+from services.queue_service import queue_service
+from services.charging_process_service import charging_process_service
+from services.charging_fault_service import charging_fault_service
+from database.queue_journal import queue_journal, SLOT_CHARGING
+from utils.loop_supervisor import loop_supervisor
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
+
+# 快照文件格式：魔数 + 版本号 + zlib(JSON(状态字典))，时间字段编码为 {"$datetime": ISO 格式}
+SNAPSHOT_MAGIC = b"ECSNAP"
+SNAPSHOT_VERSION = 2
+
+# 快照文件权限（内存模式下包含用户数据）
+SNAPSHOT_FILE_MODE = 0o600
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"无法写入状态快照的类型: {type(value).__name__}")
+
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+class SnapshotService:
+    """充电站状态快照服务"""
+
+    def __init__(self):
+        self.user_service = None
+        self.path: Optional[str] = None
+
+        # 定期快照
+        self.snapshot_running = False
+        self._save_lock = threading.Lock()
+
+        # 统计信息
+        self.last_snapshot_time: Optional[datetime] = None
+        self.last_snapshot_size = 0
+        self.last_quiesce_ms = 0.0
+        self.total_snapshots = 0
+
+    def bind_user_service(self, user_service):
+        """绑定用户服务（用户服务由服务器初始化时创建）"""
+        self.user_service = user_service
+
+    @contextmanager
+    def quiesce(self):
+        """
+        按固定顺序获取所有服务的锁，暂停状态变更
+
+        锁顺序与业务调用链一致：故障 -> 排队 -> 调度 -> 各充电桩队列 -> 充电过程 -> 充电桩
+        """
+        locks = [
+            charging_fault_service._lock,
+            queue_service._lock,
+            dispatch_service._lock,
+            *[pile_queue._lock for pile_queue in dispatch_service.pile_queues.values()],
+            charging_process_service._lock,
+            charging_pile_service._lock
+        ]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def capture(self) -> Dict[str, Any]:
+        """在静止期间复制完整的内存状态"""
+        start = time.perf_counter()
+
+        with self.quiesce():
+            state = {
+                "version": SNAPSHOT_VERSION,
+                "created_at": datetime.now(),
+                "journal_seq": queue_journal.last_seq,
+                "queue": queue_service.export_queue_state_unlocked(),
+                "sessions": [session.to_record() for session in charging_process_service.active_sessions.values()],
+                "piles": {pile_id: pile.to_record() for pile_id, pile in charging_pile_service.piles.items()},
+                "dispatch": {
+                    "total_dispatched": dispatch_service.total_dispatched,
+                    "pile_dispatched": {
+                        pile_id: pile_queue.total_dispatched
+                        for pile_id, pile_queue in dispatch_service.pile_queues.items()
+                    }
+                },
+                "fault_histories": list(charging_fault_service.fault_histories),
+                "users": self._capture_users()
+            }
+
+        self.last_quiesce_ms = (time.perf_counter() - start) * 1000
+        return state
+
+    def _capture_users(self) -> List[List[Any]]:
+        """复制内存模式的用户（数据库模式下以数据库为准，不写入快照）"""
+        if not self.user_service or self.user_service.db_manager:
+            return []
+        return [
+            [user.username, user.password, user.usertype, user.created_at, user.last_login]
+            for user in list(self.user_service._users.values())
+        ]
+
+    def save_snapshot(self, path: Optional[str] = None) -> bool:
+        """
+        保存状态快照（先写临时文件再原子替换）
+
+        Args:
+            path: 快照文件路径，默认使用启动时配置的路径
+
+        Returns:
+            是否保存成功
+        """
+        path = path or self.path
+        if not path:
+            return False
+
+        with self._save_lock:
+            try:
+                state = self.capture()
+                payload = zlib.compress(
+                    json.dumps(state, ensure_ascii=False, separators=(",", ":"), default=_encode_value).encode("utf-8"), 1
+                )
+
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+
+                tmp_path = f"{path}.tmp"
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, SNAPSHOT_FILE_MODE)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(SNAPSHOT_MAGIC)
+                    f.write(SNAPSHOT_VERSION.to_bytes(2, "big"))
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # 临时文件可能是之前留下的，创建权限不生效
+                os.chmod(tmp_path, SNAPSHOT_FILE_MODE)
+                os.replace(tmp_path, path)
+
+                self.last_snapshot_time = state["created_at"]
+                self.last_snapshot_size = len(payload)
+                self.total_snapshots += 1
+                return True
+
+            except Exception as e:
+                logger.error("snapshot_save_failed", "保存状态快照失败: %(error)s", path=path, error=e)
+                return False
+
+    def load_snapshot(self, path: str) -> Optional[Dict[str, Any]]:
+        """读取状态快照，文件不存在或损坏时返回None"""
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+
+            header_size = len(SNAPSHOT_MAGIC) + 2
+            if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                logger.warning("snapshot_invalid", "状态快照格式无效: %(path)s", path=path)
+                return None
+
+            version = int.from_bytes(data[len(SNAPSHOT_MAGIC):header_size], "big")
+            if version != SNAPSHOT_VERSION:
+                logger.warning("snapshot_version_unsupported", "不支持的状态快照版本: %(version)s",
+                               path=path, version=version)
+                return None
+
+            return json.loads(zlib.decompress(data[header_size:]).decode("utf-8"), object_hook=_decode_object)
+
+        except Exception as e:
+            logger.error("snapshot_load_failed", "读取状态快照失败: %(error)s", path=path, error=e)
+            return None
+
+    def restore_snapshot(self, snapshot: Dict[str, Any], queue_state: Dict[str, Any]):
+        """
+        恢复快照中除排队以外的状态
+
+        排队状态可能已由队列日志回放更新，由调用方传入最终的排队状态，
+        只恢复其中仍处于充电车位的车辆对应的充电会话。
+
+        Args:
+            snapshot: 状态快照
+            queue_state: 最终的排队状态
+        """
+        # 用户（只有内存模式的快照包含用户，只补充缺失的用户）
+        if self.user_service and snapshot.get("users"):
+            restored_users = 0
+            for username, password, usertype, created_at, last_login in snapshot.get("users", []):
+                if username in self.user_service._users:
+                    continue
+                user = User(username=username, password=password, usertype=usertype)
+                user.created_at = created_at
+                user.last_login = last_login
+                self.user_service._users[username] = user
+                self.user_service.mark_user_dirty(username)
+                restored_users += 1
+            logger.info("snapshot_users_restored", "已从状态快照恢复 %(users)s 个用户", users=restored_users)
+
+        # 充电会话：只恢复仍在充电的车辆
+        charging_users = {
+            (car["user_id"], car["pile_id"])
+            for car in queue_state.get("cars", {}).values()
+            if car.get("slot") == SLOT_CHARGING
+        }
+        faulty_piles = set(queue_state.get("faults", {}))
+        session_records = [
+            record for record in snapshot.get("sessions", [])
+            if (record["user_id"], record["pile_id"]) in charging_users and record["pile_id"] not in faulty_piles
+        ]
+        charging_process_service.restore_sessions(session_records)
+
+        # 充电桩统计和充电状态
+        charging_pile_service.restore_piles(
+            snapshot.get("piles", {}),
+            [record["pile_id"] for record in session_records]
+        )
+
+        # 调度统计
+        dispatch_info = snapshot.get("dispatch", {})
+        dispatch_service.total_dispatched = dispatch_info.get("total_dispatched", 0)
+        for pile_id, total in dispatch_info.get("pile_dispatched", {}).items():
+            if pile_id in dispatch_service.pile_queues:
+                dispatch_service.pile_queues[pile_id].total_dispatched = total
+
+        # 故障历史
+        charging_fault_service.restore_fault_histories(snapshot.get("fault_histories", []))
+
+    def start_periodic_snapshots(self, path: str, interval: float):
+        """启动定期快照循环（由后台循环监督器执行，不作为关键循环）"""
+        self.path = path
+        if self.snapshot_running:
+            return
+
+        self.snapshot_running = True
+        loop_supervisor.start_loop("snapshot", self._periodic_snapshot, period=interval,
+                                   critical=False, delay=interval)
+        logger.info("snapshot_started", "状态快照已启动", path=path, interval=interval)
+
+    def stop_periodic_snapshots(self):
+        """停止定期快照并保存最终快照"""
+        if not self.snapshot_running:
+            return
+
+        self.snapshot_running = False
+        loop_supervisor.stop_loop("snapshot")
+        self.save_snapshot()
+        logger.info("snapshot_stopped", "状态快照已停止")
+
+    def _periodic_snapshot(self):
+        """定期快照单次迭代（保存失败时抛出异常，由监督器退避重试）"""
+        if not self.save_snapshot():
+            raise RuntimeError("保存状态快照失败")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取快照统计信息"""
+        return {
+            "running": self.snapshot_running,
+            "path": self.path,
+            "totalSnapshots": self.total_snapshots,
+            "lastSnapshotTime": self.last_snapshot_time.isoformat() if self.last_snapshot_time else None,
+            "lastSnapshotSize": self.last_snapshot_size,
+            "lastQuiesceMs": round(self.last_quiesce_ms, 3)
+        }
+
+
+# 全局单例实例
+snapshot_service = SnapshotService()
@@ -0,0 +1,143 @@
+"""
+按需加载的用户目录
+
+用户数量很大时不在启动时加载整张用户表，而是在首次访问时从数据库读取，
+保存在容量有限的 LRU 缓存中；不存在的用户名也缓存一段时间，避免重复查询。
+提供与 dict 相同的常用接口，UserService 可以直接替换内存字典使用。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional
+
+from models.user_model import User
+
+
+class LazyUserDirectory:
+    """按需加载、LRU 淘汰的用户目录"""
+
+    def __init__(self, loader: Callable[[str], Optional[User]], capacity: int,
+                 negative_capacity: int, negative_ttl: float,
+                 pinned: Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            loader: 按用户名从数据库加载用户，不存在时返回 None
+            capacity: 缓存的最大用户数
+            negative_capacity: 缓存的不存在用户名的最大数量
+            negative_ttl: 不存在用户名的缓存时间（秒）
+            pinned: 判断用户是否不可淘汰（如尚未写回数据库）
+        """
+        self._loader = loader
+        self._capacity = capacity
+        self._negative_capacity = negative_capacity
+        self._negative_ttl = negative_ttl
+        self._pinned = pinned or (lambda username: False)
+
+        self._cache: "OrderedDict[str, User]" = OrderedDict()
+        self._missing: "OrderedDict[str, float]" = OrderedDict()  # 用户名 -> 过期时间
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, username: str, default=None) -> Optional[User]:
+        """获取用户，缓存未命中时从数据库加载"""
+        with self._lock:
+            user = self._cache.get(username)
+            if user is not None:
+                self._cache.move_to_end(username)
+                self.hits += 1
+                return user
+
+            expires = self._missing.get(username)
+            if expires is not None:
+                if expires > time.monotonic():
+                    self.negative_hits += 1
+                    return default
+                del self._missing[username]
+
+            self.misses += 1
+
+        # 在锁外查询数据库，不阻塞其他用户的缓存命中
+        user = self._loader(username)
+        self.loads += 1
+
+        with self._lock:
+            if user is None:
+                self._missing[username] = time.monotonic() + self._negative_ttl
+                self._missing.move_to_end(username)
+                while len(self._missing) > self._negative_capacity:
+                    self._missing.popitem(last=False)
+                return default
+
+            # 加载期间可能已被注册或加载，以缓存中的对象为准
+            cached = self._cache.get(username)
+            if cached is not None:
+                return cached
+            self._store(username, user)
+            return user
+
+    def __getitem__(self, username: str) -> User:
+        user = self.get(username)
+        if user is None:
+            raise KeyError(username)
+        return user
+
+    def __contains__(self, username: str) -> bool:
+        return self.get(username) is not None
+
+    def __setitem__(self, username: str, user: User):
+        with self._lock:
+            self._missing.pop(username, None)
+            self._store(username, user)
+
+    def pop(self, username: str, default=None) -> Optional[User]:
+        with self._lock:
+            return self._cache.pop(username, default)
+
+    def values(self):
+        """已缓存的用户"""
+        with self._lock:
+            return list(self._cache.values())
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._cache))
+
+    def __len__(self) -> int:
+        """已缓存的用户数量"""
+        return len(self._cache)
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取缓存统计信息"""
+        return {
+            "cached": len(self._cache),
+            "capacity": self._capacity,
+            "negativeCached": len(self._missing),
+            "hits": self.hits,
+            "misses": self.misses,
+            "negativeHits": self.negative_hits,
+            "loads": self.loads,
+            "evictions": self.evictions
+        }
+
+    def _store(self, username: str, user: User):
+        """放入缓存并按最近最少使用淘汰（调用方持有锁）"""
+        self._cache[username] = user
+        self._cache.move_to_end(username)
+
+        # 从最久未使用的一端淘汰，跳过尚未写回数据库的用户
+        skipped = 0
+        while len(self._cache) > self._capacity and skipped < len(self._cache):
+            oldest = next(iter(self._cache))
+            if self._pinned(oldest):
+                self._cache.move_to_end(oldest)
+                skipped += 1
+                continue
+            del self._cache[oldest]
+            self.evictions += 1
@@ -1,43 +1,86 @@
 from typing import Dict, List, Any, Optional
 from models.user_model import User
 from database.database_manager import DatabaseManager
+from config.database_config import DatabaseConfig
+from services.user_directory import LazyUserDirectory
 import re
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
 class UserService:
     """用户管理服务"""
     
-    def __init__(self, db_manager: Optional[DatabaseManager] = None):
-        """初始化用户服务，创建内存存储"""
+    def __init__(self, db_manager: Optional[DatabaseManager] = None, lazy: Optional[bool] = None):
+        """
+        初始化用户服务，创建内存存储
+        
+        Args:
+            db_manager: 数据库管理器，为空时使用内存模式
+            lazy: 是否按需加载用户，默认使用 DatabaseConfig.USER_DIRECTORY_LAZY（仅数据库模式有效）
+        """
         # 使用字典存储用户数据，key为username，value为User对象
         self._users: Dict[str, User] = {}
         
         # 数据库管理器
         self.db_manager = db_manager
-        
+        self.lazy = bool(db_manager) and (DatabaseConfig.USER_DIRECTORY_LAZY if lazy is None else lazy)
+        
+        # 与数据库不一致、需要写回的用户，以及正在写回的用户
+        self._dirty_users = set()
+        self._saving_users = set()
+        self._dirty_lock = threading.Lock()
+        
+        # 待写入的最后登录时间（同一用户只保留最新一次）
+        self._pending_logins: Dict[str, Any] = {}
+        self._login_flush_event = threading.Event()
+        self.login_writer_running = False
+        self.login_writer_thread = None
+        self.total_login_flushes = 0
+        self.total_logins_flushed = 0
+        
+        # 按需加载模式：首次访问时从数据库读取，尚未写回的用户不淘汰
+        if self.lazy:
+            self._users = LazyUserDirectory(
+                self._load_user_from_database,
+                capacity=DatabaseConfig.USER_CACHE_SIZE,
+                negative_capacity=DatabaseConfig.USER_NEGATIVE_CACHE_SIZE,
+                negative_ttl=DatabaseConfig.USER_NEGATIVE_CACHE_TTL,
+                pinned=lambda username: (username in self._dirty_users or username in self._saving_users
+                                         or username in self._pending_logins)
+            )
+            logger.info("用户目录使用按需加载模式")
         # 如果有数据库管理器，从数据库加载用户数据
-        if self.db_manager:
+        elif self.db_manager:
             self._load_users_from_database()
         else:
             # 没有数据库管理器时，初始化默认用户
             self._init_default_users()
     
+    def _user_from_data(self, user_data: Dict[str, Any]) -> User:
+        """数据库用户数据转换为用户对象"""
+        user = User(
+            username=user_data["username"],
+            password=user_data["password"],
+            usertype=user_data["usertype"]
+        )
+        user.created_at = user_data.get("created_at")
+        user.last_login = user_data.get("last_login")
+        return user
+    
+    def _load_user_from_database(self, username: str) -> Optional[User]:
+        """按需加载模式下从数据库读取单个用户"""
+        user_data = self.db_manager.get_user(username)
+        return self._user_from_data(user_data) if user_data else None
+    
     def _load_users_from_database(self):
         """从数据库加载用户数据到内存"""
         try:
             users_data = self.db_manager.load_all_users()
             
             for user_data in users_data:
-                user = User(
-                    username=user_data["username"],
-                    password=user_data["password"],
-                    usertype=user_data["usertype"]
-                )
-                user.created_at = user_data.get("created_at")
-                user.last_login = user_data.get("last_login")
-                
+                user = self._user_from_data(user_data)
                 self._users[user.username] = user
             
             logger.info(f"从数据库加载了 {len(users_data)} 个用户到内存")
@@ -64,34 +107,127 @@ class UserService:
         
         logger.info(f"内存模式：初始化了 {len(default_users)} 个默认用户")
     
-    def save_users_to_database(self) -> bool:
-        """将内存中的用户数据保存到数据库"""
+    def mark_user_dirty(self, username: str):
+        """标记用户需要写回数据库"""
+        with self._dirty_lock:
+            self._dirty_users.add(username)
+    
+    def start_login_writer(self):
+        """启动最后登录时间的后台批量写入"""
+        if self.login_writer_running or not self.db_manager:
+            return
+        
+        self.login_writer_running = True
+        self.login_writer_thread = threading.Thread(target=self._login_writer_loop, daemon=True)
+        self.login_writer_thread.start()
+        logger.info("最后登录时间批量写入已启动")
+    
+    def stop_login_writer(self):
+        """停止后台批量写入并写入剩余的登录时间"""
+        if not self.login_writer_running:
+            return
+        
+        self.login_writer_running = False
+        self._login_flush_event.set()
+        if self.login_writer_thread:
+            self.login_writer_thread.join()
+        self.flush_last_logins()
+        logger.info("最后登录时间批量写入已停止")
+    
+    def _login_writer_loop(self):
+        """按时间间隔或累计数量批量写入登录时间"""
+        while self.login_writer_running:
+            self._login_flush_event.wait(DatabaseConfig.LAST_LOGIN_FLUSH_INTERVAL)
+            self._login_flush_event.clear()
+            self.flush_last_logins()
+    
+    def flush_last_logins(self) -> int:
+        """
+        写入缓冲的最后登录时间
+        
+        Returns:
+            写入的用户数
+        """
+        with self._dirty_lock:
+            pending = self._pending_logins
+            self._pending_logins = {}
+        
+        if not pending:
+            return 0
+        
+        updates = [
+            {"username": username, "last_login": last_login}
+            for username, last_login in pending.items()
+        ]
+        if not self.db_manager.update_users_last_login(updates):
+            # 写入失败，合并回缓冲区（期间的新登录更新）
+            with self._dirty_lock:
+                for username, last_login in pending.items():
+                    self._pending_logins.setdefault(username, last_login)
+            return 0
+        
+        self.total_login_flushes += 1
+        self.total_logins_flushed += len(updates)
+        return len(updates)
+    
+    def get_dirty_user_count(self) -> int:
+        """获取待写回数据库的用户数量"""
+        return len(self._dirty_users)
+    
+    def save_users_to_database(self, full: bool = False) -> bool:
+        """
+        将内存中有变化的用户写回数据库
+        
+        Args:
+            full: 是否写回全部用户（默认只写回标记过的用户）
+        """
         if not self.db_manager:
             logger.warning("没有数据库管理器，无法保存数据")
             return False
         
+        # 取出待写回的用户，写入失败时重新标记；写入完成前仍不可淘汰
+        # （按需加载模式下被淘汰的用户会重新加载数据库中的旧数据）
+        with self._dirty_lock:
+            usernames = set(self._users) if full else self._dirty_users
+            self._dirty_users = set()
+            self._saving_users = self._saving_users | usernames
+        
+        if not usernames:
+            return True
+        
         try:
             # 准备用户数据
-            users_data = {}
-            for username, user in self._users.items():
-                users_data[username] = {
-                    'username': user.username,
-                    'password': user.password,
-                    'usertype': user.usertype,
-                    'created_at': user.created_at,
-                    'last_login': user.last_login
-                }
+            users_data = []
+            for username in usernames:
+                user = self._users.get(username)
+                if user:
+                    users_data.append({
+                        'username': user.username,
+                        'password': user.password,
+                        'usertype': user.usertype,
+                        'created_at': user.created_at,
+                        'last_login': user.last_login
+                    })
             
             # 保存到数据库
-            success = self.db_manager.save_all_users(users_data)
+            success = self.db_manager.upsert_users(users_data)
             if success:
                 logger.info(f"成功将 {len(users_data)} 个用户保存到数据库")
+            else:
+                with self._dirty_lock:
+                    self._dirty_users.update(usernames)
             
             return success
             
         except Exception as e:
+            with self._dirty_lock:
+                self._dirty_users.update(usernames)
             logger.error(f"保存用户数据到数据库失败: {e}")
             return False
+        
+        finally:
+            with self._dirty_lock:
+                self._saving_users = self._saving_users - usernames
     
     def _validate_username(self, username: str) -> Dict[str, Any]:
         """
@@ -191,16 +327,13 @@ class UserService:
                     last_login=new_user.last_login
                 )
                 
+                # 插入结果和用户名唯一约束保证写入成功，只在失败时按用户名查询原因
                 if not db_success:
+                    if self.db_manager.user_exists(username):
+                        return {"success": False, "message": "用户名已存在"}
                     logger.error(f"用户 {username} 数据库保存失败")
                     return {"success": False, "message": "数据库保存失败"}
                 
-                # 验证用户是否真的被保存到数据库
-                saved_users = self.db_manager.load_all_users()
-                if not any(u['username'] == username for u in saved_users):
-                    logger.error(f"用户 {username} 保存后验证失败")
-                    return {"success": False, "message": "数据库保存验证失败"}
-                
                 logger.info(f"用户 {username} 已确认保存到数据库")
             
             # 数据库保存成功后，再添加到内存
@@ -215,6 +348,83 @@ class UserService:
             logger.error(f"注册用户 {username} 时发生异常: {str(e)}")
             return {"success": False, "message": f"注册失败: {str(e)}"}
     
+    def register_users(self, users: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量注册用户
+        
+        Args:
+            users: 用户列表，每项包含 username、password、type（默认user）
+            
+        Returns:
+            注册结果字典，包含成功的用户名和失败原因
+        """
+        registered = []
+        failed = []
+        new_users: Dict[str, User] = {}
+        
+        # 逐个验证，重复的用户名（已存在或本批内重复）直接判为失败
+        for item in users:
+            username = (item.get("username") or "").strip()
+            password = (item.get("password") or "").strip()
+            usertype = (item.get("type") or "user").strip()
+            
+            message = None
+            username_validation = self._validate_username(username)
+            password_validation = self._validate_password(password)
+            if not username_validation["valid"]:
+                message = username_validation["message"]
+            elif not password_validation["valid"]:
+                message = password_validation["message"]
+            elif usertype not in ["user", "admin"]:
+                message = "用户类型必须是user或admin"
+            elif username in self._users or username in new_users:
+                message = "用户名已存在"
+            
+            if message:
+                failed.append({"username": username, "message": message})
+            else:
+                new_users[username] = User(username=username, password=password, usertype=usertype)
+        
+        try:
+            # 批量写入数据库，只把写入成功的用户加入内存
+            if self.db_manager and new_users:
+                result = self.db_manager.add_users([
+                    {
+                        "username": user.username,
+                        "password": user.password,
+                        "usertype": user.usertype,
+                        "created_at": user.created_at,
+                        "last_login": user.last_login
+                    }
+                    for user in new_users.values()
+                ])
+                for username in result["duplicates"]:
+                    failed.append({"username": username, "message": "用户名已存在"})
+                    new_users.pop(username, None)
+                for username in result["failed"]:
+                    failed.append({"username": username, "message": "数据库保存失败"})
+                    new_users.pop(username, None)
+            
+            for username, user in new_users.items():
+                self._users[username] = user
+                registered.append(username)
+            
+            logger.info(f"批量注册完成: 成功 {len(registered)} 个，失败 {len(failed)} 个")
+            
+            return {
+                "success": True,
+                "message": "批量注册完成",
+                "data": {
+                    "registered": registered,
+                    "failed": failed,
+                    "registeredCount": len(registered),
+                    "failedCount": len(failed)
+                }
+            }
+        except Exception as e:
+            logger.error(f"批量注册用户时发生异常: {str(e)}")
+            return {"success": False, "message": f"批量注册失败: {str(e)}"}
+    
     def login_user(self, username: str, password: str) -> Dict[str, Any]:
         """
         用户登录验证
@@ -247,7 +457,16 @@ class UserService:
         
         # 如果有数据库管理器，同时更新数据库
         if self.db_manager:
-            self.db_manager.update_user_last_login(username, user.last_login)
+            if self.login_writer_running:
+                # 缓冲后由后台线程批量写入，登录不等待数据库
+                with self._dirty_lock:
+                    self._pending_logins[username] = user.last_login
+                    pending_count = len(self._pending_logins)
+                if pending_count >= DatabaseConfig.LAST_LOGIN_FLUSH_BATCH_SIZE:
+                    self._login_flush_event.set()
+            elif not self.db_manager.update_user_last_login(username, user.last_login):
+                # 失败时标记，稍后写回
+                self.mark_user_dirty(username)
         
         return {
             "success": True,
@@ -282,23 +501,47 @@ class UserService:
             "data": user.to_dict()
         }
     
-    def get_all_users(self) -> Dict[str, Any]:
+    def get_all_users(self, page: Optional[int] = None, page_size: Optional[int] = None) -> Dict[str, Any]:
         """
-        获取所有用户列表
+        获取用户列表
         
+        Args:
+            page: 页码（从1开始），为空时返回全部用户
+            page_size: 每页数量
+            
         Returns:
             用户列表字典
         """
         try:
-            users_list = [user.to_dict() for user in self._users.values()]
+            # 按需加载模式下内存中只有部分用户，从数据库分页查询
+            if self.lazy:
+                page = page or 1
+                page_size = page_size or 100
+                users_list = [
+                    self._user_from_data(user_data).to_dict()
+                    for user_data in self.db_manager.load_users_page((page - 1) * page_size, page_size)
+                ]
+                total = self.db_manager.count_users()
+            else:
+                all_users = list(self._users.values())
+                total = len(all_users)
+                if page:
+                    page_size = page_size or 100
+                    all_users = all_users[(page - 1) * page_size:page * page_size]
+                users_list = [user.to_dict() for user in all_users]
+            
+            data = {
+                "users": users_list,
+                "total": total
+            }
+            if page:
+                data["page"] = page
+                data["pageSize"] = page_size
             
             return {
                 "success": True,
                 "message": "获取用户列表成功",
-                "data": {
-                    "users": users_list,
-                    "total": len(users_list)
-                }
+                "data": data
             }
         except Exception as e:
             return {"success": False, "message": f"获取用户列表失败: {str(e)}"}
@@ -317,12 +560,18 @@ class UserService:
     
     def get_user_count(self) -> int:
         """获取用户总数"""
+        if self.lazy:
+            return self.db_manager.count_users()
         return len(self._users)
     
     def get_admin_count(self) -> int:
         """获取管理员用户数量"""
+        if self.lazy:
+            return self.db_manager.count_users("admin")
         return sum(1 for user in self._users.values() if user.is_admin())
     
     def get_regular_user_count(self) -> int:
         """获取普通用户数量"""
+        if self.lazy:
+            return self.db_manager.count_users("user")
         return sum(1 for user in self._users.values() if not user.is_admin()) 
\ No newline at end of file
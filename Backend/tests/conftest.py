@@ -0,0 +1,6 @@
+"""测试配置：以 Backend 目录为导入根目录（与 run_server.py 等启动脚本一致）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
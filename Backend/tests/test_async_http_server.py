@@ -0,0 +1,186 @@
+"""utils/async_http_server.py：请求解析、keep-alive 和流式响应"""
+
+import asyncio
+
+import pytest
+
+from utils.async_http_server import AsyncHTTPServer
+
+
+async def echo_app(scope, receive, send):
+    """返回请求方法、路径、查询串、请求头 x-test 和请求体"""
+    if scope["type"] != "http":
+        return
+    message = await receive()
+    headers = dict(scope["headers"])
+    body = b"|".join([
+        scope["method"].encode(), scope["path"].encode(), scope["query_string"],
+        headers.get(b"x-test", b""), message["body"]
+    ])
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def stream_app(scope, receive, send):
+    """分三块发送响应体"""
+    if scope["type"] != "http":
+        return
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    for chunk in (b"first", b"", b"second"):
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def run_with_server(app, client, **options):
+    """在临时端口上启动服务器，执行 client(host, port) 后关闭"""
+    async def main():
+        server = AsyncHTTPServer(app, "127.0.0.1", 0, **options)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            return await client("127.0.0.1", port), server
+        finally:
+            server._server.close()
+            await server._server.wait_closed()
+
+    return asyncio.run(main())
+
+
+async def read_response(reader):
+    """读取一个响应，返回 (状态码, 响应头, 响应体)，支持 Content-Length 和分块传输"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head[:-4].decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding") == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readuntil(b"\r\n"))[:-2], 16)
+            data = await reader.readexactly(size + 2)
+            if size == 0:
+                return status, headers, body
+            body += data[:-2]
+    return status, headers, await reader.readexactly(int(headers.get("content-length", 0)))
+
+
+def test_parses_request_line_headers_and_body():
+    async def client(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"POST /api/echo%20x?a=1&b=2 HTTP/1.1\r\nHost: x\r\nX-Test:  value \r\n"
+                     b"Content-Length: 5\r\n\r\nhello")
+        response = await read_response(reader)
+        writer.close()
+        return response
+
+    (status, headers, body), _ = run_with_server(echo_app, client)
+    assert status == 200
+    assert body == b"POST|/api/echo x|a=1&b=2|value|hello"
+    assert headers["content-length"] == str(len(body))
+
+
+@pytest.mark.parametrize("request_bytes, expected_status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"GET / FTP/1.0\r\n\r\n", 400),
+    (b"GET / HTTP/1.1\r\nno-colon-header\r\n\r\n", 400),
+    (b"GET / HTTP/1.1\r\nContent-Length: abc\r\n\r\n", 400),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n", 501),
+    (b"POST / HTTP/1.1\r\nContent-Length: 2048\r\n\r\n", 413),
+])
+def test_rejects_malformed_requests(request_bytes, expected_status):
+    async def client(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(request_bytes)
+        response = await read_response(reader)
+        # 出错后服务器关闭连接
+        assert await reader.read() == b""
+        writer.close()
+        return response
+
+    (status, headers, _), _ = run_with_server(echo_app, client, max_body_size=1024)
+    assert status == expected_status
+    assert headers["connection"] == "close"
+
+
+def test_keep_alive_serves_several_requests_on_one_connection():
+    async def client(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        responses = []
+        for index in range(3):
+            writer.write(b"GET /r%d HTTP/1.1\r\nHost: x\r\n\r\n" % index)
+            responses.append(await read_response(reader))
+        writer.write(b"GET /last HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+        responses.append(await read_response(reader))
+        closed = await reader.read() == b""
+        writer.close()
+        return responses, closed
+
+    (responses, closed), server = run_with_server(echo_app, client)
+    assert [body.split(b"|")[1] for _, _, body in responses] == [b"/r0", b"/r1", b"/r2", b"/last"]
+    assert [headers["connection"] for _, headers, _ in responses] == ["keep-alive"] * 3 + ["close"]
+    assert closed
+    assert server.total_connections == 1
+    assert server.total_requests == 4
+
+
+def test_http_1_0_closes_without_keep_alive_header():
+    async def client(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"GET / HTTP/1.0\r\n\r\n")
+        response = await read_response(reader)
+        closed = await reader.read() == b""
+        writer.close()
+        return response, closed
+
+    ((_, headers, _), closed), _ = run_with_server(echo_app, client)
+    assert headers["connection"] == "close"
+    assert closed
+
+
+def test_idle_connection_closed_after_keepalive_timeout():
+    async def client(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        data = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        return data
+
+    data, _ = run_with_server(echo_app, client, keepalive_timeout=0.2)
+    assert data == b""
+
+
+def test_streaming_response_uses_chunked_encoding():
+    async def client(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"GET /stream HTTP/1.1\r\nHost: x\r\n\r\n")
+        first = await read_response(reader)
+        # 分块响应结束后连接仍可复用
+        writer.write(b"GET /stream HTTP/1.1\r\nHost: x\r\n\r\n")
+        second = await read_response(reader)
+        writer.close()
+        return first, second
+
+    (first, second), _ = run_with_server(stream_app, client)
+    for status, headers, body in (first, second):
+        assert status == 200
+        assert headers["transfer-encoding"] == "chunked"
+        assert "content-length" not in headers
+        assert body == b"firstsecond"
+
+
+def test_rejects_connections_over_limit():
+    async def client(host, port):
+        first_reader, first_writer = await asyncio.open_connection(host, port)
+        await asyncio.sleep(0.1)
+        reader, writer = await asyncio.open_connection(host, port)
+        response = await read_response(reader)
+        first_writer.close()
+        writer.close()
+        return response
+
+    (status, _, _), server = run_with_server(echo_app, client, max_connections=1)
+    assert status == 503
+    assert server.rejected_connections == 1
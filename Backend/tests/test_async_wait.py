@@ -0,0 +1,179 @@
+"""utils/async_wait.py 和 asgi.py：等待不占用线程的流式响应和长轮询"""
+
+import asyncio
+import threading
+import time
+
+from flask import Flask, jsonify
+
+from asgi import WSGIToASGI
+from utils.async_wait import DeferredResponse, Wait, Wakeup, run_blocking, stream_with_waits
+
+
+def set_later(wakeup: Wakeup, delay: float):
+    timer = threading.Timer(delay, wakeup.set)
+    timer.start()
+    return timer
+
+
+def test_wakeup_thread_wait():
+    wakeup = Wakeup()
+    assert not wakeup.wait(0.01)
+    set_later(wakeup, 0.05)
+    assert wakeup.wait(2)
+    assert wakeup.is_set()
+
+
+def test_wakeup_async_wait_resolved_from_other_thread():
+    async def main():
+        wakeup = Wakeup()
+        assert not await wakeup.wait_async(0.01)
+        set_later(wakeup, 0.05)
+        started = time.monotonic()
+        assert await wakeup.wait_async(2)
+        return time.monotonic() - started, wakeup
+
+    elapsed, wakeup = asyncio.run(main())
+    assert elapsed < 1
+    # 超时和完成的等待都不留下回调
+    assert wakeup._callbacks == []
+
+
+def test_wakeup_already_set_returns_immediately():
+    wakeup = Wakeup()
+    wakeup.set()
+    assert asyncio.run(wakeup.wait_async(0))
+    assert wakeup.wait(0)
+
+
+def test_run_blocking_returns_generator_value():
+    def waits():
+        wakeup = Wakeup()
+        set_later(wakeup, 0.02)
+        yield Wait(wakeup, 2)
+        yield Wait(Wakeup(), 0.01)
+        return "done"
+
+    assert run_blocking(waits()) == "done"
+
+
+def test_stream_with_waits_blocks_for_sync_servers():
+    closed = []
+
+    def stream():
+        try:
+            yield b"a"
+            yield Wait(Wakeup(), 0.01)
+            yield b"b"
+        finally:
+            closed.append(True)
+
+    items = list(stream_with_waits(stream(), {}))
+    assert items == [b"a", b"b"]
+    assert closed == [True]
+
+    iterable = stream()
+    assert stream_with_waits(iterable, {"echarge.async_wait": True}) is iterable
+
+
+def make_app(wakeups):
+    app = Flask(__name__)
+
+    @app.route("/stream")
+    def stream():
+        from flask import request
+
+        def body():
+            yield b"start;"
+            wakeup = wakeups.setdefault("stream", Wakeup())
+            yield Wait(wakeup, 5)
+            yield b"woken"
+        return app.response_class(stream_with_waits(body(), request.environ), mimetype="text/plain")
+
+    @app.route("/poll/<name>")
+    def poll(name):
+        def waits():
+            wakeup = wakeups.setdefault(name, Wakeup())
+            yield Wait(wakeup, 0.2 if name == "timeout" else 5)
+            return wakeup.is_set()
+
+        def finish(changed):
+            if changed:
+                return jsonify(changed=True)
+            return jsonify(changed=False), 404
+
+        return DeferredResponse(waits(), finish)
+
+    @app.route("/plain")
+    def plain():
+        return "ok"
+
+    return app
+
+
+async def call(application, path):
+    """直接调用 ASGI 应用，返回 (状态码, 响应头, 响应体)"""
+    messages = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+             "http_version": "1.1", "server": ("test", 80), "client": ("127.0.0.1", 1)}
+    await application(scope, receive, send)
+    start = messages[0]
+    assert start["type"] == "http.response.start"
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_adapter_waits_without_holding_handler_threads():
+    wakeups = {}
+    application = WSGIToASGI(make_app(wakeups), max_threads=1)
+
+    async def main():
+        # 一个处理线程上同时挂起事件流和长轮询，其他请求仍然可以处理
+        stream = asyncio.ensure_future(call(application, "/stream"))
+        poll = asyncio.ensure_future(call(application, "/poll/change"))
+        await asyncio.sleep(0.2)
+        plain = await asyncio.wait_for(call(application, "/plain"), 2)
+        assert not stream.done() and not poll.done()
+
+        set_later(wakeups["stream"], 0)
+        set_later(wakeups["change"], 0)
+        return plain, await asyncio.wait_for(stream, 2), await asyncio.wait_for(poll, 2)
+
+    plain, stream, poll = asyncio.run(main())
+    assert plain[0] == 200 and plain[2] == b"ok"
+    assert stream[0] == 200 and stream[2] == b"start;woken"
+    assert poll[0] == 200 and poll[2] == b'{"changed":true}\n'
+    assert poll[1][b"content-length"] == str(len(poll[2])).encode()
+
+
+def test_deferred_response_status_decided_after_wait():
+    application = WSGIToASGI(make_app({}), max_threads=1)
+    status, _, body = asyncio.run(call(application, "/poll/timeout"))
+    assert status == 404
+    assert body == b'{"changed":false}\n'
+
+
+def test_deferred_response_with_sync_server():
+    wakeups = {}
+    client = make_app(wakeups).test_client()
+
+    response = client.get("/poll/timeout")
+    assert response.status_code == 404
+    assert response.get_json() == {"changed": False}
+
+    wakeups["change"] = Wakeup()
+    set_later(wakeups["change"], 0.05)
+    response = client.get("/poll/change")
+    assert response.status_code == 200
+    assert response.get_json() == {"changed": True}
@@ -0,0 +1,70 @@
+"""utils/auth_token.py：签名令牌的签发、验证和过期"""
+
+import time
+
+from utils.auth_token import AuthTokenService
+
+
+def test_issue_and_verify():
+    service = AuthTokenService("secret", ttl=60)
+    token = service.issue("alice", "admin")
+
+    claims = service.verify(token)
+    assert claims["username"] == "alice"
+    assert claims["role"] == "admin"
+    assert claims["expires"] > time.time()
+
+    # 第二次验证命中缓存
+    assert service.verify(token) == claims
+    assert service.verified == 1
+    assert service.cache_hits == 1
+
+
+def test_tampered_and_foreign_tokens_are_rejected():
+    service = AuthTokenService("secret", ttl=60)
+    token = service.issue("alice", "user")
+    body, signature = token.split(".")
+
+    forged = AuthTokenService("secret", ttl=60).issue("alice", "admin").split(".")[0]
+    assert service.verify(f"{forged}.{signature}") is None
+    assert service.verify(f"{body}.{signature[:-2]}xx") is None
+    assert service.verify(AuthTokenService("other", ttl=60).issue("alice", "user")) is None
+    assert service.verify("garbage") is None
+    assert service.rejected == 4
+
+
+def test_expired_tokens_are_rejected():
+    service = AuthTokenService("secret", ttl=1)
+    token = service.issue("alice", "user")
+    assert service.verify(token) is not None
+
+    time.sleep(2.1)
+    # 缓存中的令牌过期后同样拒绝
+    assert service.verify(token) is None
+    assert service.verify(service.issue("alice", "user")) is not None
+
+
+def test_verify_cache_is_bounded():
+    service = AuthTokenService("secret", ttl=60, cache_size=2)
+    tokens = [service.issue(f"user{i}", "user") for i in range(3)]
+    for token in tokens:
+        service.verify(token)
+    assert service.get_statistics()["cached"] == 2
+    assert service.verify(tokens[0])["username"] == "user0"
+    assert service.cache_hits == 0
+
+
+def test_purpose_tokens_are_not_session_tokens():
+    service = AuthTokenService("secret", ttl=3600)
+    session_token = service.issue("alice", "user")
+    stream_token = service.issue("alice", "user", purpose="events", ttl=60)
+
+    claims = service.verify(stream_token, purpose="events")
+    assert claims["username"] == "alice"
+    assert claims["expires"] <= time.time() + 60
+    # 验证缓存命中时同样检查用途
+    assert service.verify(stream_token) is None
+    assert service.verify(session_token, purpose="events") is None
+    assert service.verify(session_token)["username"] == "alice"
+    assert service.verify(session_token, purpose="events") is None
+    assert service.verify(service.issue("alice", "user", purpose="other"), purpose="events") is None
@@ -0,0 +1,89 @@
+"""database/bill_ledger.py：定长详单账本的读写、崩溃截断和索引补齐"""
+
+import os
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from database.bill_ledger import RECORD_SIZE, BillLedger
+
+
+def make_bill(index: int, user_id: str, generate_time: datetime):
+    return SimpleNamespace(
+        bill_id=f"B{index:04d}", user_id=user_id, pile_id="A",
+        status=SimpleNamespace(value="COMPLETED"), price_type=SimpleNamespace(value="平时"),
+        energy_amount=10.0 + index, start_time=generate_time - timedelta(hours=1),
+        end_time=generate_time, unit_price=0.7, charge_cost=7.0, service_cost=8.0,
+        generate_time=generate_time
+    )
+
+
+def fill(directory, count: int = 6) -> BillLedger:
+    ledger = BillLedger()
+    ledger.open(str(directory))
+    base = datetime(2024, 5, 1, 12, 0)
+    for i in range(count):
+        ledger.append(make_bill(i, "alice" if i % 2 == 0 else "bob", base + timedelta(days=i // 2)))
+    return ledger
+
+
+def test_round_trip(tmp_path):
+    ledger = fill(tmp_path)
+    ledger.close()
+
+    ledger = BillLedger()
+    ledger.open(str(tmp_path))
+    try:
+        assert ledger.row_count == 6
+        bills = ledger.query(user_id="alice")
+        assert [bill["bill_id"] for bill in bills] == ["B0000", "B0002", "B0004"]
+        assert bills[0]["status"] == "COMPLETED"
+        assert bills[0]["price_type"] == "平时"
+        assert bills[0]["total_cost"] == 15.0
+        assert bills[1]["generate_time"] == datetime(2024, 5, 2, 12, 0)
+
+        day = ledger.query(start_date=date(2024, 5, 2), end_date=date(2024, 5, 2))
+        assert [bill["bill_id"] for bill in day] == ["B0002", "B0003"]
+        assert ledger.query(user_id="bob", limit=2)[-1]["bill_id"] == "B0003"
+        assert ledger.query(user_id="nobody") == []
+    finally:
+        ledger.close()
+
+
+def test_partial_record_is_truncated(tmp_path):
+    fill(tmp_path, 3).close()
+
+    # 模拟写到一半时崩溃
+    with open(tmp_path / BillLedger.DATA_FILE, "ab") as f:
+        f.write(b"\x01" * (RECORD_SIZE // 2))
+
+    ledger = BillLedger()
+    ledger.open(str(tmp_path))
+    assert ledger.row_count == 3
+    assert os.path.getsize(tmp_path / BillLedger.DATA_FILE) == 3 * RECORD_SIZE
+
+    ledger.append(make_bill(9, "carol", datetime(2024, 5, 3, 12, 0)))
+    ledger.close()
+
+    ledger.open(str(tmp_path))
+    try:
+        assert ledger.row_count == 4
+        assert [bill["bill_id"] for bill in ledger.query(user_id="carol")] == ["B0009"]
+    finally:
+        ledger.close()
+
+
+def test_lagging_indexes_are_rebuilt(tmp_path):
+    fill(tmp_path).close()
+
+    # 数据记录已写入，旁路索引落后（崩溃发生在写索引之前）
+    os.truncate(tmp_path / BillLedger.USER_INDEX_FILE, 2 * 4)
+    os.truncate(tmp_path / BillLedger.DATE_INDEX_FILE, 16)
+
+    ledger = BillLedger()
+    ledger.open(str(tmp_path))
+    try:
+        assert [bill["bill_id"] for bill in ledger.query(user_id="bob")] == ["B0001", "B0003", "B0005"]
+        day = ledger.query(start_date=date(2024, 5, 3))
+        assert [bill["bill_id"] for bill in day] == ["B0004", "B0005"]
+    finally:
+        ledger.close()
@@ -0,0 +1,37 @@
+"""services/charging_pile_service.py：充电循环中充电完成的充电桩被标记为待同步"""
+
+from services.charging_pile_service import ChargingPileService, loop_supervisor
+from models.charging_pile_model import PileStatus
+
+
+def make_service(monkeypatch):
+    steps = {}
+    monkeypatch.setattr(loop_supervisor, "start_loop",
+                        lambda name, step, period, **kwargs: steps.setdefault(name, step))
+    monkeypatch.setattr(loop_supervisor, "stop_loop",
+                        lambda name, **kwargs: steps.pop(name, None))
+    return ChargingPileService(), steps
+
+
+def test_charging_step_marks_finished_pile_dirty(monkeypatch):
+    service, steps = make_service(monkeypatch)
+    # 每秒充电量大于请求电量，一次迭代即完成充电
+    assert service.start_charging("A", "alice", 0.001)
+    service._dirty_piles.clear()
+
+    [charging_step] = [step for name, step in steps.items() if name.startswith("pile_charging:A:")]
+    charging_step()
+
+    assert service.get_pile("A").status == PileStatus.ACTIVE
+    assert service._dirty_piles == {"A"}
+
+
+def test_monitor_marks_finished_pile_dirty(monkeypatch):
+    service, steps = make_service(monkeypatch)
+    assert service.start_charging("C", "bob", 0.001)
+    service._dirty_piles.clear()
+
+    steps["pile_monitor"]()
+
+    assert service.get_pile("C").status == PileStatus.ACTIVE
+    assert service._dirty_piles == {"C"}
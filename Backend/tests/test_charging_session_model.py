@@ -0,0 +1,11 @@
+"""models/charging_session_model.py：按需计算的展示字段"""
+
+from models.charging_session_model import ChargingSession
+
+
+def test_zero_requested_amount_reports_zero_progress():
+    session = ChargingSession("SESSION_alice_A_1", "alice", "A", 0.0, 30.0)
+
+    assert session.progress_percent == 0.0
+    assert session.to_dict()["progressPercent"] == 0.0
+    assert session.get_simple_status()["progressPercent"] == 0.0
@@ -0,0 +1,109 @@
+"""services/dashboard_service.py：since 只省略版本未变化的分区；用户统计取自详单和归档汇总"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.charging_process_service as process_module
+import services.dashboard_service as dashboard_module
+from database.session_archive import SessionArchive
+from models.charging_bill_model import ChargingBill
+from models.charging_session_model import ChargingSession
+from services.charging_process_service import ChargingProcessService
+from services.dashboard_service import DashboardService
+from utils.state_version import state_versions, history_key, PILES, QUEUE
+
+
+@pytest.fixture
+def process(tmp_path, monkeypatch):
+    """独立的充电过程服务和归档，不影响全局单例"""
+    archive = SessionArchive()
+    monkeypatch.setattr(process_module, "session_archive", archive)
+    service = ChargingProcessService()
+    monkeypatch.setattr(dashboard_module, "charging_process_service", service)
+    yield service
+    archive.close()
+
+
+def finish_session(service, index, user_id, amount):
+    start = datetime(2024, 5, 1, 8) + timedelta(hours=index)
+    session = ChargingSession(f"SESSION_{user_id}_A_{index}", user_id, "A", amount, 30.0)
+    session.start_charging()
+    session.update_progress(amount)
+    session.start_time, session.end_time = start, start + timedelta(minutes=40)
+    bill = ChargingBill(user_id, "A", amount, session.start_time, session.end_time)
+    service.completed_sessions.append(session)
+    service.session_bills[session.session_id] = bill
+    return bill
+
+
+def test_since_omits_only_unchanged_sections(process):
+    dashboard = DashboardService()
+    first = dashboard.get_user_dashboard("dash-alice")
+    assert first["unchanged"] == []
+    assert set(DashboardService.SECTIONS) <= set(first)
+
+    repeat = dashboard.get_user_dashboard("dash-alice", since=first["version"])
+    assert repeat["unchanged"] == list(DashboardService.SECTIONS)
+    assert repeat["version"] == first["version"]
+    assert not set(DashboardService.SECTIONS) & set(repeat)
+
+    # 排队状态整体变化：前车数量和充电区状态依赖全局排队版本，用户没有排队时排队和充电状态不变
+    state_versions.bump(QUEUE)
+    changed = dashboard.get_user_dashboard("dash-alice", since=first["version"])
+    assert changed["unchanged"] == ["charging", "queue", "statistics"]
+    assert set(changed) == {"version", "aheadCount", "chargeArea", "unchanged"}
+
+    state_versions.bump(PILES)
+    state_versions.bump(history_key("dash-alice"))
+    changed_again = dashboard.get_user_dashboard("dash-alice", since=changed["version"])
+    assert changed_again["unchanged"] == ["charging", "queue", "aheadCount"]
+    assert set(changed_again) == {"version", "chargeArea", "statistics", "unchanged"}
+
+    # 版本号格式不正确时返回全部分区
+    assert dashboard.get_user_dashboard("dash-alice", since="bogus")["unchanged"] == []
+
+
+def test_charging_section_follows_session_progress(process):
+    dashboard = DashboardService()
+    session = ChargingSession("SESSION_dash-bob_A_1", "dash-bob", "A", 20.0, 30.0)
+    session.start_charging()
+    process.active_sessions[session.session_id] = session
+    process.user_sessions["dash-bob"] = session.session_id
+
+    first = dashboard.get_user_dashboard("dash-bob")
+    assert first["charging"]["chargedAmount"] == 0.0
+    assert "charging" in dashboard.get_user_dashboard("dash-bob", since=first["version"])["unchanged"]
+
+    session.update_progress(5.0)
+    progressed = dashboard.get_user_dashboard("dash-bob", since=first["version"])
+    assert progressed["charging"]["chargedAmount"] == 5.0
+    assert progressed["charging"]["progressPercent"] == 25.0
+    assert "charging" not in progressed["unchanged"]
+
+
+def test_statistics_use_bill_totals_including_archive(process, tmp_path):
+    dashboard = DashboardService()
+    bills = [finish_session(process, i, "dash-carol", 10.0 + i) for i in range(3)]
+    finish_session(process, 3, "dash-dave", 50.0)
+
+    expected = {
+        "chargeCount": 3,
+        "totalEnergy": round(sum(bill.energy_amount for bill in bills), 1),
+        "totalCost": round(sum(bill.total_cost for bill in bills), 2)
+    }
+    assert dashboard.get_user_statistics("dash-carol") == expected
+
+    # 归档后从内存移除，统计不变，并与全局归档汇总一致
+    process.enable_archive(str(tmp_path / "archive"), 0)
+    assert process.archive_completed_sessions() == 4
+    assert process.completed_sessions == []
+    assert dashboard.get_user_statistics("dash-carol") == expected
+
+    # 重新打开归档时按用户汇总
+    process_module.session_archive.close()
+    process.enable_archive(str(tmp_path / "archive"), 0)
+    assert dashboard.get_user_statistics("dash-carol") == expected
+    carol, dave = process.get_user_charging_totals("dash-carol"), process.get_user_charging_totals("dash-dave")
+    assert process.get_charging_statistics()["totalCost"] == round(carol[2] + dave[2], 2)
+    assert dashboard.get_user_statistics("dash-nobody") == {"chargeCount": 0, "totalEnergy": 0.0, "totalCost": 0.0}
@@ -0,0 +1,117 @@
+"""services/event_bus.py：持有服务锁时发布的事件在锁释放后才放入订阅方队列"""
+
+import threading
+import time
+
+from services.event_bus import BackpressurePolicy, Event, EventBus, EventType
+
+
+def test_deferred_publishes_after_outermost_scope():
+    bus = EventBus()
+    subscription = bus.subscribe("test", lambda event: None)
+
+    with bus.deferred():
+        bus.publish(Event(EventType.CAR_QUEUED, "alice"))
+        with bus.deferred():
+            bus.publish(Event(EventType.CAR_DISPATCHED, "alice", "A"))
+        # 内层作用域结束时不发布
+        assert subscription.depth() == 0
+
+    assert [event.type for event in subscription.take_batch(10)] == [
+        EventType.CAR_QUEUED, EventType.CAR_DISPATCHED
+    ]
+    assert bus.total_published == 2
+
+
+def test_block_subscriber_does_not_wait_while_lock_held():
+    bus = EventBus()
+    subscription = bus.subscribe("slow", lambda event: None, maxsize=1,
+                                 policy=BackpressurePolicy.BLOCK, block_timeout=0.2)
+    bus.publish(Event(EventType.SESSION_PROGRESS, "alice"))
+
+    service_lock = threading.Lock()
+    held_during_publish = []
+    publish = bus._publish
+
+    def record(event):
+        held_during_publish.append(service_lock.locked())
+        publish(event)
+
+    bus._publish = record
+
+    started = time.monotonic()
+    with bus.deferred(), service_lock:
+        bus.publish(Event(EventType.SESSION_PROGRESS, "alice"))
+        locked_for = time.monotonic() - started
+
+    # 持锁期间只暂存事件；队列已满的等待发生在锁释放之后，超时后丢弃新事件
+    assert locked_for < 0.1
+    assert held_during_publish == [False]
+    assert subscription.dropped == 1
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_events_published_while_stopped_are_delivered_after_restart():
+    bus = EventBus()
+    received = []
+    bus.subscribe("test", lambda event: received.append(event.user_id))
+
+    bus.start(workers=2)
+    bus.publish(Event(EventType.CAR_QUEUED, "alice"))
+    assert wait_until(lambda: received == ["alice"])
+    bus.stop()
+
+    # 停止期间发布的事件保留在订阅方队列中
+    bus.publish(Event(EventType.CAR_QUEUED, "bob"))
+    bus.publish(Event(EventType.CAR_QUEUED, "carol"))
+    assert received == ["alice"]
+
+    bus.start(workers=2)
+    try:
+        assert wait_until(lambda: received == ["alice", "bob", "carol"])
+        bus.publish(Event(EventType.CAR_QUEUED, "dave"))
+        assert wait_until(lambda: received[-1:] == ["dave"])
+    finally:
+        bus.stop()
+
+
+def test_restart_discards_stop_signals_left_in_ready_queue():
+    bus = EventBus()
+    received = []
+    bus.subscribe("test", lambda event: received.append(event.user_id))
+    # 上次停止时已退出的投递线程没有取走的停止信号
+    bus._ready.put(None)
+
+    bus.start(workers=1)
+    try:
+        bus.publish(Event(EventType.CAR_QUEUED, "alice"))
+        assert wait_until(lambda: received == ["alice"])
+    finally:
+        bus.stop()
+
+
+def test_delivery_statistics_count_every_event():
+    bus = EventBus()
+
+    def handler(event):
+        if event.user_id == "fail":
+            raise ValueError("处理失败")
+
+    subscription = bus.subscribe("test", handler)
+    bus.start(workers=4)
+    try:
+        for i in range(500):
+            bus.publish(Event(EventType.SESSION_PROGRESS, "fail" if i % 10 == 0 else "alice"))
+        assert wait_until(lambda: subscription.get_statistics()["delivered"] == 500)
+    finally:
+        bus.stop()
+
+    stats = subscription.get_statistics()
+    assert stats["errors"] == 50
+    assert stats["depth"] == 0
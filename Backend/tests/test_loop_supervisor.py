@@ -0,0 +1,108 @@
+"""utils/loop_supervisor.py：迭代出错的指数退避、线程退出后的重启，以及健康状态"""
+
+import threading
+import time
+
+from utils.loop_supervisor import BACKOFF, DEAD, RUNNING, STALLED, LoopSupervisor
+
+
+class ThreadKilled(BaseException):
+    """不被迭代错误处理捕获，使循环线程退出"""
+
+
+def make_supervisor(backoff=0.05, backoff_max=0.2, stall_timeout=60.0):
+    supervisor = LoopSupervisor()
+    supervisor.WATCHDOG_INTERVAL = 0.02
+    supervisor.configure(stall_timeout, backoff, backoff_max)
+    return supervisor
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+def loop_info(supervisor, name):
+    return next(info for info in supervisor.get_health()["loops"] if info["name"] == name)
+
+
+def test_failing_iterations_back_off_exponentially_then_recover():
+    supervisor = make_supervisor()
+    calls = []
+    in_backoff = []
+
+    def step():
+        calls.append(time.monotonic())
+        if len(calls) > 1:
+            # 上一次迭代出错后处于退避状态，关键循环未就绪
+            in_backoff.append((loop_info(supervisor, "dispatch")["state"], supervisor.get_health()["ready"],
+                               supervisor.get_loop_states()[("dispatch",)]))
+        if len(calls) <= 4:
+            raise RuntimeError(f"第 {len(calls)} 次出错")
+
+    supervisor.start_loop("dispatch", step, period=0.01)
+    try:
+        assert wait_until(lambda: loop_info(supervisor, "dispatch")["iterations"] >= 2)
+        info = loop_info(supervisor, "dispatch")
+        health = supervisor.get_health()
+    finally:
+        supervisor.stop_loop("dispatch")
+
+    assert [supervisor._backoff_delay(attempt) for attempt in (1, 2, 3, 4)] == [0.05, 0.1, 0.2, 0.2]
+    gaps = [later - earlier for earlier, later in zip(calls, calls[1:5])]
+    for gap, retry in zip(gaps, (0.05, 0.1, 0.2, 0.2)):
+        assert gap >= retry * 0.9
+    assert in_backoff[:4] == [(BACKOFF, False, 0)] * 4
+
+    assert info["failures"] == 4
+    assert info["consecutiveFailures"] == 0
+    assert info["lastError"] == "RuntimeError: 第 4 次出错"
+    assert info["state"] == RUNNING
+    assert health["ready"] and health["live"]
+
+
+def test_exited_thread_is_restarted_with_backoff(monkeypatch):
+    monkeypatch.setattr(threading, "excepthook", lambda args: None)
+    supervisor = make_supervisor()
+    calls = []
+
+    def step():
+        calls.append(time.monotonic())
+        if len(calls) <= 2:
+            raise ThreadKilled()
+
+    supervisor.start_loop("monitor", step, period=0.01)
+    try:
+        assert wait_until(lambda: loop_info(supervisor, "monitor")["state"] == DEAD, timeout=1)
+        assert supervisor.get_health()["ready"] is False
+
+        assert wait_until(lambda: loop_info(supervisor, "monitor")["iterations"] >= 1)
+        info = loop_info(supervisor, "monitor")
+    finally:
+        supervisor.stop_loop("monitor")
+
+    assert info["restarts"] == 2
+    assert info["state"] == RUNNING
+    # 第二次重启的等待是第一次的两倍
+    assert calls[1] - calls[0] >= 0.05 * 0.9
+    assert calls[2] - calls[1] >= 0.1 * 0.9
+
+
+def test_stalled_critical_loop_is_not_live():
+    supervisor = make_supervisor(stall_timeout=0.05)
+    release = threading.Event()
+    supervisor.start_loop("dispatch", lambda: release.wait(5), period=0.01)
+    supervisor.start_loop("pile_charging:A:1", lambda: release.wait(5), period=0.01, critical=False)
+    try:
+        assert wait_until(lambda: loop_info(supervisor, "dispatch")["state"] == STALLED)
+        health = supervisor.get_health()
+        assert health["live"] is False and health["ready"] is False
+        assert supervisor.get_loop_states() == {("dispatch",): 0}
+    finally:
+        release.set()
+        supervisor.stop_loop("dispatch")
+        supervisor.stop_loop("pile_charging:A:1")
+
+    assert supervisor.get_health() == {"live": True, "ready": True, "loops": []}
@@ -0,0 +1,77 @@
+"""utils/metrics.py：Prometheus 文本格式输出（标签转义、直方图累计分桶、_sum/_count）和分片汇总"""
+
+import threading
+
+from utils.metrics import MetricsRegistry
+
+
+def test_counter_labels_are_escaped():
+    registry = MetricsRegistry()
+    requests = registry.counter("echarge_requests_total", "请求数", ("path", "status"))
+    requests.inc(("/api/queue", "200"))
+    requests.inc(("/api/queue", "200"), amount=2)
+    requests.inc(('say "hi"\\\n', "500"))
+
+    assert registry.render() == (
+        "# HELP echarge_requests_total 请求数\n"
+        "# TYPE echarge_requests_total counter\n"
+        'echarge_requests_total{path="/api/queue",status="200"} 3\n'
+        'echarge_requests_total{path="say \\"hi\\"\\\\\\n",status="500"} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    registry = MetricsRegistry()
+    latency = registry.histogram("echarge_latency_seconds", "延迟", ("route",), buckets=(0.1, 0.5, 1))
+    # 等于上界的值计入该分桶（le 含边界）
+    for value in (0.05, 0.1, 0.3, 0.5, 2.0):
+        latency.observe(value, ("queue",))
+
+    assert registry.render().splitlines() == [
+        "# HELP echarge_latency_seconds 延迟",
+        "# TYPE echarge_latency_seconds histogram",
+        'echarge_latency_seconds_bucket{route="queue",le="0.1"} 2',
+        'echarge_latency_seconds_bucket{route="queue",le="0.5"} 4',
+        'echarge_latency_seconds_bucket{route="queue",le="1"} 4',
+        'echarge_latency_seconds_bucket{route="queue",le="+Inf"} 5',
+        'echarge_latency_seconds_sum{route="queue"} 2.95',
+        'echarge_latency_seconds_count{route="queue"} 5',
+    ]
+
+
+def test_thread_shards_and_remote_totals_are_summed():
+    registry = MetricsRegistry()
+    requests = registry.counter("echarge_requests_total", "请求数")
+    in_flight = registry.gauge("echarge_in_flight", "处理中的请求")
+    requests.inc()
+
+    # 已结束线程的分片并入累计值
+    worker = threading.Thread(target=lambda: [requests.inc() for _ in range(4)])
+    worker.start()
+    worker.join()
+    in_flight.inc(amount=3)
+    in_flight.dec()
+
+    registry.merge_remote("worker-1", {("echarge_requests_total", ()): [10.0]})
+    registry.merge_remote("worker-1", {("echarge_requests_total", ()): [20.0]})
+
+    lines = registry.render().splitlines()
+    assert "echarge_requests_total 25" in lines
+    assert "echarge_in_flight 2" in lines
+    assert registry.export(["echarge_requests_total"]) == {("echarge_requests_total", ()): [5.0]}
+
+
+def test_gauge_funcs_and_filters():
+    registry = MetricsRegistry()
+    registry.gauge_func("echarge_piles", "充电桩数量", lambda: {("charging",): 2, ("idle",): 3}, ("state",))
+    registry.gauge_func("echarge_utilization", "利用率", lambda: 0.4)
+    registry.gauge_func("echarge_broken", "读取失败", lambda: 1 / 0)
+
+    text = registry.render()
+    assert 'echarge_piles{state="charging"} 2\necharge_piles{state="idle"} 3\n' in text
+    assert "echarge_utilization 0.4\n" in text
+    # 读取失败的指标不输出
+    assert "echarge_broken" not in text
+
+    assert registry.render(include=["echarge_utilization"]).startswith("# HELP echarge_utilization")
+    assert "echarge_piles" not in registry.render(exclude=["echarge_piles"])
@@ -0,0 +1,82 @@
+"""services/push_service.py：按用户分发事件、同类事件合并，以及连接断开后的订阅清理"""
+
+import threading
+import time
+
+import services.push_service as push_module
+from services.push_service import PushService
+from utils.async_wait import Wait
+
+
+def take(push, sub_id):
+    """取出待发送的推送事件（不含排队状态）"""
+    events = push.next_events(sub_id, 0)
+    return {event["event"]: event["data"] for event in events if event["event"] != push_module.QUEUE_EVENT}
+
+
+def test_publish_fans_out_to_every_subscription_of_the_user():
+    push = PushService()
+    first = push.subscribe("alice")
+    second = push.subscribe("alice")
+    other = push.subscribe("bob")
+
+    push.publish("alice", "progress", {"percent": 10})
+    push.publish("alice", "progress", {"percent": 20})
+    push.publish("alice", "session_completed", {"percent": 100})
+    push.publish("carol", "progress", {"percent": 50})
+
+    expected = {"progress": {"percent": 20}, "session_completed": {"percent": 100}}
+    assert take(push, first) == expected
+    assert take(push, second) == expected
+    assert take(push, other) == {}
+    # 每个订阅只保留最新一条进度
+    assert push.get_statistics()["totalCoalesced"] == 2
+    assert push.total_published == 3
+
+
+def test_unsubscribe_wakes_waiting_reader_and_drops_user():
+    push = PushService()
+    sub_id = push.subscribe("alice")
+    take(push, sub_id)
+
+    result = []
+    reader = threading.Thread(target=lambda: result.append(push.next_events(sub_id, 5)))
+    reader.start()
+    time.sleep(0.1)
+    push.unsubscribe(sub_id)
+    reader.join(1)
+
+    # 工作进程的事件流在 next_events 返回 None 时结束
+    assert result == [None]
+    assert push.get_statistics()["activeSubscriptions"] == 0
+    assert push.get_statistics()["subscribedUsers"] == 0
+    push.publish("alice", "progress", {"percent": 10})
+    assert push.total_published == 0
+
+
+def test_stream_ends_when_subscription_is_removed():
+    push = PushService()
+    sub_id = push.subscribe("alice")
+    stream = push.stream_events(sub_id, heartbeat=60)
+
+    next(stream)  # 订阅后的排队状态
+    wait = next(stream)
+    assert isinstance(wait, Wait)
+
+    push.unsubscribe(sub_id)
+    # 断开时唤醒等待中的事件流，事件流随即结束
+    assert wait.wakeup.is_set()
+    assert list(stream) == []
+
+
+def test_idle_subscriptions_expire(monkeypatch):
+    push = PushService()
+    stale = push.subscribe("alice")
+    monkeypatch.setattr(push_module, "SUBSCRIPTION_EXPIRE", 0)
+    time.sleep(0.01)
+
+    fresh = push.subscribe("bob")
+
+    assert push.next_events(stale, 0) is None
+    assert push.next_events(fresh, 0) is not None
+    assert push.get_statistics()["subscribedUsers"] == 1
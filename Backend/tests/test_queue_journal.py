@@ -0,0 +1,117 @@
+"""database/queue_journal.py：排队状态日志的回放、压缩和崩溃截断"""
+
+import json
+import time
+
+from database.queue_journal import (OP_CANCEL, OP_DISPATCH, OP_FAULT, OP_SUBMIT, QueueJournal,
+                                    SLOT_WAITING, SLOT_WAITING_AREA)
+from models.queue_system_model import WaitingCar
+
+
+def make_car(user_id: str, mode: str = "fast") -> WaitingCar:
+    car = WaitingCar(user_id, f"req-{user_id}", mode, 30.0)
+    car.queue_number = f"F{user_id}"
+    return car
+
+
+def open_journal(path, **kwargs):
+    journal = QueueJournal()
+    state = journal.open(str(path), flush_interval=0.01, **kwargs)
+    return journal, state
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "queue.journal"
+    journal, state = open_journal(path)
+    assert state["cars"] == {}
+
+    journal.record_car(OP_SUBMIT, make_car("u1"), counters={"fast": 1})
+    journal.record_car(OP_SUBMIT, make_car("u2"), counters={"fast": 2})
+    journal.record_car(OP_DISPATCH, make_car("u1"), pile_id="A", slot=SLOT_WAITING)
+    journal.record(OP_CANCEL, user_id="u2")
+    journal.record(OP_FAULT, pile_id="B", reason="broken")
+    journal.close()
+
+    journal, state = open_journal(path)
+    journal.close()
+    assert list(state["cars"]) == ["u1"]
+    assert state["cars"]["u1"]["pile_id"] == "A"
+    assert state["cars"]["u1"]["slot"] == SLOT_WAITING
+    assert state["waiting_order"] == []
+    assert state["counters"]["fast"] == 2
+    assert state["faults"] == {"B": "broken"}
+    assert WaitingCar.from_record(state["cars"]["u1"]).queue_number == "Fu1"
+    assert journal.last_seq == 5
+
+
+def test_compaction_replaces_log_with_checkpoint(tmp_path):
+    path = tmp_path / "queue.journal"
+    journal, _ = open_journal(path, compact_threshold=3)
+
+    expected = {"cars": {}, "waiting_order": [], "counters": {"fast": 0, "slow": 0}, "faults": {}}
+
+    def provider():
+        return json.loads(json.dumps(expected))
+
+    journal.set_state_provider(provider)
+    for i in range(5):
+        car = make_car(f"u{i}")
+        record = car.to_record()
+        record.update(pile_id=None, slot=SLOT_WAITING_AREA)
+        expected["cars"][car.user_id] = record
+        expected["waiting_order"].append(car.user_id)
+        expected["counters"]["fast"] = i + 1
+        journal.record_car(OP_SUBMIT, car, counters={"fast": i + 1})
+        time.sleep(0.05)
+
+    deadline = time.time() + 2
+    while journal.total_compactions == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    journal.close()
+    assert journal.total_compactions >= 1
+
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    assert lines[0]["op"] == "checkpoint"
+    assert len(lines) < 5
+
+    journal, state = open_journal(path)
+    journal.close()
+    assert state == expected
+    assert journal.last_seq == 5
+
+
+def test_partial_tail_is_truncated_before_new_records(tmp_path):
+    path = tmp_path / "queue.journal"
+    journal, _ = open_journal(path)
+    journal.record_car(OP_SUBMIT, make_car("u1"), counters={"fast": 1})
+    journal.close()
+
+    # 模拟写到一半时崩溃
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 2, "op": "submit", "data": {"car": {"user_')
+
+    journal, state = open_journal(path)
+    assert list(state["cars"]) == ["u1"]
+    journal.record_car(OP_SUBMIT, make_car("u3"), counters={"fast": 2})
+    journal.close()
+
+    journal, state = open_journal(path)
+    journal.close()
+    assert list(state["cars"]) == ["u1", "u3"]
+    assert state["waiting_order"] == ["u1", "u3"]
+
+
+def test_replay_from_base_state_skips_included_records(tmp_path):
+    path = tmp_path / "queue.journal"
+    journal, _ = open_journal(path)
+    journal.record_car(OP_SUBMIT, make_car("u1"), counters={"fast": 1})
+    journal.record_car(OP_SUBMIT, make_car("u2"), counters={"fast": 2})
+    journal.close()
+
+    base = {"cars": {}, "waiting_order": [], "counters": {"fast": 5, "slow": 0}, "faults": {}}
+    journal, state = open_journal(path, base_state=base, after_seq=1)
+    journal.close()
+    assert list(state["cars"]) == ["u2"]
+    assert state["counters"]["fast"] == 5
+    assert journal.last_seq == 2
@@ -0,0 +1,39 @@
+"""services/queue_service.py：释放活跃请求按锁顺序持有排队服务的锁"""
+
+import threading
+
+from models.charging_request_model import ChargeMode, ChargingRequest
+from models.queue_system_model import WaitingCar
+from services.dispatch_service import dispatch_service
+from services.queue_service import queue_service
+
+
+def test_finish_request_waits_for_queue_lock():
+    queue_service.active_requests["alice"] = ChargingRequest("alice", ChargeMode.FAST, 10.0)
+
+    with queue_service._lock:
+        finisher = threading.Thread(target=queue_service.finish_request, args=("alice",))
+        finisher.start()
+        finisher.join(0.1)
+        # 持有排队服务的锁时（如正在取消请求）不能释放活跃请求
+        assert finisher.is_alive()
+        assert "alice" in queue_service.active_requests
+
+    finisher.join(1.0)
+    assert "alice" not in queue_service.active_requests
+
+
+def test_complete_charging_finishes_request_after_pile_lock(monkeypatch):
+    pile_queue = dispatch_service.pile_queues["A"]
+    pile_queue.charging_car = WaitingCar("bob", "req-bob", "fast", 10.0)
+    finished = []
+
+    def finish_request(user_id, actual_amount=0.0):
+        finished.append((user_id, pile_queue._lock.locked()))
+
+    monkeypatch.setattr(queue_service, "finish_request", finish_request)
+    completed = pile_queue.complete_charging()
+
+    assert completed.user_id == "bob"
+    assert finished == [("bob", False)]
+    assert pile_queue.charging_car is None
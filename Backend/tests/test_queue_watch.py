@@ -0,0 +1,101 @@
+"""services/queue_watch.py：长轮询只唤醒状态可能变化的等待"""
+
+import pytest
+
+import services.queue_watch as queue_watch
+from services.queue_watch import QueueWatchService, queue_status_version
+from utils.async_wait import Wait
+from utils.state_version import pile_queue_key, user_key, QUEUE, WAITING_AREA
+
+
+class FakeQueueService:
+    def __init__(self):
+        self.statuses = {}
+
+    def get_queue_status(self, user_id):
+        return self.statuses.get(user_id)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    fake = FakeQueueService()
+    monkeypatch.setattr(queue_watch, "queue_service", fake)
+    return fake
+
+
+def waiting_status(position):
+    return {"requestId": "r1", "status": "WAITING", "queuePosition": "WAITING_AREA",
+            "position": position, "aheadCount": position - 1, "assignedPileId": None}
+
+
+def pile_status(pile_id):
+    return {"requestId": "r2", "status": "WAITING", "queuePosition": "PILE_QUEUE",
+            "position": 1, "aheadCount": 1, "assignedPileId": pile_id}
+
+
+def start_watch(service, queue, user_id):
+    watch = service.watch(user_id, queue_status_version(queue.statuses[user_id]), 30)
+    wait = next(watch)
+    assert isinstance(wait, Wait)
+    return watch, wait
+
+
+def test_wakes_only_affected_waiters(queue):
+    service = QueueWatchService()
+    queue.statuses = {"alice": waiting_status(2), "bob": pile_status("A")}
+    alice, alice_wait = start_watch(service, queue, "alice")
+    bob, bob_wait = start_watch(service, queue, "bob")
+
+    # 其他充电桩的车位变化不影响任何人
+    service._on_state_change((QUEUE, pile_queue_key("B")))
+    assert not alice_wait.wakeup.is_set() and not bob_wait.wakeup.is_set()
+
+    # 等候区变化只唤醒等候区中的用户
+    service._on_state_change((QUEUE, WAITING_AREA))
+    assert alice_wait.wakeup.is_set() and not bob_wait.wakeup.is_set()
+
+    queue.statuses["alice"] = waiting_status(1)
+    with pytest.raises(StopIteration) as stop:
+        next(alice)
+    assert stop.value.value == (waiting_status(1), queue_status_version(waiting_status(1)), False)
+
+    # 所在充电桩的车位变化唤醒该用户
+    service._on_state_change((QUEUE, pile_queue_key("A")))
+    assert bob_wait.wakeup.is_set()
+    bob.close()
+
+    assert service.get_statistics()["waiting"] == 0
+    assert service.get_statistics()["watchedKeys"] == 0
+
+
+def test_unchanged_status_keeps_waiting_and_unscoped_change_wakes_all(queue):
+    service = QueueWatchService()
+    queue.statuses = {"alice": waiting_status(2), "bob": pile_status("A")}
+    alice, alice_wait = start_watch(service, queue, "alice")
+    bob, bob_wait = start_watch(service, queue, "bob")
+
+    service._on_state_change((user_key("alice"),))
+    assert alice_wait.wakeup.is_set()
+    # 状态没有变化时重新登记并继续等待
+    assert isinstance(next(alice), Wait)
+
+    service._on_state_change((QUEUE,))
+    assert bob_wait.wakeup.is_set()
+    assert service.total_wakeups == 3
+    alice.close()
+    bob.close()
+
+
+def test_blocking_waits_are_capped(queue):
+    service = QueueWatchService()
+    queue.statuses = {"alice": waiting_status(2)}
+    version = queue_status_version(waiting_status(2))
+
+    status, current, rejected = service.wait_for_change("alice", version, 30, max_waiters=0)
+    assert rejected and current == version and status == waiting_status(2)
+    assert service.total_rejected == 1
+
+    status, current, rejected = service.wait_for_change("alice", version, 0.01, max_waiters=1)
+    assert not rejected and current == version
+    assert service.total_timeouts == 1
+    assert service.get_statistics()["blocking"] == 0
@@ -0,0 +1,76 @@
+"""utils/response_encoder.py：按 Accept 协商编码格式，按 Accept-Encoding 的 q 值和大小阈值压缩"""
+
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from config import Config
+from utils import response_encoder
+from utils.response_encoder import JSON, MSGPACK, build_response
+
+app = Flask(__name__)
+PAYLOAD = {"message": "充电桩", "time": datetime(2024, 1, 1, 8, 30), "items": list(range(400))}
+
+
+def respond(headers, payload=PAYLOAD):
+    with app.test_request_context(headers=headers):
+        return build_response(payload)
+
+
+def test_json_by_default_and_vary_on_negotiated_headers():
+    response = respond({})
+
+    assert response.mimetype == JSON
+    assert response.headers["Vary"] == "Accept, Accept-Encoding"
+    assert "Content-Encoding" not in response.headers
+    assert json.loads(response.get_data()) == {**PAYLOAD, "time": "2024-01-01T08:30:00"}
+
+
+def test_msgpack_only_when_preferred():
+    msgpack = pytest.importorskip("msgpack")
+    if MSGPACK not in response_encoder.get_encoder_names():
+        pytest.skip("未启用 MessagePack 编码器")
+
+    assert respond({"Accept": "application/json, application/msgpack;q=0.5"}).mimetype == JSON
+    assert respond({"Accept": "*/*"}).mimetype == JSON
+
+    response = respond({"Accept": "application/x-msgpack"})
+    assert response.mimetype == MSGPACK
+    assert response.headers["Vary"] == "Accept, Accept-Encoding"
+    assert msgpack.unpackb(response.get_data()) == {**PAYLOAD, "time": "2024-01-01T08:30:00"}
+
+
+def test_gzip_above_threshold_when_accepted(monkeypatch):
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESSION_ENABLED", True)
+    plain = respond({}).get_data()
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESS_MIN_SIZE", len(plain))
+
+    response = respond({"Accept-Encoding": "br, gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()) == plain
+
+    # 低于阈值时不压缩
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESS_MIN_SIZE", len(plain) + 1)
+    response = respond({"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data() == plain
+
+
+@pytest.mark.parametrize("accept_encoding, compressed", [
+    ("gzip;q=0", False),
+    ("gzip;q=0, *", False),
+    ("*;q=0", False),
+    ("deflate", False),
+    ("br, *;q=0.5", True),
+    ("GZIP;q=0.3", True),
+])
+def test_gzip_respects_quality_values(monkeypatch, accept_encoding, compressed):
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESSION_ENABLED", True)
+    monkeypatch.setattr(Config, "RESPONSE_COMPRESS_MIN_SIZE", 0)
+
+    response = respond({"Accept-Encoding": accept_encoding})
+
+    assert ("Content-Encoding" in response.headers) == compressed
@@ -0,0 +1,140 @@
+"""database/session_archive.py：列式会话归档的读写、崩溃截断和汇总"""
+
+import os
+from datetime import datetime, timedelta
+
+from database.session_archive import COLUMNS, SessionArchive
+
+
+def make_record(index: int, user_id: str, with_bill: bool = True):
+    created = datetime(2024, 5, 1, 8, 0) + timedelta(hours=index)
+    return {
+        "session_id": f"S{index:04d}",
+        "user_id": user_id,
+        "pile_id": "A",
+        "status": "COMPLETED",
+        "requested_amount": 20.0,
+        "pile_power": 30.0,
+        "current_amount": 10.0 + index,
+        "total_pause_duration": 0.0,
+        "create_time": created,
+        "start_time": created,
+        "end_time": created + timedelta(minutes=30),
+        "pause_time": None,
+        "estimated_end_time": None,
+        "bill": {
+            "bill_id": f"B{index:04d}",
+            "status": "COMPLETED",
+            "generate_time": created + timedelta(minutes=30),
+            "energy_amount": 10.0 + index,
+            "total_cost": 2.0 * (10.0 + index)
+        } if with_bill else None
+    }
+
+
+def test_round_trip_and_totals(tmp_path):
+    archive = SessionArchive()
+    archive.open(str(tmp_path))
+    archive.append([make_record(0, "alice"), make_record(1, "bob"), make_record(2, "alice", with_bill=False)])
+    assert archive.get_totals() == (3, 21.0, 42.0)
+    archive.close()
+
+    archive.open(str(tmp_path))
+    try:
+        assert archive.get_totals() == (3, 21.0, 42.0)
+
+        record = archive.find_session("S0001")
+        assert record["user_id"] == "bob"
+        assert record["end_time"] == datetime(2024, 5, 1, 9, 30)
+        assert record["pause_time"] is None
+        assert record["bill"]["bill_id"] == "B0001"
+        assert record["bill"]["total_cost"] == 22.0
+        assert archive.find_session("S00") is None
+
+        sessions = archive.user_sessions("alice", 10)
+        assert [s["session_id"] for s in sessions] == ["S0002", "S0000"]
+        assert sessions[0]["bill"] is None
+    finally:
+        archive.close()
+
+
+def test_uneven_columns_and_heaps_are_truncated(tmp_path):
+    archive = SessionArchive()
+    archive.open(str(tmp_path))
+    archive.append([make_record(0, "alice"), make_record(1, "bob")])
+    archive.close()
+
+    # 模拟追加第三条记录时崩溃：字符串堆已写入，只有部分列写入
+    with open(tmp_path / "session_id.heap", "ab") as f:
+        f.write(b"S0002")
+    for name, _ in COLUMNS[:3]:
+        with open(tmp_path / f"{name}.col", "ab") as f:
+            f.write(b"\x00" * 4)
+
+    archive.open(str(tmp_path))
+    try:
+        assert archive.get_totals() == (2, 21.0, 42.0)
+        sizes = {os.path.getsize(tmp_path / f"{name}.col") // 2 for name, typecode in COLUMNS if typecode == "d"}
+        assert sizes == {8}
+        assert os.path.getsize(tmp_path / "session_id.heap") == len("S0000S0001")
+
+        archive.append([make_record(3, "carol")])
+        assert archive.find_session("S0003")["user_id"] == "carol"
+        assert archive.find_session("S0001")["user_id"] == "bob"
+        assert archive.get_totals() == (3, 34.0, 68.0)
+    finally:
+        archive.close()
+
+
+def test_append_closes_replaced_maps(tmp_path):
+    archive = SessionArchive()
+    archive.open(str(tmp_path))
+    try:
+        archive.append([make_record(0, "alice")])
+        assert archive.find_session("S0000")["user_id"] == "alice"
+        old_maps = list(archive._maps.values())
+
+        archive.append([make_record(1, "bob")])
+        assert archive.find_session("S0001")["user_id"] == "bob"
+        assert all(data.closed for data in old_maps if data is not None)
+    finally:
+        archive.close()
+
+
+def test_history_reads_bills_from_archived_rows(tmp_path, monkeypatch):
+    import services.charging_process_service as process_module
+    from services.charging_process_service import charging_process_service
+
+    archive = SessionArchive()
+    archive.open(str(tmp_path))
+    monkeypatch.setattr(process_module, "session_archive", archive)
+    try:
+        archive.append([make_record(0, "alice"), make_record(1, "alice", with_bill=False), make_record(2, "bob")])
+
+        # 历史记录的详单取自同一行，不按会话编号逐条查找
+        def no_lookup(session_id):
+            raise AssertionError("history should not look up sessions one by one")
+        monkeypatch.setattr(archive, "find_session", no_lookup)
+
+        history = charging_process_service.get_user_charging_history("alice", 10)
+        assert [(session.session_id, bill.bill_id if bill else None) for session, bill in history] == [
+            ("S0001", None), ("S0000", "B0000")
+        ]
+    finally:
+        archive.close()
+
+
+def test_user_totals_survive_reopen(tmp_path):
+    archive = SessionArchive()
+    archive.open(str(tmp_path))
+    archive.append([make_record(0, "alice"), make_record(1, "bob")])
+    archive.append([make_record(2, "alice", with_bill=False), make_record(3, "alice")])
+    expected = {"alice": (3, 23.0, 46.0), "bob": (1, 11.0, 22.0)}
+    assert archive.get_user_totals() == expected
+    archive.close()
+
+    archive.open(str(tmp_path))
+    try:
+        assert archive.get_user_totals() == expected
+    finally:
+        archive.close()
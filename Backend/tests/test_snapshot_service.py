@@ -0,0 +1,66 @@
+"""services/snapshot_service.py：状态快照的格式、权限和用户数据"""
+
+import os
+import pickle
+import stat
+import sys
+from datetime import datetime
+
+import pytest
+
+from models.user_model import User
+from services.snapshot_service import SNAPSHOT_MAGIC, SnapshotService
+
+
+class FakeUserService:
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager
+        self._users = {"alice": User("alice", "secret", "user")}
+
+    def mark_user_dirty(self, username):
+        pass
+
+
+def test_round_trip_without_pickle(tmp_path):
+    service = SnapshotService()
+    service.bind_user_service(FakeUserService())
+    path = str(tmp_path / "state.snap")
+    assert service.save_snapshot(path)
+
+    snapshot = service.load_snapshot(path)
+    assert isinstance(snapshot["created_at"], datetime)
+    assert all(isinstance(pile["created_at"], datetime) for pile in snapshot["piles"].values())
+    assert snapshot["users"][0][:3] == ["alice", "secret", "user"]
+    assert isinstance(snapshot["users"][0][3], datetime)
+
+    with open(path, "rb") as f:
+        assert f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX 文件权限")
+def test_snapshot_file_is_private(tmp_path):
+    service = SnapshotService()
+    path = str(tmp_path / "state.snap")
+    # 之前留下的临时文件权限过宽
+    with open(f"{path}.tmp", "wb"):
+        pass
+    os.chmod(f"{path}.tmp", 0o644)
+
+    assert service.save_snapshot(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_database_mode_does_not_snapshot_users(tmp_path):
+    service = SnapshotService()
+    service.bind_user_service(FakeUserService(db_manager=object()))
+    path = str(tmp_path / "state.snap")
+    assert service.save_snapshot(path)
+
+    assert service.load_snapshot(path)["users"] == []
+
+
+def test_pickle_snapshots_are_not_loaded(tmp_path):
+    path = tmp_path / "state.snap"
+    with open(path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + (1).to_bytes(2, "big") + pickle.dumps({"queue": {}}))
+    assert SnapshotService().load_snapshot(str(path)) is None
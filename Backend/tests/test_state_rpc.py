@@ -0,0 +1,112 @@
+"""utils/state_rpc.py：长度前缀帧、套接字权限，以及工作进程经服务代理调用状态进程中的服务"""
+
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from utils.state_rpc import (
+    HEADER, MAX_FRAME_SIZE, ServiceProxy, StateClient, StateRPCError, StateServer, recv_frame, send_frame
+)
+
+
+class CounterService:
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, key, amount=1):
+        self.counts[key] = self.counts.get(key, 0) + amount
+        return self.counts[key]
+
+    def fail(self):
+        raise ValueError("充电桩不存在")
+
+    def _reset(self):
+        self.counts.clear()
+
+
+@pytest.fixture
+def server(tmp_path):
+    state_server = StateServer(str(tmp_path / "run" / "state.sock"), {"counter_service": CounterService()})
+    state_server.start()
+    yield state_server
+    state_server.stop()
+
+
+def test_frames_survive_partial_reads():
+    left, right = socket.socketpair()
+    with left, right:
+        payload = {"user": "alice", "amounts": list(range(10000))}
+        sender = threading.Thread(target=send_frame, args=(left, payload))
+        # 接收缓冲区小于一帧，recv 需要多次读取
+        right.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sender.start()
+        assert recv_frame(right) == payload
+        sender.join()
+
+
+def test_oversized_and_truncated_frames_are_rejected():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(HEADER.pack(MAX_FRAME_SIZE + 1))
+        with pytest.raises(ConnectionError):
+            recv_frame(right)
+
+    left, right = socket.socketpair()
+    with right:
+        left.sendall(HEADER.pack(100) + b"partial")
+        left.close()
+        with pytest.raises(ConnectionError):
+            recv_frame(right)
+
+
+def test_socket_is_private_to_owner(server):
+    mode = stat.S_IMODE(os.stat(server.socket_path).st_mode)
+    assert mode == 0o600
+    # 绑定用的临时目录已删除
+    assert os.listdir(os.path.dirname(server.socket_path)) == ["state.sock"]
+
+
+def test_socket_is_bound_in_private_directory(tmp_path, monkeypatch):
+    socket_path = str(tmp_path / "state.sock")
+    chmod = os.chmod
+    seen = []
+
+    def record(path, mode):
+        # 设置权限前目标路径上还没有套接字，绑定所在目录只有所有者可访问
+        seen.append((os.path.exists(socket_path), stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode)))
+        chmod(path, mode)
+
+    monkeypatch.setattr(os, "chmod", record)
+    state_server = StateServer(socket_path, {})
+    state_server.start()
+    state_server.stop()
+
+    assert seen == [(False, 0o700)]
+
+
+def test_proxy_forwards_calls_to_state_process(server):
+    client = StateClient(server.socket_path, timeout=5)
+    counter_service = ServiceProxy(client, "counter_service")
+
+    assert counter_service.add("alice") == 1
+    assert counter_service.add("alice", amount=2) == 3
+    assert server.services["counter_service"].counts == {"alice": 3}
+
+    with pytest.raises(StateRPCError, match="ValueError: 充电桩不存在"):
+        counter_service.fail()
+    with pytest.raises(AttributeError):
+        counter_service._reset()
+    with pytest.raises(StateRPCError, match="不允许调用私有方法"):
+        client.call("counter_service", "_reset")
+    with pytest.raises(StateRPCError, match="未知服务"):
+        client.call("missing_service", "add")
+
+    # 错误不会断开连接
+    assert counter_service.add("bob") == 1
+    assert client.get_statistics()["totalCalls"] == 6
+    assert server.get_statistics()["totalErrors"] == 3
+    client.close()
+
@@ -0,0 +1,29 @@
+"""utils/state_version.py：版本表有上限，被淘汰聚合的 ETag 不会在状态变化后仍然匹配"""
+
+from utils.state_version import StateVersions, history_key, user_key, QUEUE
+
+
+def test_version_table_is_bounded():
+    versions = StateVersions(max_keys=3)
+    for i in range(100):
+        versions.bump(QUEUE, user_key(f"user{i}"), history_key(f"user{i}"))
+
+    assert versions.get_statistics()["aggregates"] == 3
+    assert versions.get(QUEUE) == 100
+
+
+def test_evicted_key_etag_changes_when_state_changes():
+    versions = StateVersions(max_keys=2)
+    versions.bump(user_key("alice"))
+    versions.bump(user_key("bob"))
+    versions.bump(user_key("carol"))
+
+    # alice 已被淘汰，使用被淘汰聚合的最高版本号；没有新的淘汰时 ETag 保持稳定
+    assert versions.get(user_key("alice")) == 1
+    evicted_tag = versions.etag(user_key("alice"))
+    assert versions.etag(user_key("alice")) == evicted_tag
+
+    # 状态变化后版本号大于所有被淘汰的版本号，旧的 ETag 不再匹配
+    versions.bump(user_key("alice"))
+    assert versions.etag(user_key("alice")) != evicted_tag
+    assert versions.get(user_key("alice")) > versions.get(user_key("bob"))
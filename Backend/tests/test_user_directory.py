@@ -0,0 +1,72 @@
+"""services/user_directory.py：按需加载用户目录的 LRU 淘汰、不可淘汰用户和不存在用户名缓存"""
+
+import time
+
+from models.user_model import User
+from services.user_directory import LazyUserDirectory
+
+
+class Loader:
+    def __init__(self, usernames):
+        self.usernames = set(usernames)
+        self.calls = []
+
+    def __call__(self, username):
+        self.calls.append(username)
+        return User(username, "123", "user") if username in self.usernames else None
+
+
+def test_least_recently_used_user_is_evicted():
+    loader = Loader(["a", "b", "c"])
+    directory = LazyUserDirectory(loader, capacity=2, negative_capacity=10, negative_ttl=60)
+
+    directory.get("a")
+    directory.get("b")
+    directory.get("a")  # b 成为最久未使用
+    directory.get("c")
+
+    assert list(directory) == ["a", "c"]
+    assert directory.get_statistics()["evictions"] == 1
+    directory.get("b")
+    assert loader.calls == ["a", "b", "c", "b"]
+
+
+def test_pinned_users_are_not_evicted():
+    pinned = {"a"}
+    directory = LazyUserDirectory(Loader(["a", "b", "c"]), capacity=1, negative_capacity=10,
+                                  negative_ttl=60, pinned=lambda username: username in pinned)
+
+    directory.get("a")
+    directory.get("b")
+    directory.get("c")
+    # a 尚未写回数据库，跳过；容量之外的其他用户照常淘汰
+    assert "a" in list(directory)
+    assert "b" not in list(directory)
+
+
+def test_missing_usernames_are_cached_until_ttl():
+    loader = Loader([])
+    directory = LazyUserDirectory(loader, capacity=10, negative_capacity=10, negative_ttl=0.05)
+
+    assert directory.get("ghost") is None
+    assert directory.get("ghost") is None
+    assert loader.calls == ["ghost"]
+    assert directory.get_statistics()["negativeHits"] == 1
+
+    time.sleep(0.06)
+    assert directory.get("ghost") is None
+    assert loader.calls == ["ghost", "ghost"]
+
+
+def test_concurrent_store_wins_over_loaded_user():
+    registered = User("alice", "new", "user")
+    directory = None
+
+    def loader(username):
+        # 在锁外加载期间，另一个线程注册了同名用户
+        directory[username] = registered
+        return User(username, "stale", "user")
+
+    directory = LazyUserDirectory(loader, capacity=10, negative_capacity=10, negative_ttl=60)
+    assert directory.get("alice") is registered
+    assert directory.get("alice") is registered
@@ -0,0 +1,135 @@
+"""services/user_service.py：用户写回和最后登录时间批量写入（SQLite 后端）"""
+
+import threading
+from datetime import datetime
+
+import pytest
+
+from config.database_config import DatabaseConfig
+from database.database_manager import DatabaseManager
+from services.user_service import UserService
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(DatabaseConfig, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(DatabaseConfig, "SQLITE_PATH", str(tmp_path / "users.db"))
+    monkeypatch.setattr(DatabaseConfig, "POOL_WARMUP", False)
+    manager = DatabaseManager()
+    assert manager.connect() and manager.init_database()
+    yield manager
+    manager.disconnect()
+
+
+def db_passwords(db):
+    return {user["username"]: user["password"] for user in db.load_all_users()}
+
+
+def test_save_writes_only_dirty_users_and_keeps_others(db):
+    service = UserService(db, lazy=False)
+
+    # 服务加载之后由其他进程写入的用户，不在本进程内存中
+    assert db.upsert_users([{"username": "other", "password": "pw", "usertype": "user"}])
+
+    service._users["test1"].password = "changed"
+    service.mark_user_dirty("test1")
+    # 未标记的内存修改不写回
+    service._users["test2"].password = "not-saved"
+
+    assert service.save_users_to_database()
+    passwords = db_passwords(db)
+    assert passwords["test1"] == "changed"
+    assert passwords["test2"] == "123"
+    assert passwords["other"] == "pw"
+    assert set(passwords) == {"admin", "user", "test1", "test2", "other"}
+    assert service.get_dirty_user_count() == 0
+
+
+def test_failed_save_marks_users_dirty_again(db, monkeypatch):
+    service = UserService(db, lazy=False)
+    service._users["test1"].password = "changed"
+    service.mark_user_dirty("test1")
+
+    upsert_users = db.upsert_users
+    monkeypatch.setattr(db, "upsert_users", lambda users_data: False)
+    assert not service.save_users_to_database()
+    assert service.get_dirty_user_count() == 1
+
+    monkeypatch.setattr(db, "upsert_users", upsert_users)
+    assert service.save_users_to_database()
+    assert service.get_dirty_user_count() == 0
+    assert db_passwords(db)["test1"] == "changed"
+
+
+def test_logins_are_coalesced_and_flushed_on_batch_size_and_stop(db, monkeypatch):
+    monkeypatch.setattr(DatabaseConfig, "LAST_LOGIN_FLUSH_INTERVAL", 60.0)
+    monkeypatch.setattr(DatabaseConfig, "LAST_LOGIN_FLUSH_BATCH_SIZE", 2)
+    service = UserService(db, lazy=False)
+
+    flushed = []
+    flushed_event = threading.Event()
+    update_users_last_login = db.update_users_last_login
+
+    def record(updates):
+        flushed.append(sorted(update["username"] for update in updates))
+        flushed_event.set()
+        return update_users_last_login(updates)
+
+    monkeypatch.setattr(db, "update_users_last_login", record)
+    service.start_login_writer()
+    try:
+        # 同一用户多次登录只保留最新一次，未达到批量大小时不写入
+        service.login_user("user", "123")
+        service.login_user("user", "123")
+        assert not flushed_event.wait(0.2)
+
+        service.login_user("test1", "123")
+        assert flushed_event.wait(2.0)
+        assert flushed == [["test1", "user"]]
+
+        service.login_user("admin", "123")
+    finally:
+        service.stop_login_writer()
+
+    # 停止时写入剩余的登录时间
+    assert flushed == [["test1", "user"], ["admin"]]
+    last_logins = {user["username"]: user["last_login"] for user in db.load_all_users()}
+    assert last_logins["user"] == service._users["user"].last_login
+    assert last_logins["admin"] == service._users["admin"].last_login
+    assert last_logins["test2"] is None
+
+
+def test_failed_login_flush_keeps_newer_logins(db, monkeypatch):
+    service = UserService(db, lazy=False)
+    older, newer = datetime(2024, 5, 1, 8, 0), datetime(2024, 5, 1, 9, 0)
+    service._pending_logins = {"user": older, "test1": older}
+
+    def fail(updates):
+        # 写入期间用户再次登录
+        service._pending_logins["user"] = newer
+        return False
+
+    monkeypatch.setattr(db, "update_users_last_login", fail)
+    assert service.flush_last_logins() == 0
+    assert service._pending_logins == {"user": newer, "test1": older}
+
+
+def test_users_being_saved_stay_pinned(db, monkeypatch):
+    monkeypatch.setattr(DatabaseConfig, "USER_CACHE_SIZE", 1)
+    service = UserService(db, lazy=True)
+    user = service._users.get("test1")
+    user.password = "changed"
+    service.mark_user_dirty("test1")
+
+    upsert_users = db.upsert_users
+
+    def upsert_while_loading_others(users_data):
+        # 写入期间其他用户的访问会触发淘汰
+        service._users.get("admin")
+        service._users.get("test2")
+        assert service._users.get("test1") is user
+        return upsert_users(users_data)
+
+    monkeypatch.setattr(db, "upsert_users", upsert_while_loading_others)
+    assert service.save_users_to_database()
+    assert db_passwords(db)["test1"] == "changed"
@@ -0,0 +1,307 @@
+"""
+基于 asyncio 的 HTTP/1.1 服务器
+
+运行 ASGI 应用的最小实现，不依赖第三方 ASGI 服务器：
+- 每个连接一个协程，空闲的 keep-alive 连接只占用一个套接字
+- 支持 Content-Length 请求体、keep-alive 和分块传输的流式响应
+- 连接数超过上限时直接返回 503，空闲连接超时后关闭
+"""
+
+import asyncio
+import logging
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_SIZE = 64 * 1024
+
+
+class _BadRequest(Exception):
+    """请求格式错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncHTTPServer:
+    """运行 ASGI 应用的 asyncio HTTP 服务器"""
+
+    def __init__(self, app: Callable, host: str = "0.0.0.0", port: int = 5000,
+                 max_connections: int = 10000, keepalive_timeout: float = 60.0,
+                 max_body_size: int = 1024 * 1024, backlog: int = 2048):
+        """
+        Args:
+            app: ASGI 应用
+            host: 监听地址
+            port: 监听端口
+            max_connections: 最大并发连接数
+            keepalive_timeout: 空闲连接的超时时间（秒）
+            max_body_size: 请求体的最大字节数
+            backlog: 监听队列长度
+        """
+        self.app = app
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body_size = max_body_size
+        self.backlog = backlog
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = 0
+
+        # 统计信息
+        self.total_connections = 0
+        self.total_requests = 0
+        self.rejected_connections = 0
+        self.peak_connections = 0
+
+    async def start(self):
+        """开始监听并执行 ASGI 启动流程"""
+        await self._lifespan("startup")
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port,
+            backlog=self.backlog, limit=MAX_HEADER_SIZE
+        )
+
+    async def serve_until(self, stop_event: asyncio.Event):
+        """运行直到 stop_event 被设置，然后停止监听并执行 ASGI 关闭流程"""
+        await self.start()
+        try:
+            await stop_event.wait()
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+            await self._lifespan("shutdown")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取服务器统计信息"""
+        return {
+            "activeConnections": self._connections,
+            "peakConnections": self.peak_connections,
+            "totalConnections": self.total_connections,
+            "totalRequests": self.total_requests,
+            "rejectedConnections": self.rejected_connections
+        }
+
+    async def _lifespan(self, phase: str):
+        """执行 ASGI lifespan 的 startup 或 shutdown 阶段"""
+        sent = False
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": f"lifespan.{phase}"}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"].startswith(f"lifespan.{phase}."):
+                done.set()
+
+        task = asyncio.ensure_future(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+        waiter = asyncio.ensure_future(done.wait())
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        task.cancel()
+        waiter.cancel()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的全部请求"""
+        if self._connections >= self.max_connections:
+            self.rejected_connections += 1
+            writer.write(self._simple_response(503, "Service Unavailable"))
+            await self._close(writer)
+            return
+
+        self._connections += 1
+        self.total_connections += 1
+        self.peak_connections = max(self.peak_connections, self._connections)
+
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(self._simple_response(431, "Request Header Fields Too Large"))
+                    break
+
+                try:
+                    method, target, version, headers = self._parse_head(head)
+                    body = await self._read_body(reader, headers)
+                except _BadRequest as e:
+                    writer.write(self._simple_response(e.status, str(e)))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                keep_alive = self._wants_keep_alive(version, headers)
+                self.total_requests += 1
+                await self._run_app(reader, writer, method, target, version, headers, body, keep_alive)
+        except ConnectionError:
+            # 客户端在响应写出过程中断开（如关闭事件流）
+            pass
+        except Exception as e:
+            logger.error(f"处理请求时发生错误: {e}")
+        finally:
+            self._connections -= 1
+            await self._close(writer)
+
+    async def _run_app(self, reader, writer, method: str, target: str, version: str,
+                       headers: List[Tuple[bytes, bytes]], body: bytes, keep_alive: bool):
+        """把一个请求交给 ASGI 应用并写出响应"""
+        path, _, query = target.partition("?")
+        sockname = writer.get_extra_info("sockname") or ("", 0)
+        peername = writer.get_extra_info("peername") or ("", 0)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": version,
+            "method": method,
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": headers,
+            "client": peername[:2],
+            "server": sockname[:2],
+        }
+
+        request_sent = False
+        response_started = False
+        chunked = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # 请求体已读完，等待连接断开（流式响应据此结束）
+            await reader.read(1)
+            return {"type": "http.disconnect"}
+
+        pending_start: Dict[str, Any] = {}
+
+        async def send(message):
+            nonlocal response_started, chunked
+            if message["type"] == "http.response.start":
+                pending_start.update(message)
+                return
+            if message["type"] != "http.response.body":
+                return
+
+            data = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if not response_started:
+                response_started = True
+                response_headers = list(pending_start.get("headers", []))
+                has_length = any(name.lower() == b"content-length" for name, _ in response_headers)
+                if not has_length:
+                    if more_body:
+                        chunked = True
+                        response_headers.append((b"transfer-encoding", b"chunked"))
+                    else:
+                        response_headers.append((b"content-length", str(len(data)).encode("latin-1")))
+                response_headers.append((b"connection", b"keep-alive" if keep_alive else b"close"))
+                writer.write(self._status_line(pending_start.get("status", 200)) +
+                             b"".join(name + b": " + value + b"\r\n" for name, value in response_headers) +
+                             b"\r\n")
+
+            if chunked:
+                if data:
+                    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                if not more_body:
+                    writer.write(b"0\r\n\r\n")
+            elif data and method != "HEAD":
+                writer.write(data)
+            await writer.drain()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            if not response_started:
+                writer.write(self._simple_response(500, "Internal Server Error"))
+            raise
+
+        # 应用没有发送响应体时补发空响应
+        if not response_started:
+            if pending_start:
+                await send({"type": "http.response.body", "body": b""})
+            else:
+                writer.write(self._simple_response(500, "Internal Server Error"))
+                raise ConnectionError("应用没有发送响应")
+
+    def _parse_head(self, head: bytes):
+        """解析请求行和请求头"""
+        try:
+            lines = head[:-4].decode("latin-1").split("\r\n")
+            method, target, protocol = lines[0].split(" ", 2)
+        except ValueError:
+            raise _BadRequest(400, "Bad Request")
+        if not protocol.startswith("HTTP/"):
+            raise _BadRequest(400, "Bad Request")
+
+        headers = []
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise _BadRequest(400, "Bad Request")
+            headers.append((name.strip().lower().encode("latin-1"), value.strip().encode("latin-1")))
+
+        return method.upper(), target, protocol[5:], headers
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: List[Tuple[bytes, bytes]]) -> bytes:
+        """按 Content-Length 读取请求体（不支持分块上传）"""
+        length = 0
+        for name, value in headers:
+            if name == b"transfer-encoding":
+                raise _BadRequest(501, "Not Implemented")
+            if name == b"content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    raise _BadRequest(400, "Bad Request")
+
+        if length > self.max_body_size:
+            raise _BadRequest(413, "Payload Too Large")
+        return await reader.readexactly(length) if length else b""
+
+    @staticmethod
+    def _wants_keep_alive(version: str, headers: List[Tuple[bytes, bytes]]) -> bool:
+        connection = b""
+        for name, value in headers:
+            if name == b"connection":
+                connection = value.lower()
+        if version == "1.0":
+            return connection == b"keep-alive"
+        return connection != b"close"
+
+    @staticmethod
+    def _status_line(status: int) -> bytes:
+        try:
+            phrase = HTTPStatus(status).phrase
+        except ValueError:
+            phrase = ""
+        return f"HTTP/1.1 {status} {phrase}\r\n".encode("latin-1")
+
+    @classmethod
+    def _simple_response(cls, status: int, message: str) -> bytes:
+        body = message.encode("latin-1")
+        return (cls._status_line(status) +
+                b"content-type: text/plain\r\ncontent-length: %d\r\nconnection: close\r\n\r\n%s" % (len(body), body))
+
+    @staticmethod
+    async def _close(writer: asyncio.StreamWriter):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except Exception:
+            pass
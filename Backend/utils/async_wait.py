@@ -0,0 +1,168 @@
+"""
+不占用线程的等待
+
+事件流和长轮询大部分时间在等待状态变化。同步部署时等待阻塞处理线程；
+异步部署（asgi.py）时路由不在线程中等待，而是把等待交给事件循环：
+
+- 服务为每次等待创建一个 Wakeup，状态变化时在服务线程中调用 set()，
+  事件循环中的等待方通过 loop.call_soon_threadsafe 完成对应的 asyncio future
+- 流式响应的迭代对象遇到需要等待时产出 Wait，ASGI 适配器 await 它，
+  同步服务器由 stream_with_waits 在处理线程中阻塞等待
+- 长轮询的状态码和响应体在等待结束后才能确定，使用 DeferredResponse
+"""
+
+import asyncio
+import threading
+from typing import Any, Callable, Generator, Iterable, Iterator, List, Optional
+
+from flask import Response, current_app
+
+# ASGI 适配器在 environ 中设置该键，表示可以 await 响应迭代对象产出的 Wait
+ASYNC_WAIT_ENVIRON = "echarge.async_wait"
+
+
+class Wakeup:
+    """一次性唤醒：线程中可以阻塞等待，事件循环中可以 await（不占用线程）"""
+
+    __slots__ = ("_event", "_callbacks", "_lock")
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def set(self):
+        """唤醒全部等待方（可以在持有服务锁时调用，不阻塞）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """在当前线程中等待，返回是否被唤醒"""
+        return self._event.wait(timeout)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        """在事件循环中等待，返回是否被唤醒"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        with self._lock:
+            if self._event.is_set():
+                return True
+            self._callbacks.append(wake)
+
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if wake in self._callbacks:
+                    self._callbacks.remove(wake)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Wait:
+    """流式响应迭代对象产出的等待：等到 wakeup 被唤醒或超时后继续迭代"""
+
+    __slots__ = ("wakeup", "timeout")
+
+    def __init__(self, wakeup: Wakeup, timeout: float):
+        self.wakeup = wakeup
+        self.timeout = timeout
+
+
+def run_blocking(waits: Generator[Wait, None, Any]) -> Any:
+    """在当前线程中执行产出 Wait 的生成器，返回生成器的返回值"""
+    try:
+        wait = next(waits)
+        while True:
+            wait.wakeup.wait(wait.timeout)
+            wait = next(waits)
+    except StopIteration as stop:
+        return stop.value
+
+
+def stream_with_waits(iterable: Iterable[Any], environ: dict) -> Iterable[Any]:
+    """
+    流式响应的迭代对象：异步部署时原样返回，由 ASGI 适配器 await 其中的 Wait；
+    同步服务器不认识 Wait，在处理线程中阻塞等待并跳过
+    """
+    if environ.get(ASYNC_WAIT_ENVIRON):
+        return iterable
+    return _blocking_stream(iter(iterable))
+
+
+def _blocking_stream(iterator: Iterator[Any]) -> Iterator[Any]:
+    try:
+        for item in iterator:
+            if isinstance(item, Wait):
+                item.wakeup.wait(item.timeout)
+            else:
+                yield item
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+
+class DeferredResponse(Response):
+    """
+    等待结束后才确定状态码和响应体的响应（长轮询）
+
+    waits 产出 Wait，返回值交给 finish 在请求上下文中构建最终响应（视图函数的返回值形式）。
+    after_request 钩子添加的响应头保留在最终响应中；响应关闭时才能读取最终状态码。
+    """
+
+    def __init__(self, waits: Generator[Wait, None, Any], finish: Callable[[Any], Any]):
+        super().__init__()
+        self._waits = waits
+        self._finish = finish
+        self._app = current_app._get_current_object()
+        self._closed = False
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        return stream_with_waits(self._app_iter(environ, start_response), environ)
+
+    def _app_iter(self, environ: dict, start_response: Callable) -> Iterator[Any]:
+        try:
+            result = yield from self._waits
+
+            # 构建最终响应需要请求上下文（按 Accept 协商编码），视图返回时上下文已经弹出
+            with self._app.request_context(environ):
+                final = self._app.make_response(self._finish(result))
+            self.status_code = final.status_code
+            for name, value in final.headers.items():
+                self.headers[name] = value
+            self.set_data(final.get_data())
+
+            app_iter, status, headers = self.get_wsgi_response(environ)
+            start_response(status, headers)
+            yield from app_iter
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._waits.close()
+        super().close()
@@ -0,0 +1,148 @@
+"""
+签名会话令牌
+
+登录时签发携带用户名、角色和过期时间的令牌，使用 HMAC-SHA256 签名。
+验证只需重新计算签名，不查询用户数据；最近验证通过的令牌缓存在 LRU 中，
+热点请求连签名都不必重新计算。多个进程只要配置相同的密钥即可互相验证令牌。
+令牌可以限定用途（如只用于建立事件流连接），限定用途的令牌不能作为会话令牌使用，反之亦然。
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class AuthTokenService:
+    """签名会话令牌的签发和验证"""
+
+    def __init__(self, secret: Optional[str] = None, ttl: float = 12 * 3600, cache_size: int = 10000):
+        self.configure(secret, ttl, cache_size)
+
+        # 统计信息
+        self.issued = 0
+        self.cache_hits = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def configure(self, secret: Optional[str], ttl: float, cache_size: int):
+        """
+        设置签名密钥、有效期和验证缓存大小
+
+        Args:
+            secret: 签名密钥，为空时生成随机密钥（重启后已签发的令牌失效，多进程之间不能互相验证）
+            ttl: 令牌有效期（秒）
+            cache_size: 验证缓存的最大令牌数
+        """
+        self.ephemeral_secret = not secret
+        self._secret = secret.encode("utf-8") if secret else secrets.token_bytes(32)
+        self.ttl = ttl
+        self.cache_size = cache_size
+
+        # 令牌 -> (用户名, 角色, 过期时间, 用途)
+        self._cache: "OrderedDict[str, Tuple[str, str, float, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue(self, username: str, role: str, purpose: Optional[str] = None,
+              ttl: Optional[float] = None) -> str:
+        """
+        签发令牌
+
+        Args:
+            username: 用户名
+            role: 用户角色
+            purpose: 令牌用途，为空时是会话令牌
+            ttl: 有效期（秒），默认使用配置的会话令牌有效期
+        """
+        claims = {"u": username, "r": role, "exp": int(time.time() + (self.ttl if ttl is None else ttl))}
+        if purpose:
+            claims["p"] = purpose
+        payload = json.dumps(claims, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        body = _b64encode(payload)
+        self.issued += 1
+        return f"{body}.{self._sign(body)}"
+
+    def verify(self, token: str, purpose: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        验证令牌
+
+        Args:
+            token: 令牌
+            purpose: 要求的令牌用途，为空时只接受会话令牌
+
+        Returns:
+            {"username", "role", "expires"}，签名无效、已过期或用途不符时返回None
+        """
+        now = time.time()
+
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached is not None:
+                if cached[2] > now:
+                    self._cache.move_to_end(token)
+                    if cached[3] != purpose:
+                        self.rejected += 1
+                        return None
+                    self.cache_hits += 1
+                    return {"username": cached[0], "role": cached[1], "expires": cached[2]}
+                del self._cache[token]
+
+        try:
+            body, signature = token.split(".", 1)
+            if not hmac.compare_digest(signature, self._sign(body)):
+                self.rejected += 1
+                return None
+            payload = json.loads(_b64decode(body))
+            username, role, expires = payload["u"], payload["r"], float(payload["exp"])
+            token_purpose = payload.get("p")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.rejected += 1
+            return None
+
+        if expires <= now:
+            self.rejected += 1
+            return None
+
+        with self._lock:
+            self._cache[token] = (username, role, expires, token_purpose)
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        if token_purpose != purpose:
+            self.rejected += 1
+            return None
+        self.verified += 1
+
+        return {"username": username, "role": role, "expires": expires}
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取令牌统计信息"""
+        return {
+            "issued": self.issued,
+            "verified": self.verified,
+            "cacheHits": self.cache_hits,
+            "rejected": self.rejected,
+            "cached": len(self._cache),
+            "ephemeralSecret": self.ephemeral_secret
+        }
+
+    def _sign(self, body: str) -> str:
+        return _b64encode(hmac.new(self._secret, body.encode("ascii"), hashlib.sha256).digest())
+
+
+# 全局单例实例（服务器启动时按配置设置密钥）
+auth_token_service = AuthTokenService()
@@ -0,0 +1,299 @@
+"""
+后台循环监督
+
+调度循环、充电进度监控、充电桩充电监控等后台循环注册到监督器，由监督器启动的线程
+按目标周期调用循环的单次迭代函数：
+
+- 记录每次迭代的耗时和开始时间相对计划的延迟（落后于目标周期的程度）
+- 迭代抛出异常时按指数退避重试；线程意外退出时由看门狗线程按退避重新启动
+- 单次迭代超过卡住超时视为卡住。卡住的线程无法安全中止（可能持有服务锁），
+  只标记为不健康，由存活检查失败交给进程管理器重启进程
+- 关键循环全部正常运行（未卡住、没有处于出错退避、线程存活）时才算就绪
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from utils.metrics import metrics
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
+
+LOOP_ITERATION = metrics.histogram(
+    "echarge_loop_iteration_seconds", "后台循环单次迭代耗时（秒）", ("loop",)
+)
+LOOP_LAG = metrics.histogram(
+    "echarge_loop_lag_seconds", "后台循环迭代开始时间相对计划的延迟（秒）", ("loop",)
+)
+LOOP_FAILURES = metrics.counter("echarge_loop_failures_total", "后台循环迭代出错次数", ("loop",))
+LOOP_RESTARTS = metrics.counter("echarge_loop_restarts_total", "后台循环线程意外退出后的重启次数", ("loop",))
+
+# 循环状态
+STARTING = "starting"  # 已启动，尚未完成第一次迭代
+RUNNING = "running"    # 正常运行
+BACKOFF = "backoff"    # 迭代出错，等待重试
+STALLED = "stalled"    # 单次迭代超过卡住超时
+DEAD = "dead"          # 线程意外退出，等待看门狗重启
+STOPPED = "stopped"    # 已停止，或迭代函数返回 False 结束
+
+HEALTHY_STATES = (STARTING, RUNNING)
+
+
+class SupervisedLoop:
+    """一个受监督的后台循环"""
+
+    def __init__(self, name: str, step: Callable[[], Any], period: float,
+                 kind: str, critical: bool):
+        self.name = name
+        self.step = step
+        self.period = period
+        self.kind = kind          # 指标标签，同类循环（如各充电桩的充电循环）共用
+        self.critical = critical  # 关键循环不健康时存活/就绪检查失败
+        self.running = True
+        self.thread: Optional[threading.Thread] = None
+        self.wake = threading.Event()
+
+        # 运行统计（monotonic 时间）
+        self.iterations = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.iteration_started: Optional[float] = None  # 进行中的迭代开始时间
+        self.last_finished: Optional[float] = None
+        self.last_duration = 0.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stall_reported = False
+
+
+class LoopSupervisor:
+    """后台循环监督器"""
+
+    # 看门狗检查间隔（秒）
+    WATCHDOG_INTERVAL = 1.0
+
+    def __init__(self):
+        self._loops: Dict[str, SupervisedLoop] = {}
+        self._lock = threading.Lock()
+        self._watchdog: Optional[threading.Thread] = None
+
+        self.stall_timeout = 60.0
+        self.backoff = 1.0
+        self.backoff_max = 30.0
+
+    def configure(self, stall_timeout: float, backoff: float, backoff_max: float):
+        """
+        配置监督参数
+
+        Args:
+            stall_timeout: 单次迭代超过该时间（秒）视为卡住
+            backoff: 迭代出错或线程退出后第一次重试的等待（秒），连续出错时翻倍
+            backoff_max: 重试等待上限（秒）
+        """
+        self.stall_timeout = stall_timeout
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+    def start_loop(self, name: str, step: Callable[[], Any], period: float,
+                   kind: Optional[str] = None, critical: bool = True,
+                   delay: float = 0.0) -> SupervisedLoop:
+        """
+        启动受监督的循环（同名循环已在运行时返回已有的）
+
+        Args:
+            name: 循环名称
+            step: 单次迭代函数，返回 False 时循环结束
+            period: 目标周期（秒），按计划时间调度，迭代耗时不累积到周期中
+            kind: 指标标签，默认与名称相同
+            critical: 是否为关键循环
+            delay: 第一次迭代前的等待（秒）
+        """
+        with self._lock:
+            existing = self._loops.get(name)
+            if existing and existing.running:
+                return existing
+
+            loop = SupervisedLoop(name, step, period, kind or name, critical)
+            self._loops[name] = loop
+            self._start_thread(loop, delay)
+
+            if self._watchdog is None or not self._watchdog.is_alive():
+                self._watchdog = threading.Thread(target=self._watchdog_loop, name="loop-watchdog", daemon=True)
+                self._watchdog.start()
+            return loop
+
+    def stop_loop(self, name: str, wait: bool = True, timeout: float = 10.0):
+        """
+        停止循环（正在进行的迭代会执行完）
+
+        Args:
+            name: 循环名称
+            wait: 是否等待循环线程退出；持有迭代函数需要的锁时必须为 False
+            timeout: 最长等待时间（秒）
+        """
+        with self._lock:
+            loop = self._loops.pop(name, None)
+        if not loop:
+            return
+
+        loop.running = False
+        loop.wake.set()
+        thread = loop.thread
+        if wait and thread and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def get_health(self) -> Dict[str, Any]:
+        """
+        获取后台循环健康状态
+
+        Returns:
+            live: 没有卡住的关键循环；ready: 全部关键循环正常运行；loops: 各循环状态
+        """
+        now = time.monotonic()
+        loops = [self._describe(loop, now) for loop in list(self._loops.values())]
+        critical = [info for info in loops if info["critical"]]
+        watchdog_alive = self._watchdog is not None and self._watchdog.is_alive()
+
+        return {
+            "live": all(info["state"] != STALLED for info in critical) and (watchdog_alive or not loops),
+            "ready": all(info["state"] in HEALTHY_STATES for info in critical),
+            "loops": loops
+        }
+
+    def get_loop_states(self) -> Dict[tuple, int]:
+        """关键循环是否健康，供 echarge_loop_healthy 指标读取"""
+        now = time.monotonic()
+        return {
+            (loop.name,): int(self._state(loop, now) in HEALTHY_STATES)
+            for loop in list(self._loops.values()) if loop.critical
+        }
+
+    def _start_thread(self, loop: SupervisedLoop, delay: float):
+        loop.thread = threading.Thread(
+            target=self._run, args=(loop, delay), name=f"loop-{loop.name}", daemon=True
+        )
+        loop.thread.start()
+
+    def _backoff_delay(self, attempts: int) -> float:
+        return min(self.backoff * 2 ** (min(attempts, 16) - 1), self.backoff_max)
+
+    def _run(self, loop: SupervisedLoop, delay: float):
+        """循环线程：按计划时间调用迭代函数，记录耗时和延迟，出错时退避重试"""
+        next_run = time.monotonic() + delay
+        while loop.running:
+            wait = next_run - time.monotonic()
+            if wait > 0:
+                loop.wake.wait(wait)
+                if not loop.running:
+                    break
+
+            started = time.monotonic()
+            lag = max(started - next_run, 0.0)
+            loop.iteration_started = started
+            try:
+                result = loop.step()
+            except Exception as e:
+                loop.iteration_started = None
+                loop.failures += 1
+                loop.consecutive_failures += 1
+                loop.last_error = f"{type(e).__name__}: {e}"
+                LOOP_FAILURES.inc((loop.kind,))
+
+                retry = self._backoff_delay(loop.consecutive_failures)
+                logger.error("loop_iteration_failed",
+                             "后台循环 %(loop)s 迭代出错（连续 %(attempt)s 次），%(retry).1f 秒后重试: %(error)s",
+                             loop=loop.name, attempt=loop.consecutive_failures, retry=retry, error=loop.last_error)
+                next_run = time.monotonic() + retry
+                continue
+
+            finished = time.monotonic()
+            loop.iteration_started = None
+            loop.iterations += 1
+            loop.consecutive_failures = 0
+            loop.last_finished = finished
+            loop.last_duration = finished - started
+            loop.last_lag = lag
+            loop.max_lag = max(loop.max_lag, lag)
+            LOOP_ITERATION.observe(loop.last_duration, (loop.kind,))
+            LOOP_LAG.observe(lag, (loop.kind,))
+
+            if result is False:
+                break
+
+            # 落后于计划时不补跑错过的迭代
+            next_run = max(next_run + loop.period, finished)
+
+        loop.running = False
+        with self._lock:
+            if self._loops.get(loop.name) is loop:
+                del self._loops[loop.name]
+
+    def _watchdog_loop(self):
+        """看门狗：重启意外退出的循环线程，报告卡住的循环"""
+        while True:
+            time.sleep(self.WATCHDOG_INTERVAL)
+            now = time.monotonic()
+            with self._lock:
+                for loop in list(self._loops.values()):
+                    if not loop.running:
+                        continue
+
+                    if loop.thread and not loop.thread.is_alive():
+                        loop.restarts += 1
+                        loop.iteration_started = None
+                        LOOP_RESTARTS.inc((loop.kind,))
+                        retry = self._backoff_delay(loop.restarts)
+                        logger.error("loop_thread_exited",
+                                     "后台循环 %(loop)s 线程已退出，%(retry).1f 秒后重新启动（第 %(attempt)s 次）",
+                                     loop=loop.name, attempt=loop.restarts, retry=retry, last_error=loop.last_error)
+                        self._start_thread(loop, retry)
+                        continue
+
+                    started = loop.iteration_started
+                    stalled = self._state(loop, now) == STALLED
+                    if stalled and not loop.stall_reported and started is not None:
+                        logger.warning("loop_stalled", "后台循环 %(loop)s 单次迭代已超过 %(stall_timeout)g 秒，可能已卡住",
+                                       loop=loop.name, stall_timeout=self.stall_timeout,
+                                       iteration_seconds=round(now - started, 3))
+                    loop.stall_reported = stalled
+
+    def _state(self, loop: SupervisedLoop, now: float) -> str:
+        if not loop.running:
+            return STOPPED
+        if loop.thread is None or not loop.thread.is_alive():
+            return DEAD
+        started = loop.iteration_started
+        if started is not None and now - started > self.stall_timeout:
+            return STALLED
+        if loop.consecutive_failures:
+            return BACKOFF
+        if loop.iterations == 0:
+            return STARTING
+        return RUNNING
+
+    def _describe(self, loop: SupervisedLoop, now: float) -> Dict[str, Any]:
+        started = loop.iteration_started
+        return {
+            "name": loop.name,
+            "state": self._state(loop, now),
+            "critical": loop.critical,
+            "periodSeconds": loop.period,
+            "iterations": loop.iterations,
+            "failures": loop.failures,
+            "consecutiveFailures": loop.consecutive_failures,
+            "restarts": loop.restarts,
+            "lastError": loop.last_error,
+            "lastDurationMs": round(loop.last_duration * 1000, 3),
+            "lastLagMs": round(loop.last_lag * 1000, 3),
+            "maxLagMs": round(loop.max_lag * 1000, 3),
+            "secondsSinceLastIteration": round(now - loop.last_finished, 3) if loop.last_finished else None,
+            "currentIterationSeconds": round(now - started, 3) if started is not None else None
+        }
+
+
+# 全局单例实例
+loop_supervisor = LoopSupervisor()
+metrics.gauge_func("echarge_loop_healthy", "关键后台循环是否正常运行（1 正常，0 卡住、出错退避或线程退出）",
+                   loop_supervisor.get_loop_states, ("loop",))
@@ -0,0 +1,262 @@
+"""
+运行指标
+
+计数器、增减量表和直方图按线程分片记录：每个线程只写自己的分片，记录时不加锁；
+抓取时汇总全部分片，已结束线程的分片并入累计值后释放。
+取值型指标（队列深度、充电桩利用率等）在抓取时由回调函数读取。
+多进程部署时工作进程定期把请求指标的累计值上报给状态进程，与状态进程的值相加后输出。
+/metrics 接口以 Prometheus 文本格式输出。
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 默认延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标定义"""
+
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labelnames: Sequence[str]):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _values(self, labels: Labels) -> List[float]:
+        """当前线程分片中该指标和标签的值（首次使用时创建）"""
+        shard = self.registry._thread_shard()
+        key = (self.name, labels)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = self._new_values()
+        return values
+
+    def _new_values(self) -> List[float]:
+        return [0.0]
+
+    def render(self, totals: Dict[Labels, List[float]]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, values in sorted(totals.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(values[0])}")
+        return lines
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self._values(labels)[0] += amount
+
+
+class Gauge(_Metric):
+    """可增减的量（如处理中的请求数），同一请求的增减应在同一线程中完成"""
+
+    kind = "gauge"
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self._values(labels)[0] += amount
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        self._values(labels)[0] -= amount
+
+
+class Histogram(_Metric):
+    """直方图：分桶计数、总和与次数"""
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets: Sequence[float]):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_values(self) -> List[float]:
+        # 各分桶（不累计）、+Inf 分桶、总和
+        return [0.0] * (len(self.buckets) + 2)
+
+    def observe(self, value: float, labels: Labels = ()):
+        values = self._values(labels)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def render(self, totals: Dict[Labels, List[float]]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels, values in sorted(totals.items()):
+            cumulative = 0.0
+            for bound, count in zip(bounds, values[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{label_text} {_format_value(cumulative)}")
+        return lines
+
+
+class GaugeFunc(_Metric):
+    """抓取时由回调函数读取的量，回调返回数值或 {标签值元组: 数值}"""
+
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labelnames, func: Callable):
+        super().__init__(registry, name, help_text, labelnames)
+        self.func = func
+
+    def collect(self) -> Dict[Labels, List[float]]:
+        result = self.func()
+        if isinstance(result, dict):
+            return {tuple(labels): [value] for labels, value in result.items()}
+        return {(): [result]}
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict[Tuple[str, Labels], List[float]] = {}
+        self._remote: Dict[str, Dict[Tuple[str, Labels], List[float]]] = {}  # 来源 -> 最近一次上报的累计值
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(name, lambda: Counter(self, name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(name, lambda: Gauge(self, name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(self, name, help_text, labelnames, buckets))
+
+    def gauge_func(self, name: str, help_text: str, func: Callable, labelnames: Sequence[str] = ()) -> GaugeFunc:
+        return self._register(name, lambda: GaugeFunc(self, name, help_text, labelnames, func))
+
+    def render(self, include: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()) -> str:
+        """
+        以 Prometheus 文本格式输出指标
+
+        Args:
+            include: 只输出这些指标，为 None 时输出全部
+            exclude: 不输出的指标
+        """
+        include = set(include) if include is not None else None
+        exclude = set(exclude)
+        totals = self._collect_shards()
+
+        by_metric: Dict[str, Dict[Labels, List[float]]] = {}
+        for (name, labels), values in totals.items():
+            by_metric.setdefault(name, {})[labels] = values
+
+        lines: List[str] = []
+        for name, metric in list(self._metrics.items()):
+            if name in exclude or (include is not None and name not in include):
+                continue
+            if isinstance(metric, GaugeFunc):
+                try:
+                    values = metric.collect()
+                except Exception as e:
+                    # structured_log 依赖本模块，在使用时导入
+                    from utils.structured_log import get_event_logger
+                    get_event_logger(__name__).error("metric_collect_failed", "读取指标失败 %(metric)s: %(error)s",
+                                                     metric=name, error=e)
+                    continue
+            else:
+                values = by_metric.get(name, {})
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
+
+    def export(self, names: Iterable[str]) -> Dict[Tuple[str, Labels], List[float]]:
+        """导出指定指标在本进程的累计值（工作进程上报给状态进程）"""
+        names = set(names)
+        totals = self._collect_shards(include_remote=False)
+        return {key: values for key, values in totals.items() if key[0] in names}
+
+    def merge_remote(self, source: str, totals: Dict[Tuple[str, Labels], List[float]]):
+        """
+        记录其他进程上报的累计值，输出时与本进程的值相加
+
+        同一来源只保留最新一次上报；已退出进程的最后一次上报保留，计数器之和不回退。
+        """
+        with self._lock:
+            self._remote[source] = totals
+
+    def _register(self, name: str, factory: Callable[[], _Metric]):
+        """按名称注册指标，同名指标已存在时返回已有的"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def _thread_shard(self) -> Dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _collect_shards(self, include_remote: bool = True) -> Dict[Tuple[str, Labels], List[float]]:
+        """汇总全部线程分片（默认加上其他进程上报的累计值）；已结束线程的分片并入累计值后移除"""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = live
+
+            totals = {key: list(values) for key, values in self._retired.items()}
+            if include_remote:
+                for remote in self._remote.values():
+                    self._merge(totals, remote)
+            for _, shard in live:
+                # dict.copy() 和切片在持有 GIL 时完成，记录线程同时写入也不会出错
+                self._merge(totals, shard.copy())
+        return totals
+
+    @staticmethod
+    def _merge(target: Dict, shard: Dict):
+        for key, values in shard.items():
+            values = values[:]
+            existing = target.get(key)
+            if existing is None:
+                target[key] = values
+            else:
+                for i, value in enumerate(values):
+                    existing[i] += value
+
+
+# 全局单例实例
+metrics = MetricsRegistry()
@@ -0,0 +1,119 @@
+"""
+响应编码
+
+按媒体类型注册编码器，响应按请求的 Accept 头协商编码格式：
+- application/json：安装了 orjson 时使用 orjson（原生支持 datetime），否则使用标准库 json
+- application/msgpack：安装了 msgpack 时可用，只有客户端明确请求时才使用（内部调用方）
+响应体超过阈值且客户端接受 gzip 时压缩响应。
+"""
+
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Tuple
+
+from flask import Response, request
+
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# 编码器: 媒体类型 -> 编码函数
+_encoders: Dict[str, Callable[[Any], bytes]] = {}
+
+# 客户端请求的媒体类型别名
+_media_aliases = {"application/x-msgpack": MSGPACK}
+
+
+def _default(obj: Any) -> Any:
+    """编码器不能直接处理的类型（与 Flask 默认 JSON 编码一致）"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"无法编码的类型: {type(obj).__name__}")
+
+
+def _encode_json_std(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _encode_json_orjson(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _encode_msgpack(obj: Any) -> bytes:
+    # datetime 编码为与 JSON 相同的 ISO 字符串，两种格式的字段内容一致
+    return msgpack.packb(obj, default=_default, use_bin_type=True, datetime=False)
+
+
+def register_encoder(media_type: str, encode: Callable[[Any], bytes]):
+    """注册（或替换）媒体类型的编码器"""
+    _encoders[media_type] = encode
+
+
+def get_encoder_names() -> Dict[str, str]:
+    """获取已注册的编码器（媒体类型 -> 实现）"""
+    return {media_type: encode.__name__ for media_type, encode in _encoders.items()}
+
+
+register_encoder(JSON, _encode_json_orjson if orjson else _encode_json_std)
+if msgpack and Config.RESPONSE_MSGPACK_ENABLED:
+    register_encoder(MSGPACK, _encode_msgpack)
+
+
+def negotiate_media_type() -> str:
+    """按 Accept 头选择编码格式，默认 JSON；其他格式只有在 Accept 中明确列出时才使用"""
+    accept = request.accept_mimetypes
+    best, best_quality = JSON, accept[JSON]
+    for value, quality in accept:
+        media_type = _media_aliases.get(value, value)
+        if media_type != JSON and media_type in _encoders and quality > 0 and quality >= best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def encode_json(payload: Any) -> bytes:
+    """用已注册的 JSON 编码器编码（不协商，用于事件流等固定为 JSON 的输出）"""
+    return _encoders[JSON](payload)
+
+
+def encode_body(payload: Any) -> Tuple[bytes, str]:
+    """按协商结果编码响应体，返回 (响应体, 媒体类型)"""
+    media_type = negotiate_media_type()
+    return _encoders[media_type](payload), media_type
+
+
+def _accepts_gzip() -> bool:
+    """Accept-Encoding 中 gzip（或 *）的 q 值大于 0"""
+    return request.accept_encodings["gzip"] > 0
+
+
+def build_response(payload: Any, status: int = 200) -> Response:
+    """编码响应体并在超过阈值时压缩"""
+    body, media_type = encode_body(payload)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if (Config.RESPONSE_COMPRESSION_ENABLED and len(body) >= Config.RESPONSE_COMPRESS_MIN_SIZE
+            and _accepts_gzip()):
+        body = gzip.compress(body, compresslevel=Config.RESPONSE_COMPRESS_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(body, status=status, mimetype=media_type, headers=headers)
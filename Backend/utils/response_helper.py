@@ -1,7 +1,8 @@
-from flask import jsonify
-from typing import Any, Dict, Optional
+from flask import Response, request
+from typing import Any, Dict, Optional, Tuple
+from utils.response_encoder import build_response
 
-def success_response(message: str = "操作成功", data: Any = None, code: int = 200) -> Dict[str, Any]:
+def success_response(message: str = "操作成功", data: Any = None, code: int = 200) -> Response:
     """
     创建成功响应
     
@@ -22,9 +23,9 @@ def success_response(message: str = "操作成功", data: Any = None, code: int
     if data is not None:
         response["data"] = data
     
-    return jsonify(response)
+    return build_response(response)
 
-def error_response(message: str = "操作失败", code: int = 400, data: Any = None) -> Dict[str, Any]:
+def error_response(message: str = "操作失败", code: int = 400, data: Any = None) -> Tuple[Response, int]:
     """
     创建错误响应
     
@@ -45,9 +46,9 @@ def error_response(message: str = "操作失败", code: int = 400, data: Any = N
     if data is not None:
         response["data"] = data
     
-    return jsonify(response), code
+    return build_response(response, code), code
 
-def validation_error_response(errors: Dict[str, str]) -> Dict[str, Any]:
+def validation_error_response(errors: Dict[str, str]) -> Tuple[Response, int]:
     """
     创建验证错误响应
     
@@ -63,7 +64,7 @@ def validation_error_response(errors: Dict[str, str]) -> Dict[str, Any]:
         data={"validation_errors": errors}
     )
 
-def unauthorized_response(message: str = "未授权访问") -> Dict[str, Any]:
+def unauthorized_response(message: str = "未授权访问") -> Tuple[Response, int]:
     """
     创建未授权响应
     
@@ -75,7 +76,7 @@ def unauthorized_response(message: str = "未授权访问") -> Dict[str, Any]:
     """
     return error_response(message=message, code=401)
 
-def forbidden_response(message: str = "权限不足") -> Dict[str, Any]:
+def forbidden_response(message: str = "权限不足") -> Tuple[Response, int]:
     """
     创建禁止访问响应
     
@@ -87,7 +88,7 @@ def forbidden_response(message: str = "权限不足") -> Dict[str, Any]:
     """
     return error_response(message=message, code=403)
 
-def not_found_response(message: str = "资源不存在") -> Dict[str, Any]:
+def not_found_response(message: str = "资源不存在") -> Tuple[Response, int]:
     """
     创建资源不存在响应
     
@@ -99,7 +100,7 @@ def not_found_response(message: str = "资源不存在") -> Dict[str, Any]:
     """
     return error_response(message=message, code=404)
 
-def server_error_response(message: str = "服务器内部错误") -> Dict[str, Any]:
+def server_error_response(message: str = "服务器内部错误") -> Tuple[Response, int]:
     """
     创建服务器错误响应
     
@@ -109,4 +110,46 @@ def server_error_response(message: str = "服务器内部错误") -> Dict[str, A
     Returns:
         服务器错误响应
     """
-    return error_response(message=message, code=500) 
\ No newline at end of file
+    return error_response(message=message, code=500) 
+
+def etag_matches(etag: str) -> bool:
+    """
+    判断请求的 If-None-Match 是否与当前 ETag 匹配（弱比较）
+    
+    Args:
+        etag: 当前状态的 ETag（不含引号）
+        
+    Returns:
+        匹配时客户端缓存的响应仍然有效
+    """
+    return request.if_none_match.contains_weak(etag)
+
+def not_modified_response(etag: str) -> Response:
+    """
+    创建304未修改响应
+    
+    Args:
+        etag: 当前状态的 ETag（不含引号）
+        
+    Returns:
+        不带响应体的304响应
+    """
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def with_etag(response: Response, etag: str) -> Response:
+    """
+    为响应添加 ETag，要求客户端每次使用前重新验证
+    
+    Args:
+        response: 成功响应
+        etag: 构建响应前获取的 ETag（不含引号）
+        
+    Returns:
+        添加了 ETag 的响应
+    """
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,277 @@
+"""
+充电站状态进程的本地 IPC
+
+多进程部署时由一个状态进程持有调度、排队、充电过程等全部状态，
+HTTP 工作进程通过 Unix 套接字调用状态进程中服务的公开方法。
+
+协议：每帧为 4 字节大端长度 + pickle 数据。
+- 请求: (服务名, 方法名, 位置参数, 关键字参数)
+- 响应: (是否成功, 返回值或错误信息)
+
+套接字文件权限为 0600，只允许同一用户的进程连接（pickle 只能用于可信的本地进程之间）。
+套接字先在权限为 0700 的临时目录中绑定并设置权限，再移动到目标路径，目标路径上不会出现权限更宽的套接字。
+"""
+
+import os
+import pickle
+import socket
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
+
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+
+class StateRPCError(RuntimeError):
+    """状态进程调用失败"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_frame(sock: socket.socket, obj: Any):
+    """发送一帧"""
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock: socket.socket) -> Any:
+    """接收一帧"""
+    (size,) = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ConnectionError(f"帧长度超出限制: {size}")
+    return pickle.loads(_recv_exact(sock, size))
+
+
+class StateServer:
+    """状态进程中的服务端，把请求分发给本进程的服务单例"""
+
+    def __init__(self, socket_path: str, services: Dict[str, Any]):
+        self.socket_path = socket_path
+        self.services = services
+
+        self.running = False
+        self._listener: Optional[socket.socket] = None
+        self._accept_thread = None
+
+        # 统计信息
+        self.total_connections = 0
+        self.total_requests = 0
+        self.total_errors = 0
+
+    def start(self):
+        """开始监听"""
+        if self.running:
+            return
+
+        directory = os.path.dirname(self.socket_path) or "."
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        # mkdtemp 创建的目录权限为 0700，其他用户在套接字移动到目标路径前无法连接
+        private_dir = tempfile.mkdtemp(prefix=".state-rpc-", dir=directory)
+        try:
+            private_path = os.path.join(private_dir, "state.sock")
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._listener.bind(private_path)
+            os.chmod(private_path, 0o600)
+            self._listener.listen(128)
+            os.replace(private_path, self.socket_path)
+        except OSError:
+            if self._listener is not None:
+                self._listener.close()
+                self._listener = None
+            raise
+        finally:
+            shutil.rmtree(private_dir, ignore_errors=True)
+
+        self.running = True
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+        logger.info("state_server_listening", "状态进程已监听: %(socket_path)s", socket_path=self.socket_path)
+
+    def stop(self):
+        """停止监听并删除套接字文件"""
+        if not self.running:
+            return
+
+        self.running = False
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        logger.info("state_server_stopped", "状态进程已停止监听", socket_path=self.socket_path)
+
+    def _accept_loop(self):
+        """接受工作进程连接，每个连接一个线程"""
+        while self.running:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                break
+            self.total_connections += 1
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn: socket.socket):
+        """处理一个连接上的请求"""
+        with conn:
+            while self.running:
+                try:
+                    service_name, method_name, args, kwargs = recv_frame(conn)
+                except (ConnectionError, OSError, EOFError):
+                    return
+
+                self.total_requests += 1
+                try:
+                    send_frame(conn, (True, self._dispatch(service_name, method_name, args, kwargs)))
+                except (ConnectionError, OSError):
+                    return
+                except Exception as e:
+                    self.total_errors += 1
+                    try:
+                        send_frame(conn, (False, f"{type(e).__name__}: {e}"))
+                    except (ConnectionError, OSError):
+                        return
+
+    def _dispatch(self, service_name: str, method_name: str, args, kwargs) -> Any:
+        """调用服务的公开方法"""
+        service = self.services.get(service_name)
+        if service is None:
+            raise StateRPCError(f"未知服务: {service_name}")
+        if method_name.startswith("_"):
+            raise StateRPCError(f"不允许调用私有方法: {method_name}")
+
+        method = getattr(service, method_name)
+        if not callable(method):
+            raise StateRPCError(f"{service_name}.{method_name} 不是方法")
+        return method(*args, **kwargs)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取服务端统计信息"""
+        return {
+            "running": self.running,
+            "socketPath": self.socket_path,
+            "totalConnections": self.total_connections,
+            "totalRequests": self.total_requests,
+            "totalErrors": self.total_errors
+        }
+
+
+class StateClient:
+    """工作进程中的客户端，每个线程使用独立的长连接"""
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        # 统计信息
+        self.total_calls = 0
+        self.total_call_time = 0.0
+        self.reconnects = 0
+
+    def call(self, service_name: str, method_name: str, args=(), kwargs=None) -> Any:
+        """调用状态进程中服务的方法"""
+        request = (service_name, method_name, args, kwargs or {})
+        start = time.perf_counter()
+
+        # 连接可能因状态进程重启而断开，重新连接后重试一次（未发送成功的请求才重试）
+        for attempt in range(2):
+            sock = self._get_socket()
+            try:
+                send_frame(sock, request)
+            except (ConnectionError, OSError):
+                self._close_socket()
+                if attempt:
+                    raise StateRPCError("无法连接状态进程")
+                self.reconnects += 1
+                continue
+
+            try:
+                ok, value = recv_frame(sock)
+            except (ConnectionError, OSError, EOFError) as e:
+                self._close_socket()
+                raise StateRPCError(f"状态进程连接中断: {e}")
+            break
+
+        self.total_calls += 1
+        self.total_call_time += time.perf_counter() - start
+
+        if not ok:
+            raise StateRPCError(value)
+        return value
+
+    def close(self):
+        """关闭当前线程的连接"""
+        self._close_socket()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取客户端统计信息"""
+        return {
+            "socketPath": self.socket_path,
+            "totalCalls": self.total_calls,
+            "avgCallMs": round(self.total_call_time / self.total_calls * 1000, 3) if self.total_calls else 0.0,
+            "reconnects": self.reconnects
+        }
+
+    def _get_socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise StateRPCError(f"无法连接状态进程: {e}")
+            self._local.sock = sock
+        return sock
+
+    def _close_socket(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+            self._local.sock = None
+
+
+class ServiceProxy:
+    """服务代理：调用公开方法时转发到状态进程"""
+
+    def __init__(self, client: StateClient, service_name: str):
+        self._client = client
+        self._service_name = service_name
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def remote_method(*args, **kwargs):
+            return self._client.call(self._service_name, name, args, kwargs)
+
+        remote_method.__name__ = name
+        return remote_method
+
+    def __repr__(self):
+        return f"ServiceProxy({self._service_name!r})"
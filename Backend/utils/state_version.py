@@ -0,0 +1,124 @@
+"""
+充电站状态版本号
+
+每个聚合（充电桩集合、排队状态、某个用户的充电请求和充电历史）维护一个单调递增的版本号，
+状态变化时推进版本。轮询接口用版本号生成 ETag，客户端携带 If-None-Match
+且状态没有变化时直接返回 304，不必重新构建和序列化响应。
+
+按用户的聚合随用户数增长，版本表只保留最近推进的 STATE_VERSION_MAX_KEYS 个聚合。
+不在表中的聚合使用被淘汰聚合的最高版本号：淘汰后相关 ETag 最多失效一次，
+聚合再次变化时版本号一定大于该值，不会在状态变化后仍然匹配旧的 ETag。
+"""
+
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from utils.structured_log import get_event_logger
+
+logger = get_event_logger(__name__)
+
+PILES = "piles"
+QUEUE = "queue"
+WAITING_AREA = "waiting_area"  # 等候区车辆的增减（与 QUEUE 一同推进）
+
+
+def user_key(user_id: str) -> str:
+    """用户充电请求的聚合名"""
+    return f"user:{user_id}"
+
+
+def pile_queue_key(pile_id: str) -> str:
+    """充电桩车位的聚合名（与 QUEUE 一同推进）"""
+    return f"pile_queue:{pile_id}"
+
+
+def history_key(user_id: str) -> str:
+    """用户充电历史的聚合名"""
+    return f"history:{user_id}"
+
+
+# 计入排队版本号的字段（长轮询用）
+QUEUE_VERSION_FIELDS = ("requestId", "status", "queuePosition", "position", "aheadCount", "assignedPileId")
+
+
+def queue_status_version(queue_status: Optional[Dict[str, Any]]) -> str:
+    """
+    排队状态的版本号，只由位置相关字段计算（不含随时间变化的预计等待时间），没有排队信息时为 "none"
+    """
+    if not queue_status:
+        return "none"
+    fields = tuple(queue_status.get(name) for name in QUEUE_VERSION_FIELDS)
+    return format(zlib.crc32(repr(fields).encode("utf-8")), "08x")
+
+
+class StateVersions:
+    """按聚合维护的状态版本号"""
+
+    def __init__(self, max_keys: int):
+        """
+        Args:
+            max_keys: 保留版本号的聚合数量上限，超过时淘汰最久未推进的聚合
+        """
+        # 进程启动标识：重启后版本号从头开始，旧的 ETag 不会被误认为仍然有效
+        self._epoch = format(int(time.time() * 1000), "x")
+        self._counter = 0
+        self._versions: "OrderedDict[str, int]" = OrderedDict()  # 按推进顺序排列
+        self._max_keys = max_keys
+        self._evicted = 0  # 被淘汰聚合的最高版本号，不在表中的聚合使用该值
+        self._listeners: List[Callable] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable):
+        """注册版本变化监听器，参数为变化的聚合名元组（在调用方持有服务锁时执行，不能阻塞）"""
+        self._listeners.append(listener)
+
+    def bump(self, *keys: str):
+        """推进聚合的版本号（可在持有其他服务锁时调用）"""
+        with self._lock:
+            self._counter += 1
+            for key in keys:
+                self._versions[key] = self._counter
+                self._versions.move_to_end(key)
+            while len(self._versions) > self._max_keys:
+                # 按推进顺序淘汰，被淘汰的版本号递增
+                _, self._evicted = self._versions.popitem(last=False)
+
+        for listener in self._listeners:
+            try:
+                listener(keys)
+            except Exception as e:
+                logger.error("state_listener_failed", "状态版本监听器执行失败: %(error)s",
+                             keys=",".join(keys), error=e)
+
+    def get(self, key: str) -> int:
+        """获取聚合的当前版本号，不在版本表中（从未变化过或已被淘汰）时为被淘汰聚合的最高版本号"""
+        return self._versions.get(key, self._evicted)
+
+    def etag(self, *keys: str, extra=None) -> str:
+        """
+        由聚合版本号生成 ETag（不含引号）
+
+        Args:
+            keys: 响应依赖的聚合
+            extra: 响应中随时间变化、不由版本号覆盖的少量值（如按分钟显示的排队时长）
+        """
+        tag = f"{self._epoch}-" + ".".join(str(self._versions.get(key, self._evicted)) for key in keys)
+        if extra is not None:
+            tag += "-" + format(zlib.crc32(repr(extra).encode("utf-8")), "x")
+        return tag
+
+    def get_statistics(self) -> Dict[str, int]:
+        """获取版本统计信息"""
+        return {
+            "counter": self._counter,
+            "aggregates": len(self._versions),
+            "evictedVersion": self._evicted
+        }
+
+
+# 全局单例实例
+state_versions = StateVersions(Config.STATE_VERSION_MAX_KEYS)
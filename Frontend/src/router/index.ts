@@ -62,12 +62,13 @@ const router = createRouter({
 // 路由守卫
 router.beforeEach((to, from, next) => {
   const userJson = localStorage.getItem('currentUser')
+  const token = localStorage.getItem('authToken')
   const requiresAuth = to.matched.some(record => record.meta.requiresAuth)
   
-  if (requiresAuth && !userJson) {
+  if (requiresAuth && (!userJson || !token)) {
     // 需要登录但用户未登录，跳转到登录页
     next({ name: 'login' })
-  } else if (requiresAuth && userJson) {
+  } else if (requiresAuth && userJson && token) {
     // 需要登录且用户已登录，检查用户类型是否匹配
     const user = JSON.parse(userJson)
     const requiredUserType = to.matched.find(record => record.meta.userType)?.meta.userType